@@ -0,0 +1,216 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+SYS_CPU = Path("/sys/devices/system/cpu")
+SYS_NODE = Path("/sys/devices/system/node")
+
+
+def parse_cpulist(text: str) -> list[int]:
+    """
+    Parse a kernel CPU list such as ``"0-3,8,10-11"``
+    """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def detect_topology(sys_cpu: Path = SYS_CPU, sys_node: Path = SYS_NODE) -> dict:
+    """
+    Detect the usable CPUs grouped by NUMA node and physical core
+
+    Only CPUs in this process's affinity mask are considered. Without sysfs
+    (e.g. macOS) every CPU is treated as its own core on a single node.
+
+    Returns:
+        ``{"nodes": [[[cpu, sibling, ...], ...core], ...node]}``; each core
+        lists its hyper-thread siblings, first CPU first
+    """
+    if hasattr(os, "sched_getaffinity"):
+        allowed = set(os.sched_getaffinity(0))
+    else:
+        allowed = set(range(os.cpu_count() or 1))
+
+    node_cpus = []
+    for node_dir in sorted(sys_node.glob("node[0-9]*"), key=lambda p: int(p.name[4:])):
+        cpus = [c for c in parse_cpulist((node_dir / "cpulist").read_text()) if c in allowed]
+        if cpus:
+            node_cpus.append(cpus)
+    if not node_cpus:
+        node_cpus = [sorted(allowed)]
+
+    nodes = []
+    for cpus in node_cpus:
+        cores = {}
+        for cpu in cpus:
+            siblings_file = sys_cpu / f"cpu{cpu}" / "topology" / "thread_siblings_list"
+            if siblings_file.exists():
+                siblings = [c for c in parse_cpulist(siblings_file.read_text()) if c in allowed]
+            else:
+                siblings = [cpu]
+            cores.setdefault(min(siblings), siblings)
+        nodes.append([cores[key] for key in sorted(cores)])
+    return {"nodes": nodes}
+
+
+def candidate_layouts(topology: dict, max_workers: int | None = None) -> list[dict]:
+    """
+    Worker layouts in which no two workers share a physical core
+
+    Each worker gets ``threads`` physical cores (and their hyper-thread
+    siblings in its affinity mask) from a single NUMA node, so a worker's
+    torch thread pool never spans nodes. Candidates range from one thread per
+    worker to one worker per NUMA node. When ``threads`` does not divide a
+    node's core count (or ``max_workers`` caps the workers), the remaining
+    cores are left out of every worker's cpuset.
+
+    Args:
+        topology: Result of ``detect_topology()``
+        max_workers: Upper bound on the worker count, e.g. from available memory
+
+    Returns:
+        Layouts as ``{"workers", "threads", "cpusets"}``
+    """
+    nodes = topology["nodes"]
+    cores_per_node = min(len(cores) for cores in nodes)
+    thread_counts = sorted({t for t in (1, 2, 4, 8, cores_per_node) if t <= cores_per_node})
+
+    layouts = []
+    for threads in thread_counts:
+        cpusets = []
+        for cores in nodes:
+            for start in range(0, len(cores) - threads + 1, threads):
+                cpusets.append(sorted(cpu for core in cores[start:start + threads] for cpu in core))
+        if max_workers is not None:
+            cpusets = cpusets[:max_workers]
+        if cpusets:
+            layouts.append({"workers": len(cpusets), "threads": threads, "cpusets": cpusets})
+    return layouts
+
+
+def default_layout(layouts: list[dict]) -> dict:
+    """
+    Layout used without tuning: the middle ground of about four threads per worker
+    """
+    return min(layouts, key=lambda layout: (abs(layout["threads"] - 4), -layout["threads"]))
+
+
+def apply_layout(cpuset: list[int], threads: int):
+    """
+    Pin the current process to ``cpuset`` and size its thread pools
+
+    OpenMP/MKL read their environment variables when the library starts, so
+    this should run before torch is first used in the process.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpuset)
+
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Inter-op pool already started; keep its size
+        pass
+
+
+def _benchmark_worker(cpuset, threads, model_path, imgsz, seconds, barrier, counts):
+    apply_layout(cpuset, threads)
+    import numpy as np
+    from ultralytics import YOLOWorld
+
+    model = YOLOWorld(model_path)
+    image = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    model.predict(image, imgsz=imgsz, verbose=False)  # warm-up
+    barrier.wait()
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        model.predict(image, imgsz=imgsz, verbose=False)
+        done += 1
+    counts.put(done)
+
+
+def benchmark_layout(layout: dict, model_path: str, imgsz: int = 640, seconds: float = 5.0) -> float:
+    """
+    Run every worker of a layout concurrently and measure total images per second
+
+    Running all workers at once (rather than one worker in isolation) also
+    captures memory bandwidth and cache contention between them.
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(layout["workers"])
+    counts = context.Queue()
+    processes = [
+        context.Process(target=_benchmark_worker,
+                        args=(cpuset, layout["threads"], model_path, imgsz, seconds, barrier, counts))
+        for cpuset in layout["cpusets"]
+    ]
+    for process in processes:
+        process.start()
+    total = sum(counts.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / seconds
+
+
+def tune_layout(model_path: str, max_workers: int | None = None, imgsz: int = 640, seconds: float = 5.0,
+                benchmark=benchmark_layout) -> dict:
+    """
+    Pick the worker layout with the highest measured throughput
+
+    Args:
+        model_path: Weights used for the benchmark
+        max_workers: Upper bound on the worker count
+        imgsz: Benchmark input size
+        seconds: Measurement time per candidate layout
+        benchmark: Callable ``(layout, model_path, imgsz, seconds) -> images/s``
+
+    Returns:
+        The best layout with its measured ``throughput`` and all ``candidates``
+    """
+    topology = detect_topology()
+    layouts = candidate_layouts(topology, max_workers=max_workers)
+    results = []
+    for layout in layouts:
+        throughput = benchmark(layout, model_path, imgsz, seconds)
+        print(f"CPU layout {layout['workers']} workers x {layout['threads']} threads: {throughput:.1f} images/s")
+        results.append(dict(layout, throughput=throughput))
+    best = max(results, key=lambda layout: layout["throughput"])
+    best["candidates"] = [{k: r[k] for k in ("workers", "threads", "throughput")} for r in results]
+    # Recorded so that a cached result can be checked against the machine and model
+    best["topology"] = topology
+    best["model"] = model_path
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Choose the gunicorn worker and thread layout for this machine")
+    parser.add_argument("--model", default="./yolov8s-world.pt")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--output", default=None, help="Write the chosen layout as JSON to this file")
+    args = parser.parse_args()
+
+    layout = tune_layout(args.model, max_workers=args.max_workers, imgsz=args.imgsz, seconds=args.seconds)
+    text = json.dumps(layout, indent=4)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+gunicorn settings for the detection API
+
+The worker count, the torch/OpenMP threads per worker and the CPUs each
+worker is pinned to follow the machine's core/NUMA layout. The layout is
+picked by a short tuning run (``python -m cpu_layout``) on the first
+start and cached in cpu_layout.json until the topology or model changes.
+
+Environment:
+    CPU_LAYOUT_TUNING: "0" skips the tuning run and uses the default layout
+    CPU_LAYOUT_MAX_WORKERS: Upper bound on the worker count
+    CPU_LAYOUT_MODEL: Weights used for tuning
+    CPU_LAYOUT_FILE: Location of the cached layout
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from cpu_layout import apply_layout, candidate_layouts, default_layout, detect_topology
+
+LAYOUT_FILE = Path(os.environ.get("CPU_LAYOUT_FILE", "./cpu_layout.json"))
+TUNING_MODEL = os.environ.get("CPU_LAYOUT_MODEL", "./yolov8s-world.pt")
+MAX_WORKERS = int(os.environ["CPU_LAYOUT_MAX_WORKERS"]) if os.environ.get("CPU_LAYOUT_MAX_WORKERS") else None
+
+
+def load_layout() -> dict:
+    """
+    Cached layout if it still matches this machine, otherwise a freshly tuned one
+    """
+    topology = detect_topology()
+    if LAYOUT_FILE.exists():
+        cached = json.loads(LAYOUT_FILE.read_text())
+        if (cached.get("topology") == topology and cached.get("model") == TUNING_MODEL
+                and (MAX_WORKERS is None or cached["workers"] <= MAX_WORKERS)):
+            return cached
+
+    if os.environ.get("CPU_LAYOUT_TUNING", "1") != "0":
+        # Tuning runs in a separate process so the master never loads torch
+        command = [sys.executable, "-m", "cpu_layout", "--model", TUNING_MODEL, "--output", str(LAYOUT_FILE)]
+        if MAX_WORKERS is not None:
+            command += ["--max-workers", str(MAX_WORKERS)]
+        try:
+            subprocess.run(command, check=True)
+            return json.loads(LAYOUT_FILE.read_text())
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            print(f"CPU layout tuning failed, using the default layout: {e}")
+
+    return default_layout(candidate_layouts(topology, max_workers=MAX_WORKERS))
+
+
+layout = load_layout()
+
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = layout["workers"]
+
+
+def pre_fork(server, worker):
+    # Give the new worker a CPU set no live worker holds (replacements reuse the slot of the worker they replace)
+    used = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    free = [slot for slot in range(len(layout["cpusets"])) if slot not in used]
+    # More workers than CPU sets (e.g. after TTIN) share sets round-robin
+    worker.cpu_slot = free[0] if free else len(server.WORKERS) % len(layout["cpusets"])
+
+
+def post_fork(server, worker):
+    cpuset = layout["cpusets"][worker.cpu_slot]
+    apply_layout(cpuset, layout["threads"])
+    server.log.info("Worker %s pinned to CPUs %s with %s threads", worker.pid, cpuset, layout["threads"])
@@ -1,29 +1,301 @@
-from fastapi import FastAPI, UploadFile, HTTPException, Form
+from fastapi import FastAPI, UploadFile, HTTPException, Form, File, Request, Header, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from yolo.object_detection import YoloDetector
+from yolo.dataset_split import DatasetSplit
+from yolo.incremental import TrainingLedger, select_incremental_samples
+from yolo.model_registry import ModelRegistry
+from yolo.model_pool import ModelPool
+from yolo.ingest import DecodedImage, UploadTooLarge, decode_image, decode_image_file, read_upload
+from yolo.detections import Detections
+from yolo.latency_profile import LatencyProfile
+from yolo.distillation import build_distillation_dataset
+from yolo.admission import LANES, AdmissionController, AdmissionRejected, RateLimited
+from yolo.pipeline import Stage, StagedPipeline
+from yolo.coalescing import SingleFlight, request_key
+from yolo.grpc_server import detect_response, grpc_available, start_grpc_server
+from yolo.batch_jobs import JOB_STATES, BatchJobRunner, BatchJobStore
+from yolo.render_cache import RenderCache
+from yolo.annotate import draw_bounding_boxes, render_annotated_image
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import tempfile
 import os
-from PIL import Image, ImageDraw, ImageFont
-import io
-import base64
 import random
 import json
 import shutil
 from pathlib import Path
 import yaml
 from datetime import datetime
+from contextlib import asynccontextmanager
+import time
+import asyncio
+from concurrent.futures import BrokenExecutor
+import numpy as np
+from PIL import Image
+import orjson
+
+# Registry of fine-tuned model versions
+MODEL_REGISTRY_DIR = Path("model_registry")
+MODEL_REGISTRY_MAX_BYTES = 2 * 1024 ** 3  # Disk quota for stored checkpoints
+MODEL_REGISTRY_KEEP_LAST = 3  # Newest versions that are never pruned
+PRELOADED_VERSIONS = 2  # Newest versions kept in memory for instant switching
+model_registry = ModelRegistry(
+    MODEL_REGISTRY_DIR,
+    max_bytes=MODEL_REGISTRY_MAX_BYTES,
+    keep_last=MODEL_REGISTRY_KEEP_LAST
+)
+
+# Model pool: other registered versions (e.g. one per restaurant chain or
+# camera site) are served side by side when a request names them. They are
+# loaded on first use and the least recently used are evicted when all
+# resident models (serving, preloaded and pooled) exceed the budget
+MODEL_POOL_MAX_BYTES = 1024 ** 3
+
+# Cascade (opt-in, e.g. CASCADE_MODEL_PATH=./yolov8n-world.pt): a small model
+# screens every image and only images whose top confidences fall inside the
+# uncertainty band are sent to the main model
+CASCADE_MODEL_PATH = os.environ.get("CASCADE_MODEL_PATH") or None
+CASCADE_UNCERTAINTY_BAND = (0.25, 0.6)
+
+# Backbone features of recently seen images are cached so that re-querying
+# an image with another set of classes only runs the text-conditioned head
+FEATURE_CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+# Large vocabularies: above this many classes, each image only runs the
+# detection head on the classes whose text embeddings are most similar to
+# the whole image (CLIP), so menu-sized vocabularies do not slow down linearly
+CANDIDATE_CLASSES = 80
+VOCABULARY_INDEX_DIR = Path("vocabulary_index")
+
+# Vocabulary maintenance: classes whose text embeddings are at least this
+# similar are suggested as duplicates (e.g. "backpack" and "backpak"). With an
+# auto-merge similarity (opt-in, e.g. 0.95), new classes above it are merged
+# into the existing class when added
+CLASS_MERGE_SIMILARITY = 0.9
+AUTO_MERGE_SIMILARITY = None
+
+# Prepared models (vocabulary embeddings baked in, conv/BN fused) are saved
+# here keyed by weights hash and vocabulary, so that new or restarted workers
+# load them directly instead of running the text encoder
+MODEL_ARTIFACT_DIR = Path("model_artifacts")
+MODEL_ARTIFACT_MAX_BYTES = 2 * 1024 ** 3
+
+# Serve the promoted registry version if there is one
+if model_registry.active:
+    _active_entry = model_registry.get(model_registry.active)
+    yolo = YoloDetector(
+        model_path=_active_entry["weights"],
+        model_version=_active_entry["version"],
+        cascade_model_path=CASCADE_MODEL_PATH,
+        uncertainty_band=CASCADE_UNCERTAINTY_BAND,
+        closed_set=_active_entry.get("backend") == "closed_set",
+        world_model_path=_active_entry.get("teacher_weights"),
+        feature_cache_bytes=FEATURE_CACHE_MAX_BYTES,
+        candidate_k=CANDIDATE_CLASSES,
+        vocabulary_index_dir=VOCABULARY_INDEX_DIR,
+        auto_merge_threshold=AUTO_MERGE_SIMILARITY,
+        artifact_cache_dir=MODEL_ARTIFACT_DIR,
+        artifact_cache_bytes=MODEL_ARTIFACT_MAX_BYTES
+    )
+else:
+    yolo = YoloDetector(
+        cascade_model_path=CASCADE_MODEL_PATH,
+        uncertainty_band=CASCADE_UNCERTAINTY_BAND,
+        feature_cache_bytes=FEATURE_CACHE_MAX_BYTES,
+        candidate_k=CANDIDATE_CLASSES,
+        vocabulary_index_dir=VOCABULARY_INDEX_DIR,
+        auto_merge_threshold=AUTO_MERGE_SIMILARITY,
+        artifact_cache_dir=MODEL_ARTIFACT_DIR,
+        artifact_cache_bytes=MODEL_ARTIFACT_MAX_BYTES
+    )
 
-yolo = YoloDetector()
+def load_pool_model(version: str):
+    """
+    モデルプール用に登録済みバージョンのモデルを読み込む（事前読み込み済みならそれを使う）
+    """
+    model = model_registry.get_preloaded(version, yolo.vocabulary_version)
+    if model is not None:
+        return model
+    entry = model_registry.get(version)
+    closed_set = entry.get("backend") == "closed_set"
+    # Reuse the serving model's text embeddings instead of running the text encoder again
+    vocabulary_from = yolo.model if not (closed_set or yolo.closed_set) else None
+    return yolo.prepare_model(entry["weights"], vocabulary_from=vocabulary_from, closed_set=closed_set)
+
+def resident_models() -> list:
+    """
+    モデルプールの外でメモリに保持されているモデル（配信中・事前読み込み済み）
+    """
+    return [yolo.model, *model_registry.preloaded_models()]
+
+model_pool = ModelPool(load_pool_model, max_bytes=MODEL_POOL_MAX_BYTES, resident=resident_models)
+
+# Upload handling: uploads larger than this are rejected while streaming, and
+# images are decoded at about the model input size. Request bodies are capped
+# as they are received (multipart bodies are spooled before an endpoint runs),
+# with room for the form fields next to the image
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+MAX_BATCH_REQUEST_BYTES = 2 * 1024 ** 3
+DETECTION_IMAGE_SIZE = 640
+# Tiled inference decodes at a higher resolution so that small items survive
+TILED_IMAGE_SIZE = 2560
+
+# Detection parameter defaults shared by the HTTP and gRPC endpoints
+DEFAULT_CONFIDENCE = 0.25
+DEFAULT_TILE_SIZE = 640
+DEFAULT_TILE_OVERLAP = 0.2
+DEFAULT_TILE_FULL_IMAGE = True
+
+# Annotated images are rendered lazily: /detect returns a short-lived URL and
+# keeps the decoded image and detections (in a directory shared by the
+# workers, in memory under /dev/shm), and the image is only drawn and encoded
+# when the URL is fetched. Stored images are downscaled to RENDER_MAX_SIDE; if
+# an entry cannot be stored (e.g. /dev/shm is full) the URL is null
+RENDER_CACHE_DIR = Path(os.environ.get(
+    "RENDER_CACHE_DIR",
+    "/dev/shm/yolo-renders" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "yolo-renders")
+))
+RENDER_CACHE_MAX_BYTES = 512 * 1024 ** 2
+RENDER_TTL_SECONDS = 300
+RENDER_MAX_SIDE = 1280
+RENDER_FORMATS = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+render_cache = RenderCache(RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES, ttl_seconds=RENDER_TTL_SECONDS,
+                           max_side=RENDER_MAX_SIDE)
 
 # Training data directory
 TRAINING_DATA_DIR = Path("training_data")
 TRAINING_DATA_DIR.mkdir(exist_ok=True)
 
+# Validation split: fraction of images held out per class, capped so that
+# validation stays cheap as the dataset grows
+VAL_FRACTION = 0.2
+MAX_VAL_IMAGES = 200
+dataset_split = DatasetSplit(TRAINING_DATA_DIR, val_fraction=VAL_FRACTION, max_val_images=MAX_VAL_IMAGES)
+
+# Distillation: unlabeled images placed here are pseudo-labeled by the
+# open-vocabulary model and used to train a closed-set student detector
+UNLABELED_DATA_DIR = TRAINING_DATA_DIR / "unlabeled"
+DISTILLATION_DATA_DIR = TRAINING_DATA_DIR / "distill"
+DISTILL_STUDENT_WEIGHTS = "yolov8n.pt"
+
+# Record of fine-tuning runs, used by incremental training
+training_ledger = TrainingLedger(TRAINING_DATA_DIR)
+
+# Per-resolution latency profile used to pick the input size per request
+latency_profile = LatencyProfile(sizes=(320, 416, 512, 640, 800, 960), default_size=DETECTION_IMAGE_SIZE)
+
+# Admission control in front of the detector: concurrent inferences, queue
+# size and per-client rate limits (requests per second with a burst allowance)
+INFERENCE_CONCURRENCY = 1
+MAX_QUEUED_REQUESTS = 64
+CLIENT_RATE_PER_SECOND = 5.0
+CLIENT_BURST = 20
+admission = AdmissionController(
+    max_concurrency=INFERENCE_CONCURRENCY,
+    rate_per_second=CLIENT_RATE_PER_SECOND,
+    burst=CLIENT_BURST,
+    max_queue=MAX_QUEUED_REQUESTS
+)
+
+# Request pipeline: decoding and annotation (box drawing, JPEG and base64
+# encoding) run in their own process pools and inference on a dedicated
+# executor, so the stages of different requests overlap instead of the
+# inference cores idling while an image is decoded or encoded. The worker
+# processes are single-threaded and import only PIL (yolo.ingest, yolo.annotate).
+# Each stage takes STAGE_QUEUE_PER_WORKER items per worker; further requests wait in front of it
+DECODE_PROCESSES = 2
+ANNOTATE_PROCESSES = 2
+STAGE_QUEUE_PER_WORKER = 2
+pipeline = StagedPipeline([
+    Stage("decode", DECODE_PROCESSES, processes=True, max_in_flight=DECODE_PROCESSES * STAGE_QUEUE_PER_WORKER),
+    Stage("infer", INFERENCE_CONCURRENCY, max_in_flight=INFERENCE_CONCURRENCY * STAGE_QUEUE_PER_WORKER),
+    Stage("annotate", ANNOTATE_PROCESSES, processes=True,
+          max_in_flight=ANNOTATE_PROCESSES * STAGE_QUEUE_PER_WORKER)
+])
+
+# Identical detection requests (same image bytes, vocabulary, model and
+# parameters) arriving while the first one is running wait for its result
+# instead of running inference again, e.g. app retries or a shared photo.
+# Beyond this many waiters per request, duplicates are rejected with 503
+MAX_COALESCED_WAITERS = 32
+single_flight = SingleFlight(max_waiters=MAX_COALESCED_WAITERS)
+
+# gRPC front end: internal services send raw image bytes and receive packed
+# detections through the same model, admission control, pipeline and request
+# coalescing as the HTTP API (needs requirements-grpc.txt; port 0 disables it)
+GRPC_PORT = int(os.environ.get("GRPC_PORT", "50051"))
+GRPC_STREAM_WINDOW = 4
+
+# Offline batch jobs: clients submit a manifest of image paths (relative to
+# BATCH_INPUT_DIR) or uploads and poll for progress instead of holding a
+# connection per image. Jobs are stored in SQLite (created on first use) and
+# survive restarts; they run in the background in the batch lane, up to
+# BATCH_SIZE images per inference, and write their results as JSONL. An
+# inference holds the only slot, so batches are cut to what the latency
+# profile says runs in BATCH_MAX_SLOT_MS; interactive requests wait at most
+# about that long. A job whose worker stops renewing its lease for
+# BATCH_JOB_LEASE_SECONDS is resumed by another worker
+BATCH_JOBS_DIR = Path(os.environ.get("BATCH_JOBS_DIR", "batch_jobs"))
+BATCH_INPUT_DIR = Path(os.environ.get("BATCH_INPUT_DIR", "batch_inputs"))
+BATCH_SIZE = 8
+BATCH_MAX_SLOT_MS = 250
+BATCH_JOB_LEASE_SECONDS = 300
+MAX_BATCH_UPLOADS = 500
+batch_jobs = BatchJobStore(BATCH_JOBS_DIR, lease_seconds=BATCH_JOB_LEASE_SECONDS)
+
+def measure_latency_profile(runs: int = 3):
+    """
+    実際のリクエストと同じ入力経路で入力サイズごとの推論レイテンシを計測する
+
+    リクエストの画像はモデルの入力解像度程度でPIL画像としてデコードされ、
+    _predict_rgbでレターボックス処理されるため、同じ形の画像で計測する
+    """
+    rng = np.random.default_rng(0)
+    probes = {}
+    for size in latency_profile.sizes:
+        # A 4:3 photo decoded at this size; every run gets other pixels so the feature cache is not hit
+        shape = (size * 3 // 4, size, 3)
+        images = [Image.fromarray(rng.integers(0, 256, shape, dtype=np.uint8)) for _ in range(runs + 1)]
+        probes[size] = iter(images)
+    latency_profile.measure(lambda imgsz: yolo.predict_image(next(probes[imgsz]), imgsz=imgsz, cascade=False),
+                            runs=runs)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the stage worker processes before serving traffic
+    pipeline.start()
+    # Measure inference latency per input size before serving traffic
+    if yolo.get_current_classes():
+        try:
+            measure_latency_profile()
+        except Exception as e:
+            print(f"Warning: Could not measure latency profile: {e}")
+    grpc_server = None
+    if GRPC_PORT and grpc_available():
+        grpc_server = await start_grpc_server(detect_grpc_request, GRPC_PORT,
+                                              max_message_bytes=MAX_UPLOAD_BYTES + 1024 * 1024,
+                                              stream_window=GRPC_STREAM_WINDOW)
+        print(f"gRPC detection server listening on port {GRPC_PORT}")
+    elif GRPC_PORT:
+        print("gRPC is not set up (make setup-grpc); gRPC detection server disabled")
+    # Resume queued and interrupted batch jobs
+    batch_runner.start()
+    yield
+    await batch_runner.stop()
+    if grpc_server is not None:
+        await grpc_server.stop(5)
+    pipeline.shutdown()
+
+class FastJSONResponse(JSONResponse):
+    """JSON response serialized with orjson, which also encodes NumPy values natively"""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
 # Enhanced FastAPI app with better OpenAPI documentation
 app = FastAPI(
+    lifespan=lifespan,
     title="YOLO-World Object Detection API",
     description="""
     🔍 **YOLO-World Object Detection API**
@@ -88,6 +360,17 @@ class ClassesRequest(BaseModel):
         description="List of object class names to add for detection",
     )
 
+class MergeClassesRequest(BaseModel):
+    """Request model for merging detection classes"""
+    canonical: str = Field(
+        ...,
+        description="Class name to keep"
+    )
+    aliases: List[str] = Field(
+        ...,
+        description="Class names merged into the canonical class"
+    )
+
 class ClassesResponse(BaseModel):
     """Response model for class-related operations"""
     classes: List[str] = Field(
@@ -98,6 +381,10 @@ class ClassesResponse(BaseModel):
         ...,
         description="Status message about the operation"
     )
+    merged: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Requested classes that were added under an existing class (aliases and near-duplicates)"
+    )
 
 class ModelInfoResponse(BaseModel):
     """Response model for model information"""
@@ -146,9 +433,17 @@ class DetectionResponse(BaseModel):
         ...,
         description="Status message about the detection operation"
     )
-    processed_image: str = Field(
-        ...,
-        description="Base64 encoded image with bounding boxes drawn"
+    processed_image_url: Optional[str] = Field(
+        None,
+        description="Short-lived link to the image with bounding boxes drawn, rendered when fetched"
+    )
+    processed_image_expires_in: Optional[int] = Field(
+        None,
+        description="Seconds the processed image link stays valid"
+    )
+    processed_image: Optional[str] = Field(
+        None,
+        description="Base64 encoded image with bounding boxes drawn (only with inline_image=true)"
     )
 
 class MessageResponse(BaseModel):
@@ -158,6 +453,103 @@ class MessageResponse(BaseModel):
         description="Status or informational message"
     )
 
+class ModelVersion(BaseModel):
+    """Registered model version"""
+    version: str = Field(
+        ...,
+        description="Registry version id, e.g. v0003"
+    )
+    created_at: str = Field(
+        ...,
+        description="Registration time (ISO 8601)"
+    )
+    weights: str = Field(
+        ...,
+        description="Path to the stored checkpoint"
+    )
+    size_bytes: int = Field(
+        ...,
+        description="Checkpoint size on disk"
+    )
+    metrics: Dict[str, float] = Field(
+        ...,
+        description="Training and validation metrics"
+    )
+    dataset_snapshot: Optional[str] = Field(
+        None,
+        description="Id of the dataset state the model was trained on"
+    )
+    vocabulary: List[str] = Field(
+        ...,
+        description="Detection classes at training time"
+    )
+    active: bool = Field(
+        ...,
+        description="Whether this version is the promoted one"
+    )
+    preloaded: bool = Field(
+        ...,
+        description="Whether this version is held in memory for instant switching"
+    )
+    backend: str = Field(
+        "world",
+        description="'world' for YOLO-World checkpoints, 'closed_set' for distilled fixed-vocabulary detectors"
+    )
+
+class DistillationResponse(BaseModel):
+    """Response model for distillation into a closed-set detector"""
+    version: str = Field(
+        ...,
+        description="Registry version of the distilled model"
+    )
+    promoted: bool = Field(
+        ...,
+        description="Whether the distilled model now serves detection requests"
+    )
+    teacher_metrics: Dict[str, float] = Field(
+        ...,
+        description="Accuracy of the open-vocabulary model on the validation split"
+    )
+    student_metrics: Dict[str, float] = Field(
+        ...,
+        description="Accuracy of the distilled model on the validation split"
+    )
+    images: int = Field(
+        ...,
+        description="Images in the distillation dataset"
+    )
+    human_boxes: int = Field(
+        ...,
+        description="Human-labeled boxes used for training"
+    )
+    pseudo_boxes: int = Field(
+        ...,
+        description="Boxes added from the open-vocabulary model's detections"
+    )
+    message: str = Field(
+        ...,
+        description="Status message"
+    )
+
+class ModelRegistryResponse(BaseModel):
+    """Response model for the model registry"""
+    active: Optional[str] = Field(
+        None,
+        description="Promoted model version"
+    )
+    serving: Optional[str] = Field(
+        None,
+        description="Version (or weights path) of the model currently serving requests"
+    )
+    total_bytes: int = Field(
+        ...,
+        description="Disk usage of all stored checkpoints"
+    )
+    versions: List[ModelVersion] = Field(
+        ...,
+        description="Registered model versions, oldest first"
+    )
+
 class LabelingData(BaseModel):
     """Labeling data for training"""
     boxes: List[Dict] = Field(
@@ -189,6 +581,58 @@ class LabelingResponse(BaseModel):
     )
 
 
+class RequestSizeLimit:
+    """
+    ASGI middleware rejecting request bodies over a size limit with 413
+
+    The declared Content-Length is checked before anything is read; chunked
+    bodies are counted while they are received.
+    """
+
+    def __init__(self, app, max_bytes):
+        """
+        Args:
+            app: ASGI application
+            max_bytes: Function of the request path returning its limit in bytes
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.max_bytes(scope["path"])
+        detail = f"Request body exceeds the maximum size of {max_bytes} bytes"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def request_size_limit(path: str) -> int:
+    """
+    リクエストボディの上限（バイト）
+    """
+    if path == "/batch/jobs":
+        return MAX_BATCH_REQUEST_BYTES
+    return MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+
+app.add_middleware(RequestSizeLimit, max_bytes=request_size_limit)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -217,13 +661,34 @@ async def root():
             "GET /redoc": "Alternative API documentation (ReDoc)",
             "GET /openapi.json": "OpenAPI specification",
             "GET /model/info": "Get model information",
+            "GET /model/latency-profile": "Get per-resolution inference latency",
+            "GET /model/cascade": "Get cascade escalation statistics",
+            "GET /admission/stats": "Get request queue, load shedding and request coalescing statistics",
+            "GET /pipeline/stats": "Get per-stage worker pool statistics",
+            "GET /health": "Liveness and readiness check",
             "GET /model/classes": "Get current detection classes",
             "POST /model/classes": "Add new detection classes",
             "DELETE /model/classes": "Clear all detection classes",
+            "GET /model/classes/duplicates": "Suggest near-duplicate and synonym classes to merge",
+            "POST /model/classes/merge": "Merge classes into a canonical class",
+            "POST /model/classes/dedupe": "Merge all suggested duplicate classes",
+            "GET /model/classes/aliases": "Get merged class names and their canonical class",
+            "GET /model/registry": "List registered model versions",
+            "GET /model/pool": "Get loaded model variants and pool hit/miss statistics",
+            "POST /model/registry/{version}/promote": "Serve a registered model version",
+            "POST /model/registry/rollback": "Serve the previously promoted model version",
+            "POST /model/registry/prune": "Delete old model versions over the disk quota",
             "POST /detect": "Detect objects in uploaded image",
+            "GET /detect/renders/{render_id}": "Get the processed image of a detection (rendered on request)",
             "POST /detect/with-confidence": "Detect objects with custom confidence",
+            "POST /batch/jobs": "Submit an offline detection job for many images",
+            "GET /batch/jobs": "List batch jobs",
+            "GET /batch/jobs/{job_id}": "Get batch job progress and throughput",
+            "GET /batch/jobs/{job_id}/results": "Download batch job results (JSONL)",
+            "DELETE /batch/jobs/{job_id}": "Cancel a batch job",
             "POST /labeling/submit": "Submit labeling data",
             "POST /training/start": "Start model fine-tuning",
+            "POST /training/distill": "Distill the model into a closed-set detector",
             "GET /training/data/stats": "Get training data statistics"
         }
     }
@@ -248,6 +713,81 @@ async def get_model_info():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting model info: {str(e)}")
 
+@app.get(
+    "/model/latency-profile",
+    tags=["model"],
+    summary="Get Latency Profile",
+    description="Get the per-resolution inference latency measured at startup and the current slowdown factor",
+    response_model=Dict[str, Any]
+)
+async def get_latency_profile():
+    """Get the per-resolution latency profile"""
+    try:
+        return latency_profile.get_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting latency profile: {str(e)}")
+
+@app.get(
+    "/model/cascade",
+    tags=["model"],
+    summary="Get Cascade Statistics",
+    description="Get the cascade configuration and how many images were answered by the small model or escalated",
+    response_model=Dict[str, Any]
+)
+async def get_cascade_stats():
+    """Get cascade statistics"""
+    try:
+        return yolo.get_cascade_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting cascade statistics: {str(e)}")
+
+@app.get(
+    "/admission/stats",
+    tags=["info"],
+    summary="Get Admission Statistics",
+    description="Get running and queued requests per priority lane and counts of shed requests",
+    response_model=Dict[str, Any]
+)
+async def get_admission_stats():
+    """Get request queue statistics"""
+    return {**admission.get_stats(), "coalescing": single_flight.get_stats()}
+
+@app.get(
+    "/pipeline/stats",
+    tags=["info"],
+    summary="Get Pipeline Statistics",
+    description="""
+    Get the worker pool, in-flight and waiting requests and mean time of each request pipeline stage,
+    and the store of processed images waiting to be rendered
+    """,
+    response_model=Dict[str, Any]
+)
+async def get_pipeline_stats():
+    """Get request pipeline statistics"""
+    return {**pipeline.get_stats(), "renders": render_cache.get_stats()}
+
+@app.get(
+    "/health",
+    tags=["info"],
+    summary="Health Check",
+    description="""
+    Liveness and readiness of this model server, used by the router to pick backends.
+    The server is ready once detection classes are configured.
+    """,
+    response_model=Dict[str, Any]
+)
+async def health():
+    """Health and readiness check"""
+    stats = admission.get_stats()
+    return {
+        "status": "ok",
+        "ready": bool(yolo.get_current_classes()),
+        "model_version": str(yolo.model_version),
+        "vocabulary_version": yolo.vocabulary_version,
+        "active": stats["active"],
+        "queued": sum(stats["queued"].values())
+    }
+
 @app.get(
     "/model/classes",
     tags=["model"],
@@ -278,6 +818,8 @@ async def get_current_classes():
     - Duplicate classes are automatically filtered out
     - Empty strings and whitespace-only strings are ignored
     - Classes are automatically saved to the vocabulary file
+    - Aliases of merged classes (and, with auto-merge enabled, near-duplicates
+      of existing classes) are added as the existing class and listed in `merged`
 
     **Example classes:** person, car, bicycle, dog, cat, chair, table, etc.
     """,
@@ -289,7 +831,8 @@ async def get_current_classes():
                 "application/json": {
                     "example": {
                         "classes": ["person", "car", "bicycle"],
-                        "message": "Successfully added classes. Total classes: 3"
+                        "message": "Successfully added classes. Total classes: 3",
+                        "merged": {}
                     }
                 }
             }
@@ -317,13 +860,14 @@ async def add_detection_classes(request: ClassesRequest):
         if not valid_classes:
             raise HTTPException(status_code=400, detail="No valid classes provided")
 
-        yolo.add_classes(valid_classes)
+        # Preparing the model (text encoder, warm-up) must not block the event loop
+        merged = dict(await asyncio.to_thread(yolo.add_classes, valid_classes))
         updated_classes = yolo.get_current_classes()
 
-        return ClassesResponse(
-            classes=updated_classes,
-            message=f"Successfully added classes. Total classes: {len(updated_classes)}"
-        )
+        message = f"Successfully added classes. Total classes: {len(updated_classes)}"
+        if merged:
+            message += f". Merged into existing classes: {', '.join(f'{name} -> {canonical}' for name, canonical in merged.items())}"
+        return ClassesResponse(classes=updated_classes, message=message, merged=merged)
     except HTTPException:
         raise
     except Exception as e:
@@ -346,107 +890,432 @@ async def add_detection_classes(request: ClassesRequest):
 async def clear_detection_classes():
     """Clear all detection classes"""
     try:
-        yolo.current_classes.clear()
-        yolo._update_model_classes()
-        yolo._save_custom_vocab()
+        await asyncio.to_thread(yolo.clear_classes)
 
         return MessageResponse(message="All detection classes cleared successfully")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing classes: {str(e)}")
 
-def draw_bounding_boxes(image_path: str, detections_data: List[Dict]) -> str:
+@app.get(
+    "/model/classes/duplicates",
+    tags=["model"],
+    summary="Suggest Class Merges",
+    description="""
+    Find near-duplicate or synonym classes (e.g. misspellings) by the similarity of their
+    cached text embeddings. In each group the class added first is suggested as canonical.
+    """,
+    response_model=Dict[str, Any]
+)
+async def get_duplicate_classes(
+    threshold: float = Query(CLASS_MERGE_SIMILARITY, ge=0.0, le=1.0, description="Minimum cosine similarity")
+):
+    """Suggest duplicate classes"""
+    try:
+        return {"threshold": threshold, "groups": yolo.suggest_merges(threshold)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding duplicate classes: {str(e)}")
+
+@app.post(
+    "/model/classes/merge",
+    tags=["model"],
+    summary="Merge Detection Classes",
+    description="""
+    Merge classes into a canonical class. The merged classes are removed from the vocabulary
+    and kept as aliases: adding or labeling them later uses the canonical class, and detections
+    are reported under the canonical name.
+    """,
+    response_model=ClassesResponse
+)
+async def merge_detection_classes(request: MergeClassesRequest):
+    """Merge classes into a canonical class"""
+    try:
+        canonical = request.canonical.strip()
+        aliases = [alias.strip() for alias in request.aliases if alias.strip()]
+        if not canonical or not aliases:
+            raise HTTPException(status_code=400, detail="A canonical class and at least one alias are required")
+
+        # Rebuilding the text embeddings and warming up the model must not block the event loop
+        merged = await asyncio.to_thread(yolo.merge_classes, aliases, canonical)
+        updated_classes = yolo.get_current_classes()
+        return ClassesResponse(
+            classes=updated_classes,
+            message=f"Merged {len(merged)} classes into '{canonical}'. Total classes: {len(updated_classes)}"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error merging classes: {str(e)}")
+
+@app.post(
+    "/model/classes/dedupe",
+    tags=["model"],
+    summary="Merge Duplicate Classes",
+    description="Merge every group of classes suggested by `GET /model/classes/duplicates` at the given similarity",
+    response_model=Dict[str, Any]
+)
+async def dedupe_detection_classes(
+    threshold: float = Query(CLASS_MERGE_SIMILARITY, ge=0.0, le=1.0, description="Minimum cosine similarity")
+):
+    """Merge all suggested duplicate classes"""
+    try:
+        merged = await asyncio.to_thread(yolo.merge_duplicates, threshold)
+        return {"merged": merged, "classes": yolo.get_current_classes()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error merging duplicate classes: {str(e)}")
+
+@app.get(
+    "/model/classes/aliases",
+    tags=["model"],
+    summary="Get Class Aliases",
+    description="Get merged class names and the canonical class each one is reported as",
+    response_model=Dict[str, Any]
+)
+async def get_class_aliases():
+    """Get class aliases"""
+    return {"aliases": yolo.aliases.to_dict()}
+
+def get_registry_response() -> ModelRegistryResponse:
+    return ModelRegistryResponse(
+        active=model_registry.active,
+        serving=yolo.model_version,
+        total_bytes=model_registry.total_bytes(),
+        versions=model_registry.list_versions()
+    )
+
+def prune_model_registry(max_bytes: Optional[int] = None):
+    """
+    ディスク容量を超えた古いモデルバージョンを削除し、モデルプールからも外す
+    """
+    for version in model_registry.prune(max_bytes):
+        model_pool.evict(version)
+
+def activate_model_version(version: str) -> dict:
     """
-    画像にバウンディングボックスを描画し、Base64エンコードした文字列を返す
+    登録済みのモデルバージョンを読み込み、推論に使用する
     """
+    entry = model_registry.get(version)
+    closed_set = entry.get("backend") == "closed_set"
+    model = model_registry.get_preloaded(version, yolo.vocabulary_version)
+    if model is not None:
+        yolo.swap_model(model, entry["weights"], version=version, closed_set=closed_set)
+    else:
+        yolo.load_trained_model(entry["weights"], version=version, closed_set=closed_set)
+    print(f"Serving model version {version}")
+    return entry
+
+@app.get(
+    "/model/registry",
+    tags=["model"],
+    summary="List Model Versions",
+    description="List all registered fine-tuned model versions with their metrics, dataset snapshot and vocabulary",
+    response_model=ModelRegistryResponse
+)
+async def get_model_registry():
+    """List registered model versions"""
     try:
-        # 画像を開く
-        image = Image.open(image_path)
-        draw = ImageDraw.Draw(image)
+        return get_registry_response()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting model registry: {str(e)}")
 
-        # カラーパレット
-        colors = [
-            '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4',
-            '#FECA57', '#FF9FF3', '#A8E6CF', '#FFD93D'
-        ]
+@app.get(
+    "/model/pool",
+    tags=["model"],
+    summary="Get Model Pool",
+    description="List the model variants loaded for requests that name a model version, with pool hit/miss statistics",
+    response_model=Dict[str, Any]
+)
+async def get_model_pool():
+    """Get model pool statistics"""
+    try:
+        return model_pool.get_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting model pool: {str(e)}")
 
-        # フォントを設定（デフォルトフォントを使用）
+@app.post(
+    "/model/registry/{version}/promote",
+    tags=["model"],
+    summary="Promote Model Version",
+    description="""
+    Serve a registered model version.
+
+    Preloaded versions are switched to instantly; others are loaded and warmed up first
+    while the current model keeps serving requests.
+    """,
+    response_model=ModelRegistryResponse
+)
+async def promote_model_version(version: str):
+    """Promote a registered model version"""
+    try:
         try:
-            # より大きなフォントを試す
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20)
-        except:
-            try:
-                font = ImageFont.truetype("arial.ttf", 20)
-            except:
-                font = ImageFont.load_default()
+            model_registry.get(version)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+        # Loading and warming up the model must not block the requests it replaces the model for
+        await asyncio.to_thread(activate_model_version, version)
+        model_registry.promote(version)
+        return get_registry_response()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error promoting model version: {str(e)}")
 
-        for i, detection in enumerate(detections_data):
-            # バウンディングボックスの座標
-            bbox = detection['bbox']
-            x1, y1, x2, y2 = bbox
+@app.post(
+    "/model/registry/rollback",
+    tags=["model"],
+    summary="Roll Back Model Version",
+    description="Serve the model version that was promoted before the current one",
+    response_model=ModelRegistryResponse
+)
+async def rollback_model_version():
+    """Roll back to the previously promoted model version"""
+    try:
+        version = model_registry.previous_version()
+        if version is None:
+            raise HTTPException(status_code=400, detail="No previous model version to roll back to")
 
-            # 色を選択
-            color = colors[i % len(colors)]
+        await asyncio.to_thread(activate_model_version, version)
+        model_registry.rollback()
+        return get_registry_response()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rolling back model version: {str(e)}")
 
-            # バウンディングボックスを描画（太い線）
-            line_width = 4
-            draw.rectangle([x1, y1, x2, y2], outline=color, width=line_width)
+@app.post(
+    "/model/registry/prune",
+    tags=["model"],
+    summary="Prune Model Versions",
+    description="""
+    Delete the oldest model versions until the registry fits the disk quota.
+    The promoted version and the newest versions are always kept.
+    """,
+    response_model=ModelRegistryResponse
+)
+async def prune_model_versions(max_bytes: Optional[int] = None):
+    """Delete old model versions over the disk quota"""
+    try:
+        if max_bytes is not None and max_bytes < 0:
+            raise HTTPException(status_code=400, detail="max_bytes must not be negative")
 
-            # ラベルテキストの準備
-            label = f"{detection['class']} {detection['confidence']*100:.0f}%"
+        prune_model_registry(max_bytes)
+        return get_registry_response()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error pruning model versions: {str(e)}")
 
-            # テキストサイズを計算
-            try:
-                bbox_text = draw.textbbox((0, 0), label, font=font)
-                text_width = bbox_text[2] - bbox_text[0]
-                text_height = bbox_text[3] - bbox_text[1]
-            except:
-                # fallback for older PIL versions
-                try:
-                    # Try to get text size using textbbox with different method
-                    bbox_text = draw.textbbox((0, 0), label, font=font)
-                    text_width = bbox_text[2] - bbox_text[0]
-                    text_height = bbox_text[3] - bbox_text[1]
-                except:
-                    # Final fallback - estimate text size
-                    text_width = len(label) * 10  # Rough estimate
-                    text_height = 20  # Rough estimate
-
-            # ラベル背景を描画
-            label_y = max(0, y1 - text_height - 10)
-            draw.rectangle(
-                [x1, label_y, x1 + text_width + 10, y1],
-                fill=color
-            )
+def choose_inference_size(imgsz: Optional[int], latency_budget_ms: Optional[float]) -> int:
+    """
+    リクエストの指定（解像度またはレイテンシ予算）から推論解像度を決める
+    """
+    if imgsz is not None and imgsz <= 0:
+        raise HTTPException(status_code=400, detail="imgsz must be positive")
+    if latency_budget_ms is not None and latency_budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="Latency budget must be positive")
+    return latency_profile.choose(imgsz=imgsz, budget_ms=latency_budget_ms)
 
-            # ラベルテキストを描画
-            draw.text(
-                (x1 + 5, label_y + 2),
-                label,
-                fill='white',
-                font=font
-            )
+def validate_tiling(tile_size: int, tile_overlap: float):
+    """
+    タイル推論のパラメータを検証する
+    """
+    if tile_size < 320 or tile_size > 1280 or tile_size % 32 != 0:
+        raise HTTPException(status_code=400, detail="Tile size must be a multiple of 32 between 320 and 1280")
+    if not 0.0 <= tile_overlap <= 0.5:
+        raise HTTPException(status_code=400, detail="Tile overlap must be between 0.0 and 0.5")
+
+def select_pool_model(version: Optional[str]):
+    """
+    リクエストで指定されたモデルバージョンをモデルプールから取得する
+
+    未指定または配信中のバージョンの場合はNoneを返す
+    """
+    if version is None or version == str(yolo.model_version):
+        return None
+    if not yolo.get_current_classes():
+        # Nothing to detect; predict_image reports it without loading the model
+        return None
+    try:
+        return model_pool.get(version, yolo.vocabulary_version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+def run_detection(decoded: DecodedImage, confidence: float, tiled: bool, tile_size: int,
+                  tile_overlap: float, tile_full_image: bool, imgsz: Optional[int] = None,
+                  cascade: Optional[bool] = None, model_version: Optional[str] = None):
+    """
+    通常推論またはタイル推論を実行し、結果を列指向のDetectionsに変換する
+
+    model_versionが指定された場合はモデルプールのモデルで推論する。
+    Resultsオブジェクト（入力画像のコピーを含む）はここで解放される
+    """
+    pooled = select_pool_model(model_version)
+    if pooled is not None:
+        if tiled:
+            validate_tiling(tile_size, tile_overlap)
+            result = yolo.predict_tiled(decoded.image, conf_threshold=confidence, tile_size=tile_size,
+                                        overlap=tile_overlap, include_full_image=tile_full_image,
+                                        model=pooled, model_version=model_version)
+        else:
+            result = yolo.predict_image(decoded.image, conf_threshold=confidence, imgsz=imgsz,
+                                        model=pooled, model_version=model_version)
+    elif not tiled:
+        start = time.perf_counter()
+        result = yolo.predict_image(decoded.image, conf_threshold=confidence, imgsz=imgsz, cascade=cascade)
+        # The profile holds end-to-end latencies of the main model alone; cascade
+        # requests (which also run the small model) are not comparable
+        if imgsz is not None and result is not None and getattr(result, "cascade_stage", None) is None:
+            latency_profile.record(imgsz, (time.perf_counter() - start) * 1000)
+    else:
+        validate_tiling(tile_size, tile_overlap)
+        result = yolo.predict_tiled(
+            decoded.image,
+            conf_threshold=confidence,
+            tile_size=tile_size,
+            overlap=tile_overlap,
+            include_full_image=tile_full_image
+        )
 
-        # 画像をBase64にエンコード
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG", quality=90)
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+    if result is None:
+        return None
+    # One bulk tensor -> NumPy transfer for all boxes
+    return Detections.from_result(result)
+
+async def detect_image_bytes(image_bytes: bytes, confidence: float, tiled: bool, tile_size: int,
+                             tile_overlap: float, tile_full_image: bool, inference_size: int,
+                             cascade: Optional[bool], model: Optional[str], ticket: Dict[str, Any]):
+    """
+    画像をデコードし、推論スロットを待って推論する（HTTPとgRPCで共通の処理）
 
-        return img_str
+    戻り値はデコード画像とDetections（クラス未設定の場合はNone）
+    """
+    # Rate limited requests and a full queue are rejected before the image is decoded
+    admission.check(**ticket)
+
+    # Decode at about the model resolution; this overlaps with the inference of earlier requests
+    decoded = await decode_image_bytes(image_bytes, tiled=tiled, target_size=inference_size)
+
+    # Wait for an inference slot; requests past their deadline are dropped here.
+    # The check above already took the client's rate limit token
+    async with admission.admit(lane=ticket["lane"], deadline=ticket["deadline"]):
+        # Perform object detection on the inference stage's executor
+        detections = await pipeline.run(
+            "infer", run_detection, decoded, confidence, tiled, tile_size, tile_overlap, tile_full_image,
+            imgsz=inference_size, cascade=cascade, model_version=model
+        )
+    return decoded, detections
+
+def coalesced_headers(headers: Optional[Dict[str, str]], coalesced: bool) -> Optional[Dict[str, str]]:
+    """
+    共有した推論結果のレスポンスにX-Coalescedヘッダーを付ける
+    """
+    if not coalesced:
+        return headers
+    return {**(headers or {}), "X-Coalesced": "true"}
+
+def coalescing_key(image_bytes: bytes, endpoint: str, *params) -> str:
+    """
+    同一リクエストを判定するキー（画像のハッシュ・語彙・モデル・パラメータ）を作成する
+    """
+    return request_key(image_bytes, endpoint, str(yolo.vocabulary_version), str(yolo.model_version), *params)
+
+def detection_headers(detections: Detections, tiled: bool, inference_size: int) -> Dict[str, str]:
+    """
+    推論に使用したモデル・語彙・解像度・カスケード段をレスポンスヘッダーにする
+    """
+    headers = {
+        "X-Model-Version": str(detections.model_version or yolo.model_version),
+        "X-Vocabulary-Version": str(yolo.vocabulary_version)
+    }
+    if not tiled:
+        headers["X-Inference-Size"] = str(inference_size)
+    if isinstance(detections.cascade_stage, str):
+        headers["X-Cascade-Stage"] = detections.cascade_stage
+    return headers
+
+def admission_ticket(
+    request: Request,
+    x_priority: Optional[str] = Header(None),
+    x_request_timeout_ms: Optional[float] = Header(None),
+    x_client_id: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """
+    リクエストヘッダーから優先度レーン・期限・クライアントIDを取得する
+
+    期限はリクエスト到着時刻からの相対時間（ミリ秒）で指定する
+    """
+    lane = (x_priority or "interactive").lower()
+    if lane not in LANES:
+        raise HTTPException(status_code=400, detail=f"X-Priority must be one of {', '.join(LANES)}")
+    deadline = None
+    if x_request_timeout_ms is not None:
+        if x_request_timeout_ms <= 0:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout-Ms must be positive")
+        deadline = time.monotonic() + x_request_timeout_ms / 1000
+    client_id = x_client_id or (request.client.host if request.client else None)
+    return {"lane": lane, "deadline": deadline, "client_id": client_id}
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    """
+    アドミッション制御で拒否されたリクエストをHTTPエラーに変換する
+    """
+    headers = {"Retry-After": "1"} if isinstance(e, RateLimited) else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
 
+async def read_image_upload(image: UploadFile) -> bytes:
+    """
+    アップロードされた画像をサイズ上限付きで読み込む
+    """
+    # Validate file type
+    if not image.content_type or not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    return await read_upload_bytes(image)
+
+async def read_upload_bytes(upload: UploadFile) -> bytes:
+    """
+    アップロードされたファイルをサイズ上限付きで読み込む
+    """
+    try:
+        content = await read_upload(upload, MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if len(content) == 0:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    return content
+
+async def decode_image_bytes(image_bytes: bytes, tiled: bool = False,
+                             target_size: int = DETECTION_IMAGE_SIZE) -> DecodedImage:
+    """
+    アップロードされた画像をモデルの入力解像度程度でデコードする
+
+    タイル推論の場合は、小さな物体が消えないよう高解像度でデコードする
+    """
+    try:
+        # Decoded in the decode stage's worker processes
+        if tiled:
+            return await pipeline.run("decode", decode_image, image_bytes,
+                                      target_size=TILED_IMAGE_SIZE, max_size=TILED_IMAGE_SIZE)
+        return await pipeline.run("decode", decode_image, image_bytes, target_size=target_size)
+    except BrokenExecutor:
+        # A decode worker died (not the client's fault); the stage has started new workers
+        raise HTTPException(status_code=503, detail="Image decoding is temporarily unavailable",
+                            headers={"Retry-After": "1"})
     except Exception as e:
-        print(f"Error drawing bounding boxes: {e}")
-        # エラーの場合は元の画像をそのまま返す
-        with open(image_path, "rb") as img_file:
-            img_str = base64.b64encode(img_file.read()).decode()
-        return img_str
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
 
 @app.post(
     "/detect",
     tags=["detection"],
+    response_class=FastJSONResponse,
     summary="Detect Objects in Image",
     description="""
     Upload an image and detect objects using the configured detection classes.
-    Returns the detection results along with the processed image containing bounding boxes.
+    Returns the detection results along with a link to the processed image containing bounding boxes.
 
     **Requirements:**
     - At least one detection class must be configured (use POST /model/classes)
@@ -457,11 +1326,56 @@ def draw_bounding_boxes(image_path: str, detections_data: List[Dict]) -> str:
     - List of detected objects with bounding boxes
     - Confidence scores for each detection
     - Class labels for identified objects
-    - Processed image with bounding boxes drawn (Base64 encoded)
+    - `processed_image_url`: Short-lived link to the image with bounding boxes drawn, valid for
+      `processed_image_expires_in` seconds (see `GET /detect/renders/{render_id}`); the image is
+      only rendered when it is fetched, at most 1280 pixels on its longest side. It is null if
+      the image could not be kept
+    - `inline_image=true` returns the processed image inline instead (`processed_image`, Base64
+      encoded JPEG)
 
     **Bounding Box Format:**
     - [x1, y1, x2, y2] where (x1,y1) is top-left corner and (x2,y2) is bottom-right corner
-    - Coordinates are in pixels relative to the original image dimensions
+    - Coordinates are in pixels relative to the original (EXIF-upright) image dimensions
+
+    **Image Handling:**
+    - Uploads larger than 25 MB are rejected (413)
+    - JPEGs are decoded directly at about the model input resolution; the processed image
+      is returned at that resolution
+
+    **Input Resolution:**
+    - `imgsz`: Run inference at this size (rounded to a multiple of 32, 320-960)
+    - `latency_budget_ms`: Use the largest size whose profiled latency fits the budget
+    - Otherwise 640 is used, stepped down automatically while the server is overloaded
+    - The size used is returned in the `X-Inference-Size` header
+
+    **Cascade:**
+    - A small model screens the image first; only images where it finds nothing or whose top
+      confidences are uncertain (0.25-0.6) are re-run on the main model
+    - `cascade=false` always uses the main model
+    - The stage that produced the result (`small` or `large`) is returned in the
+      `X-Cascade-Stage` header
+
+    **Model Variants:**
+    - `model`: Registered model version to use instead of the promoted one (e.g. a variant
+      fine-tuned for one restaurant chain); unknown versions are rejected (404)
+    - Variants are loaded on first use and kept in a memory-bounded pool (`GET /model/pool`);
+      they run without the cascade
+    - The version used is returned in the `X-Model-Version` header
+
+    **Admission Control:**
+    - `X-Priority`: `interactive` (default), `labeling` or `batch`; queued requests are served
+      in that order
+    - `X-Request-Timeout-Ms`: Time the client is willing to wait; requests still queued when it
+      expires are dropped without running inference (504)
+    - `X-Client-Id`: Key for the per-client rate limit (defaults to the client address); requests
+      over the limit are rejected (429)
+    - When too many requests are queued, new ones are rejected (503)
+
+    **Tiled Inference (`tiled=true`):**
+    - For large overhead photos with small items
+    - The image is cut into overlapping tiles (`tile_size`, `tile_overlap`) that run as one
+      batch, and duplicates across tiles are merged with class-wise NMS
+    - `tile_full_image` also runs the whole image to keep objects larger than a tile
     """,
     responses={
         200: {
@@ -477,7 +1391,8 @@ def draw_bounding_boxes(image_path: str, detections_data: List[Dict]) -> str:
                             }
                         ],
                         "message": "Object detection completed. Found 1 objects.",
-                        "processed_image": "base64_encoded_image_string"
+                        "processed_image_url": "/detect/renders/q1v0Jc2vR9C3kP7yTt8hZw",
+                        "processed_image_expires_in": 300
                     }
                 }
             }
@@ -485,77 +1400,163 @@ def draw_bounding_boxes(image_path: str, detections_data: List[Dict]) -> str:
         400: {
             "description": "Invalid file format or empty file",
         },
+        429: {
+            "description": "Client rate limit exceeded"
+        },
+        503: {
+            "description": "Too many queued requests"
+        },
+        504: {
+            "description": "Request deadline passed before inference"
+        },
         500: {
             "description": "Processing error"
         }
     }
 )
 async def detect_object(
-    image: UploadFile
+    image: UploadFile,
+    tiled: bool = Form(False),
+    tile_size: int = Form(DEFAULT_TILE_SIZE),
+    tile_overlap: float = Form(DEFAULT_TILE_OVERLAP),
+    tile_full_image: bool = Form(DEFAULT_TILE_FULL_IMAGE),
+    imgsz: Optional[int] = Form(None),
+    latency_budget_ms: Optional[float] = Form(None),
+    cascade: Optional[bool] = Form(None),
+    model: Optional[str] = Form(None),
+    inline_image: bool = Form(False),
+    ticket: Dict[str, Any] = Depends(admission_ticket)
 ):
     """Detect objects in uploaded image and return processed image with bounding boxes"""
     try:
-        # Validate file type
-        if not image.content_type or not image.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-
-        # Read the uploaded file content
-        image_bytes = await image.read()
+        # Pick the input size from the request and the latency profile
+        inference_size = choose_inference_size(imgsz, latency_budget_ms)
+        image_bytes = await read_image_upload(image)
 
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
-
-        # Create a temporary file to save the image
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            temp_file.write(image_bytes)
-            temp_file_path = temp_file.name
-
-        try:
+        async def detect():
             # Perform object detection
-            result = yolo.predict_image(temp_file_path)
+            decoded, detections = await detect_image_bytes(
+                image_bytes, DEFAULT_CONFIDENCE, tiled, tile_size, tile_overlap, tile_full_image, inference_size,
+                cascade, model, ticket
+            )
 
-            if result is None:
-                return {
+            if detections is None:
+                content = {
                     "detections": [],
-                    "message": "No detection classes set. Please configure the model first using POST /model/classes",
-                    "processed_image": ""
+                    "message": "No detection classes set. Please configure the model first using POST /model/classes"
                 }
+                if inline_image:
+                    content["processed_image"] = ""
+                else:
+                    content["processed_image_url"] = None
+                return content, None
+
+            content = {
+                # Original image coordinates
+                "detections": detections.scaled(*decoded.scale).to_records(),
+                "message": f"Object detection completed. Found {len(detections)} objects."
+            }
+            headers = detection_headers(detections, tiled, inference_size)
+            if inline_image:
+                # 画像にバウンディングボックスを描画（デコード画像の座標）、描画とエンコードは別プロセスで行う
+                content["processed_image"] = await pipeline.run("annotate", draw_bounding_boxes, decoded.image,
+                                                                detections.to_records())
+            else:
+                # Keep the decoded image and boxes (decoded image coordinates); drawn only if the URL is fetched
+                try:
+                    render_id = await asyncio.to_thread(render_cache.put, decoded.image, detections.to_records())
+                except OSError as e:
+                    # The detections are still valid without the image
+                    print(f"Warning: Could not store the processed image: {e}")
+                    content["processed_image_url"] = None
+                else:
+                    content["processed_image_url"] = f"/detect/renders/{render_id}"
+                    content["processed_image_expires_in"] = RENDER_TTL_SECONDS
+                    # The image is only stored on this server; a router sends the link back here
+                    headers["X-Render-Id"] = render_id
+            return content, headers
+
+        # Identical requests already in flight share one inference
+        key = coalescing_key(image_bytes, "detect", tiled, tile_size, tile_overlap, tile_full_image,
+                             inference_size, cascade, model, inline_image)
+        (content, headers), coalesced = await single_flight.run(key, detect, deadline=ticket["deadline"])
+        return FastJSONResponse(content, headers=coalesced_headers(headers, coalesced))
 
-            # Extract detection information
-            detections = []
-            detections_data = []
-            if result.boxes is not None and len(result.boxes) > 0:
-                for box in result.boxes:
-                    detection = {
-                        "class": result.names[int(box.cls[0])],
-                        "confidence": float(box.conf[0]),
-                        "bbox": [float(coord) for coord in box.xyxy[0].tolist()]  # [x1, y1, x2, y2]
-                    }
-                    detections.append(detection)
-                    detections_data.append(detection)
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-            # 画像にバウンディングボックスを描画
-            processed_image_b64 = draw_bounding_boxes(temp_file_path, detections_data)
+@app.get(
+    "/detect/renders/{render_id}",
+    tags=["detection"],
+    summary="Get Processed Image",
+    description="""
+    Get the image of a `POST /detect` response with its bounding boxes drawn.
 
-            return {
-                "detections": detections,
-                "message": f"Object detection completed. Found {len(detections)} objects.",
-                "processed_image": processed_image_b64
-            }
+    The link is returned as `processed_image_url` and is valid for `processed_image_expires_in`
+    seconds (404 afterwards). The image is drawn and encoded when it is requested:
 
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+    - `size`: Maximum long side in pixels (default: the resolution the image was decoded at)
+    - `format`: `jpeg` (default), `png` or `webp`
+
+    Responses carry `ETag` and `Cache-Control` headers; a request whose `If-None-Match` matches
+    the ETag is answered with 304 without rendering.
+    """,
+    responses={
+        200: {
+            "description": "Processed image",
+            "content": {"image/jpeg": {}, "image/png": {}, "image/webp": {}}
+        },
+        304: {
+            "description": "The cached image is still valid"
+        },
+        404: {
+            "description": "Unknown or expired image link"
+        }
+    }
+)
+async def get_processed_image(
+    render_id: str,
+    size: Optional[int] = Query(None, ge=16, le=4096),
+    image_format: str = Query("jpeg", alias="format"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Render the processed image of a detection response"""
+    try:
+        if image_format not in RENDER_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RENDER_FORMATS)}")
+        expires_in = render_cache.expires_in(render_id)
+        if expires_in is None:
+            raise HTTPException(status_code=404, detail="Processed image not found or expired")
+
+        # A render id always shows the same image and boxes, so the parameters identify the content
+        etag = f'"{render_id}-{size or 0}-{image_format}"'
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={int(expires_in)}, immutable"}
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if etag in tags or "*" in tags:
+                return Response(status_code=304, headers=headers)
+
+        entry = await asyncio.to_thread(render_cache.get, render_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Processed image not found or expired")
+        image, detections_data = entry
+        # Drawing and encoding run in the annotate stage's worker processes
+        content = await pipeline.run("annotate", render_annotated_image, image, detections_data, size, image_format)
+        return Response(content, media_type=RENDER_FORMATS[image_format], headers=headers)
 
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error rendering image: {str(e)}")
 
 @app.post(
     "/detect/with-confidence",
     tags=["detection"],
+    response_class=FastJSONResponse,
     summary="Detect Objects with Custom Confidence",
     description="""
     Upload an image and detect objects with a custom confidence threshold.
@@ -571,6 +1572,9 @@ async def detect_object(
     - 0.3-0.5: Balanced detection (default range)
     - 0.5-0.8: High confidence detections only
     - 0.8-1.0: Very conservative detection
+
+    Tiled inference, input resolution selection, the cascade, model variants and the admission
+    control headers are available with the same parameters as `POST /detect`.
     """,
     responses={
         200: {
@@ -590,7 +1594,16 @@ async def detect_object(
 )
 async def detect_object_with_confidence(
     image: UploadFile,
-    confidence: float = Form(0.25)
+    confidence: float = Form(DEFAULT_CONFIDENCE),
+    tiled: bool = Form(False),
+    tile_size: int = Form(DEFAULT_TILE_SIZE),
+    tile_overlap: float = Form(DEFAULT_TILE_OVERLAP),
+    tile_full_image: bool = Form(DEFAULT_TILE_FULL_IMAGE),
+    imgsz: Optional[int] = Form(None),
+    latency_budget_ms: Optional[float] = Form(None),
+    cascade: Optional[bool] = Form(None),
+    model: Optional[str] = Form(None),
+    ticket: Dict[str, Any] = Depends(admission_ticket)
 ):
     """Detect objects in uploaded image with custom confidence threshold"""
     try:
@@ -598,57 +1611,269 @@ async def detect_object_with_confidence(
         if not 0.0 <= confidence <= 1.0:
             raise HTTPException(status_code=400, detail="Confidence must be between 0.0 and 1.0")
 
-        # Validate file type
-        if not image.content_type or not image.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-
-        # Read the uploaded file content
-        image_bytes = await image.read()
-
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
-
-        # Create a temporary file to save the image
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            temp_file.write(image_bytes)
-            temp_file_path = temp_file.name
+        # Pick the input size from the request and the latency profile
+        inference_size = choose_inference_size(imgsz, latency_budget_ms)
+        image_bytes = await read_image_upload(image)
 
-        try:
+        async def detect():
             # Perform object detection with custom confidence
-            result = yolo.predict_image(temp_file_path, conf_threshold=confidence)
+            decoded, detections = await detect_image_bytes(
+                image_bytes, confidence, tiled, tile_size, tile_overlap, tile_full_image, inference_size,
+                cascade, model, ticket
+            )
 
-            if result is None:
+            if detections is None:
                 return {
                     "detections": [],
                     "message": "No detection classes set. Please configure the model first using POST /model/classes"
-                }
-
-            # Extract detection information
-            detections = []
-            if result.boxes is not None and len(result.boxes) > 0:
-                for box in result.boxes:
-                    detection = {
-                        "class": result.names[int(box.cls[0])],
-                        "confidence": float(box.conf[0]),
-                        "bbox": box.xyxy[0].tolist()  # [x1, y1, x2, y2]
-                    }
-                    detections.append(detection)
+                }, None
 
             return {
-                "detections": detections,
+                # [x1, y1, x2, y2] in original image coordinates
+                "detections": detections.scaled(*decoded.scale).to_records(),
                 "message": f"Object detection completed with confidence {confidence}. Found {len(detections)} objects."
-            }
+            }, detection_headers(detections, tiled, inference_size)
 
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+        # Identical requests already in flight share one inference
+        key = coalescing_key(image_bytes, "detect/with-confidence", confidence, tiled, tile_size, tile_overlap,
+                             tile_full_image, inference_size, cascade, model)
+        (content, headers), coalesced = await single_flight.run(key, detect, deadline=ticket["deadline"])
+        return FastJSONResponse(content, headers=coalesced_headers(headers, coalesced))
 
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
+async def detect_grpc_request(request, lane: str, deadline: Optional[float], client_id: Optional[str]):
+    """
+    gRPCのDetectリクエスト（detector_pb2.DetectRequest）をHTTP APIと同じモデル・アドミッション制御・パイプラインで処理する
+
+    エラーはHTTPExceptionとして送出し、gRPCのステータスコードに変換される
+    """
+    if lane not in LANES:
+        raise HTTPException(status_code=400, detail=f"x-priority must be one of {', '.join(LANES)}")
+    if not request.image:
+        raise HTTPException(status_code=400, detail="Empty image")
+    if len(request.image) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image exceeds the maximum size of {MAX_UPLOAD_BYTES} bytes")
+    confidence = request.confidence if request.HasField("confidence") else DEFAULT_CONFIDENCE
+    if not 0.0 <= confidence <= 1.0:
+        raise HTTPException(status_code=400, detail="Confidence must be between 0.0 and 1.0")
+    inference_size = choose_inference_size(request.imgsz or None, None)
+    model = request.model or None
+    ticket = {"lane": lane, "deadline": deadline, "client_id": client_id}
+
+    async def detect():
+        decoded, detections = await detect_image_bytes(
+            request.image, confidence, request.tiled, DEFAULT_TILE_SIZE, DEFAULT_TILE_OVERLAP,
+            DEFAULT_TILE_FULL_IMAGE, inference_size, None, model, ticket
+        )
+        if detections is None:
+            raise HTTPException(status_code=409, detail="No detection classes set")
+        return detections.scaled(*decoded.scale), detection_headers(detections, request.tiled, inference_size)
+
+    # Identical gRPC requests already in flight share one inference
+    key = coalescing_key(request.image, "grpc", confidence, request.tiled, inference_size, model)
+    (detections, headers), coalesced = await single_flight.run(key, detect, deadline=deadline)
+    return detect_response(
+        detections,
+        model_version=headers["X-Model-Version"],
+        vocabulary_version=headers["X-Vocabulary-Version"],
+        inference_size=inference_size,
+        id=request.id,
+        coalesced=coalesced
+    )
+
+def batch_chunk_size(imgsz: int) -> int:
+    """
+    推論スロットをBATCH_MAX_SLOT_MS程度だけ占有するバッチの画像数をレイテンシプロファイルから決める
+    """
+    latency_ms = latency_profile.expected_ms(imgsz)
+    if not latency_ms:
+        return BATCH_SIZE
+    return max(1, min(BATCH_SIZE, int(BATCH_MAX_SLOT_MS // latency_ms)))
+
+async def process_batch_items(params: Dict[str, Any], items: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    バッチジョブの画像をまとめてデコード・推論し、画像ごとの結果レコードを作成する
+
+    推論はチャンクごとにbatchレーンでアドミッション制御を通るため、チャンクの間に対話的なリクエストが優先される
+    """
+    imgsz = params["imgsz"]
+    # Files are read and decoded in the decode stage's worker processes, several at a time
+    decoded = await asyncio.gather(
+        *(pipeline.run("decode", decode_image_file, source, target_size=imgsz) for _, source in items),
+        return_exceptions=True
+    )
+    records = {}
+    images = []
+    for (seq, source), image in zip(items, decoded):
+        if isinstance(image, BrokenExecutor):
+            # A dead decode worker says nothing about the image; the runner retries the batch
+            raise image
+        if isinstance(image, Exception):
+            records[seq] = {"seq": seq, "source": source, "error": f"Invalid image file: {str(image)}"}
+        else:
+            images.append((seq, source, image))
+
+    results = []
+    chunk_size = batch_chunk_size(imgsz)
+    for start in range(0, len(images), chunk_size):
+        chunk = images[start:start + chunk_size]
+        # One slot in the lowest priority lane per chunk; interactive requests queued meanwhile go first
+        async with admission.admit(lane="batch"):
+            chunk_results = await pipeline.run("infer", yolo.predict_batch, [image.image for _, _, image in chunk],
+                                               conf_threshold=params["confidence"], imgsz=imgsz)
+        if chunk_results is None:
+            raise RuntimeError("No detection classes set")
+        results += chunk_results
+    for (seq, source, image), result in zip(images, results):
+        detections = Detections.from_result(result)
+        records[seq] = {
+            "seq": seq,
+            "source": source,
+            "width": image.original_size[0],
+            "height": image.original_size[1],
+            "model_version": str(detections.model_version or yolo.model_version),
+            "vocabulary_version": str(yolo.vocabulary_version),
+            "detections": detections.scaled(*image.scale).to_records()
+        }
+    return [records[seq] for seq, _ in items]
+
+batch_runner = BatchJobRunner(batch_jobs, process_batch_items, batch_size=BATCH_SIZE,
+                              retry=(AdmissionRejected, BrokenExecutor))
+
+def resolve_batch_manifest(manifest: str) -> List[str]:
+    """
+    マニフェスト（1行に1つの画像パス）をBATCH_INPUT_DIR内の絶対パスに変換する
+    """
+    root = BATCH_INPUT_DIR.resolve()
+    sources = []
+    for line in manifest.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        path = (root / line).resolve()
+        if not path.is_relative_to(root):
+            raise HTTPException(status_code=400, detail=f"Path is outside the batch input directory: {line}")
+        sources.append(str(path))
+    return sources
+
+def get_batch_job_or_404(job_id: str) -> Dict[str, Any]:
+    """
+    バッチジョブを取得する（存在しない場合は404）
+    """
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Batch job not found: {job_id}")
+    return job
+
+@app.post(
+    "/batch/jobs",
+    tags=["batch"],
+    status_code=202,
+    summary="Submit Batch Job",
+    description="""
+    Queue an offline detection job instead of sending one request per image.
+
+    **Parameters:**
+    - `manifest`: Optional text file with one image path per line, relative to the
+      server's batch input directory (lines starting with # are ignored)
+    - `images`: Optional image files to process
+    - `confidence`: Confidence threshold (0.0-1.0, default 0.25)
+    - `imgsz`: Inference size (rounded to a multiple of 32, 320-960)
+
+    The job runs in the background in the batch priority lane with batched inference,
+    survives server restarts and writes one JSON line per image to its results file.
+    Poll `GET /batch/jobs/{job_id}` for progress.
+    """,
+    response_model=Dict[str, Any]
+)
+async def submit_batch_job(
+    manifest: Optional[UploadFile] = File(None),
+    images: Optional[List[UploadFile]] = File(None),
+    confidence: float = Form(DEFAULT_CONFIDENCE),
+    imgsz: Optional[int] = Form(None)
+):
+    """Submit an offline detection job"""
+    try:
+        if not 0.0 <= confidence <= 1.0:
+            raise HTTPException(status_code=400, detail="Confidence must be between 0.0 and 1.0")
+        params = {"confidence": confidence, "imgsz": choose_inference_size(imgsz, None)}
+
+        sources = []
+        if manifest is not None:
+            try:
+                sources = resolve_batch_manifest((await read_upload(manifest, MAX_UPLOAD_BYTES)).decode("utf-8"))
+            except (UploadTooLarge, UnicodeDecodeError) as e:
+                raise HTTPException(status_code=400, detail=f"Invalid manifest: {str(e)}")
+        images = images or []
+        if len(images) > MAX_BATCH_UPLOADS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_UPLOADS} images can be uploaded per job")
+        uploads = [(image.filename, await read_image_upload(image)) for image in images]
+        if not sources and not uploads:
+            raise HTTPException(status_code=400, detail="Provide a manifest or images")
+
+        return await asyncio.to_thread(batch_jobs.submit, sources, params, uploads)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting batch job: {str(e)}")
+
+@app.get(
+    "/batch/jobs",
+    tags=["batch"],
+    summary="List Batch Jobs",
+    description="List the most recent batch jobs, optionally only those in one state",
+    response_model=Dict[str, Any]
+)
+async def list_batch_jobs(status: Optional[str] = None, limit: int = Query(50, ge=1, le=1000)):
+    """List batch jobs"""
+    if status is not None and status not in JOB_STATES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(JOB_STATES)}")
+    return {"jobs": batch_jobs.list(status=status, limit=limit), "worker": batch_runner.get_stats()}
+
+@app.get(
+    "/batch/jobs/{job_id}",
+    tags=["batch"],
+    summary="Get Batch Job",
+    description="Get the state, progress (done, failed, total), throughput and estimated time left of a batch job",
+    response_model=Dict[str, Any]
+)
+async def get_batch_job(job_id: str):
+    """Get batch job progress"""
+    return get_batch_job_or_404(job_id)
+
+@app.get(
+    "/batch/jobs/{job_id}/results",
+    tags=["batch"],
+    summary="Get Batch Job Results",
+    description="""
+    Download the results of a batch job as JSON lines, one per image with its detections
+    (or an error). Results of a running job contain the images finished so far.
+    """
+)
+async def get_batch_job_results(job_id: str):
+    """Download batch job results"""
+    get_batch_job_or_404(job_id)
+    return FileResponse(batch_jobs.results_path(job_id), media_type="application/x-ndjson",
+                        filename=f"{job_id}.jsonl")
+
+@app.delete(
+    "/batch/jobs/{job_id}",
+    tags=["batch"],
+    summary="Cancel Batch Job",
+    description="Cancel a queued or running batch job; results written so far are kept",
+    response_model=Dict[str, Any]
+)
+async def cancel_batch_job(job_id: str):
+    """Cancel a batch job"""
+    get_batch_job_or_404(job_id)
+    return batch_jobs.cancel(job_id)
+
 def save_labeling_data(image_path: str, labeling_data: LabelingData, image_filename: str):
     """
     ラベリングデータをYOLO形式で保存
@@ -681,8 +1906,8 @@ def save_labeling_data(image_path: str, labeling_data: LabelingData, image_filen
             width = abs(x2 - x1) / labeling_data.image_width
             height = abs(y2 - y1) / labeling_data.image_height
 
-            # Get class ID (for now, use simple mapping)
-            class_name = box['label']
+            # Get class ID (for now, use simple mapping); merged classes are labeled as their canonical class
+            class_name = yolo.canonical_name(box['label'])
             class_id = get_or_create_class_id(class_name)
 
             # Write YOLO format: class_id center_x center_y width height
@@ -728,9 +1953,11 @@ def count_total_labels():
 
     return total
 
-def create_training_config():
+def create_training_config(train_images: List[Path] = None, config_name: str = "data.yaml"):
     """
     YOLOv8用のトレーニング設定ファイルを作成
+
+    train_imagesを指定した場合は、その画像だけを学習に使用する（インクリメンタル学習用）
     """
     classes_file = TRAINING_DATA_DIR / "classes.txt"
     if not classes_file.exists():
@@ -743,16 +1970,21 @@ def create_training_config():
     if not classes:
         return None
 
+    # Assign new images to train/val without reshuffling existing ones
+    train_list, val_list = dataset_split.write_lists()
+    if train_images is not None:
+        train_list = dataset_split.write_list(Path(config_name).stem, train_images)
+
     # Create data.yaml
     config = {
         'path': str(TRAINING_DATA_DIR.absolute()),
-        'train': 'images',
-        'val': 'images',  # For simplicity, using same for validation
+        'train': Path(train_list).name,
+        'val': Path(val_list).name,
         'nc': len(classes),
         'names': classes
     }
 
-    config_path = TRAINING_DATA_DIR / "data.yaml"
+    config_path = TRAINING_DATA_DIR / config_name
     with open(config_path, 'w', encoding='utf-8') as f:
         yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
 
@@ -777,6 +2009,7 @@ def create_training_config():
     - Images are saved in `training_data/images/`
     - Labels are saved in `training_data/labels/` in YOLO format
     - Class mappings are maintained in `training_data/classes.txt`
+    - Train/validation assignments are kept in `training_data/split.json`
     """,
     response_model=LabelingResponse
 )
@@ -786,10 +2019,6 @@ async def submit_labeling_data(
 ):
     """Submit manually labeled data for training"""
     try:
-        # Validate file type
-        if not image.content_type or not image.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-
         # Parse labeling data
         try:
             labeling_json = json.loads(labeling_data)
@@ -797,10 +2026,8 @@ async def submit_labeling_data(
         except (json.JSONDecodeError, ValueError) as e:
             raise HTTPException(status_code=400, detail=f"Invalid labeling data format: {str(e)}")
 
-        # Read image
-        image_bytes = await image.read()
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        # Read image (clients may send it as application/octet-stream)
+        image_bytes = await read_upload_bytes(image)
 
         # Save image temporarily
         with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
@@ -863,11 +2090,31 @@ async def submit_labeling_data(
     3. Starts model fine-tuning process
     4. Returns training status
 
+    **Modes:**
+    - `full`: Train on the whole training split, starting from the loaded model
+    - `incremental`: Resume from the best weights of the last run and train on the samples
+      added since then, plus `replay_ratio` previously seen samples per new sample to
+      guard against forgetting
+
+    Every run records the samples it consumed in `training_data/training_runs.json`.
+    The best checkpoint is registered in the model registry (see `GET /model/registry`)
+    and promoted.
+
+    **Time budget:** When `time_budget_minutes` is given, `epochs` is ignored. A few
+    training steps are benchmarked to pick batch size, image size, dataloader workers and
+    epochs that fit the budget, and training stops cleanly when the budget runs out. The
+    best checkpoint so far is saved after every epoch.
+
     **Note:** This is a long-running process. In production, this should be implemented as an async task.
     """,
     response_model=MessageResponse
 )
-async def start_model_training(epochs: int = 50):
+async def start_model_training(
+    epochs: int = 50,
+    mode: str = "full",
+    replay_ratio: float = 1.0,
+    time_budget_minutes: float = None
+):
     """Start model fine-tuning with collected labeling data"""
     try:
         # Validate epochs parameter
@@ -877,6 +2124,24 @@ async def start_model_training(epochs: int = 50):
                 detail="Epochs must be between 1 and 500"
             )
 
+        if mode not in ("full", "incremental"):
+            raise HTTPException(
+                status_code=400,
+                detail="Mode must be 'full' or 'incremental'"
+            )
+
+        if replay_ratio < 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Replay ratio must not be negative"
+            )
+
+        if time_budget_minutes is not None and not 1 <= time_budget_minutes <= 24 * 60:
+            raise HTTPException(
+                status_code=400,
+                detail="Time budget must be between 1 and 1440 minutes"
+            )
+
         # Check if training data exists
         images_dir = TRAINING_DATA_DIR / "images"
         labels_dir = TRAINING_DATA_DIR / "labels"
@@ -897,8 +2162,27 @@ async def start_model_training(epochs: int = 50):
                 detail="Insufficient training data. Please add more labeled images."
             )
 
-        # Create training config
-        config_path = create_training_config()
+        # Select the samples for this run
+        train_images = dataset_split.update()["train"]
+        start_weights = None
+        if mode == "incremental":
+            new_images, replay_images = select_incremental_samples(
+                train_images, training_ledger.seen_samples(), replay_ratio=replay_ratio
+            )
+            if not new_images:
+                raise HTTPException(
+                    status_code=400,
+                    detail="No new training samples since the last run."
+                )
+            config_path = create_training_config(
+                train_images=new_images + replay_images,
+                config_name="data_incremental.yaml"
+            )
+            start_weights = training_ledger.latest_weights()
+        else:
+            new_images, replay_images = train_images, []
+            config_path = create_training_config()
+
         if not config_path:
             raise HTTPException(
                 status_code=400,
@@ -907,29 +2191,60 @@ async def start_model_training(epochs: int = 50):
 
         # Start actual training
         try:
-            print(f"Starting model fine-tuning with {len(image_files)} images and {epochs} epochs...")
-            results = yolo.fine_tune_model(config_path, epochs=epochs)
-
-            # Get the path to the best trained model
-            runs_dir = Path("runs/detect")
-            if runs_dir.exists():
-                # Find the most recent training run
-                train_dirs = [d for d in runs_dir.iterdir() if d.is_dir() and d.name.startswith('train')]
-                if train_dirs:
-                    latest_run = max(train_dirs, key=lambda x: x.stat().st_mtime)
-                    best_model_path = latest_run / "weights" / "best.pt"
-
-                    if best_model_path.exists():
-                        # Load the fine-tuned model
-                        yolo.load_trained_model(str(best_model_path))
-                        print(f"Fine-tuned model loaded from: {best_model_path}")
+            n_samples = len(new_images) + len(replay_images)
+            if time_budget_minutes is not None:
+                print(f"Starting {mode} model fine-tuning with {n_samples} images within {time_budget_minutes} minutes...")
+                results, plan = yolo.fine_tune_with_budget(
+                    config_path,
+                    budget_minutes=time_budget_minutes,
+                    n_train=n_samples,
+                    n_val=dataset_split.get_counts()["val"],
+                    base_weights=start_weights
+                )
+                epochs = plan["epochs"]
+            else:
+                print(f"Starting {mode} model fine-tuning with {n_samples} images and {epochs} epochs...")
+                results = yolo.fine_tune_model(config_path, epochs=epochs, base_weights=start_weights)
+
+            # Register the best checkpoint of this run and serve it
+            entry = None
+            best_model_path = yolo.last_best_weights
+            if best_model_path and Path(best_model_path).exists():
+                metrics = getattr(results, "results_dict", None)
+                entry = model_registry.register(
+                    best_model_path,
+                    metrics=metrics if isinstance(metrics, dict) else None,
+                    dataset_snapshot=dataset_split.snapshot_id(),
+                    vocabulary=yolo.get_current_classes(),
+                    source=f"{mode} training, {epochs} epochs"
+                )
+                prune_model_registry()
+                model_registry.preload(yolo.prepare_model, yolo.vocabulary_version, k=PRELOADED_VERSIONS)
+                await asyncio.to_thread(activate_model_version, entry["version"])
+                model_registry.promote(entry["version"])
+                print(f"Fine-tuned model {entry['version']} loaded from: {best_model_path}")
+
+            training_ledger.record_run(
+                mode=mode,
+                new_samples=[p.name for p in new_images],
+                replay_samples=[p.name for p in replay_images],
+                weights=entry["weights"] if entry else None,
+                epochs=epochs,
+                start_weights=start_weights
+            )
 
             total_labels = count_total_labels()
 
+            if mode == "incremental":
+                return MessageResponse(
+                    message=f"Incremental fine-tuning completed successfully! Trained on {len(new_images)} new and {len(replay_images)} replayed images for {epochs} epochs."
+                )
             return MessageResponse(
                 message=f"Model fine-tuning completed successfully! Trained on {len(image_files)} images with {total_labels} labels for {epochs} epochs."
             )
 
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             print(f"Error during training: {e}")
             raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
@@ -939,6 +2254,121 @@ async def start_model_training(epochs: int = 50):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error starting training: {str(e)}")
 
+@app.post(
+    "/training/distill",
+    tags=["training"],
+    summary="Distill into a Closed-Set Detector",
+    description="""
+    Train a plain (closed-set) YOLOv8 detector from the open-vocabulary model for cheaper
+    steady-state serving.
+
+    **Process:**
+    1. Every training image is pseudo-labeled with the current model; teacher boxes are added
+       where no human box exists. Images in `training_data/unlabeled/` are pseudo-labeled only
+    2. `student` (default `yolov8n.pt`) is fine-tuned on the human plus pseudo labels
+    3. Teacher and student are evaluated on the human-labeled validation split
+    4. The student is registered in the model registry with `backend: closed_set`
+
+    **Promotion:** With `promote=true` the student is served only if its mAP50 is at most
+    `max_map_drop` below the teacher's. It can also be promoted later with
+    `POST /model/registry/{version}/promote`. A closed-set model has a fixed vocabulary: adding
+    or clearing detection classes switches back to the open-vocabulary model.
+
+    **Note:** This is a long-running process. In production, this should be implemented as an async task.
+    """,
+    response_model=DistillationResponse
+)
+async def distill_model(
+    epochs: int = 50,
+    student: str = DISTILL_STUDENT_WEIGHTS,
+    conf_threshold: float = 0.4,
+    promote: bool = False,
+    max_map_drop: float = 0.02
+):
+    """Distill the open-vocabulary model into a closed-set detector"""
+    try:
+        if epochs <= 0 or epochs > 500:
+            raise HTTPException(status_code=400, detail="Epochs must be between 1 and 500")
+        if not 0.0 <= conf_threshold <= 1.0:
+            raise HTTPException(status_code=400, detail="Confidence must be between 0.0 and 1.0")
+        if not yolo.get_current_classes():
+            raise HTTPException(status_code=400, detail="No detection classes set. Please configure the model first.")
+
+        # Refresh the train/val lists; validation stays human-labeled only
+        config_path = create_training_config()
+        if not config_path:
+            raise HTTPException(
+                status_code=400,
+                detail="No training data available. Please submit some labeled data first."
+            )
+        with open(config_path, 'r', encoding='utf-8') as f:
+            class_names = yaml.safe_load(f)["names"]
+
+        unlabeled_images = []
+        if UNLABELED_DATA_DIR.exists():
+            unlabeled_images = sorted(list(UNLABELED_DATA_DIR.glob("*.jpg")) + list(UNLABELED_DATA_DIR.glob("*.png")))
+
+        try:
+            teacher_version = yolo.model_version
+            dataset = build_distillation_dataset(
+                lambda path: yolo.predict_image(str(path), conf_threshold=conf_threshold, cascade=False),
+                labeled_images=dataset_split.update()["train"],
+                labels_dir=TRAINING_DATA_DIR / "labels",
+                out_dir=DISTILLATION_DATA_DIR,
+                class_names=class_names,
+                val_list=TRAINING_DATA_DIR / "val.txt",
+                unlabeled_images=unlabeled_images
+            )
+
+            print(f"Distilling {teacher_version} into {student} for {epochs} epochs...")
+            yolo.fine_tune_model(dataset["config_path"], epochs=epochs, student_weights=student)
+            best_model_path = yolo.last_best_weights
+            if not best_model_path or not Path(best_model_path).exists():
+                raise RuntimeError("Distillation produced no checkpoint")
+
+            # Compare on the human-labeled validation split
+            teacher_metrics = yolo.evaluate(config_path)
+            student_metrics = yolo.evaluate(config_path, model_path=best_model_path, closed_set=True)
+            print(f"Teacher: {teacher_metrics}, student: {student_metrics}")
+
+            entry = model_registry.register(
+                best_model_path,
+                metrics=student_metrics,
+                dataset_snapshot=dataset_split.snapshot_id(),
+                vocabulary=class_names,
+                source=f"distilled from {teacher_version} into {student}, {epochs} epochs",
+                backend="closed_set",
+                extra={"teacher_metrics": teacher_metrics, "teacher_weights": yolo.world_model_path}
+            )
+            prune_model_registry()
+
+            promoted = promote and student_metrics["map50"] >= teacher_metrics["map50"] - max_map_drop
+            if promoted:
+                # The swap (load, set_classes, warm-up) must not block the requests still being served
+                await asyncio.to_thread(activate_model_version, entry["version"])
+                model_registry.promote(entry["version"])
+
+        except Exception as e:
+            print(f"Error during distillation: {e}")
+            raise HTTPException(status_code=500, detail=f"Distillation failed: {str(e)}")
+
+        return DistillationResponse(
+            version=entry["version"],
+            promoted=promoted,
+            teacher_metrics=teacher_metrics,
+            student_metrics=student_metrics,
+            images=dataset["images"],
+            human_boxes=dataset["human_boxes"],
+            pseudo_boxes=dataset["pseudo_boxes"],
+            message=f"Distilled model {entry['version']} registered"
+                    + (" and promoted." if promoted else ".")
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting distillation: {str(e)}")
+
 @app.get(
     "/training/data/stats",
     tags=["training"],
@@ -958,6 +2388,7 @@ async def get_training_data_stats():
             "total_labels": 0,
             "classes": [],
             "class_counts": {},
+            "split": {"train": 0, "val": 0},
             "data_directory": str(TRAINING_DATA_DIR.absolute())
         }
 
@@ -996,6 +2427,9 @@ async def get_training_data_stats():
             stats["total_labels"] = total_labels
             stats["class_counts"] = class_counts
 
+        if images_dir.exists():
+            stats["split"] = dataset_split.get_counts()
+
         return stats
 
     except Exception as e:
@@ -0,0 +1,388 @@
+"""
+Router spreading detection traffic over several model servers
+
+Each backend is a regular model server (``gunicorn main:app``) on this or
+another host. The router health checks them, sends each detection request
+to the ready backend with the fewest outstanding requests and retries on
+another backend when one cannot be reached or is overloaded.
+
+    ROUTER_BACKENDS=http://10.0.0.2:8000,http://10.0.0.3:8000 uvicorn router:app --port 8080
+
+Clients may send ``X-Vocabulary-Version`` / ``X-Model-Version`` (as returned
+by a previous detection response) to stay on backends serving the same
+vocabulary and model. Processed image links (``/detect/renders/{id}``) are
+sent to the backend that answered the detection, which is the only one
+holding the image.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Response
+
+
+class Backend:
+    """
+    A model server behind the router
+
+    ``outstanding`` counts requests the router has sent and not yet seen
+    answered. Health, readiness and the served model/vocabulary versions come
+    from the backend's ``/health`` endpoint. Detection response headers are
+    not used for them: a request may name a pooled model variant, whose
+    version is not the one the backend serves by default.
+    """
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = False
+        self.ready = False
+        self.model_version = None
+        self.vocabulary_version = None
+        self.outstanding = 0
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_checked = None
+
+    def get_stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ready": self.ready,
+            "model_version": self.model_version,
+            "vocabulary_version": self.vocabulary_version,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class BackendPool:
+    """
+    Health-aware least-outstanding-requests selection over model servers
+
+    A backend is taken out of rotation after ``fail_threshold`` failed health
+    checks in a row, or at once when a request cannot reach it, and comes back
+    with its next successful health check. Requests that name a vocabulary or
+    model version go to backends serving that version whenever one is
+    healthy, since another vocabulary would detect a different set of classes.
+
+    All methods must be called from the event loop the router runs on.
+    """
+
+    def __init__(self, urls: list[str], fail_threshold: int = 2):
+        if not urls:
+            raise ValueError("At least one backend is required")
+        self.backends = [Backend(url) for url in urls]
+        self.fail_threshold = fail_threshold
+
+    def choose(self, vocabulary_version: str = None, model_version: str = None, exclude=()) -> Backend | None:
+        """
+        Pick the backend for a request
+
+        Readiness and version affinity come first, then the fewest
+        outstanding requests; ties go to the backend that has served the
+        fewest requests so that idle backends take turns.
+
+        Args:
+            vocabulary_version: Vocabulary version the client expects, if any
+            model_version: Model version the client expects, if any
+            exclude: Backends already tried for this request
+
+        Returns:
+            The chosen backend, or None if no healthy backend is left
+        """
+        candidates = [b for b in self.backends if b.healthy and b not in exclude]
+        if not candidates:
+            return None
+
+        def key(backend):
+            return (
+                not backend.ready,
+                vocabulary_version is not None and backend.vocabulary_version != vocabulary_version,
+                model_version is not None and backend.model_version != model_version,
+                backend.outstanding,
+                backend.requests,
+            )
+
+        return min(candidates, key=key)
+
+    def mark_unreachable(self, backend: Backend):
+        """Take a backend out of rotation until its next successful health check"""
+        backend.healthy = False
+        backend.failures = max(backend.failures, self.fail_threshold)
+        backend.errors += 1
+
+    def update_health(self, backend: Backend, status: dict | None):
+        """
+        Record the result of a health check
+
+        Args:
+            backend: Checked backend
+            status: Body of the ``/health`` response, or None if the check failed
+        """
+        backend.last_checked = time.time()
+        if status is None:
+            backend.failures += 1
+            if backend.failures >= self.fail_threshold:
+                backend.healthy = False
+                backend.ready = False
+            return
+        backend.failures = 0
+        backend.healthy = True
+        backend.ready = bool(status.get("ready", True))
+        backend.model_version = status.get("model_version")
+        backend.vocabulary_version = status.get("vocabulary_version")
+
+    async def check(self, client: httpx.AsyncClient, backend: Backend, timeout: float = 1.0):
+        """Run one health check against ``backend``"""
+        try:
+            response = await client.get(f"{backend.url}/health", timeout=timeout)
+            status = response.json() if response.status_code == 200 else None
+        except (httpx.HTTPError, ValueError):
+            status = None
+        self.update_health(backend, status)
+
+    async def check_all(self, client: httpx.AsyncClient, timeout: float = 1.0):
+        """Health check every backend concurrently"""
+        await asyncio.gather(*(self.check(client, backend, timeout) for backend in self.backends))
+
+    def get_stats(self) -> dict:
+        return {
+            "backends": [backend.get_stats() for backend in self.backends],
+            "healthy": sum(backend.healthy for backend in self.backends),
+            "ready": sum(backend.healthy and backend.ready for backend in self.backends),
+        }
+
+
+class RenderRoutes:
+    """
+    Sticky routes from processed image ids to the backend that stored the image
+
+    Backends name the id of a stored image in the ``X-Render-Id`` header of
+    the detection response. Routes expire with the backends' image links;
+    the oldest routes are dropped beyond ``max_entries``.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 100_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # render id -> (backend, expiry on the monotonic clock)
+        self._routes: OrderedDict[str, tuple[Backend, float]] = OrderedDict()
+
+    def add(self, render_id: str, backend: Backend):
+        self._routes[render_id] = (backend, time.monotonic() + self.ttl_seconds)
+        self._routes.move_to_end(render_id)
+        while len(self._routes) > self.max_entries:
+            self._routes.popitem(last=False)
+
+    def get(self, render_id: str) -> Backend | None:
+        """The backend holding the image, or None if the id is unknown or expired"""
+        route = self._routes.get(render_id)
+        if route is None:
+            return None
+        backend, expires = route
+        if time.monotonic() >= expires:
+            del self._routes[render_id]
+            return None
+        return backend
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+
+# Backends as comma-separated base URLs
+ROUTER_BACKENDS = [url.strip() for url in os.environ.get("ROUTER_BACKENDS", "http://127.0.0.1:8001,http://127.0.0.1:8002").split(",") if url.strip()]
+HEALTH_CHECK_INTERVAL = 2.0  # Seconds between health check rounds
+HEALTH_CHECK_TIMEOUT = 1.0
+HEALTH_FAIL_THRESHOLD = 2  # Failed checks in a row before a backend leaves rotation
+BACKEND_TIMEOUT = 60.0
+MAX_ATTEMPTS = 2  # Backends tried per request
+# Same body limit as the backends' upload limit (25 MiB image plus form fields)
+MAX_REQUEST_BYTES = 26 * 1024 * 1024
+pool = BackendPool(ROUTER_BACKENDS, fail_threshold=HEALTH_FAIL_THRESHOLD)
+# Same lifetime as the backends' processed image links
+RENDER_ROUTE_TTL_SECONDS = 300
+render_routes = RenderRoutes(RENDER_ROUTE_TTL_SECONDS)
+
+ROUTED_PATHS = ("/detect", "/detect/with-confidence", "/detect/renders/{render_id}")
+# Request headers passed on to backends; the rest (Host, Content-Length, ...) is set by httpx
+FORWARDED_HEADERS = ("content-type", "accept", "x-priority", "x-request-timeout-ms", "x-client-id")
+RENDER_FORWARDED_HEADERS = ("accept", "if-none-match")
+# Response headers that describe the backend connection rather than the body
+HOP_BY_HOP_HEADERS = ("connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding")
+
+
+def create_client() -> httpx.AsyncClient:
+    """
+    バックエンドへの接続を使い回すHTTPクライアントを作成する
+    """
+    return httpx.AsyncClient(timeout=BACKEND_TIMEOUT, limits=httpx.Limits(max_keepalive_connections=64))
+
+
+async def health_check_loop(client: httpx.AsyncClient):
+    """
+    一定間隔で全バックエンドのヘルスチェックを行う
+    """
+    while True:
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+        await pool.check_all(client, timeout=HEALTH_CHECK_TIMEOUT)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client = create_client()
+    app.state.client = client
+    # Know which backends are up before taking traffic
+    await pool.check_all(client, timeout=HEALTH_CHECK_TIMEOUT)
+    checker = asyncio.create_task(health_check_loop(client))
+    yield
+    checker.cancel()
+    await client.aclose()
+
+
+app = FastAPI(
+    lifespan=lifespan,
+    title="YOLO-World Detection Router",
+    description="Spreads detection requests over several YOLO-World model servers",
+    version="1.0.0"
+)
+
+
+def forwarded_headers(request: Request, remaining_ms: float | None) -> dict:
+    """
+    バックエンドに渡すリクエストヘッダーを作成する
+
+    レート制限がクライアント単位で働くよう、元のクライアントをX-Client-Idで伝える。
+    期限はルーターで経過した時間を差し引いて渡す
+    """
+    headers = {name: value for name, value in request.headers.items() if name in FORWARDED_HEADERS}
+    if "x-client-id" not in headers and request.client:
+        headers["x-client-id"] = request.client.host
+    if remaining_ms is not None:
+        headers["x-request-timeout-ms"] = f"{remaining_ms:.0f}"
+    return headers
+
+
+async def read_limited_body(request: Request) -> bytes:
+    """
+    リクエストボディを上限まで読み込む
+
+    バックエンドのRequestSizeLimitと同様に、宣言されたContent-Lengthを先に確認し、
+    チャンク転送のボディは受信しながら数える
+    """
+    detail = f"Request body exceeds the maximum size of {MAX_REQUEST_BYTES} bytes"
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+        raise HTTPException(status_code=413, detail=detail)
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_REQUEST_BYTES:
+            raise HTTPException(status_code=413, detail=detail)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@app.get("/health", summary="Router Health Check", description="Healthy while at least one backend is healthy")
+async def health():
+    """Router health check"""
+    stats = pool.get_stats()
+    if stats["healthy"] == 0:
+        raise HTTPException(status_code=503, detail="No healthy backends")
+    return {"status": "ok", "healthy": stats["healthy"], "ready": stats["ready"]}
+
+
+@app.get("/router/backends", summary="Get Backend Status", description="Health, served versions and load of every backend")
+async def get_backends():
+    """Get backend status"""
+    return pool.get_stats()
+
+
+@app.post("/detect", summary="Detect Objects in Image", description="Routed to a model server's POST /detect")
+@app.post("/detect/with-confidence", summary="Detect Objects with Custom Confidence",
+          description="Routed to a model server's POST /detect/with-confidence")
+async def route_detection(request: Request):
+    """Forward a detection request to the least loaded ready backend"""
+    body = await read_limited_body(request)
+    vocabulary_version = request.headers.get("x-vocabulary-version")
+    model_version = request.headers.get("x-model-version")
+    timeout_ms = request.headers.get("x-request-timeout-ms")
+    try:
+        deadline = time.monotonic() + float(timeout_ms) / 1000 if timeout_ms is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout-Ms must be a number")
+
+    tried = []
+    response = None
+    served_by = None
+    while len(tried) < MAX_ATTEMPTS:
+        backend = pool.choose(vocabulary_version, model_version, exclude=tried)
+        if backend is None:
+            break
+        tried.append(backend)
+
+        remaining_ms = None
+        if deadline is not None:
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            if remaining_ms <= 0:
+                raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            response = await request.app.state.client.post(
+                f"{backend.url}{request.url.path}",
+                params=request.query_params,
+                content=body,
+                headers=forwarded_headers(request, remaining_ms)
+            )
+        except httpx.TransportError as e:
+            print(f"Warning: Backend {backend.url} unreachable: {e}")
+            pool.mark_unreachable(backend)
+            continue
+        finally:
+            backend.outstanding -= 1
+        served_by = backend
+        render_id = response.headers.get("x-render-id")
+        if render_id:
+            render_routes.add(render_id, backend)
+
+        if response.status_code != 503:
+            break
+        # Overloaded: the request was shed before inference, so try another backend
+
+    if response is None:
+        raise HTTPException(status_code=503, detail="No healthy backends")
+
+    headers = {name: value for name, value in response.headers.items() if name not in HOP_BY_HOP_HEADERS}
+    headers["x-backend"] = served_by.url
+    return Response(content=response.content, status_code=response.status_code, headers=headers)
+
+
+@app.get("/detect/renders/{render_id}", summary="Get Processed Image",
+         description="Routed to the model server that answered the detection")
+async def route_render(render_id: str, request: Request):
+    """Forward a processed image request to the backend holding the image"""
+    backend = render_routes.get(render_id)
+    if backend is None:
+        raise HTTPException(status_code=404, detail="Processed image not found or expired")
+    headers = {name: value for name, value in request.headers.items() if name in RENDER_FORWARDED_HEADERS}
+    try:
+        response = await request.app.state.client.get(
+            f"{backend.url}{request.url.path}",
+            params=request.query_params,
+            headers=headers
+        )
+    except httpx.TransportError as e:
+        print(f"Warning: Backend {backend.url} unreachable: {e}")
+        pool.mark_unreachable(backend)
+        raise HTTPException(status_code=503, detail="The backend holding the processed image is unavailable")
+
+    headers = {name: value for name, value in response.headers.items() if name not in HOP_BY_HOP_HEADERS}
+    headers["x-backend"] = backend.url
+    return Response(content=response.content, status_code=response.status_code, headers=headers)
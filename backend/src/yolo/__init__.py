@@ -4,6 +4,34 @@ YOLO-World Object Detection Package
 This package provides object detection capabilities using YOLO-World model.
 """
 
-from .object_detection import YoloDetector
+import importlib
 
-__all__ = ['YoloDetector']
\ No newline at end of file
+# Exported names and the submodules defining them. Submodules are imported
+# on first access, so that the pipeline's worker processes can import light
+# modules such as ingest without loading torch and ultralytics
+_EXPORTS = {
+    'YoloDetector': 'object_detection',
+    'DatasetSplit': 'dataset_split',
+    'TrainingLedger': 'incremental',
+    'ModelHolder': 'model_holder',
+    'ModelRegistry': 'model_registry',
+    'ModelPool': 'model_pool',
+    'VocabularyIndex': 'vocabulary_index',
+    'AliasMap': 'vocabulary_aliases',
+    'DecodedImage': 'ingest',
+    'decode_image': 'ingest',
+    'LatencyProfile': 'latency_profile',
+    'AdmissionController': 'admission',
+    'BatchJobStore': 'batch_jobs',
+    'BatchJobRunner': 'batch_jobs',
+    'ModelArtifactCache': 'artifact_cache',
+    'RenderCache': 'render_cache',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
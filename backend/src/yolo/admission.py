@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+# Priority lanes, highest priority first
+LANES = ("interactive", "labeling", "batch")
+
+
+class AdmissionRejected(Exception):
+    status_code = 503
+
+
+class DeadlineExceeded(AdmissionRejected):
+    status_code = 504
+
+
+class RateLimited(AdmissionRejected):
+    status_code = 429
+
+
+class QueueFull(AdmissionRejected):
+    status_code = 503
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def idle(self, now: float) -> bool:
+        """Whether the bucket has refilled completely, i.e. holds no rate limiting state"""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AdmissionController:
+    """
+    Deadline-aware admission in front of the detector
+
+    At most ``max_concurrency`` requests run at once. Waiting requests are
+    served strictly by lane priority (then arrival order); requests whose
+    deadline passes while queued are dropped before they reach inference.
+    Each client is rate limited with a token bucket.
+    """
+
+    def __init__(self, max_concurrency: int = 1, lanes=LANES, rate_per_second: float = 10.0,
+                 burst: float = 20.0, max_queue: int = 64, max_clients: int = 10000):
+        self.max_concurrency = max_concurrency
+        self.lanes = tuple(lanes)
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_clients = max_clients
+        self._active = 0
+        self._waiters: list = []  # heap of (priority, seq, future, deadline, lane)
+        self._seq = itertools.count()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._counters = {"admitted": 0, "rate_limited": 0, "deadline_exceeded": 0, "queue_full": 0}
+
+    def _check_rate(self, client_id: str | None):
+        if client_id is None or self.rate_per_second <= 0:
+            return
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._evict_buckets()
+            bucket = self._buckets[client_id] = TokenBucket(self.rate_per_second, self.burst)
+        if not bucket.take():
+            self._counters["rate_limited"] += 1
+            raise RateLimited(f"Rate limit exceeded for client {client_id}")
+
+    def _evict_buckets(self):
+        # Refilled buckets behave exactly like new ones and can go; only if
+        # every client is active is the least recently seen one dropped
+        now = time.monotonic()
+        for client_id in [c for c, bucket in self._buckets.items() if bucket.idle(now)]:
+            del self._buckets[client_id]
+        if len(self._buckets) >= self.max_clients:
+            del self._buckets[min(self._buckets, key=lambda c: self._buckets[c].updated)]
+
+    def _remove_waiter(self, future: asyncio.Future):
+        # Abandoned waiters must not count towards max_queue
+        for i, entry in enumerate(self._waiters):
+            if entry[2] is future:
+                self._waiters[i] = self._waiters[-1]
+                self._waiters.pop()
+                heapq.heapify(self._waiters)
+                return
+
+    def _expired(self, deadline: float | None) -> bool:
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _must_wait(self) -> bool:
+        return self._active >= self.max_concurrency or bool(self._waiters)
+
+    def _dispatch(self):
+        while self._waiters and self._active < self.max_concurrency:
+            _, _, future, deadline, _ = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if self._expired(deadline):
+                self._counters["deadline_exceeded"] += 1
+                future.set_exception(DeadlineExceeded("Request deadline exceeded while queued"))
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    def check(self, lane: str = "interactive", deadline: float | None = None, client_id: str | None = None):
+        """
+        Reject a request that would not be admitted now, before work is spent on it
+
+        Runs the rate, deadline and queue checks of ``acquire`` without
+        waiting, e.g. before an upload is decoded. The client's rate limit
+        token is taken here, so the later ``acquire`` is made without ``client_id``.
+
+        Raises:
+            RateLimited: The client exceeded its request rate
+            DeadlineExceeded: The deadline has passed
+            QueueFull: Too many requests are already waiting
+        """
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+        self._check_rate(client_id)
+        if self._expired(deadline):
+            self._counters["deadline_exceeded"] += 1
+            raise DeadlineExceeded("Request deadline exceeded before inference")
+        if self._must_wait() and len(self._waiters) >= self.max_queue:
+            self._counters["queue_full"] += 1
+            raise QueueFull("Too many queued requests")
+
+    async def acquire(self, lane: str = "interactive", deadline: float | None = None,
+                      client_id: str | None = None):
+        """
+        Wait for an inference slot
+
+        Args:
+            lane: Priority lane, one of ``lanes``
+            deadline: ``time.monotonic()`` value after which the client no longer wants the result
+            client_id: Key for per-client rate limiting
+
+        Raises:
+            RateLimited: The client exceeded its request rate
+            DeadlineExceeded: The deadline passed before a slot became free
+            QueueFull: Too many requests are already waiting
+        """
+        self.check(lane, deadline, client_id)
+
+        if not self._must_wait():
+            self._active += 1
+            self._counters["admitted"] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (self.lanes.index(lane), next(self._seq), future, deadline, lane))
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Granted at the same moment the deadline passed; give the slot back
+                self.release()
+            future.cancel()
+            self._remove_waiter(future)
+            self._counters["deadline_exceeded"] += 1
+            raise DeadlineExceeded("Request deadline exceeded while queued")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            future.cancel()
+            self._remove_waiter(future)
+            raise
+        self._counters["admitted"] += 1
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, lane: str = "interactive", deadline: float | None = None,
+                    client_id: str | None = None):
+        await self.acquire(lane, deadline, client_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> dict:
+        queued = {lane: 0 for lane in self.lanes}
+        for _, _, future, _, lane in self._waiters:
+            if not future.done():
+                queued[lane] += 1
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queued": queued,
+            **self._counters,
+        }
@@ -0,0 +1,133 @@
+import base64
+import io
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Drawing and encoding run in the pipeline's annotate worker processes, so
+# this module must stay importable without the detector (torch, ultralytics)
+
+
+def annotate_image(image_source, detections_data: List[Dict]) -> Image.Image:
+    """
+    画像にバウンディングボックスとラベルを描画する
+
+    image_sourceは画像ファイルのパス、またはデコード済みのPIL画像（元の画像は変更しない）
+    """
+    # 画像を開く
+    if isinstance(image_source, Image.Image):
+        image = image_source.copy()
+    else:
+        image = Image.open(image_source)
+    draw = ImageDraw.Draw(image)
+
+    # カラーパレット
+    colors = [
+        '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4',
+        '#FECA57', '#FF9FF3', '#A8E6CF', '#FFD93D'
+    ]
+
+    # フォントを設定（デフォルトフォントを使用）
+    try:
+        # より大きなフォントを試す
+        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20)
+    except:
+        try:
+            font = ImageFont.truetype("arial.ttf", 20)
+        except:
+            font = ImageFont.load_default()
+
+    for i, detection in enumerate(detections_data):
+        # バウンディングボックスの座標
+        bbox = detection['bbox']
+        x1, y1, x2, y2 = bbox
+
+        # 色を選択
+        color = colors[i % len(colors)]
+
+        # バウンディングボックスを描画（太い線）
+        line_width = 4
+        draw.rectangle([x1, y1, x2, y2], outline=color, width=line_width)
+
+        # ラベルテキストの準備
+        label = f"{detection['class']} {detection['confidence']*100:.0f}%"
+
+        # テキストサイズを計算
+        try:
+            bbox_text = draw.textbbox((0, 0), label, font=font)
+            text_width = bbox_text[2] - bbox_text[0]
+            text_height = bbox_text[3] - bbox_text[1]
+        except:
+            # fallback for older PIL versions
+            try:
+                # Try to get text size using textbbox with different method
+                bbox_text = draw.textbbox((0, 0), label, font=font)
+                text_width = bbox_text[2] - bbox_text[0]
+                text_height = bbox_text[3] - bbox_text[1]
+            except:
+                # Final fallback - estimate text size
+                text_width = len(label) * 10  # Rough estimate
+                text_height = 20  # Rough estimate
+
+        # ラベル背景を描画
+        label_y = max(0, y1 - text_height - 10)
+        draw.rectangle(
+            [x1, label_y, x1 + text_width + 10, y1],
+            fill=color
+        )
+
+        # ラベルテキストを描画
+        draw.text(
+            (x1 + 5, label_y + 2),
+            label,
+            fill='white',
+            font=font
+        )
+
+    return image
+
+
+def draw_bounding_boxes(image_source, detections_data: List[Dict]) -> str:
+    """
+    画像にバウンディングボックスを描画し、Base64エンコードした文字列を返す
+
+    image_sourceは画像ファイルのパス、またはデコード済みのPIL画像
+    """
+    try:
+        image = annotate_image(image_source, detections_data)
+
+        # 画像をBase64にエンコード
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG", quality=90)
+        img_str = base64.b64encode(buffered.getvalue()).decode()
+
+        return img_str
+
+    except Exception as e:
+        print(f"Error drawing bounding boxes: {e}")
+        # エラーの場合は元の画像をそのまま返す
+        if isinstance(image_source, Image.Image):
+            buffered = io.BytesIO()
+            image_source.save(buffered, format="JPEG", quality=90)
+            return base64.b64encode(buffered.getvalue()).decode()
+        with open(image_source, "rb") as img_file:
+            img_str = base64.b64encode(img_file.read()).decode()
+        return img_str
+
+
+def render_annotated_image(image: Image.Image, detections_data: List[Dict], max_size: Optional[int],
+                           image_format: str) -> bytes:
+    """
+    バウンディングボックスを描画した画像を指定の長辺サイズ・形式でエンコードする
+    """
+    annotated = annotate_image(image, detections_data)
+    if max_size is not None and max(annotated.size) > max_size:
+        annotated.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
+    buffered = io.BytesIO()
+    if image_format == "jpeg":
+        annotated.save(buffered, format="JPEG", quality=90)
+    elif image_format == "webp":
+        annotated.save(buffered, format="WEBP", quality=85)
+    else:
+        annotated.save(buffered, format="PNG")
+    return buffered.getvalue()
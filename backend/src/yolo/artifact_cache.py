@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import torch
+import ultralytics
+
+
+def file_digest(path, chunk_size: int = 4 * 1024 * 1024) -> str:
+    """
+    Content hash of a file, e.g. model weights
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelArtifactCache:
+    """
+    On-disk cache of prepared models for fast worker starts
+
+    Preparing a YOLO-World model means loading the checkpoint, running the
+    CLIP text encoder for the vocabulary (``set_classes``) and fusing conv
+    and batch norm layers on the first prediction. An artifact is the model
+    after these steps, saved as an ultralytics checkpoint, so the next
+    worker (or restart) with the same weights and vocabulary only loads it.
+
+    Artifacts are keyed by the content hash of the weights, a vocabulary key
+    and the ultralytics and torch versions (checkpoints pickle their
+    modules). Writes are atomic, so workers starting together can share the
+    directory; the least recently used artifacts are deleted over
+    ``max_bytes``.
+    """
+
+    def __init__(self, root, max_bytes: int | None = None):
+        """
+        Args:
+            root: Directory holding the artifacts
+            max_bytes: Disk budget; None keeps every artifact
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._digests: dict[tuple, str] = {}  # (path, size, mtime) -> content hash
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0, "errors": 0}
+
+    def weights_digest(self, weights_path) -> str:
+        """
+        Content hash of a weights file, computed once per file version
+        """
+        path = Path(weights_path).resolve()
+        stat = path.stat()
+        key = (str(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(path)
+            with self._lock:
+                self._digests[key] = digest
+        return digest
+
+    def key(self, weights_path, vocabulary: str) -> str | None:
+        """
+        Artifact key of a model prepared from ``weights_path`` for a vocabulary
+
+        Args:
+            weights_path: Checkpoint the model is prepared from
+            vocabulary: Identifies everything baked into the model besides the
+                weights, e.g. the vocabulary hash
+
+        Returns:
+            The key, or None if the weights are not a local file
+        """
+        if not Path(weights_path).is_file():
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (self.weights_digest(weights_path), vocabulary, ultralytics.__version__, torch.__version__):
+            digest.update(str(part).encode("utf-8") + b"\0")
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / f"{key}.pt"
+
+    def get(self, key: str) -> Path | None:
+        """
+        Path of a stored artifact, or None on a miss
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)  # Recency for eviction
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return path
+
+    def put(self, key: str, module: torch.nn.Module, train_args: dict | None = None) -> Path:
+        """
+        Store a prepared model
+
+        Args:
+            key: Artifact key
+            module: The prepared ``nn.Module`` (e.g. ``YOLOWorld(...).model``)
+            train_args: Checkpoint arguments to keep with the model
+
+        Returns:
+            The artifact path
+        """
+        path = self.path(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            torch.save({
+                "model": module,
+                "train_args": dict(train_args or {}),
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "version": ultralytics.__version__,
+            }, tmp)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        with self._lock:
+            self._stats["stored"] += 1
+        self.prune()
+        return path
+
+    def discard(self, key: str):
+        """Delete an artifact that could not be loaded"""
+        self.path(key).unlink(missing_ok=True)
+        with self._lock:
+            self._stats["errors"] += 1
+
+    def _artifacts(self) -> list[tuple[float, int, Path]]:
+        artifacts = []
+        for path in self.root.glob("*.pt"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Pruned by another worker
+            artifacts.append((stat.st_mtime, stat.st_size, path))
+        return artifacts
+
+    def prune(self) -> list[str]:
+        """
+        Delete the least recently used artifacts over the disk budget; the newest one is always kept
+
+        Returns:
+            Keys of the deleted artifacts
+        """
+        if self.max_bytes is None:
+            return []
+        artifacts = sorted(self._artifacts())
+        total = sum(size for _, size, _ in artifacts)
+        removed = []
+        for _, size, path in artifacts[:-1]:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed.append(path.stem)
+        with self._lock:
+            self._stats["evictions"] += len(removed)
+        return removed
+
+    def get_stats(self) -> dict:
+        artifacts = self._artifacts()
+        with self._lock:
+            return {
+                "artifacts": len(artifacts),
+                "bytes": sum(size for _, size, _ in artifacts),
+                "max_bytes": self.max_bytes,
+                **self._stats,
+            }
@@ -0,0 +1,408 @@
+import asyncio
+import json
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from .admission import AdmissionRejected
+
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    busy_seconds REAL NOT NULL DEFAULT 0,
+    results_bytes INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+
+class BatchJobStore:
+    """
+    Durable queue of offline detection jobs in one SQLite database
+
+    A job is a list of image files (one item per image) plus detection
+    parameters. Results are appended to ``<root>/<job id>/results.jsonl``,
+    one JSON object per image, as each batch of items finishes.
+
+    A worker leases the job it processes and renews the lease while it works
+    on it, including while a batch waits for admission or is retried. If the
+    worker dies or is recycled, the lease runs out and another
+    worker (or the restarted server) resumes the job at its first unfinished
+    item. The results file is cut back to the length committed with the last
+    batch first, so a batch interrupted while being written is run again
+    rather than reported twice.
+    """
+
+    def __init__(self, root, lease_seconds: float = 300.0):
+        """
+        Args:
+            root: Directory holding ``jobs.db``, uploaded inputs and results;
+                created when the store is first used
+            lease_seconds: Time after the last lease renewal before a job
+                counts as abandoned and may be taken over
+        """
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # The database is opened on first use (with the lock held), so creating a store touches no files
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+            db = sqlite3.connect(self.root / "jobs.db", timeout=30, isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _query(self, sql: str, params=()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def results_path(self, job_id: str) -> Path:
+        return self.job_dir(job_id) / "results.jsonl"
+
+    def submit(self, sources: list[str], params: dict, uploads=()) -> dict:
+        """
+        Queue a job
+
+        Args:
+            sources: Paths of image files to process
+            params: Detection parameters, passed to the batch processor
+            uploads: ``(filename, bytes)`` pairs stored with the job and
+                processed after ``sources``
+
+        Returns:
+            The job, see ``get()``
+        """
+        job_id = uuid.uuid4().hex
+        sources = [str(source) for source in sources]
+        uploads = list(uploads)
+        if uploads:
+            inputs = self.job_dir(job_id) / "inputs"
+            inputs.mkdir(parents=True)
+            for i, (filename, data) in enumerate(uploads):
+                path = inputs / f"{i:06d}_{re.sub(r'[^A-Za-z0-9._-]', '_', Path(filename or 'image').name)}"
+                path.write_bytes(data)
+                sources.append(str(path))
+        if not sources:
+            raise ValueError("A job needs at least one image")
+        self.job_dir(job_id).mkdir(exist_ok=True)
+        self.results_path(job_id).touch()
+
+        with self._transaction() as db:
+            db.execute("INSERT INTO jobs (id, status, params, total, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                       (job_id, json.dumps(params), len(sources), time.time()))
+            db.executemany("INSERT INTO items (job_id, seq, source) VALUES (?, ?, ?)",
+                           [(job_id, seq, source) for seq, source in enumerate(sources)])
+        return self.get(job_id)
+
+    def claim(self, owner: str) -> dict | None:
+        """
+        Lease the oldest queued or abandoned job
+
+        Returns:
+            The job with its parameters, or None if there is nothing to do
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, "
+                       "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                       (owner, now + self.lease_seconds, now, row["id"]))
+        return self.get(row["id"])
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """
+        Extend the lease of a job the worker is still processing
+
+        Returns:
+            False if the worker no longer holds the job (cancelled or taken over)
+        """
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                                (time.time() + self.lease_seconds, job_id, owner))
+        return cursor.rowcount > 0
+
+    def pending_items(self, job_id: str, limit: int) -> list[tuple[int, str]]:
+        rows = self._query("SELECT seq, source FROM items WHERE job_id = ? AND status = 'pending' "
+                           "ORDER BY seq LIMIT ?", (job_id, limit))
+        return [(row["seq"], row["source"]) for row in rows]
+
+    def record_batch(self, job_id: str, owner: str, records: list[dict], seconds: float) -> bool:
+        """
+        Append the results of a batch and mark its items finished
+
+        Args:
+            job_id: Job id
+            owner: Worker holding the lease
+            records: One JSON-serializable dict per item with its ``seq``;
+                records with an ``error`` count as failed
+            seconds: Processing time of the batch, for throughput
+
+        Returns:
+            False if the worker no longer holds the job (cancelled or taken
+            over); nothing is recorded then
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT results_bytes FROM jobs WHERE id = ? AND owner = ? AND status = 'running'",
+                             (job_id, owner)).fetchone()
+            if row is None:
+                return False
+            data = b"".join(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n" for record in records)
+            path = self.results_path(job_id)
+            with open(path, "ab") as f:
+                # Drop output of a batch that was interrupted before it was committed
+                f.truncate(row["results_bytes"])
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            failed = [record["seq"] for record in records if "error" in record]
+            db.executemany("UPDATE items SET status = ? WHERE job_id = ? AND seq = ?",
+                           [("failed" if "error" in record else "done", job_id, record["seq"])
+                            for record in records])
+            db.execute("UPDATE jobs SET done = done + ?, failed = failed + ?, results_bytes = ?, "
+                       "busy_seconds = busy_seconds + ?, lease_until = ? WHERE id = ?",
+                       (len(records) - len(failed), len(failed), row["results_bytes"] + len(data), seconds,
+                        time.time() + self.lease_seconds, job_id))
+        return True
+
+    def _end(self, job_id: str, owner: str, status: str, error: str | None = None):
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, owner = NULL, lease_until = NULL "
+                       "WHERE id = ? AND owner = ? AND status = 'running'",
+                       (status, error, time.time(), job_id, owner))
+
+    def finish(self, job_id: str, owner: str):
+        self._end(job_id, owner, "completed")
+
+    def fail(self, job_id: str, owner: str, error: str):
+        self._end(job_id, owner, "failed", error)
+
+    def release(self, job_id: str, owner: str):
+        """
+        Give a job back to the queue, e.g. on shutdown, so it resumes without waiting for the lease
+        """
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL "
+                       "WHERE id = ? AND owner = ? AND status = 'running'", (job_id, owner))
+
+    def cancel(self, job_id: str) -> dict | None:
+        """
+        Cancel a queued or running job; finished results are kept
+
+        Returns:
+            The job, or None if it does not exist
+        """
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', finished_at = ?, owner = NULL, lease_until = NULL "
+                       "WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id))
+        return self.get(job_id)
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> dict:
+        processed = row["done"] + row["failed"]
+        rate = processed / row["busy_seconds"] if row["busy_seconds"] > 0 else None
+        remaining = row["total"] - processed
+        end = row["finished_at"] or time.time()
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "params": json.loads(row["params"]),
+            "total": row["total"],
+            "done": row["done"],
+            "failed": row["failed"],
+            "progress": processed / row["total"] if row["total"] else 1.0,
+            "images_per_second": rate,
+            "eta_seconds": remaining / rate if rate and row["status"] in ("queued", "running") else None,
+            "elapsed_seconds": end - row["started_at"] if row["started_at"] else None,
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "error": row["error"],
+        }
+
+    def get(self, job_id: str) -> dict | None:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._job(rows[0]) if rows else None
+
+    def list(self, status: str | None = None, limit: int = 50) -> list[dict]:
+        """
+        Most recent jobs first, optionally only those in one state
+        """
+        if status is None:
+            rows = self._query("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        else:
+            rows = self._query("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                               (status, limit))
+        return [self._job(row) for row in rows]
+
+    def get_stats(self) -> dict:
+        counts = {state: 0 for state in JOB_STATES}
+        for row in self._query("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["count"]
+        pending = self._query("SELECT COUNT(*) AS count FROM items JOIN jobs ON jobs.id = items.job_id "
+                              "WHERE items.status = 'pending' AND jobs.status IN ('queued', 'running')")
+        return {"jobs": counts, "pending_images": pending[0]["count"]}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class BatchJobRunner:
+    """
+    Background worker that processes queued jobs one batch at a time
+
+    ``process_batch(params, items)`` is awaited with the job's parameters
+    and up to ``batch_size`` ``(seq, source)`` items and returns one record
+    per item. Errors in ``retry`` (by default admission rejections, e.g. a
+    full queue while interactive traffic peaks) pause the job and retry the
+    batch; any other error fails the job. The job's lease is renewed every
+    third of the lease time while it is processed, so a batch that waits
+    long for admission is not taken over by another worker.
+    """
+
+    def __init__(self, store: BatchJobStore, process_batch, batch_size: int = 8, poll_interval: float = 2.0,
+                 retry=(AdmissionRejected,), owner: str | None = None):
+        self.store = store
+        self.process_batch = process_batch
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry = retry
+        # Unique per process so a restarted worker never mistakes an old lease for its own
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: asyncio.Task | None = None
+        self._current: str | None = None
+        self._counters = {"batches": 0, "images": 0, "retries": 0}
+
+    def start(self):
+        """Start the worker on the running event loop"""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker and give its current job back to the queue"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._current is not None:
+            self.store.release(self._current, self.owner)
+            self._current = None
+
+    async def _run(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.owner)
+            except sqlite3.Error as e:
+                # E.g. the database stayed locked by another worker past the busy timeout
+                print(f"Could not claim a batch job: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self._current = job["id"]
+            print(f"Processing batch job {job['id']} ({job['total']} images)")
+            heartbeat = asyncio.create_task(self._keep_leased(job["id"]))
+            try:
+                await self._process(job)
+            except Exception as e:
+                print(f"Batch job {job['id']} failed: {e}")
+                try:
+                    await asyncio.to_thread(self.store.fail, job["id"], self.owner, str(e))
+                except sqlite3.Error as e:
+                    # The lease runs out and the job is resumed later
+                    print(f"Could not mark batch job {job['id']} as failed: {e}")
+            finally:
+                heartbeat.cancel()
+            self._current = None
+
+    async def _keep_leased(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self.store.renew, job_id, self.owner):
+                    # Cancelled or taken over; the next record_batch() stops the job
+                    return
+            except sqlite3.Error as e:
+                # Retried at the next interval, well before the lease runs out
+                print(f"Could not renew the lease of batch job {job_id}: {e}")
+
+    async def _process(self, job: dict):
+        while True:
+            items = await asyncio.to_thread(self.store.pending_items, job["id"], self.batch_size)
+            if not items:
+                await asyncio.to_thread(self.store.finish, job["id"], self.owner)
+                return
+            start = time.monotonic()
+            try:
+                records = await self.process_batch(job["params"], items)
+            except self.retry:
+                self._counters["retries"] += 1
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if not await asyncio.to_thread(self.store.record_batch, job["id"], self.owner, records,
+                                           time.monotonic() - start):
+                print(f"Batch job {job['id']} was cancelled or taken over")
+                return
+            self._counters["batches"] += 1
+            self._counters["images"] += len(records)
+
+    def get_stats(self) -> dict:
+        return {"owner": self.owner, "current_job": self._current, "batch_size": self.batch_size,
+                **self._counters, **self.store.get_stats()}
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import time
+
+from .admission import AdmissionRejected, DeadlineExceeded
+
+
+class TooManyWaiters(AdmissionRejected):
+    status_code = 503
+
+
+def request_key(data: bytes, *params) -> str:
+    """
+    Key of a request: content hash of its payload plus every parameter that changes the result
+    """
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(repr(params).encode())
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalescing of identical in-flight requests
+
+    The first request for a key (the leader) starts the work as its own
+    task; identical requests arriving while it runs wait for that task and
+    receive the same result instead of running it again. Since the task is
+    not owned by any one caller, a leader that disconnects does not cancel
+    the work its followers are waiting for.
+
+    Errors that belong to the leader rather than to the input (``private``,
+    by default admission rejections such as the leader's rate limit or
+    deadline) are not shared: followers run the work again themselves.
+    """
+
+    def __init__(self, max_waiters: int = 32, private=(AdmissionRejected,)):
+        self.max_waiters = max_waiters
+        self.private = private
+        self._flights: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+        self._counters = {"leaders": 0, "coalesced": 0, "rejected": 0}
+
+    def _start(self, key: str, work) -> asyncio.Task:
+        task = asyncio.ensure_future(work())
+        self._flights[key] = task
+        self._waiters[key] = 0
+        task.add_done_callback(lambda _: self._finish(key, task))
+        return task
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            del self._waiters[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here so an error nobody waits for is not logged as lost
+
+    async def run(self, key: str, work, deadline: float | None = None):
+        """
+        Run ``work()`` once for all concurrent callers with the same key
+
+        Args:
+            key: Request key, e.g. from ``request_key()``
+            work: Coroutine function producing the result
+            deadline: ``time.monotonic()`` value after which this caller stops waiting
+
+        Returns:
+            Tuple of (result, coalesced): ``coalesced`` is True if the result
+            came from another caller's work
+
+        Raises:
+            TooManyWaiters: Too many callers are already waiting for the key
+            DeadlineExceeded: The deadline passed while waiting for another caller's work
+        """
+        while True:
+            task = self._flights.get(key)
+            leader = task is None
+            if leader:
+                task = self._start(key, work)
+                self._counters["leaders"] += 1
+            elif self._waiters[key] >= self.max_waiters:
+                self._counters["rejected"] += 1
+                raise TooManyWaiters("Too many identical requests in flight")
+            else:
+                self._waiters[key] += 1
+                self._counters["coalesced"] += 1
+
+            try:
+                if not leader and deadline is not None:
+                    # asyncio.wait does not cancel the shared task on timeout
+                    done, _ = await asyncio.wait({task}, timeout=max(0.0, deadline - time.monotonic()))
+                    if not done:
+                        raise DeadlineExceeded("Request deadline exceeded while waiting for an identical request")
+                return await asyncio.shield(task), not leader
+            except self.private:
+                if leader or not task.done():
+                    raise
+                # The leader's own rejection; try again, possibly as the new leader
+            finally:
+                if not leader and self._flights.get(key) is task:
+                    self._waiters[key] -= 1
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "waiting": sum(self._waiters.values()),
+            "max_waiters": self.max_waiters,
+            **self._counters,
+        }
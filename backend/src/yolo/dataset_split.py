@@ -0,0 +1,191 @@
+import hashlib
+import json
+import math
+from pathlib import Path
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+class DatasetSplit:
+    """
+    Persistent, class-stratified train/validation split of a YOLO dataset
+
+    Assignments are stored in ``split.json`` next to the ``images`` and
+    ``labels`` directories. Images that already have an assignment never move;
+    only newly added images are placed, so the validation set stays fixed while
+    the dataset grows.
+    """
+
+    def __init__(self, data_dir, val_fraction: float = 0.2, max_val_images: int = 200):
+        self.data_dir = Path(data_dir)
+        self.images_dir = self.data_dir / "images"
+        self.labels_dir = self.data_dir / "labels"
+        self.split_file = self.data_dir / "split.json"
+        self.val_fraction = val_fraction
+        self.max_val_images = max_val_images
+        self.assignments: dict[str, str] = {}
+        self._load()
+
+    def _load(self):
+        if self.split_file.exists():
+            try:
+                with open(self.split_file, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict) and isinstance(loaded.get("assignments"), dict):
+                    self.assignments = dict(loaded["assignments"])
+                else:
+                    print(f"Warning: Invalid format in {self.split_file}.")
+            except json.JSONDecodeError:
+                print(f"Warning: JSON decoding error in {self.split_file}. Rebuilding split.")
+
+    def _save(self):
+        with open(self.split_file, 'w', encoding='utf-8') as f:
+            json.dump({"assignments": self.assignments}, f, ensure_ascii=False, indent=4)
+
+    def _image_files(self) -> list[Path]:
+        if not self.images_dir.exists():
+            return []
+        return sorted(p for p in self.images_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+
+    def _image_classes(self, image_file: Path) -> set[int]:
+        label_file = self.labels_dir / f"{image_file.stem}.txt"
+        classes = set()
+        if label_file.exists():
+            with open(label_file, 'r') as f:
+                for line in f:
+                    try:
+                        classes.add(int(line.split()[0]))
+                    except (ValueError, IndexError):
+                        continue
+        return classes
+
+    def _strata(self, image_file: Path) -> set:
+        # Images without labels (backgrounds) form their own stratum, so that
+        # they get their share of validation images but never crowd out labeled ones
+        return self._image_classes(image_file) or {None}
+
+    def _assign(self, strata: set, class_totals: dict, class_val: dict, n_total: int, n_val: int) -> str:
+        val_limit = min(self.max_val_images, math.floor(self.val_fraction * (n_total + 1)))
+        if n_val >= val_limit:
+            return "train"
+
+        # Stratify on the rarest class in the image so that small classes get
+        # their share of validation images, but never their first examples.
+        rarest = min(strata, key=lambda c: class_totals.get(c, 0))
+        wanted = math.floor(self.val_fraction * (class_totals.get(rarest, 0) + 1))
+        return "val" if class_val.get(rarest, 0) < wanted else "train"
+
+    def _plan(self, image_files: list[Path]) -> tuple[dict[str, str], bool]:
+        """
+        Assignments after placing new images and dropping deleted ones
+
+        Returns:
+            Tuple of (assignments, whether they differ from the stored ones)
+        """
+        present = {p.name for p in image_files}
+        assignments = {name: split for name, split in self.assignments.items() if name in present}
+        changed = len(assignments) != len(self.assignments)
+
+        class_totals: dict = {}
+        class_val: dict = {}
+        n_total = n_val = 0
+
+        def count(strata, split):
+            nonlocal n_total, n_val
+            n_total += 1
+            for c in strata:
+                class_totals[c] = class_totals.get(c, 0) + 1
+            if split == "val":
+                n_val += 1
+                for c in strata:
+                    class_val[c] = class_val.get(c, 0) + 1
+
+        pending = []
+        for image_file in image_files:
+            split = assignments.get(image_file.name)
+            if split is None:
+                pending.append(image_file)
+            else:
+                count(self._strata(image_file), split)
+
+        for image_file in pending:
+            strata = self._strata(image_file)
+            split = self._assign(strata, class_totals, class_val, n_total, n_val)
+            assignments[image_file.name] = split
+            changed = True
+            count(strata, split)
+
+        return assignments, changed
+
+    def update(self) -> dict[str, list[Path]]:
+        """
+        Assign new images to a split and drop entries for deleted images
+
+        Returns:
+            Mapping of ``"train"`` and ``"val"`` to their image paths
+        """
+        image_files = self._image_files()
+        assignments, changed = self._plan(image_files)
+        if changed:
+            self.assignments = assignments
+            self._save()
+
+        splits: dict[str, list[Path]] = {"train": [], "val": []}
+        for image_file in image_files:
+            splits[self.assignments[image_file.name]].append(image_file)
+        return splits
+
+    def write_lists(self) -> tuple[str, str]:
+        """
+        Update the split and write ``train.txt`` / ``val.txt`` image lists
+
+        Paths are written relative to the dataset directory so the lists stay
+        valid if the directory is moved. When no validation image exists yet,
+        the training list is reused so that training can still run.
+
+        Returns:
+            Tuple of (train list path, val list path)
+        """
+        splits = self.update()
+        if not splits["val"]:
+            print("Warning: Validation split is empty. Validating on the training images.")
+            splits["val"] = splits["train"]
+
+        return self.write_list("train", splits["train"]), self.write_list("val", splits["val"])
+
+    def write_list(self, name: str, image_files: list[Path]) -> str:
+        """
+        Write an image list file usable as a ``train``/``val`` entry in data.yaml
+        """
+        list_path = self.data_dir / f"{name}.txt"
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for image_file in image_files:
+                f.write(f"./images/{image_file.name}\n")
+        return str(list_path)
+
+    def get_counts(self) -> dict[str, int]:
+        """
+        Number of images per split, including images ``update`` has yet to
+        place; nothing is written
+        """
+        counts = {"train": 0, "val": 0}
+        for split in self._plan(self._image_files())[0].values():
+            counts[split] = counts.get(split, 0) + 1
+        return counts
+
+    def snapshot_id(self) -> str:
+        """
+        Id of the current dataset state (images, labels and split)
+
+        Returns:
+            Short hash that changes whenever an image, label or assignment changes
+        """
+        splits = self.update()
+        digest = hashlib.sha1()
+        for split in ("train", "val"):
+            for image_file in splits[split]:
+                digest.update(f"{split}:{image_file.name}:{image_file.stat().st_size}\n".encode("utf-8"))
+                label_file = self.labels_dir / f"{image_file.stem}.txt"
+                if label_file.exists():
+                    digest.update(label_file.read_bytes())
+        return digest.hexdigest()[:12]
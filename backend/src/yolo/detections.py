@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class Detections:
+    """
+    Columnar detection results
+
+    Boxes, confidences and class ids are NumPy arrays filled from the model
+    output with a single tensor-to-NumPy transfer, so building a response never
+    touches a tensor per box. Holding a ``Detections`` instead of the
+    ultralytics ``Results`` lets the result and its copy of the input image be
+    freed right after inference.
+    """
+
+    __slots__ = ("xyxy", "confidence", "class_id", "names", "model_version", "cascade_stage")
+
+    def __init__(self, xyxy: np.ndarray, confidence: np.ndarray, class_id: np.ndarray, names,
+                 model_version=None, cascade_stage=None):
+        self.xyxy = xyxy
+        self.confidence = confidence
+        self.class_id = class_id
+        self.names = names
+        self.model_version = model_version
+        self.cascade_stage = cascade_stage
+
+    @classmethod
+    def from_result(cls, result) -> "Detections":
+        """
+        Convert an ultralytics ``Results`` object
+
+        Args:
+            result: Detection result whose ``boxes.data`` rows are
+                [x1, y1, x2, y2, (track id,) conf, cls]
+
+        Returns:
+            The detections; the result itself is not referenced
+        """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            data = np.zeros((0, 6), dtype=np.float32)
+        else:
+            data = boxes.data.detach().cpu().numpy()
+        return cls(
+            xyxy=data[:, :4],
+            confidence=data[:, -2],
+            class_id=data[:, -1].astype(np.int64),
+            names=result.names,
+            model_version=getattr(result, "model_version", None),
+            cascade_stage=getattr(result, "cascade_stage", None),
+        )
+
+    def __len__(self) -> int:
+        return len(self.confidence)
+
+    def scaled(self, sx: float, sy: float) -> "Detections":
+        """
+        Scale box coordinates, e.g. from decoded to original image pixels
+        """
+        xyxy = self.xyxy * np.array([sx, sy, sx, sy], dtype=self.xyxy.dtype)
+        return Detections(xyxy, self.confidence, self.class_id, self.names, self.model_version, self.cascade_stage)
+
+    def class_names(self) -> list[str]:
+        return [self.names[i] for i in self.class_id.tolist()]
+
+    def to_records(self) -> list[dict]:
+        """
+        Convert to ``{"class", "confidence", "bbox"}`` dictionaries, one per box
+        """
+        return [
+            {"class": name, "confidence": confidence, "bbox": bbox}
+            for name, confidence, bbox in zip(self.class_names(), self.confidence.tolist(), self.xyxy.tolist())
+        ]
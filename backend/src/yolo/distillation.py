@@ -0,0 +1,137 @@
+import os
+import shutil
+from pathlib import Path
+
+import yaml
+
+
+def _read_labels(label_file: Path) -> list[tuple[int, float, float, float, float]]:
+    if not label_file.exists():
+        return []
+    labels = []
+    with open(label_file, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 5:
+                labels.append((int(parts[0]), *map(float, parts[1:])))
+    return labels
+
+
+def _iou_xywh(a, b) -> float:
+    ax1, ay1, ax2, ay2 = a[0] - a[2] / 2, a[1] - a[3] / 2, a[0] + a[2] / 2, a[1] + a[3] / 2
+    bx1, by1, bx2, by2 = b[0] - b[2] / 2, b[1] - b[3] / 2, b[0] + b[2] / 2, b[1] + b[3] / 2
+    inter = max(0.0, min(ax2, bx2) - max(ax1, bx1)) * max(0.0, min(ay2, by2) - max(ay1, by1))
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def pseudo_labels(result, class_ids: dict[str, int]) -> list[tuple[int, float, float, float, float]]:
+    """
+    Convert a detection result to YOLO label rows
+
+    Args:
+        result: ultralytics Results of the teacher model
+        class_ids: Dataset class id per class name; other classes are dropped
+
+    Returns:
+        Rows of (class_id, center_x, center_y, width, height), normalized
+    """
+    if result is None or result.boxes is None or len(result.boxes) == 0:
+        return []
+    rows = []
+    for cls, xywhn in zip(result.boxes.cls.tolist(), result.boxes.xywhn.tolist()):
+        class_id = class_ids.get(result.names[int(cls)])
+        if class_id is not None:
+            rows.append((class_id, *xywhn))
+    return rows
+
+
+def merge_labels(human: list, pseudo: list, iou_threshold: float = 0.5) -> list:
+    """
+    Add teacher boxes to human labels, skipping boxes a human already drew
+
+    Human labels always win: a pseudo box overlapping any human box by more
+    than ``iou_threshold`` is dropped.
+    """
+    merged = list(human)
+    for box in pseudo:
+        if all(_iou_xywh(box[1:], h[1:]) <= iou_threshold for h in human):
+            merged.append(box)
+    return merged
+
+
+def _link_or_copy(src: Path, dst: Path):
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def build_distillation_dataset(predict, labeled_images: list[Path], labels_dir, out_dir, class_names: list[str],
+                               val_list, unlabeled_images: list[Path] = (), iou_threshold: float = 0.5) -> dict:
+    """
+    Pseudo-label images with the teacher and write a closed-set training dataset
+
+    Human-labeled images keep their labels and gain the teacher's boxes for
+    objects nobody labeled; unlabeled images are trained on teacher boxes
+    only. Validation uses the human-labeled validation list unchanged so that
+    teacher and student are compared on ground truth.
+
+    Args:
+        predict: Callable ``(image_path) -> Results`` running the teacher
+        labeled_images: Human-labeled training images
+        labels_dir: Directory with the human YOLO labels
+        out_dir: Output dataset directory
+        class_names: Dataset class names in class id order
+        val_list: Path to the human-labeled validation image list
+        unlabeled_images: Additional images without human labels
+        iou_threshold: IoU above which a teacher box duplicates a human box
+
+    Returns:
+        Statistics and the path of the generated data.yaml
+    """
+    out_dir = Path(out_dir)
+    images_out = out_dir / "images"
+    labels_out = out_dir / "labels"
+    for directory in (images_out, labels_out):
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+
+    class_ids = {name: i for i, name in enumerate(class_names)}
+    stats = {"images": 0, "human_boxes": 0, "pseudo_boxes": 0}
+    entries = [(path, True) for path in labeled_images] + [(path, False) for path in unlabeled_images]
+
+    train_lines = []
+    for image_path, labeled in entries:
+        image_path = Path(image_path)
+        human = _read_labels(Path(labels_dir) / f"{image_path.stem}.txt") if labeled else []
+        pseudo = pseudo_labels(predict(image_path), class_ids)
+        labels = merge_labels(human, pseudo, iou_threshold=iou_threshold)
+
+        _link_or_copy(image_path, images_out / image_path.name)
+        with open(labels_out / f"{image_path.stem}.txt", 'w') as f:
+            for class_id, cx, cy, w, h in labels:
+                f.write(f"{class_id} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n")
+        train_lines.append(f"./images/{image_path.name}")
+
+        stats["images"] += 1
+        stats["human_boxes"] += len(human)
+        stats["pseudo_boxes"] += len(labels) - len(human)
+
+    with open(out_dir / "train.txt", 'w', encoding='utf-8') as f:
+        f.write("\n".join(train_lines) + ("\n" if train_lines else ""))
+
+    config_path = out_dir / "data.yaml"
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.dump({
+            'path': str(out_dir.absolute()),
+            'train': "train.txt",
+            'val': str(Path(val_list).absolute()),
+            'nc': len(class_names),
+            'names': list(class_names)
+        }, f, default_flow_style=False, allow_unicode=True)
+
+    print(f"Distillation dataset: {stats}")
+    return dict(stats, config_path=str(config_path))
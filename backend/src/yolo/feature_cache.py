@@ -0,0 +1,193 @@
+import hashlib
+import threading
+import types
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import ultralytics
+from ultralytics.nn.modules import C2fAttn, ImagePoolingAttn, WorldDetect
+
+# Layers that read the text embeddings; everything before the first one is
+# the vocabulary-independent image backbone
+TEXT_CONDITIONED_LAYERS = (C2fAttn, ImagePoolingAttn, WorldDetect)
+
+# The cached forward pass re-implements WorldModel.predict's layer loop, so
+# it is only installed on ultralytics versions it was checked against; keep
+# this in step with the pin in requirements.txt
+SUPPORTED_ULTRALYTICS_VERSIONS = ("8.4.177",)
+
+
+def image_digest(image) -> str:
+    """
+    Content hash of an RGB PIL image or HWC array
+    """
+    pixels = np.ascontiguousarray(np.asarray(image))
+    digest = hashlib.blake2b(pixels.data, digest_size=16)
+    digest.update(str(pixels.shape).encode())
+    return digest.hexdigest()
+
+
+def backbone_end(world_model) -> int | None:
+    """
+    Number of leading layers whose output does not depend on the vocabulary
+
+    The split is moved back to the last layer whose output the model keeps
+    anyway, so the cached features are just the kept backbone outputs.
+
+    Returns:
+        The layer count, or None if the model has no text-conditioned layers
+    """
+    end = next((i for i, m in enumerate(world_model.model) if isinstance(m, TEXT_CONDITIONED_LAYERS)), None)
+    if end is None:
+        return None
+    while end > 1 and end - 1 not in world_model.save:
+        end -= 1
+    return end
+
+
+class FeatureCache:
+    """
+    Memory-bounded LRU cache of YOLO-World backbone features per image
+
+    The backbone of a YOLO-World model does not see the class prompts, so
+    when the same image is detected again under another vocabulary, another
+    confidence or another model's text embeddings, only the text-conditioned
+    neck and head have to run. Entries are keyed by model weights, image
+    content and input shape, so they stay valid when a model is prepared
+    again for a new vocabulary.
+
+    A model is connected with ``attach()``; predictions then use the cache
+    while inside ``use(key)`` and run normally otherwise.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # (weights key, image key, input shape) -> (kept layer outputs, bytes)
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._context = threading.local()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def attach(self, world_model, weights_key: str):
+        """
+        Route a WorldModel's forward pass through the cache
+
+        Args:
+            world_model: ``ultralytics.nn.tasks.WorldModel`` instance (``YOLOWorld(...).model``)
+            weights_key: Identifies the backbone weights; models loaded from
+                the same checkpoint share cache entries
+        """
+        if ultralytics.__version__ not in SUPPORTED_ULTRALYTICS_VERSIONS:
+            print(f"Warning: ultralytics {ultralytics.__version__} is not supported; feature cache not used")
+            return
+        end = backbone_end(world_model)
+        if end is None:
+            print(f"Warning: {type(world_model).__name__} has no text-conditioned layers; feature cache not used")
+            return
+        world_model.predict = types.MethodType(self._make_predict(weights_key, end), world_model)
+
+    @contextmanager
+    def use(self, key: str):
+        """
+        Use cached features for the single image predicted inside the ``with`` block
+
+        Args:
+            key: Content key of the image, e.g. from ``image_digest()``
+        """
+        previous = getattr(self._context, "key", None)
+        self._context.key = key
+        try:
+            yield
+        finally:
+            self._context.key = previous
+
+    def _make_predict(self, weights_key: str, end: int):
+        cache = self
+
+        def predict(self, x, profile=False, txt_feats=None, augment=False, embed=None):
+            key = getattr(cache._context, "key", None)
+            if key is None or x.shape[0] != 1 or profile or augment or embed:
+                return type(self).predict(self, x, profile=profile, txt_feats=txt_feats, augment=augment, embed=embed)
+
+            entry_key = (weights_key, key, tuple(x.shape))
+            y = cache._get(entry_key)
+            if y is None:
+                y = cache._run_backbone(self, x, end)
+                cache._put(entry_key, y)
+            return cache._run_head(self, y, end, txt_feats)
+
+        return predict
+
+    @staticmethod
+    def _run_backbone(model, x, end: int) -> list:
+        y = []
+        for m in model.model[:end]:
+            if m.f != -1:
+                x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+            x = m(x)
+            # The last backbone output is always kept (see backbone_end)
+            y.append(x if m.i in model.save or m.i == end - 1 else None)
+        return y
+
+    @staticmethod
+    def _run_head(model, y: list, end: int, txt_feats=None):
+        # Same as WorldModel.predict from layer ``end`` on
+        y = list(y)
+        x = y[-1]
+        txt_feats = (model.txt_feats if txt_feats is None else txt_feats).type_as(x)
+        if txt_feats.shape[0] != x.shape[0] or model.model[-1].export:
+            txt_feats = txt_feats.expand(x.shape[0], -1, -1)
+        ori_txt_feats = txt_feats.clone()
+        for m in model.model[end:]:
+            if m.f != -1:
+                x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+            if isinstance(m, C2fAttn):
+                x = m(x, txt_feats)
+            elif isinstance(m, WorldDetect):
+                x = m(x, ori_txt_feats)
+            elif isinstance(m, ImagePoolingAttn):
+                txt_feats = m(x, txt_feats)
+            else:
+                x = m(x)
+            y.append(x if m.i in model.save else None)
+        return x
+
+    def _get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def _put(self, key: tuple, y: list):
+        size = sum(t.numel() * t.element_size() for t in y if t is not None)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (y, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
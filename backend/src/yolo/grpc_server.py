@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import deque
+
+try:
+    import grpc
+    from grpc import aio
+
+    # Generated from detector.proto by `make setup-grpc`
+    from . import detector_pb2
+except ImportError:  # Optional dependency: make setup-grpc
+    grpc = detector_pb2 = None
+
+SERVICE_NAME = "detector.v1.Detector"
+
+# HTTP-style status codes raised by the detection path -> gRPC status code names
+_STATUS_CODES = {
+    400: "INVALID_ARGUMENT",
+    404: "NOT_FOUND",
+    409: "FAILED_PRECONDITION",
+    413: "RESOURCE_EXHAUSTED",
+    429: "RESOURCE_EXHAUSTED",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+
+def grpc_available() -> bool:
+    return grpc is not None
+
+
+def detect_response(detections, **fields):
+    """
+    Build a ``DetectResponse`` from ``Detections``; class ids index the names found in the image
+
+    Args:
+        detections: Detections in original image coordinates
+        **fields: Other response fields (model_version, id, coalesced, ...)
+    """
+    names = detections.class_names()
+    class_names = list(dict.fromkeys(names))
+    index = {name: i for i, name in enumerate(class_names)}
+    return detector_pb2.DetectResponse(
+        boxes=detections.xyxy.ravel().tolist(),
+        scores=detections.confidence.tolist(),
+        class_ids=[index[name] for name in names],
+        class_names=class_names,
+        **fields
+    )
+
+
+def error_status(error: Exception) -> tuple[str, str]:
+    """
+    gRPC status code name and message for an error from the detection path
+
+    Errors carrying an HTTP ``status_code`` (HTTPException, admission
+    rejections) keep their meaning; anything else is INTERNAL.
+    """
+    code = _STATUS_CODES.get(getattr(error, "status_code", None), "INTERNAL")
+    return code, str(getattr(error, "detail", None) or error)
+
+
+class DetectorService:
+    """
+    ``detector.v1.Detector`` servicer on top of a detection coroutine
+
+    The coroutine is the same detection path the HTTP API uses (same model,
+    admission control, pipeline and request coalescing), so both front ends
+    share one scheduler. Requests and responses are the messages generated
+    from detector.proto: raw image bytes and packed arrays, nothing is base64
+    or JSON encoded.
+
+    Streamed images are processed ``stream_window`` at a time so that their
+    decode, inference and encode stages overlap; responses keep request order.
+    """
+
+    def __init__(self, detect, stream_window: int = 4):
+        """
+        Args:
+            detect: Coroutine function ``(detector_pb2.DetectRequest, lane, deadline, client_id) -> DetectResponse``;
+                ``deadline`` is a ``time.monotonic()`` value or None
+            stream_window: Streamed images in flight per stream
+        """
+        self.detect = detect
+        self.stream_window = stream_window
+
+    @staticmethod
+    def _ticket(context) -> dict:
+        metadata = dict(context.invocation_metadata() or ())
+        remaining = context.time_remaining()
+        return {
+            "lane": metadata.get("x-priority", "interactive").lower(),
+            "deadline": time.monotonic() + remaining if remaining is not None else None,
+            "client_id": metadata.get("x-client-id") or context.peer(),
+        }
+
+    async def Detect(self, request, context):
+        try:
+            return await self.detect(request, **self._ticket(context))
+        except Exception as e:
+            code, message = error_status(e)
+            await context.abort(getattr(grpc.StatusCode, code), message)
+
+    async def _detect_item(self, request, ticket: dict):
+        try:
+            return await self.detect(request, **ticket)
+        except Exception as e:
+            code, message = error_status(e)
+            return detector_pb2.DetectResponse(id=request.id, error=f"{code}: {message}")
+
+    async def DetectStream(self, request_iterator, context):
+        ticket = self._ticket(context)
+        pending = deque()
+        try:
+            async for request in request_iterator:
+                pending.append(asyncio.ensure_future(self._detect_item(request, ticket)))
+                if len(pending) >= self.stream_window:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def handler(self):
+        """Generic RPC handler; messages are (de)serialized by the generated detector_pb2"""
+        request, response = detector_pb2.DetectRequest, detector_pb2.DetectResponse
+        return grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "Detect": grpc.unary_unary_rpc_method_handler(
+                self.Detect, request_deserializer=request.FromString, response_serializer=response.SerializeToString
+            ),
+            "DetectStream": grpc.stream_stream_rpc_method_handler(
+                self.DetectStream, request_deserializer=request.FromString,
+                response_serializer=response.SerializeToString
+            ),
+        })
+
+
+async def start_grpc_server(detect, port: int, max_message_bytes: int = 32 * 1024 * 1024, stream_window: int = 4):
+    """
+    Start the gRPC front end on the running event loop
+
+    Args:
+        detect: Detection coroutine, see ``DetectorService``
+        port: TCP port; several worker processes can bind the same port
+            (SO_REUSEPORT) and the kernel spreads connections over them
+        max_message_bytes: Largest accepted request / response
+        stream_window: Streamed images in flight per stream
+
+    Returns:
+        The started ``grpc.aio.Server`` (stop it with ``await server.stop(grace)``)
+    """
+    if grpc is None:
+        raise RuntimeError("gRPC is not set up; run make setup-grpc")
+    server = aio.server(options=[
+        ("grpc.max_receive_message_length", max_message_bytes),
+        ("grpc.max_send_message_length", max_message_bytes),
+    ])
+    server.add_generic_rpc_handlers((DetectorService(detect, stream_window=stream_window).handler(),))
+    server.add_insecure_port(f"[::]:{port}")
+    await server.start()
+    return server
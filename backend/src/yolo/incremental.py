@@ -0,0 +1,90 @@
+import json
+import random
+from datetime import datetime
+from pathlib import Path
+
+
+class TrainingLedger:
+    """
+    Record of fine-tuning runs and the training samples each one consumed
+
+    The ledger is stored as ``training_runs.json`` in the training data
+    directory and is used to pick the samples and starting weights of the next
+    incremental run.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+        self.ledger_file = self.data_dir / "training_runs.json"
+        self.runs: list[dict] = []
+        self._load()
+
+    def _load(self):
+        if self.ledger_file.exists():
+            try:
+                with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, list):
+                    self.runs = loaded
+                else:
+                    print(f"Warning: Invalid format in {self.ledger_file}.")
+            except json.JSONDecodeError:
+                print(f"Warning: JSON decoding error in {self.ledger_file}. File might be corrupted.")
+
+    def _save(self):
+        with open(self.ledger_file, 'w', encoding='utf-8') as f:
+            json.dump(self.runs, f, ensure_ascii=False, indent=4)
+
+    def seen_samples(self) -> set[str]:
+        seen = set()
+        for run in self.runs:
+            seen.update(run.get("new_samples", []))
+            seen.update(run.get("replay_samples", []))
+        return seen
+
+    def latest_weights(self) -> str | None:
+        """
+        Get the best weights of the most recent run that still exist on disk
+        """
+        for run in reversed(self.runs):
+            weights = run.get("weights")
+            if weights and Path(weights).exists():
+                return weights
+        return None
+
+    def record_run(self, mode: str, new_samples: list[str], replay_samples: list[str],
+                   weights: str | None, epochs: int, start_weights: str | None = None) -> dict:
+        run = {
+            "run_id": len(self.runs) + 1,
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "mode": mode,
+            "epochs": epochs,
+            "start_weights": start_weights,
+            "weights": weights,
+            "new_samples": sorted(new_samples),
+            "replay_samples": sorted(replay_samples),
+        }
+        self.runs.append(run)
+        self._save()
+        return run
+
+
+def select_incremental_samples(train_images: list[Path], seen: set[str], replay_ratio: float = 1.0,
+                               seed: int | None = None) -> tuple[list[Path], list[Path]]:
+    """
+    Pick the samples for an incremental fine-tuning run
+
+    Args:
+        train_images: Images currently in the training split
+        seen: Image names consumed by earlier runs
+        replay_ratio: Number of previously seen images to replay per new image
+        seed: Seed for the replay sampling
+
+    Returns:
+        Tuple of (new images, sampled replay images)
+    """
+    new_images = [p for p in train_images if p.name not in seen]
+    old_images = [p for p in train_images if p.name in seen]
+    n_replay = min(len(old_images), round(len(new_images) * replay_ratio))
+    replay_images = random.Random(seed).sample(old_images, n_replay) if n_replay > 0 else []
+    return new_images, sorted(replay_images)
@@ -0,0 +1,107 @@
+import io
+
+from PIL import Image, ImageOps
+
+# EXIF orientations that rotate the image by 90 degrees
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+async def read_upload(upload, max_bytes: int, chunk_size: int = 1024 * 1024) -> bytes:
+    """
+    Read an uploaded file in chunks, stopping as soon as it exceeds the size cap
+
+    Args:
+        upload: FastAPI/Starlette UploadFile
+        max_bytes: Maximum accepted size in bytes
+        chunk_size: Bytes read per chunk
+
+    Returns:
+        The file content
+
+    Raises:
+        UploadTooLarge: If the file is larger than max_bytes
+    """
+    size = getattr(upload, "size", None)
+    if size is not None and size > max_bytes:
+        raise UploadTooLarge(f"File exceeds the maximum size of {max_bytes} bytes")
+
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise UploadTooLarge(f"File exceeds the maximum size of {max_bytes} bytes")
+    return bytes(buffer)
+
+
+class DecodedImage:
+    """
+    Image decoded at (roughly) model resolution
+
+    ``image`` is an upright RGB image whose long side is at least the
+    requested target size. ``original_size`` is the upright size of the full
+    resolution photo and ``scale`` maps decoded pixels back to it.
+    """
+
+    def __init__(self, image: Image.Image, original_size: tuple[int, int]):
+        self.image = image
+        self.original_size = original_size
+        self.scale = (original_size[0] / image.size[0], original_size[1] / image.size[1])
+
+    def to_original(self, bbox: list[float]) -> list[float]:
+        """
+        Map an [x1, y1, x2, y2] box from decoded to original image coordinates
+        """
+        sx, sy = self.scale
+        x1, y1, x2, y2 = bbox
+        return [x1 * sx, y1 * sy, x2 * sx, y2 * sy]
+
+
+def decode_image(data: bytes, target_size: int = 640, max_size: int | None = None) -> DecodedImage:
+    """
+    Decode image bytes straight to about the model input resolution
+
+    JPEGs are decoded with PIL's draft mode, which lets libjpeg downscale by
+    1/2, 1/4 or 1/8 during the DCT instead of decoding every pixel of a large
+    photo. EXIF orientation is applied so that boxes match the upright photo.
+
+    Args:
+        data: Encoded image bytes
+        target_size: Minimum long side of the decoded image
+        max_size: Optional maximum long side; larger images are downscaled
+
+    Returns:
+        The decoded image and its mapping to original coordinates
+    """
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    orientation = image.getexif().get(0x0112, 1)
+
+    if image.format == "JPEG":
+        long_side = max(width, height)
+        if long_side > target_size:
+            image.draft("RGB", (max(1, width * target_size // long_side), max(1, height * target_size // long_side)))
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if max_size is not None and max(image.size) > max_size:
+        image.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
+
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return DecodedImage(image, (width, height))
+
+
+def decode_image_file(path, target_size: int = 640, max_size: int | None = None) -> DecodedImage:
+    """
+    Read and decode an image file, see ``decode_image``
+    """
+    with open(path, "rb") as f:
+        return decode_image(f.read(), target_size=target_size, max_size=max_size)
@@ -0,0 +1,131 @@
+import statistics
+import threading
+import time
+
+
+class LatencyProfile:
+    """
+    Per-resolution inference latency, used to pick an input size per request
+
+    The profile is measured once (usually at startup). While serving, observed
+    latencies are compared with the profile; when the server runs slower than
+    profiled (overload, a training job on the same host, ...) requests that
+    did not ask for a fixed size are stepped down to smaller resolutions.
+    A step is taken back only once the slowdown falls below its (lower)
+    step-up ratio, so the size does not flap around a threshold.
+    """
+
+    def __init__(self, sizes=(320, 416, 512, 640, 800, 960), default_size: int = 640,
+                 step_down_ratios=(1.5, 3.0), step_up_ratios=(1.2, 2.4), smoothing: float = 0.2):
+        self.sizes = sorted(sizes)
+        self.default_size = default_size
+        self.step_down_ratios = step_down_ratios
+        self.step_up_ratios = step_up_ratios
+        self.smoothing = smoothing
+        self.latencies_ms: dict[int, float] = {}
+        self._slowdown = 1.0
+        self._steps = 0
+        self._lock = threading.Lock()
+
+    def measure(self, predict, runs: int = 3):
+        """
+        Time inference at every configured size
+
+        Args:
+            predict: Callable ``(imgsz) -> Any`` running one inference
+            runs: Timed runs per size after one warm-up run
+        """
+        latencies = {}
+        for size in self.sizes:
+            predict(size)  # warm-up
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                predict(size)
+                timings.append((time.perf_counter() - start) * 1000)
+            latencies[size] = statistics.median(timings)
+        with self._lock:
+            self.latencies_ms = latencies
+            self._slowdown = 1.0
+            self._steps = 0
+        print(f"Latency profile (ms): {{{', '.join(f'{k}: {v:.0f}' for k, v in latencies.items())}}}")
+
+    def snap(self, imgsz: int) -> int:
+        """
+        Round a requested size to a multiple of 32 within the supported range
+        """
+        imgsz = max(self.sizes[0], min(self.sizes[-1], int(imgsz)))
+        return max(32, round(imgsz / 32) * 32)
+
+    def overload_steps(self) -> int:
+        with self._lock:
+            return self._steps
+
+    def choose(self, imgsz: int | None = None, budget_ms: float | None = None) -> int:
+        """
+        Pick the input size for a request
+
+        Args:
+            imgsz: Explicitly requested size; honoured as is (snapped to a multiple of 32)
+            budget_ms: Latency budget; the largest profiled size that fits is used
+
+        Returns:
+            The input size to run inference at
+        """
+        if imgsz is not None:
+            return self.snap(imgsz)
+
+        with self._lock:
+            latencies = dict(self.latencies_ms)
+            slowdown = self._slowdown
+
+        if budget_ms is not None and latencies:
+            # Budget against current, not profiled, speed
+            fitting = [s for s in self.sizes if latencies.get(s, float("inf")) * slowdown <= budget_ms]
+            size = fitting[-1] if fitting else self.sizes[0]
+            return size
+
+        size = self.default_size
+        steps = self.overload_steps()
+        if steps:
+            smaller = [s for s in self.sizes if s <= size]
+            size = smaller[max(0, len(smaller) - 1 - steps)]
+        return size
+
+    def expected_ms(self, imgsz: int) -> float | None:
+        """
+        Expected latency of one inference at a size under the current load
+
+        Sizes between profiled sizes use the next larger one (the largest
+        beyond the profile). None until the profile is measured.
+        """
+        with self._lock:
+            if not self.latencies_ms:
+                return None
+            profiled = sorted(self.latencies_ms)
+            size = next((s for s in profiled if s >= imgsz), profiled[-1])
+            return self.latencies_ms[size] * self._slowdown
+
+    def record(self, imgsz: int, latency_ms: float):
+        """
+        Feed an observed inference latency back into the overload estimate
+        """
+        with self._lock:
+            expected = self.latencies_ms.get(imgsz)
+            if not expected:
+                return
+            ratio = latency_ms / expected
+            self._slowdown += self.smoothing * (ratio - self._slowdown)
+            while self._steps < len(self.step_down_ratios) and self._slowdown >= self.step_down_ratios[self._steps]:
+                self._steps += 1
+            while self._steps > 0 and self._slowdown < self.step_up_ratios[self._steps - 1]:
+                self._steps -= 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "latencies_ms": {str(k): round(v, 1) for k, v in self.latencies_ms.items()},
+                "slowdown": round(self._slowdown, 2),
+                "overload_steps": self._steps,
+                "default_size": self.default_size,
+            }
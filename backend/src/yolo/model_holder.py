@@ -0,0 +1,97 @@
+import gc
+import threading
+from contextlib import contextmanager
+
+import torch
+
+
+class _Slot:
+    def __init__(self, model, tag):
+        self.model = model
+        self.tag = tag
+        self.refs = 0
+        self.retired = False
+
+
+class ModelHolder:
+    """
+    Double-buffered holder for the serving model
+
+    Readers pin the current model with ``acquire()``. ``swap()`` publishes an
+    already prepared model atomically; the previous model keeps serving the
+    requests that pinned it and is released as soon as the last of them
+    finishes.
+    """
+
+    def __init__(self, model=None, tag=None):
+        self._lock = threading.Lock()
+        self._current = _Slot(model, tag) if model is not None else None
+        self._draining: list[_Slot] = []
+
+    @property
+    def current(self):
+        slot = self._current
+        return slot.model if slot is not None else None
+
+    @property
+    def tag(self):
+        slot = self._current
+        return slot.tag if slot is not None else None
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pin the current model for the duration of the ``with`` block
+
+        Yields:
+            Tuple of (model, tag)
+        """
+        with self._lock:
+            slot = self._current
+            if slot is None:
+                raise RuntimeError("No model loaded")
+            slot.refs += 1
+        try:
+            yield slot.model, slot.tag
+        finally:
+            with self._lock:
+                slot.refs -= 1
+                drained = slot.retired and slot.refs == 0
+                if drained:
+                    self._draining.remove(slot)
+            if drained:
+                self._release(slot)
+
+    def swap(self, model, tag=None):
+        """
+        Make ``model`` the current model
+
+        Args:
+            model: Fully prepared (classes set, warmed up) model
+            tag: Identifier reported alongside the model, e.g. its weights path
+        """
+        with self._lock:
+            old, self._current = self._current, _Slot(model, tag)
+            drained = False
+            if old is not None:
+                old.retired = True
+                drained = old.refs == 0
+                if not drained:
+                    self._draining.append(old)
+        if drained:
+            self._release(old)
+
+    def _release(self, slot: _Slot):
+        slot.model = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print(f"Released model {slot.tag}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "tag": self.tag,
+                "in_flight": self._current.refs if self._current is not None else 0,
+                "draining": [{"tag": s.tag, "in_flight": s.refs} for s in self._draining],
+            }
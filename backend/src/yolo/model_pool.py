@@ -0,0 +1,154 @@
+import gc
+import itertools
+import threading
+from collections import OrderedDict
+
+
+def model_nbytes(model) -> int:
+    """
+    Memory held by a model's parameters and buffers, in bytes
+    """
+    module = getattr(model, "model", model)
+    return sum(t.numel() * t.element_size() for t in itertools.chain(module.parameters(), module.buffers()))
+
+
+class ModelPool:
+    """
+    Warm pool of models served side by side, e.g. one fine-tuned variant per
+    restaurant chain
+
+    Models are loaded on first use and kept until the memory budget is
+    exceeded, then the least recently used ones are evicted. The budget covers
+    every resident model: models held outside the pool (the serving model,
+    preloaded registry versions) count against it but are never evicted. A
+    model loaded for an older vocabulary is reloaded. Requests already using
+    an evicted model finish with it; its memory is freed when the last one is
+    done.
+    """
+
+    def __init__(self, loader, max_bytes: int, sizer=model_nbytes, resident=None):
+        """
+        Args:
+            loader: Callable ``(model_id) -> model`` returning a prepared model;
+                raises KeyError for unknown ids
+            max_bytes: Memory budget for all resident models. The most recently
+                used pooled model is always kept, even if the budget is exceeded
+            sizer: Callable ``(model) -> bytes`` estimating a model's memory
+            resident: Callable returning the models held in memory outside the
+                pool; models that are also pooled are counted once
+        """
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.sizer = sizer
+        self.resident = resident
+        # model id -> (vocabulary version, model, bytes)
+        self._models: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        # model id -> [load lock, requests holding or waiting for it]
+        self._loading: dict[str, list] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _lookup(self, model_id: str, vocabulary_version: str):
+        with self._lock:
+            entry = self._models.get(model_id)
+            if entry is None or entry[0] != vocabulary_version:
+                return None
+            self._models.move_to_end(model_id)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def get(self, model_id: str, vocabulary_version: str):
+        """
+        Get a model, loading it if it is not pooled for this vocabulary
+
+        Concurrent requests for the same model wait for a single load.
+
+        Args:
+            model_id: Model to serve
+            vocabulary_version: Vocabulary the model must be prepared for
+
+        Returns:
+            The prepared model
+        """
+        model = self._lookup(model_id, vocabulary_version)
+        if model is not None:
+            return model
+
+        with self._lock:
+            loading = self._loading.setdefault(model_id, [threading.Lock(), 0])
+            loading[1] += 1
+        try:
+            with loading[0]:
+                # Another request may have loaded it while we waited
+                model = self._lookup(model_id, vocabulary_version)
+                if model is not None:
+                    return model
+
+                with self._lock:
+                    self._stats["misses"] += 1
+                print(f"Loading model {model_id} into the model pool...")
+                model = self.loader(model_id)
+                size = self.sizer(model)
+                resident = self._resident_models()
+
+                with self._lock:
+                    self._models[model_id] = (vocabulary_version, model, size)
+                    self._models.move_to_end(model_id)
+                    evicted = self._evict_over_budget(resident)
+        finally:
+            # Drop the lock with its last user, so ids (including unknown ones) do not accumulate
+            with self._lock:
+                loading[1] -= 1
+                if loading[1] == 0:
+                    del self._loading[model_id]
+        if evicted:
+            print(f"Evicted models from the model pool: {evicted}")
+            gc.collect()
+        return model
+
+    def _resident_models(self) -> dict[int, int]:
+        """Bytes of the models held outside the pool, by object id"""
+        if self.resident is None:
+            return {}
+        return {id(model): self.sizer(model) for model in self.resident() if model is not None}
+
+    def _outside_bytes(self, resident: dict[int, int]) -> int:
+        pooled = {id(entry[1]) for entry in self._models.values()}
+        return sum(size for model_id, size in resident.items() if model_id not in pooled)
+
+    def _evict_over_budget(self, resident: dict[int, int]) -> list[str]:
+        evicted = []
+        # The most recently used model stays; evicting a model that is also
+        # held outside the pool would free nothing
+        for model_id in list(self._models)[:-1]:
+            if sum(entry[2] for entry in self._models.values()) + self._outside_bytes(resident) <= self.max_bytes:
+                break
+            if id(self._models[model_id][1]) in resident:
+                continue
+            del self._models[model_id]
+            evicted.append(model_id)
+            self._stats["evictions"] += 1
+        return evicted
+
+    def evict(self, model_id: str):
+        """Drop a model, e.g. after its registry version was deleted"""
+        with self._lock:
+            removed = self._models.pop(model_id, None)
+        if removed is not None:
+            gc.collect()
+
+    def get_stats(self) -> dict:
+        resident = self._resident_models()
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else None,
+                "models": [
+                    {"model_id": model_id, "vocabulary_version": entry[0], "bytes": entry[2]}
+                    for model_id, entry in reversed(self._models.items())
+                ],
+                "bytes": sum(entry[2] for entry in self._models.values()),
+                "resident_bytes": self._outside_bytes(resident),
+                "max_bytes": self.max_bytes,
+            }
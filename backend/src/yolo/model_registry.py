@@ -0,0 +1,226 @@
+import json
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+
+class ModelRegistry:
+    """
+    Versioned store of fine-tuned checkpoints
+
+    Every registered checkpoint is copied to ``<root>/<version>/best.pt`` and
+    recorded in ``<root>/registry.json`` with its training metrics, dataset
+    snapshot id and vocabulary. Promotions are kept as a history so that the
+    previous model can be restored with ``rollback()``.
+    """
+
+    def __init__(self, root="model_registry", max_bytes: int | None = None, keep_last: int = 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.root / "registry.json"
+        self.max_bytes = max_bytes
+        self.keep_last = keep_last
+        self.versions: list[dict] = []
+        self.active: str | None = None
+        self.history: list[str] = []
+        self._lock = threading.RLock()
+        # version -> (vocabulary version, prepared model)
+        self._preloaded: OrderedDict[str, tuple] = OrderedDict()
+        self._load()
+
+    def _load(self):
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f)
+                self.versions = loaded.get("versions", [])
+                self.active = loaded.get("active")
+                self.history = loaded.get("history", [])
+            except (json.JSONDecodeError, AttributeError):
+                print(f"Warning: Could not read {self.index_file}. Starting with an empty registry.")
+
+    def _save(self):
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "active": self.active,
+                "history": self.history,
+                "versions": self.versions,
+            }, f, ensure_ascii=False, indent=4)
+
+    def get(self, version: str) -> dict:
+        with self._lock:
+            for entry in self.versions:
+                if entry["version"] == version:
+                    return entry
+        raise KeyError(f"Unknown model version: {version}")
+
+    def list_versions(self) -> list[dict]:
+        with self._lock:
+            return [dict(entry, active=entry["version"] == self.active,
+                         preloaded=entry["version"] in self._preloaded)
+                    for entry in self.versions]
+
+    def register(self, weights_path, metrics: dict | None = None, dataset_snapshot: str | None = None,
+                 vocabulary: list[str] | None = None, source: str | None = None,
+                 backend: str = "world", extra: dict | None = None) -> dict:
+        """
+        Copy a checkpoint into the registry
+
+        Args:
+            weights_path: Path to the trained weights, e.g. ``runs/detect/train3/weights/best.pt``
+            metrics: Final training/validation metrics
+            dataset_snapshot: Id of the dataset state the model was trained on
+            vocabulary: Detection classes at training time
+            source: Free-form origin of the checkpoint
+            backend: ``"world"`` for YOLO-World checkpoints or ``"closed_set"``
+                for plain YOLO detectors with a fixed vocabulary
+            extra: Additional fields stored with the entry
+
+        Returns:
+            The new registry entry
+        """
+        with self._lock:
+            number = max((int(e["version"][1:]) for e in self.versions), default=0) + 1
+            version = f"v{number:04d}"
+            version_dir = self.root / version
+            version_dir.mkdir(parents=True, exist_ok=True)
+            target = version_dir / "best.pt"
+            shutil.copy2(weights_path, target)
+
+            entry = {
+                "version": version,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "weights": str(target),
+                "size_bytes": target.stat().st_size,
+                "metrics": {k: float(v) for k, v in (metrics or {}).items()},
+                "dataset_snapshot": dataset_snapshot,
+                "vocabulary": sorted(vocabulary or []),
+                "source": str(source) if source else str(weights_path),
+                "backend": backend,
+                **(extra or {}),
+            }
+            self.versions.append(entry)
+            self._save()
+            print(f"Registered model {version} from {weights_path}")
+            return entry
+
+    def promote(self, version: str) -> dict:
+        with self._lock:
+            entry = self.get(version)
+            self.active = version
+            self.history.append(version)
+            self._save()
+            return entry
+
+    def previous_version(self) -> str | None:
+        """
+        Get the version that was active before the current one
+        """
+        with self._lock:
+            known = {e["version"] for e in self.versions}
+            for version in reversed(self.history[:-1]):
+                if version != self.active and version in known:
+                    return version
+        return None
+
+    def rollback(self) -> dict:
+        """
+        Mark the previously active version as active again
+
+        Returns:
+            The restored registry entry
+        """
+        with self._lock:
+            version = self.previous_version()
+            if version is None:
+                raise ValueError("No previous model version to roll back to")
+            # Drop the rolled-back version from the history so that repeated
+            # rollbacks keep walking backwards
+            while self.history and self.history[-1] != version:
+                self.history.pop()
+            self.active = version
+            self._save()
+            return self.get(version)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e.get("size_bytes", 0) for e in self.versions)
+
+    def prune(self, max_bytes: int | None = None) -> list[str]:
+        """
+        Delete the oldest versions until the registry fits the disk quota
+
+        The active version and the ``keep_last`` newest versions are never
+        deleted.
+
+        Returns:
+            Removed version ids
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return []
+
+        removed = []
+        with self._lock:
+            protected = {e["version"] for e in self.versions[-self.keep_last:]} if self.keep_last > 0 else set()
+            protected.add(self.active)
+            for entry in list(self.versions):
+                if self.total_bytes() <= max_bytes:
+                    break
+                if entry["version"] in protected:
+                    continue
+                shutil.rmtree(self.root / entry["version"], ignore_errors=True)
+                self.versions.remove(entry)
+                self._preloaded.pop(entry["version"], None)
+                removed.append(entry["version"])
+            if removed:
+                self._save()
+        if removed:
+            print(f"Pruned model versions: {removed}")
+        return removed
+
+    def preload(self, loader, vocabulary_version: str, k: int | None = None):
+        """
+        Keep the ``k`` newest versions loaded in memory for instant switching
+
+        Args:
+            loader: Callable ``(weights_path) -> model`` returning a prepared model;
+                closed-set entries are loaded with ``closed_set=True``
+            vocabulary_version: Vocabulary the models are prepared for; models
+                prepared for another vocabulary are reloaded
+            k: Number of versions to keep loaded (defaults to ``keep_last``)
+        """
+        k = self.keep_last if k is None else k
+        with self._lock:
+            wanted = [e for e in self.versions[-k:]] if k > 0 else []
+        wanted_ids = {e["version"] for e in wanted}
+
+        for entry in wanted:
+            cached = self._preloaded.get(entry["version"])
+            if cached is not None and cached[0] == vocabulary_version:
+                continue
+            if entry.get("backend") == "closed_set":
+                model = loader(entry["weights"], closed_set=True)
+            else:
+                model = loader(entry["weights"])
+            with self._lock:
+                self._preloaded[entry["version"]] = (vocabulary_version, model)
+
+        with self._lock:
+            for version in list(self._preloaded):
+                if version not in wanted_ids:
+                    del self._preloaded[version]
+
+    def preloaded_models(self) -> list:
+        """Models currently kept loaded by ``preload()``"""
+        with self._lock:
+            return [model for _, model in self._preloaded.values()]
+
+    def get_preloaded(self, version: str, vocabulary_version: str):
+        with self._lock:
+            cached = self._preloaded.get(version)
+        if cached is not None and cached[0] == vocabulary_version:
+            return cached[1]
+        return None
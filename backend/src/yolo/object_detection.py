@@ -1,16 +1,95 @@
-from ultralytics import YOLOWorld
+from ultralytics import YOLO, YOLOWorld
+from ultralytics.engine.results import Results
+from ultralytics.utils.nms import non_max_suppression
 import json
 from pathlib import Path
 import os
+import threading
+import hashlib
+import weakref
+from contextlib import nullcontext
+import numpy as np
+import torch
+import yaml
+from PIL import Image
+from .model_holder import ModelHolder
+from .tiling import make_tiles, merge_tile_detections
+from .preprocess import InputBufferPool, image_size, letterbox_into, letterbox_shape
+from .feature_cache import FeatureCache, image_digest
+from .vocabulary_index import ClipEncoder, VocabularyIndex, top_k_classes
+from .vocabulary_aliases import AliasMap, find_duplicate_classes, find_duplicates_of
+from .training_budget import benchmark_training_step, plan_training
+from .artifact_cache import ModelArtifactCache
 
 class YoloDetector:
-    def __init__(self, model_path="./yolov8s-world.pt", vocab_file="custom_vocab.json"):
-        self.model = YOLOWorld(model_path)
+    def __init__(self, model_path="./yolov8s-world.pt", vocab_file="custom_vocab.json", model_version=None,
+                 cascade_model_path=None, uncertainty_band=(0.25, 0.6), cascade_top_k=3,
+                 closed_set=False, world_model_path=None, feature_cache_bytes=None,
+                 candidate_k=None, vocabulary_index_dir="vocabulary_index", clip_encoder=None,
+                 aliases_file=None, auto_merge_threshold=None, artifact_cache_dir=None, artifact_cache_bytes=None):
         self.model_path = model_path
+        self._initial_version = model_version or model_path
+        # A distilled closed-set model can serve instead of YOLO-World; the
+        # open-vocabulary weights are kept for training and vocabulary changes
+        self.closed_set = closed_set
+        self.world_model_path = world_model_path or (model_path if not closed_set else "./yolov8s-world.pt")
+        self._world_version = self._initial_version if not closed_set else self.world_model_path
         self.vocab_file = Path(vocab_file)
         self.current_classes = set()
+        # The serving model is double-buffered: replacements are prepared on a
+        # standby instance and swapped in atomically under _swap_lock
+        self._holder = ModelHolder()
+        self._swap_lock = threading.RLock()
+        # Optional small first-stage model; images only go to the main model
+        # when its top confidences fall inside the uncertainty band
+        self.cascade_model_path = cascade_model_path
+        self.uncertainty_band = uncertainty_band
+        self.cascade_top_k = cascade_top_k
+        self._cascade_holder = ModelHolder()
+        self._cascade_stats = {"small": 0, "escalated": 0}
+        self._stats_lock = threading.Lock()
+        # Reused model input tensors for decoded (PIL) images and tiles
+        self._input_buffers = InputBufferPool()
+        # Optional cache of vocabulary-independent backbone features per image,
+        # so re-querying an image with other classes only runs the neck and head
+        self._feature_cache = FeatureCache(feature_cache_bytes) if feature_cache_bytes else None
+        # Large vocabularies: class text embeddings are kept in an index with
+        # stable ids, and above candidate_k classes each image only runs the
+        # head on the candidate_k classes most similar to the whole image
+        self.candidate_k = candidate_k
+        self._vocab_index = VocabularyIndex(vocabulary_index_dir) if candidate_k else None
+        self._clip = clip_encoder or (ClipEncoder() if candidate_k else None)
+        # (ordered class names, (N, dim) embeddings) of each prepared model with
+        # candidate slots; they belong to the model, so requests still running
+        # on the previous model during a vocabulary change use its own classes
+        self._model_candidates = weakref.WeakKeyDictionary()
+        # Near-duplicate and synonym classes are merged into a canonical class;
+        # with auto_merge_threshold set, newly added classes similar enough to an
+        # existing class are merged as they are added
+        self.aliases = AliasMap(aliases_file or self.vocab_file.with_name(f"{self.vocab_file.stem}_aliases.json"))
+        self.auto_merge_threshold = auto_merge_threshold
+        # Optional on-disk cache of prepared models (vocabulary baked in,
+        # conv/BN fused), so later workers skip the text encoder at startup
+        self._artifacts = ModelArtifactCache(artifact_cache_dir, max_bytes=artifact_cache_bytes) \
+            if artifact_cache_dir else None
+        self.last_best_weights = None
         self._load_custom_vocab()
 
+    @property
+    def model(self):
+        return self._holder.current
+
+    @property
+    def model_version(self):
+        """Registry version (or weights path) of the serving model"""
+        return self._holder.tag
+
+    @property
+    def vocabulary_version(self) -> str:
+        """Short, order-independent hash of the current vocabulary"""
+        digest = hashlib.sha1("\n".join(sorted(self.current_classes)).encode("utf-8"))
+        return digest.hexdigest()[:12]
+
     def _load_custom_vocab(self):
         if self.vocab_file.exists():
             try:
@@ -27,35 +106,530 @@ class YoloDetector:
 
     def _save_custom_vocab(self):
         with open(self.vocab_file, 'w', encoding='utf-8') as f:
-            json.dump(list(self.current_classes), f, ensure_ascii=False, indent=4)
+            json.dump(self.ordered_classes(), f, ensure_ascii=False, indent=4)
         print(f"Custom vocabulary saved to {self.vocab_file}.")
 
-    def _update_model_classes(self):
-        if self.current_classes:
-            self.model.set_classes(list(self.current_classes))
-            print(f"Model detection classes updated: {list(self.current_classes)}")
+    def ordered_classes(self) -> list[str]:
+        """Current classes in a stable order: by vocabulary index id, else alphabetical"""
+        if self._vocab_index is not None:
+            return self._vocab_index.sort(self.current_classes)
+        return sorted(self.current_classes)
+
+    @property
+    def prefilter_active(self) -> bool:
+        """Each image runs on its own candidate classes instead of the full vocabulary"""
+        return self.candidate_k is not None and len(self.current_classes) > self.candidate_k and not self.closed_set
+
+    @property
+    def cascade_enabled(self) -> bool:
+        return self._cascade_holder.current is not None and not self.closed_set
+
+    def prepare_model(self, model_path: str, warmup: bool = True, vocabulary_from=None, closed_set: bool = False):
+        """
+        Load a standby model with the current vocabulary, ready to be swapped in
+
+        Args:
+            model_path: Path to the model weights
+            warmup: Run one inference so the first real request does not pay
+                the lazy initialization cost
+            vocabulary_from: Prepared model whose class names and text
+                embeddings are reused instead of running the text encoder again
+            closed_set: The weights are a plain YOLO detector with a fixed
+                vocabulary (e.g. a distilled model)
+        """
+        artifact_key = self._artifact_key(model_path, closed_set)
+        model = self._load_artifact(artifact_key, closed_set) if artifact_key else None
+        if model is not None:
+            if self.prefilter_active and not closed_set:
+                # The head's placeholder slots are in the artifact; predictions need the class embeddings
+                self._model_candidates[model] = self._class_text_embeddings()
         else:
-            print("No detection classes set.")
+            model = YOLO(model_path) if closed_set else YOLOWorld(model_path)
+            if closed_set:
+                # The class names are baked into the checkpoint
+                pass
+            elif vocabulary_from is not None:
+                # Text embeddings come from the shared CLIP text encoder, so they
+                # are valid for every YOLO-World checkpoint
+                model.model.txt_feats = vocabulary_from.model.txt_feats
+                model.model.model[-1].nc = vocabulary_from.model.model[-1].nc
+                model.model.names = vocabulary_from.model.names
+                model.predictor = None
+                if vocabulary_from in self._model_candidates:
+                    self._model_candidates[model] = self._model_candidates[vocabulary_from]
+            elif self.prefilter_active:
+                self._use_candidate_slots(model)
+            elif self.current_classes:
+                model.set_classes(self.ordered_classes())
+            if artifact_key:
+                self._store_artifact(artifact_key, model)
+        if self._feature_cache is not None and not closed_set:
+            self._feature_cache.attach(model.model, weights_key=self._weights_key(model_path))
+        if warmup:
+            model.predict(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+        return model
 
-    def add_classes(self, new_classes: list[str]):
-        for cls in new_classes:
-            self.current_classes.add(cls)
-        self._update_model_classes()
-        self._save_custom_vocab()
+    def _artifact_key(self, model_path: str, closed_set: bool) -> str | None:
+        """Artifact cache key of a model prepared from model_path with the current vocabulary"""
+        if self._artifacts is None:
+            return None
+        if closed_set:
+            vocabulary = "closed_set"
+        elif self.prefilter_active:
+            # Placeholder slots hold the first candidate_k classes in index order
+            vocabulary = f"candidates:{self.candidate_k}:{self.vocabulary_version}"
+        elif self.current_classes:
+            vocabulary = "\n".join(self.ordered_classes())  # Class ids follow this order
+        else:
+            return None
+        try:
+            return self._artifacts.key(model_path, vocabulary)
+        except OSError as e:
+            print(f"Warning: Could not hash {model_path} for the artifact cache: {e}")
+            return None
+
+    def _load_artifact(self, key: str, closed_set: bool):
+        path = self._artifacts.get(key)
+        if path is None:
+            return None
+        try:
+            model = YOLO(path) if closed_set else YOLOWorld(path)
+        except Exception as e:
+            print(f"Warning: Discarding unreadable model artifact {path}: {e}")
+            self._artifacts.discard(key)
+            return None
+        print(f"Loaded prepared model from artifact cache: {path}")
+        return model
+
+    def _store_artifact(self, key: str, model):
+        try:
+            # Fuse conv and batch norm now so that loading workers skip it too
+            model.model.fuse(verbose=False)
+            ckpt = getattr(model, "ckpt", None)
+            self._artifacts.put(key, model.model, train_args=ckpt.get("train_args") if isinstance(ckpt, dict) else None)
+        except Exception as e:
+            print(f"Warning: Could not store model artifact: {e}")
+
+    def _use_candidate_slots(self, model):
+        """
+        Size a YOLO-World model's head for candidate_k classes
+
+        The embeddings of the first candidate_k classes are only placeholders;
+        every prediction passes the text features of its own candidates.
+        """
+        names, embeddings = self._class_text_embeddings()
+        k = self.candidate_k
+        model.model.txt_feats = torch.from_numpy(embeddings[:k]).unsqueeze(0)
+        model.model.model[-1].nc = k
+        model.model.names = dict(enumerate(names[:k]))
+        model.predictor = None
+        self._model_candidates[model] = (names, embeddings)
+
+    def _candidate_classes(self, model, image):
+        """
+        Candidate classes of an image for a model with candidate slots
+
+        Args:
+            model: Model the image runs on
+            image: RGB PIL image
+
+        Returns:
+            Tuple of (class names, text features (1, K, dim)), or None when
+            the model runs its full vocabulary
+        """
+        candidates = self._model_candidates.get(model)
+        if candidates is None:
+            return None
+        names, embeddings = candidates
+        rows = top_k_classes(self._clip.encode_image(image), embeddings, self.candidate_k)
+        return [names[i] for i in rows], torch.from_numpy(embeddings[rows]).unsqueeze(0)
+
+    @staticmethod
+    def _weights_key(model_path) -> str:
+        """Identify a checkpoint by path and modification time"""
+        path = Path(model_path)
+        if path.exists():
+            return f"{path.resolve()}@{path.stat().st_mtime_ns}"
+        return str(model_path)
+
+    def _update_model_classes(self):
+        with self._swap_lock:
+            serving = self._holder.current is not None
+            if not self.current_classes and serving:
+                print("No detection classes set.")
+                return
+            tag = self._holder.tag if serving else self._initial_version
+            if self.closed_set and serving:
+                # A closed-set model cannot learn new classes; serve the
+                # open-vocabulary model it was distilled from again
+                print(f"Vocabulary changed; switching from closed-set model back to {self.world_model_path}")
+                self.closed_set = False
+                self.model_path = self.world_model_path
+                tag = self._world_version
+            model = self.prepare_model(self.model_path, warmup=serving, closed_set=self.closed_set)
+            cascade_model = None
+            if self.cascade_model_path and self.current_classes and not self.closed_set and not self.prefilter_active:
+                cascade_model = self.prepare_model(self.cascade_model_path, warmup=serving, vocabulary_from=model)
+            self._holder.swap(model, tag=tag)
+            if cascade_model is not None:
+                self._cascade_holder.swap(cascade_model, tag=self.cascade_model_path)
+            elif self._cascade_holder.current is not None:
+                # The small model's vocabulary is stale; run the main model alone
+                self._cascade_holder.swap(None)
+            if self.current_classes:
+                print(f"Model detection classes updated: {self.ordered_classes()}")
+            else:
+                print("No detection classes set.")
+
+    def add_classes(self, new_classes: list[str]) -> dict[str, str]:
+        """
+        Add classes to the vocabulary
+
+        Aliases of merged classes are added as their canonical class; with
+        ``auto_merge_threshold`` set, new classes that are near-duplicates of
+        an existing class are merged into it.
+
+        Returns:
+            The requested names that were added under another class, mapped to that class
+        """
+        # The class set is replaced, never mutated, so predictions iterate a consistent snapshot
+        with self._swap_lock:
+            added = {self.aliases.canonical(cls) for cls in new_classes} - self.current_classes
+            self.current_classes = self.current_classes | added
+            if added and self.auto_merge_threshold is not None and self._vocab_index is not None:
+                names, embeddings = self._class_text_embeddings()
+                self._apply_merges(find_duplicates_of(names, embeddings, added, self.auto_merge_threshold))
+            self._update_model_classes()
+            self._save_custom_vocab()
+            merged = {cls: self.aliases.canonical(cls) for cls in new_classes}
+        return {cls: canonical for cls, canonical in merged.items() if canonical != cls}
+
+    def clear_classes(self):
+        """Remove every class from the vocabulary"""
+        with self._swap_lock:
+            self.current_classes = set()
+            self._update_model_classes()
+            self._save_custom_vocab()
+
+    def _class_text_embeddings(self):
+        """
+        Current classes in stable order with their normalized text embeddings
+
+        Uses the vocabulary index when there is one, else the text features
+        of the serving YOLO-World model, so the text encoder does not run again.
+        """
+        if self._vocab_index is not None:
+            names = self.ordered_classes()
+            self._vocab_index.add(names, self._clip.encode_text)
+            return names, self._vocab_index.embeddings(names)
+        model = self.model
+        if self.closed_set or model is None or getattr(model.model, "txt_feats", None) is None:
+            raise ValueError("Class text embeddings are not available for the serving model")
+        names = model.model.names
+        names = [names[i] for i in sorted(names)] if isinstance(names, dict) else list(names)
+        return names, model.model.txt_feats[0].float().cpu().numpy()
+
+    def suggest_merges(self, threshold: float = 0.9) -> list[dict]:
+        """
+        Find near-duplicate or synonym classes in the current vocabulary
+
+        Args:
+            threshold: Minimum cosine similarity of the class text embeddings
+
+        Returns:
+            Groups of ``{"canonical", "aliases", "similarity"}``; the class
+            added first is canonical
+        """
+        names, embeddings = self._class_text_embeddings()
+        return find_duplicate_classes(names, embeddings, threshold)
+
+    def _apply_merges(self, groups: list[dict]) -> list[dict]:
+        applied = []
+        for group in groups:
+            canonical = self.aliases.canonical(group["canonical"])
+            aliases = [alias for alias in group["aliases"] if alias != canonical]
+            if not aliases:
+                continue
+            self.current_classes = (self.current_classes - set(aliases)) | {canonical}
+            self.aliases.add(aliases, canonical)
+            print(f"Merged classes {aliases} into '{canonical}'")
+            applied.append({**group, "canonical": canonical, "aliases": aliases})
+        return applied
+
+    def merge_classes(self, aliases: list[str], canonical: str) -> list[str]:
+        """
+        Merge classes into a canonical class
+
+        The aliases are removed from the vocabulary; detections and labels
+        using them are reported under the canonical name from then on.
+
+        Args:
+            aliases: Class names to merge
+            canonical: Class to keep (added to the vocabulary if missing)
+
+        Returns:
+            The aliases that were merged
+        """
+        with self._swap_lock:
+            applied = self._apply_merges([{"canonical": canonical, "aliases": list(aliases)}])
+            self._update_model_classes()
+            self._save_custom_vocab()
+        return applied[0]["aliases"] if applied else []
+
+    def merge_duplicates(self, threshold: float = 0.9) -> list[dict]:
+        """
+        Merge every group found by ``suggest_merges(threshold)``
+
+        Returns:
+            The merged groups
+        """
+        with self._swap_lock:
+            applied = self._apply_merges(self.suggest_merges(threshold))
+            if applied:
+                self._update_model_classes()
+                self._save_custom_vocab()
+        return applied
+
+    def canonical_name(self, name: str) -> str:
+        return self.aliases.canonical(name)
+
+    def _canonical_result(self, result):
+        """Report detections of merged classes (e.g. from older models) under the canonical name"""
+        if len(self.aliases) and any(name in self.aliases for name in result.names.values()):
+            result.names = {i: self.aliases.canonical(name) for i, name in result.names.items()}
+        return result
 
     def get_current_classes(self) -> list[str]:
-        return list(self.current_classes)
+        return self.ordered_classes()
 
-    def predict_image(self, image_path: str, conf_threshold: float = 0.25):
+    def predict_image(self, image_path, conf_threshold: float = 0.25, imgsz: int | None = None,
+                      cascade: bool | None = None, model=None, model_version: str | None = None):
+        """
+        Detect objects in one image
+
+        Args:
+            image_path: Image path, PIL image or numpy array
+            conf_threshold: Confidence threshold
+            imgsz: Model input size (defaults to the model's)
+            cascade: Run the small model first and only escalate uncertain
+                images (defaults to on when a cascade model is configured)
+            model: Prepared model to run instead of the serving model, e.g.
+                one from the model pool; the cascade is not used
+            model_version: Version reported for ``model``
+
+        Returns:
+            Results, or None if no classes are set
+        """
+        if not self.current_classes:
+            print("Warning: No detection classes set. Please add classes using add_classes() first.")
+            return None
+
+        source = image_path if isinstance(image_path, (str, Path)) else type(image_path).__name__
+        print(f"Executing detection on {source} (Classes: {list(self.current_classes)})...")
+
+        if model is not None:
+            result = self._predict_one(model, image_path, conf_threshold, imgsz)
+            print(f"Detection served by pooled model {model_version}")
+            result.model_version = model_version
+            result.cascade_stage = None
+            return self._canonical_result(result)
+
+        if cascade is None:
+            cascade = self.cascade_enabled
+        if cascade and self.cascade_enabled:
+            result = self._predict_small(image_path, conf_threshold, imgsz)
+            if result is not None:
+                return result
+
+        with self._holder.acquire() as (model, version):
+            result = self._predict_one(model, image_path, conf_threshold, imgsz)
+        print(f"Detection served by model {version}")
+        result.model_version = version
+        result.cascade_stage = "large" if cascade and self.cascade_enabled else None
+        return self._canonical_result(result)
+
+    def predict_batch(self, images: list, conf_threshold: float = 0.25, imgsz: int = 640):
+        """
+        Detect objects in several images with one batched forward pass
+
+        Meant for offline jobs where throughput matters more than the latency
+        of a single image; the cascade is not used.
+
+        Args:
+            images: Decoded RGB images (PIL images or HWC uint8 arrays)
+            conf_threshold: Confidence threshold
+            imgsz: Model input size; every image is letterboxed to imgsz x imgsz
+
+        Returns:
+            Results per image in input order, or None if no classes are set
+        """
+        if not self.current_classes:
+            print("Warning: No detection classes set. Please add classes using add_classes() first.")
+            return None
+        if not images:
+            return []
+
+        print(f"Executing batched detection on {len(images)} images (Classes: {list(self.current_classes)})...")
+        with self._holder.acquire() as (model, version):
+            if model in self._model_candidates:
+                # Candidate classes differ per image, so each image needs its own text features
+                results = [self._predict_rgb(model, [image], conf_threshold, imgsz,
+                                             classes=self._candidate_classes(model, image))[0] for image in images]
+            else:
+                results = self._predict_rgb(model, images, conf_threshold, imgsz)
+        print(f"Detection served by model {version}")
+        for result in results:
+            result.model_version = version
+            result.cascade_stage = None
+        return [self._canonical_result(result) for result in results]
+
+    def _predict_one(self, model, image_path, conf_threshold: float, imgsz: int | None):
+        if model in self._model_candidates and not isinstance(image_path, Image.Image):
+            # Candidate selection needs the whole RGB image
+            if isinstance(image_path, np.ndarray):
+                image_path = Image.fromarray(np.ascontiguousarray(image_path[..., ::-1]))  # BGR like ultralytics
+            else:
+                image_path = Image.open(image_path).convert("RGB")
+        if isinstance(image_path, Image.Image):
+            classes = self._candidate_classes(model, image_path)
+            return self._predict_rgb(model, [image_path], conf_threshold, imgsz or 640, classes=classes)[0]
+        predict_args = {"imgsz": imgsz} if imgsz is not None else {}
+        return model.predict(image_path, conf=conf_threshold, verbose=False, **predict_args)[0]
+
+    def _predict_rgb(self, model, images: list, conf_threshold: float, size: int, classes=None) -> list:
+        """
+        Run RGB images (PIL images or HWC uint8 arrays) as one batch through a
+        pooled input tensor
+
+        The images are letterboxed straight into the reused buffer, which is
+        passed to the model as an already normalized tensor, so ultralytics'
+        own letterbox, colour conversion and normalization copies are skipped.
+        Boxes are returned in source image coordinates. ``classes`` from
+        ``_candidate_classes()`` runs the head on those classes only.
+        """
+        if len(images) == 1:
+            height, width = letterbox_shape(*image_size(images[0]), size)
+        else:
+            height = width = size
+        features = nullcontext()
+        if self._feature_cache is not None and len(images) == 1:
+            features = self._feature_cache.use(image_digest(images[0]))
+        with self._input_buffers.acquire(len(images), height, width) as batch, features:
+            placements = [letterbox_into(image, batch[i]) for i, image in enumerate(images)]
+            if classes is None:
+                results = model.predict(batch, conf=conf_threshold, verbose=False)
+            else:
+                results = self._predict_candidates(model, batch, conf_threshold, *classes)
+        return [placement.restore(result) for placement, result in zip(placements, results)]
+
+    @staticmethod
+    def _predict_candidates(model, batch: torch.Tensor, conf_threshold: float, names: list[str],
+                            txt_feats: torch.Tensor) -> list:
+        """
+        Run a normalized input batch with per-request text features and NMS
+        """
+        if model.predictor is None:
+            # Set up the inference copy of the model (fused, eval mode) like a first regular prediction
+            model.predict(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+        with torch.inference_mode():
+            preds = model.predictor.model(batch, txt_feats=txt_feats)
+        preds = preds[0] if isinstance(preds, (list, tuple)) else preds
+        detections = non_max_suppression(preds, conf_threshold, 0.7, max_det=300)
+        # Results only need the input shape here; restore() sets the source image shape
+        height, width = batch.shape[2:]
+        blank = np.broadcast_to(np.zeros(1, dtype=np.uint8), (height, width, 3))
+        names = dict(enumerate(names))
+        return [Results(blank, path="", names=names, boxes=boxes) for boxes in detections]
+
+    def _predict_small(self, image_path, conf_threshold: float, imgsz: int | None):
+        """
+        First cascade stage: return the small model's result, or None if the
+        image has to go to the main model
+        """
+        low, high = self.uncertainty_band
+        with self._cascade_holder.acquire() as (model, version):
+            # Detect down to the band so that uncertain boxes are visible
+            result = self._predict_one(model, image_path, min(conf_threshold, low), imgsz)
+
+        confidences = result.boxes.conf if result.boxes is not None else []
+        top = sorted((float(c) for c in confidences), reverse=True)[:self.cascade_top_k]
+        escalate = not top or any(low <= c < high for c in top)
+        with self._stats_lock:
+            self._cascade_stats["escalated" if escalate else "small"] += 1
+        if escalate:
+            return None
+
+        print(f"Detection served by cascade model {version}")
+        result = result[result.boxes.conf >= conf_threshold]
+        # Clients pin versions and the router matches them against /health, so
+        # report the serving model; the stage is reported separately
+        result.model_version = self._holder.tag
+        result.cascade_stage = "small"
+        return result
+
+    def predict_tiled(self, image, conf_threshold: float = 0.25, tile_size: int = 640, overlap: float = 0.2,
+                      include_full_image: bool = True, tile_imgsz: int | None = None, iou_threshold: float = 0.5,
+                      model=None, model_version: str | None = None):
+        """
+        Detect small objects in a large image by running overlapping tiles as one batch
+
+        Args:
+            image: PIL image
+            conf_threshold: Confidence threshold
+            tile_size: Tile edge length in image pixels
+            overlap: Fraction of a tile shared with its neighbour
+            include_full_image: Also run the whole (downscaled) image so that
+                objects larger than a tile are found
+            tile_imgsz: Model input size per tile (defaults to tile_size)
+            iou_threshold: IoU for merging duplicates across tiles
+            model: Prepared model to run instead of the serving model
+            model_version: Version reported for ``model``
+
+        Returns:
+            Results with the merged detections in image coordinates, or None
+            if no classes are set
+        """
         if not self.current_classes:
             print("Warning: No detection classes set. Please add classes using add_classes() first.")
             return None
 
-        print(f"Executing detection on {image_path} (Classes: {list(self.current_classes)})...")
-        results = self.model.predict(image_path, conf=conf_threshold, verbose=False)
-        return results[0]
+        tiles = make_tiles(image.width, image.height, tile_size=tile_size, overlap=overlap)
+        # Tiles are views into the decoded pixels, copied only into the input buffer
+        pixels = np.asarray(image)
+        sources = [pixels[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        offsets = [(tile[0], tile[1]) for tile in tiles]
+        if include_full_image and len(tiles) > 1:
+            sources.append(image)
+            offsets.append((0, 0))
+
+        print(f"Executing tiled detection with {len(tiles)} tiles (Classes: {list(self.current_classes)})...")
+        # All tiles share the whole image's candidates so that they merge by class
+        if model is not None:
+            results = self._predict_rgb(model, sources, conf_threshold, tile_imgsz or tile_size,
+                                        classes=self._candidate_classes(model, image))
+            version = model_version
+        else:
+            with self._holder.acquire() as (model, version):
+                # One batched call lets torch spread the tiles over all cores
+                results = self._predict_rgb(model, sources, conf_threshold, tile_imgsz or tile_size,
+                                            classes=self._candidate_classes(model, image))
+        print(f"Detection served by model {version}")
+
+        merged = merge_tile_detections([r.boxes.data if r.boxes is not None else None for r in results],
+                                       offsets, iou_threshold=iou_threshold)
+        result = Results(pixels[..., ::-1], path="", names=results[0].names, boxes=merged)
+        result.model_version = version
+        return self._canonical_result(result)
 
-    def fine_tune_model(self, data_config_path: str, epochs: int = 50, imgsz: int = 640):
+    def _training_model(self, student_weights: str | None = None, base_weights: str | None = None):
+        """Load a separate instance of the network a training run starts from"""
+        if student_weights:
+            return YOLO(student_weights)
+        return YOLOWorld(base_weights or self.world_model_path)
+
+    def fine_tune_model(self, data_config_path: str, epochs: int = 50, imgsz: int = 640,
+                        patience: int = 10, device: str = 'cpu', student_weights: str | None = None,
+                        base_weights: str | None = None, **train_args):
         """
         Fine-tune the YOLO model with custom labeled data
 
@@ -63,26 +637,36 @@ class YoloDetector:
             data_config_path: Path to the data.yaml configuration file
             epochs: Number of training epochs
             imgsz: Image size for training
+            patience: Epochs without validation improvement before stopping early
+            device: Training device, e.g. 'cpu' or 'cuda'
+            student_weights: Train this closed-set YOLO checkpoint (e.g. 'yolov8n.pt')
+                instead of the open-vocabulary model
+            base_weights: Start from these YOLO-World weights, e.g. the best weights of
+                the previous run, instead of the served model's weights
+            **train_args: Additional ultralytics training arguments (batch, workers, time, ...)
 
         Returns:
             Training results
         """
         try:
             print(f"Starting fine-tuning with config: {data_config_path}")
-            print(f"Training parameters: epochs={epochs}, imgsz={imgsz}")
+            print(f"Training parameters: epochs={epochs}, imgsz={imgsz}, patience={patience}, device={device}, {train_args}")
 
-            # Start training
-            results = self.model.train(
+            # Train a separate instance so the serving model is never mutated
+            training_model = self._training_model(student_weights, base_weights)
+            results = training_model.train(
                 data=data_config_path,
                 epochs=epochs,
                 imgsz=imgsz,
-                patience=10,
+                patience=patience,
                 save=True,
                 plots=True,
-                device='cpu',  # Use CPU for compatibility, change to 'cuda' if GPU available
-                verbose=True
+                device=device,
+                verbose=True,
+                **train_args
             )
 
+            self.last_best_weights = getattr(training_model.trainer, "best", None)
             print("Fine-tuning completed successfully!")
             return results
 
@@ -90,21 +674,100 @@ class YoloDetector:
             print(f"Error during fine-tuning: {e}")
             raise e
 
-    def load_trained_model(self, model_path: str):
+    def fine_tune_with_budget(self, data_config_path: str, budget_minutes: float, n_train: int, n_val: int,
+                              patience: int = 10, device: str = 'cpu', student_weights: str | None = None,
+                              base_weights: str | None = None):
+        """
+        Fine-tune within a wall-clock budget
+
+        A few training steps are benchmarked to choose batch size, image size,
+        dataloader workers and epochs. Training then runs with the remaining
+        budget as a hard time limit: ultralytics re-estimates the epoch count
+        after the first epoch, stops cleanly when the limit is reached, and
+        keeps ``best.pt``/``last.pt`` up to date after every epoch.
+
+        Args:
+            data_config_path: Path to the data.yaml configuration file
+            budget_minutes: Wall-clock budget for benchmarking and training
+            n_train: Number of training images
+            n_val: Number of validation images
+            patience: Epochs without validation improvement before stopping early
+            device: Training device
+            student_weights: Train this closed-set YOLO checkpoint instead of the open-vocabulary model
+            base_weights: Start from these YOLO-World weights instead of the served model's
+
+        Returns:
+            Tuple of (training results, training plan)
+
+        Raises:
+            ValueError: If no time is left for training after benchmarking
+        """
+        # Benchmark the network that will be trained, not the one being served
+        network = self._training_model(student_weights, base_weights).model
+        plan = plan_training(
+            lambda imgsz, batch: benchmark_training_step(network, imgsz, batch),
+            n_train=n_train,
+            n_val=n_val,
+            budget_seconds=budget_minutes * 60
+        )
+        print(f"Time-budgeted training plan: {plan}")
+        # time=0 would disable the trainer's time limit
+        if plan["remaining_seconds"] <= 0:
+            raise ValueError(
+                f"The time budget of {budget_minutes} minutes was used up by benchmarking. Please increase the budget."
+            )
+
+        results = self.fine_tune_model(
+            data_config_path,
+            epochs=plan["epochs"],
+            imgsz=plan["imgsz"],
+            patience=patience,
+            device=device,
+            student_weights=student_weights,
+            base_weights=base_weights,
+            batch=plan["batch"],
+            workers=plan["workers"],
+            time=plan["remaining_seconds"] / 3600
+        )
+        return results, plan
+
+    def _set_serving_path(self, model_path: str, version: str | None, closed_set: bool):
+        self.model_path = model_path
+        self.closed_set = closed_set
+        if not closed_set:
+            self.world_model_path = model_path
+            self._world_version = version or model_path
+
+    def swap_model(self, model, model_path: str, version: str | None = None, closed_set: bool = False):
+        """
+        Serve an already prepared model, e.g. one preloaded by the model registry
+
+        Args:
+            model: Model prepared with prepare_model()
+            model_path: Path to the model's weights
+            version: Registry version of the model
+            closed_set: The model is a closed-set (distilled) detector
+        """
+        with self._swap_lock:
+            self._holder.swap(model, tag=version or model_path)
+            self._set_serving_path(model_path, version, closed_set)
+
+    def load_trained_model(self, model_path: str, version: str | None = None, closed_set: bool = False):
         """
         Load a fine-tuned model
 
         Args:
             model_path: Path to the trained model file
+            version: Registry version of the model, reported as the model version
+            closed_set: The weights are a closed-set (distilled) detector
         """
         try:
             print(f"Loading fine-tuned model from: {model_path}")
-            self.model = YOLOWorld(model_path)
-            self.model_path = model_path
-
-            # Update classes if they exist
-            if self.current_classes:
-                self._update_model_classes()
+            with self._swap_lock:
+                # Prepare and warm up the new model while the old one keeps serving
+                model = self.prepare_model(model_path, closed_set=closed_set)
+                self._holder.swap(model, tag=version or model_path)
+                self._set_serving_path(model_path, version, closed_set)
 
             print("Fine-tuned model loaded successfully!")
 
@@ -112,13 +775,63 @@ class YoloDetector:
             print(f"Error loading fine-tuned model: {e}")
             raise e
 
+    def evaluate(self, data_config_path: str, model_path: str | None = None, closed_set: bool = False,
+                 imgsz: int = 640, device: str = 'cpu') -> dict:
+        """
+        Measure detection accuracy on the validation split of a dataset
+
+        Args:
+            data_config_path: Path to the data.yaml configuration file
+            model_path: Weights to evaluate (defaults to the open-vocabulary model)
+            closed_set: The weights are a closed-set YOLO detector
+            imgsz: Validation image size
+            device: Validation device
+
+        Returns:
+            Dictionary with mAP50 and mAP50-95
+        """
+        if closed_set:
+            model = YOLO(model_path)
+        else:
+            model = YOLOWorld(model_path or self.world_model_path)
+            # Class ids in the labels follow the dataset's class order
+            with open(data_config_path, 'r', encoding='utf-8') as f:
+                names = yaml.safe_load(f)["names"]
+            model.set_classes([names[k] for k in sorted(names)] if isinstance(names, dict) else list(names))
+        metrics = model.val(data=data_config_path, imgsz=imgsz, device=device, plots=False, verbose=False)
+        return {"map50": float(metrics.box.map50), "map50_95": float(metrics.box.map)}
+
     def get_model_info(self):
         """
         Get information about the current model
         """
         return {
             "model_path": self.model_path,
+            "model_version": self.model_version,
+            "vocabulary_version": self.vocabulary_version,
             "current_classes": list(self.current_classes),
-            "model_type": type(self.model).__name__
+            "model_type": type(self.model).__name__,
+            "closed_set": self.closed_set,
+            "serving": self._holder.get_stats(),
+            "input_buffers": self._input_buffers.get_stats(),
+            "feature_cache": self._feature_cache.get_stats() if self._feature_cache is not None else None,
+            "artifact_cache": self._artifacts.get_stats() if self._artifacts is not None else None,
+            "vocabulary_index": self._vocab_index.get_stats() if self._vocab_index is not None else None,
+            "candidate_k": self.candidate_k,
+            "prefiltering": self.prefilter_active,
+            "aliases": self.aliases.to_dict(),
+            "cascade": self.get_cascade_stats()
+        }
+
+    def get_cascade_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._cascade_stats)
+        total = stats["small"] + stats["escalated"]
+        return {
+            "enabled": self.cascade_enabled,
+            "model_path": self.cascade_model_path,
+            "uncertainty_band": list(self.uncertainty_band),
+            **stats,
+            "escalation_rate": stats["escalated"] / total if total else 0.0,
         }
 
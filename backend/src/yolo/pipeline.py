@@ -0,0 +1,156 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Thread pools of native libraries in the worker processes; a stage runs one
+# item per process, so more threads would only compete with inference
+_WORKER_THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def init_stage_worker():
+    """Initializer of process stage workers: single-threaded native libraries"""
+    for var in _WORKER_THREAD_VARIABLES:
+        os.environ[var] = "1"
+
+
+class Stage:
+    """
+    One pipeline stage: an executor and a bound on the work handed to it
+
+    ``max_in_flight`` items may be submitted at once (running or queued in
+    the executor); further callers wait on the stage's semaphore, which is
+    the bounded queue in front of the stage. A process pool broken by a dead
+    worker is replaced, so only the items in flight at that moment fail.
+    """
+
+    def __init__(self, name: str, workers: int, processes: bool = False, max_in_flight: int | None = None):
+        self.name = name
+        self.workers = workers
+        self.processes = processes
+        self.max_in_flight = max_in_flight or 2 * workers
+        self.executor = self._create_executor()
+        self._slots = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {"completed": 0, "failed": 0, "restarts": 0}
+        self._busy_seconds = 0.0
+
+    def _create_executor(self):
+        if self.processes:
+            # Spawned, not forked: forking a process whose torch/OpenMP threads
+            # are running is unsafe. Workers import only the modules of the
+            # functions they run, so these must not import the detector
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_stage_worker)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-stage")
+
+    def _replace_executor(self, broken):
+        # Requests that failed together on the same broken pool replace it once
+        if self.executor is broken:
+            self.executor = self._create_executor()
+            self._stats["restarts"] += 1
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # One semaphore per event loop (a semaphore must not be shared across loops)
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.max_in_flight))
+        return self._slots[1]
+
+    async def run(self, fn, *args, **kwargs):
+        slots = self._get_slots()
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        start = time.perf_counter()
+        executor = self.executor
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                executor, functools.partial(fn, *args, **kwargs)
+            )
+        except BrokenExecutor:
+            self._stats["failed"] += 1
+            self._replace_executor(executor)
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        else:
+            self._stats["completed"] += 1
+            return result
+        finally:
+            self._busy_seconds += time.perf_counter() - start
+            self._in_flight -= 1
+            slots.release()
+
+    def start(self):
+        """Start the workers now instead of on the first request"""
+        if self.processes:
+            for future in [self.executor.submit(int) for _ in range(self.workers)]:
+                future.result()
+
+    def get_stats(self) -> dict:
+        done = self._stats["completed"] + self._stats["failed"]
+        return {
+            "executor": "process" if self.processes else "thread",
+            "workers": self.workers,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            **self._stats,
+            "mean_ms": round(self._busy_seconds / done * 1000, 2) if done else None,
+        }
+
+
+class StagedPipeline:
+    """
+    Request processing split into stages with their own worker pools
+
+    A request passes through the stages one after another, but each stage
+    runs on its own executor, so while one request is in inference the next
+    one can be decoded and the previous one annotated and encoded. Stages
+    are bounded: when a stage is saturated, callers wait in front of it
+    instead of piling work (and decoded images) into its executor.
+
+    Process stages spawn their workers, so functions run there must be
+    module-level (picklable) in modules that do not load the model.
+    """
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+
+    async def run(self, stage: str, fn, *args, **kwargs):
+        """
+        Run ``fn(*args, **kwargs)`` on a stage's executor
+
+        Args:
+            stage: Stage name
+            fn: Function to run; for process stages a module-level function
+                whose arguments and result can be pickled
+
+        Returns:
+            The function's result (its exception is re-raised)
+
+        Raises:
+            BrokenExecutor: A worker process died; the stage has already
+                started a new pool, so the request can be retried
+        """
+        return await self.stages[stage].run(fn, *args, **kwargs)
+
+    def start(self):
+        for stage in self.stages.values():
+            stage.start()
+
+    def shutdown(self):
+        for stage in self.stages.values():
+            stage.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        return {name: stage.get_stats() for name, stage in self.stages.items()}
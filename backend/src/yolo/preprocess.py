@@ -0,0 +1,161 @@
+import math
+import threading
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+# Letterbox padding colour used by ultralytics (114 / 255)
+PAD_VALUE = 114 / 255
+
+
+class Letterbox:
+    """
+    Placement of an image inside a model input
+
+    Boxes predicted on the letterboxed input are mapped back to the source
+    image with ``restore()``.
+    """
+
+    __slots__ = ("ratio", "left", "top", "width", "height")
+
+    def __init__(self, ratio: float, left: int, top: int, width: int, height: int):
+        self.ratio = ratio
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+    def restore(self, result):
+        """
+        Map a result predicted on the letterboxed input to source image coordinates
+        """
+        result.orig_shape = (self.height, self.width)
+        if result.boxes is None or len(result.boxes) == 0:
+            return result
+        data = result.boxes.data.clone()
+        data[:, [0, 2]] = (data[:, [0, 2]] - self.left) / self.ratio
+        data[:, [1, 3]] = (data[:, [1, 3]] - self.top) / self.ratio
+        result.update(boxes=data)  # Clips to orig_shape
+        return result
+
+
+def image_size(image) -> tuple[int, int]:
+    """
+    (width, height) of a PIL image or HWC array
+    """
+    if isinstance(image, Image.Image):
+        return image.size
+    return image.shape[1], image.shape[0]
+
+
+def letterbox_shape(width: int, height: int, size: int, stride: int = 32) -> tuple[int, int]:
+    """
+    Smallest (height, width) model input holding the image scaled to ``size``
+
+    Like ultralytics' rectangular inference, the short side is only padded up
+    to the next multiple of ``stride`` instead of to a square.
+    """
+    ratio = size / max(width, height)
+    return (math.ceil(round(height * ratio) / stride) * stride,
+            math.ceil(round(width * ratio) / stride) * stride)
+
+
+def letterbox_into(image, out: torch.Tensor, pad_value: float = PAD_VALUE) -> Letterbox:
+    """
+    Letterbox an RGB image into a preallocated (3, H, W) float tensor
+
+    Resizing happens on uint8 pixels; the HWC to CHW transpose, the uint8 to
+    float conversion and the 0-255 to 0-1 scaling are then done in a single
+    pass that writes straight into ``out``. Only the padding strips are
+    filled, the image area is never written twice.
+
+    Args:
+        image: RGB PIL image or RGB uint8 array (may be a strided view, e.g. a tile)
+        out: Destination tensor of shape (3, H, W)
+        pad_value: Value of the padding, in 0-1 units
+
+    Returns:
+        The placement of the image in ``out``
+    """
+    width, height = image_size(image)
+    out_height, out_width = out.shape[1:]
+    ratio = min(out_height / height, out_width / width)
+    new_width, new_height = round(width * ratio), round(height * ratio)
+
+    if (new_width, new_height) != (width, height):
+        if isinstance(image, Image.Image):
+            image = image.resize((new_width, new_height), Image.Resampling.BILINEAR)
+        else:
+            image = cv2.resize(np.ascontiguousarray(image), (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    left = (out_width - new_width) // 2
+    top = (out_height - new_height) // 2
+    right, bottom = left + new_width, top + new_height
+    out[:, :top].fill_(pad_value)
+    out[:, bottom:].fill_(pad_value)
+    out[:, top:bottom, :left].fill_(pad_value)
+    out[:, top:bottom, right:].fill_(pad_value)
+
+    with warnings.catch_warnings():
+        # PIL hands out read-only arrays; the tensor is only read from
+        warnings.simplefilter("ignore", UserWarning)
+        pixels = torch.from_numpy(np.asarray(image))
+    torch.mul(pixels.permute(2, 0, 1), 1 / 255, out=out[:, top:bottom, left:right])
+    return Letterbox(ratio, left, top, width, height)
+
+
+class InputBufferPool:
+    """
+    Reusable model input tensors keyed by shape
+
+    Each ``acquire()`` hands out a (batch, 3, height, width) float32 tensor that
+    no other caller is using. Released buffers are kept for the next request
+    of the same shape, so steady-state serving does not allocate input
+    tensors at all.
+    """
+
+    def __init__(self, max_buffers_per_shape: int = 2, max_shapes: int = 8):
+        self.max_buffers_per_shape = max_buffers_per_shape
+        self.max_shapes = max_shapes
+        self._free: OrderedDict[tuple[int, int, int], list[torch.Tensor]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"allocated": 0, "reused": 0}
+
+    @contextmanager
+    def acquire(self, batch: int, height: int, width: int):
+        """
+        Borrow an input buffer for the duration of the ``with`` block
+
+        Yields:
+            Tensor of shape (batch, 3, height, width)
+        """
+        key = (batch, height, width)
+        with self._lock:
+            free = self._free.get(key)
+            buffer = free.pop() if free else None
+            self._stats["reused" if buffer is not None else "allocated"] += 1
+        if buffer is None:
+            buffer = torch.empty((batch, 3, height, width), dtype=torch.float32)
+        try:
+            yield buffer
+        finally:
+            with self._lock:
+                free = self._free.setdefault(key, [])
+                self._free.move_to_end(key)
+                if len(free) < self.max_buffers_per_shape:
+                    free.append(buffer)
+                while len(self._free) > self.max_shapes:
+                    self._free.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "pooled_bytes": sum(b.numel() * b.element_size() for free in self._free.values() for b in free),
+                "shapes": [list(key) for key in self._free],
+            }
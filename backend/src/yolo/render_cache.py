@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+_RENDER_ID = re.compile(r"^[A-Za-z0-9_-]{22}$")
+
+
+class RenderCache:
+    """
+    Short-lived store of decoded images and their detections, rendered on demand
+
+    Detection responses reference an annotated image by id instead of
+    inlining it; the image is only drawn and encoded when the reference is
+    fetched, which most clients never do. Each entry is the decoded pixels
+    (``<id>.npy``, no encoding cost) plus the detections (``<id>.json``)
+    in a directory shared by the worker processes of a server, so whichever
+    worker receives the fetch can render it. ``/dev/shm`` keeps it in memory.
+
+    Images larger than ``max_side`` (e.g. decoded for tiled inference) are
+    stored downscaled with their boxes, so an entry stays a few MB. Entries
+    expire after ``ttl_seconds``; the oldest are deleted when the entries
+    exceed ``max_bytes``. Ids are random, so a reference can only be fetched
+    by the client it was returned to.
+    """
+
+    def __init__(self, root, max_bytes: int, ttl_seconds: float = 300.0, max_side: int | None = 1280):
+        """
+        Args:
+            root: Directory holding the entries
+            max_bytes: Budget for all entries
+            ttl_seconds: Lifetime of an entry
+            max_side: Longest side of stored images (None keeps them as they are)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_side = max_side
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "failed": 0, "hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _paths(self, render_id: str) -> tuple[Path, Path]:
+        return self.root / f"{render_id}.npy", self.root / f"{render_id}.json"
+
+    def put(self, image, detections: list[dict]) -> str:
+        """
+        Keep an image and its detections for rendering
+
+        Args:
+            image: Decoded RGB PIL image
+            detections: ``{"class", "confidence", "bbox"}`` records in the
+                image's pixel coordinates
+
+        Returns:
+            The render id
+
+        Raises:
+            OSError: The entry could not be written (e.g. the file system is
+                full); nothing of it is left behind
+        """
+        if self.max_side is not None and max(image.size) > self.max_side:
+            scale = self.max_side / max(image.size)
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                 Image.Resampling.BILINEAR)
+            detections = [dict(d, bbox=[v * scale for v in d["bbox"]]) for d in detections]
+        render_id = secrets.token_urlsafe(16)
+        pixels_path, detections_path = self._paths(render_id)
+        tmp = self.root / f".{render_id}.npy.tmp"
+        try:
+            detections_path.write_text(json.dumps(detections), encoding="utf-8")
+            # The pixel file appears last (atomically), so a visible entry is complete
+            with open(tmp, "wb") as f:
+                np.save(f, np.asarray(image))
+            os.replace(tmp, pixels_path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            self._remove(render_id)
+            self._count("failed")
+            raise
+        self._count("stored")
+        self.prune()
+        return render_id
+
+    def expires_in(self, render_id: str) -> float | None:
+        """
+        Seconds until an entry expires, or None if it does not exist (any more)
+        """
+        if not _RENDER_ID.match(render_id):
+            return None
+        try:
+            created = self._paths(render_id)[0].stat().st_mtime
+        except FileNotFoundError:
+            return None
+        remaining = created + self.ttl_seconds - time.time()
+        if remaining <= 0:
+            self._remove(render_id)
+            self._count("expired")
+            return None
+        return remaining
+
+    def get(self, render_id: str) -> tuple[Image.Image, list[dict]] | None:
+        """
+        Load an entry
+
+        Returns:
+            Tuple of (image, detections), or None if the id is unknown or expired
+        """
+        if self.expires_in(render_id) is None:
+            self._count("misses")
+            return None
+        pixels_path, detections_path = self._paths(render_id)
+        try:
+            pixels = np.load(pixels_path)
+            detections = json.loads(detections_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self._count("misses")  # Evicted by another worker in between
+            return None
+        self._count("hits")
+        return Image.fromarray(pixels), detections
+
+    def _remove(self, render_id: str):
+        for path in self._paths(render_id):
+            path.unlink(missing_ok=True)
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for path in self.root.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Removed by another worker
+            entries.append((stat.st_mtime, stat.st_size, path.stem))
+        return entries
+
+    def prune(self) -> int:
+        """
+        Delete expired entries and the oldest entries over the budget
+
+        Returns:
+            Number of deleted entries
+        """
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for created, size, render_id in entries:
+            expired = created + self.ttl_seconds <= now
+            if not expired and total <= self.max_bytes:
+                break
+            self._remove(render_id)
+            total -= size
+            removed += 1
+            self._count("expired" if expired else "evictions")
+        return removed
+
+    def get_stats(self) -> dict:
+        entries = self._entries()
+        with self._lock:
+            return {
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                **self._stats,
+            }
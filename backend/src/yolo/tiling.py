@@ -0,0 +1,64 @@
+import math
+
+import torch
+from torchvision.ops import batched_nms
+
+
+def _tile_starts(length: int, tile_size: int, stride: int) -> list[int]:
+    if length <= tile_size:
+        return [0]
+    # Fewest tiles whose stride does not exceed the requested one, spread
+    # evenly so that the last tile is flush with the border
+    n = math.ceil((length - tile_size) / stride) + 1
+    return [round(i * (length - tile_size) / (n - 1)) for i in range(n)]
+
+
+def make_tiles(width: int, height: int, tile_size: int = 640, overlap: float = 0.2) -> list[tuple[int, int, int, int]]:
+    """
+    Cut an image into overlapping tiles that cover it completely
+
+    Args:
+        width: Image width
+        height: Image height
+        tile_size: Tile edge length in pixels
+        overlap: Fraction of a tile shared with its neighbour
+
+    Returns:
+        Tile boxes as (x1, y1, x2, y2)
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _tile_starts(height, tile_size, stride)
+        for x in _tile_starts(width, tile_size, stride)
+    ]
+
+
+def merge_tile_detections(tile_boxes: list[torch.Tensor], offsets: list[tuple[int, int]],
+                          iou_threshold: float = 0.5) -> torch.Tensor:
+    """
+    Shift per-tile detections to image coordinates and run class-wise NMS across tiles
+
+    Args:
+        tile_boxes: Per-tile (N, 6) tensors of [x1, y1, x2, y2, conf, cls] in tile coordinates
+        offsets: (x, y) position of each tile in the image
+        iou_threshold: IoU above which overlapping boxes of the same class are merged
+
+    Returns:
+        (M, 6) tensor of merged detections sorted by confidence
+    """
+    shifted = []
+    for boxes, (x, y) in zip(tile_boxes, offsets):
+        if boxes is None or len(boxes) == 0:
+            continue
+        boxes = boxes.detach().float().cpu().clone()
+        boxes[:, [0, 2]] += x
+        boxes[:, [1, 3]] += y
+        shifted.append(boxes)
+
+    if not shifted:
+        return torch.zeros((0, 6))
+
+    merged = torch.cat(shifted)
+    keep = batched_nms(merged[:, :4], merged[:, 4], merged[:, 5].long(), iou_threshold)
+    return merged[keep]
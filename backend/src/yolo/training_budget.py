@@ -0,0 +1,121 @@
+import copy
+import math
+import os
+import time
+
+import torch
+
+# Validation runs forward passes only, which cost roughly a third of a
+# forward/backward training step per image
+VAL_COST_RATIO = 0.35
+
+
+def _sum_outputs(outputs):
+    if isinstance(outputs, torch.Tensor):
+        return outputs.float().sum()
+    if isinstance(outputs, dict):
+        outputs = list(outputs.values())
+    if isinstance(outputs, (list, tuple)):
+        total = 0
+        for output in outputs:
+            total = total + _sum_outputs(output)
+        return total
+    return 0
+
+
+def benchmark_training_step(module: torch.nn.Module, imgsz: int, batch: int, iterations: int = 3) -> float:
+    """
+    Measure the forward/backward cost of one training image
+
+    A copy of the network is trained on random input so that the served model
+    is left untouched.
+
+    Args:
+        module: The underlying torch detection model
+        imgsz: Input image size
+        batch: Batch size
+        iterations: Timed iterations after one warm-up step
+
+    Returns:
+        Seconds per training image
+    """
+    model = copy.deepcopy(module).float().train()
+    for p in model.parameters():
+        p.requires_grad_(True)
+    x = torch.rand(batch, 3, imgsz, imgsz)
+
+    def step():
+        model.zero_grad(set_to_none=True)
+        loss = _sum_outputs(model(x))
+        if isinstance(loss, torch.Tensor) and loss.requires_grad:
+            loss.backward()
+
+    step()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        step()
+    elapsed = time.perf_counter() - start
+    del model
+    return elapsed / (iterations * batch)
+
+
+def default_workers() -> int:
+    """
+    Dataloader workers for CPU training
+
+    Loader processes compete with the training threads for cores, so only a
+    small share of the CPUs is given to them.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    return max(1, min(4, cpus // 4))
+
+
+def plan_training(benchmark, n_train: int, n_val: int, budget_seconds: float,
+                  imgsz_candidates=(640, 512, 416, 320), batch_candidates=(16, 8, 4),
+                  min_epochs: int = 3, max_epochs: int = 300, safety: float = 0.85) -> dict:
+    """
+    Choose training settings that fit a wall-clock budget
+
+    Batch sizes are benchmarked at the largest image size; the fastest one is
+    then used to probe smaller sizes until one allows at least ``min_epochs``.
+
+    Args:
+        benchmark: Callable ``(imgsz, batch) -> seconds per image``
+        n_train: Number of training images
+        n_val: Number of validation images
+        budget_seconds: Wall-clock budget for training
+        imgsz_candidates: Image sizes to try, largest first
+        batch_candidates: Batch sizes to try
+        min_epochs: Smallest acceptable number of epochs
+        max_epochs: Upper bound on the planned epochs
+        safety: Fraction of the budget planned for, leaving headroom for setup and checkpoints
+
+    Returns:
+        Training plan with imgsz, batch, workers, epochs and the measured throughput
+    """
+    start = time.perf_counter()
+    imgsz_candidates = sorted(imgsz_candidates, reverse=True)
+
+    largest = imgsz_candidates[0]
+    timings = {batch: benchmark(largest, batch) for batch in batch_candidates}
+    batch = min(timings, key=timings.get)
+
+    plan = None
+    for imgsz in imgsz_candidates:
+        seconds_per_image = timings[batch] if imgsz == largest else benchmark(imgsz, batch)
+        epoch_seconds = seconds_per_image * (n_train + n_val * VAL_COST_RATIO)
+        remaining = budget_seconds - (time.perf_counter() - start)
+        epochs = math.floor(remaining * safety / epoch_seconds) if epoch_seconds > 0 else max_epochs
+        plan = {
+            "imgsz": imgsz,
+            "batch": min(batch, max(1, n_train)),
+            "workers": default_workers(),
+            "epochs": max(1, min(max_epochs, epochs)),
+            "seconds_per_image": seconds_per_image,
+            "estimated_epoch_seconds": epoch_seconds,
+        }
+        if epochs >= min_epochs:
+            break
+
+    plan["remaining_seconds"] = max(0.0, budget_seconds - (time.perf_counter() - start))
+    return plan
@@ -0,0 +1,166 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+def find_duplicate_classes(names: list[str], embeddings: np.ndarray, threshold: float = 0.9) -> list[dict]:
+    """
+    Group near-duplicate or synonym classes by text embedding similarity
+
+    Classes are visited in the given order; each class not yet grouped becomes
+    the canonical name of a group, and every later class whose embedding is at
+    least ``threshold`` similar to it joins that group. Comparing against the
+    canonical class only (not every member) keeps groups from chaining into
+    unrelated classes.
+
+    Args:
+        names: Class names in order of preference, e.g. by stable class id so
+            that the first spelling added stays canonical
+        embeddings: Normalized (n, dim) text embeddings of ``names``
+        threshold: Minimum cosine similarity to merge
+
+    Returns:
+        ``{"canonical", "aliases", "similarity"}`` dictionaries, one per group
+        with at least one alias; ``similarity`` holds one score per alias
+    """
+    if len(names) < 2:
+        return []
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similarity = embeddings @ embeddings.T
+
+    grouped = np.zeros(len(names), dtype=bool)
+    groups = []
+    for i, name in enumerate(names):
+        if grouped[i]:
+            continue
+        members = [j for j in range(i + 1, len(names)) if not grouped[j] and similarity[i, j] >= threshold]
+        if not members:
+            continue
+        grouped[members] = True
+        groups.append({
+            "canonical": name,
+            "aliases": [names[j] for j in members],
+            "similarity": [round(float(similarity[i, j]), 4) for j in members],
+        })
+    return groups
+
+
+def find_duplicates_of(names: list[str], embeddings: np.ndarray, new_names, threshold: float = 0.9) -> list[dict]:
+    """
+    Find the existing classes that newly added classes duplicate
+
+    Only the rows of ``new_names`` are compared with the vocabulary (k x n
+    instead of n x n), so adding a few classes to a menu-sized vocabulary
+    stays cheap. A new class joins the first class before it in ``names``
+    that is at least ``threshold`` similar and not merged itself, like in
+    ``find_duplicate_classes``.
+
+    Args:
+        names: Class names in order of preference, including ``new_names``
+        embeddings: Normalized (n, dim) text embeddings of ``names``
+        new_names: The newly added classes
+        threshold: Minimum cosine similarity to merge
+
+    Returns:
+        ``{"canonical", "aliases", "similarity"}`` dictionaries, one per
+        canonical class
+    """
+    index = {name: i for i, name in enumerate(names)}
+    rows = sorted(index[name] for name in set(new_names) if name in index)
+    if not rows or len(names) < 2:
+        return []
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    vectors = embeddings[rows]
+    similarity = vectors @ embeddings.T
+    similarity /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity /= np.maximum(np.linalg.norm(embeddings, axis=1), 1e-12)
+
+    merged = set()
+    groups: dict[int, list] = {}
+    for row, j in enumerate(rows):
+        for i in np.flatnonzero(similarity[row, :j] >= threshold):
+            if i not in merged:
+                merged.add(j)
+                groups.setdefault(int(i), []).append((j, similarity[row, i]))
+                break
+    return [{
+        "canonical": names[i],
+        "aliases": [names[j] for j, _ in members],
+        "similarity": [round(float(score), 4) for _, score in members],
+    } for i, members in sorted(groups.items())]
+
+
+class AliasMap:
+    """
+    Mapping from merged class names to the canonical class they were merged into
+
+    Aliases are no longer part of the vocabulary, so the detection head stays
+    small, but requests, labels and older models may still use them; they are
+    resolved to the canonical name. Stored in a JSON file next to the
+    vocabulary, written only once the first alias is added.
+    """
+
+    def __init__(self, path="vocab_aliases.json"):
+        self.path = Path(path)
+        self._aliases: dict[str, str] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                aliases = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Warning: JSON decoding error in {self.path}. Class aliases are not used.")
+            return
+        if isinstance(aliases, dict):
+            self._aliases = {str(alias): str(canonical) for alias, canonical in aliases.items()}
+        else:
+            print(f"Warning: Invalid format in {self.path}.")
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._aliases
+
+    def canonical(self, name: str) -> str:
+        """Canonical class name of ``name`` (the name itself if it is not an alias)"""
+        seen = {name}
+        while name in self._aliases:
+            name = self._aliases[name]
+            if name in seen:
+                break
+            seen.add(name)
+        return name
+
+    def add(self, aliases: list[str], canonical: str):
+        """
+        Record ``aliases`` as other names of ``canonical`` and save the mapping
+
+        Aliases that pointed to one of the new aliases are repointed, and a
+        canonical name that was itself an alias is resolved first.
+        """
+        canonical = self.canonical(canonical)
+        aliases = [alias for alias in aliases if alias != canonical]
+        if not aliases:
+            return
+        for alias in aliases:
+            self._aliases[alias] = canonical
+        for alias, target in self._aliases.items():
+            if target in aliases:
+                self._aliases[alias] = canonical
+        self.save()
+
+    def to_dict(self) -> dict[str, str]:
+        return dict(sorted(self._aliases.items()))
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=4)
+        os.replace(tmp, self.path)
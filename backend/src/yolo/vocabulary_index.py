@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+class VocabularyIndex:
+    """
+    Class text embeddings in a memory-mapped matrix with stable class ids
+
+    A class keeps the id (row) it was first added with, so class order no
+    longer depends on set iteration order and embeddings are computed once
+    per name, not once per vocabulary change. Rows are only ever appended;
+    ``<root>/embeddings.npy`` is opened read-only with ``mmap_mode`` so a
+    menu-sized vocabulary is paged in on demand instead of loaded up front.
+    """
+
+    def __init__(self, root="vocabulary_index", dim: int = 512):
+        self.root = Path(root)
+        self.names_file = self.root / "names.json"
+        self.embeddings_file = self.root / "embeddings.npy"
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._names: list[str] = []
+        self._ids: dict[str, int] = {}
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._load()
+
+    def _load(self):
+        if not (self.names_file.exists() and self.embeddings_file.exists()):
+            return
+        try:
+            with open(self.names_file, 'r', encoding='utf-8') as f:
+                names = json.load(f)
+            matrix = np.load(self.embeddings_file, mmap_mode="r")
+        except (json.JSONDecodeError, ValueError, OSError) as e:
+            print(f"Warning: Could not read vocabulary index {self.root}: {e}. Starting with an empty index.")
+            return
+        # A crash between the two writes can leave extra rows; names decide
+        count = min(len(names), len(matrix))
+        self._names = names[:count]
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self._matrix = matrix
+        self.dim = matrix.shape[1]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def ids(self, names) -> list[int]:
+        """Stable ids of known class names (KeyError for unknown ones)"""
+        return [self._ids[name] for name in names]
+
+    def sort(self, names) -> list[str]:
+        """Order class names by id; names not in the index go last, alphabetically"""
+        return sorted(names, key=lambda name: (self._ids.get(name, len(self._ids)), name))
+
+    def add(self, names, encode) -> list[int]:
+        """
+        Make sure every name has an embedding
+
+        Args:
+            names: Class names
+            encode: Callable ``(list[str]) -> array (n, dim)`` computing
+                normalized text embeddings, called once for all new names
+
+        Returns:
+            The ids of ``names``
+        """
+        with self._lock:
+            missing = [name for name in dict.fromkeys(names) if name not in self._ids]
+            if missing:
+                vectors = np.asarray(encode(missing), dtype=np.float32).reshape(len(missing), -1)
+                self._append(missing, vectors)
+            return self.ids(names)
+
+    def _append(self, names: list[str], vectors: np.ndarray):
+        self.root.mkdir(parents=True, exist_ok=True)
+        count = len(self._names)
+        tmp = self.embeddings_file.with_suffix(".tmp.npy")
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(count + len(names), vectors.shape[1]))
+        if count:
+            grown[:count] = self._matrix[:count]
+        grown[count:] = vectors
+        grown.flush()
+        del grown
+        os.replace(tmp, self.embeddings_file)
+
+        self._names = self._names + names
+        tmp = self.names_file.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._names, f, ensure_ascii=False)
+        os.replace(tmp, self.names_file)
+
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self._matrix = np.load(self.embeddings_file, mmap_mode="r")
+        self.dim = vectors.shape[1]
+
+    def embeddings(self, names) -> np.ndarray:
+        """
+        Embeddings of ``names`` as a contiguous (n, dim) float32 array
+        """
+        ids = np.asarray(self.ids(names), dtype=np.int64)
+        return np.ascontiguousarray(self._matrix[ids]) if len(ids) else np.zeros((0, self.dim), dtype=np.float32)
+
+    def get_stats(self) -> dict:
+        return {"classes": len(self._names), "dim": self.dim, "bytes": len(self._names) * self.dim * 4}
+
+
+def top_k_classes(image_embedding: np.ndarray, class_embeddings: np.ndarray, k: int) -> np.ndarray:
+    """
+    Rows of the ``k`` class embeddings most similar to an image embedding
+
+    Args:
+        image_embedding: Normalized (dim,) image embedding
+        class_embeddings: Normalized (n, dim) class embeddings
+        k: Number of classes to keep
+
+    Returns:
+        Row indices in ascending order, so the class order stays stable
+    """
+    if k >= len(class_embeddings):
+        return np.arange(len(class_embeddings))
+    scores = class_embeddings @ image_embedding
+    return np.sort(np.argpartition(-scores, k - 1)[:k])
+
+
+class ClipEncoder:
+    """
+    CLIP model embedding class names and whole images into one space
+
+    YOLO-World's class embeddings are CLIP ViT-B/32 text embeddings, so the
+    same text embeddings serve as the detector's text features and for the
+    image-level similarity that picks candidate classes. The model is
+    loaded on first use.
+    """
+
+    def __init__(self, variant: str = "clip:ViT-B/32", device: str = "cpu"):
+        self.variant = variant
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                import torch
+                from ultralytics.nn.text_model import build_text_model
+                self._model = build_text_model(self.variant, device=torch.device(self.device))
+        return self._model
+
+    def encode_text(self, names: list[str]) -> np.ndarray:
+        model = self._load()
+        tokens = model.tokenize(names)
+        return np.concatenate([model.encode_text(batch).cpu().numpy() for batch in tokens.split(256)])
+
+    def encode_image(self, image) -> np.ndarray:
+        """
+        Normalized embedding of a whole RGB PIL image
+        """
+        return self._load().encode_image(image)[0].cpu().numpy()
@@ -0,0 +1,179 @@
+import pytest
+import asyncio
+import os
+import sys
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.admission import AdmissionController, DeadlineExceeded, QueueFull, RateLimited
+
+
+class TestAdmissionController:
+    """Test class for AdmissionController"""
+
+    def test_admit_and_release(self):
+        """Test that a free slot is granted immediately and released afterwards"""
+        controller = AdmissionController(max_concurrency=1)
+
+        async def run():
+            async with controller.admit("interactive"):
+                assert controller.get_stats()["active"] == 1
+            return controller.get_stats()
+
+        stats = asyncio.run(run())
+
+        assert stats["active"] == 0
+        assert stats["admitted"] == 1
+
+    def test_priority_order(self):
+        """Test that queued requests are served by lane, then by arrival"""
+        controller = AdmissionController(max_concurrency=1)
+        order = []
+
+        async def job(name, lane):
+            async with controller.admit(lane):
+                order.append(name)
+
+        async def run():
+            await controller.acquire("interactive")
+            tasks = [asyncio.create_task(job(name, lane)) for name, lane in
+                     [("batch", "batch"), ("labeling", "labeling"), ("first", "interactive"), ("second", "interactive")]]
+            await asyncio.sleep(0)
+            assert controller.get_stats()["queued"] == {"interactive": 2, "labeling": 1, "batch": 1}
+            controller.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+        assert order == ["first", "second", "labeling", "batch"]
+
+    def test_expired_deadline_rejected(self):
+        """Test that a request whose deadline already passed never runs"""
+        controller = AdmissionController()
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(controller.acquire("interactive", deadline=time.monotonic() - 1))
+        assert controller.get_stats()["deadline_exceeded"] == 1
+        assert controller.get_stats()["active"] == 0
+
+    def test_deadline_expires_in_queue(self):
+        """Test that a queued request is dropped once its deadline passes"""
+        controller = AdmissionController(max_concurrency=1)
+
+        async def run():
+            await controller.acquire("interactive")
+            with pytest.raises(DeadlineExceeded):
+                await controller.acquire("batch", deadline=time.monotonic() + 0.01)
+            controller.release()
+            return controller.get_stats()
+
+        stats = asyncio.run(run())
+
+        assert stats["active"] == 0
+        assert stats["queued"]["batch"] == 0
+        assert stats["deadline_exceeded"] == 1
+
+    def test_rate_limit_per_client(self):
+        """Test that each client has its own token bucket"""
+        controller = AdmissionController(rate_per_second=0.001, burst=2)
+
+        async def run():
+            for _ in range(2):
+                async with controller.admit(client_id="a"):
+                    pass
+            with pytest.raises(RateLimited):
+                await controller.acquire(client_id="a")
+            async with controller.admit(client_id="b"):
+                pass
+
+        asyncio.run(run())
+
+        assert controller.get_stats()["rate_limited"] == 1
+
+    def test_queue_full(self):
+        """Test that new requests are shed when the queue is full"""
+        controller = AdmissionController(max_concurrency=1, max_queue=1)
+
+        async def run():
+            await controller.acquire()
+            waiter = asyncio.create_task(controller.acquire())
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFull):
+                await controller.acquire()
+            controller.release()
+            await waiter
+            controller.release()
+
+        asyncio.run(run())
+
+        assert controller.get_stats()["queue_full"] == 1
+        assert controller.get_stats()["active"] == 0
+
+    def test_check_before_acquire(self):
+        """Test that check rejects without waiting and takes the client's rate limit token"""
+        controller = AdmissionController(max_concurrency=1, max_queue=0, rate_per_second=0.001, burst=1)
+
+        async def run():
+            controller.check(client_id="a")
+            async with controller.admit():
+                with pytest.raises(QueueFull):
+                    controller.check(client_id="b")
+            with pytest.raises(RateLimited):
+                controller.check(client_id="a")
+
+        asyncio.run(run())
+
+        stats = controller.get_stats()
+        assert (stats["admitted"], stats["queue_full"], stats["rate_limited"], stats["active"]) == (1, 1, 1, 0)
+
+    def test_abandoned_waiters_leave_queue(self):
+        """Test that timed-out and cancelled waiters no longer count towards the queue limit"""
+        controller = AdmissionController(max_concurrency=1, max_queue=1)
+
+        async def run():
+            await controller.acquire()
+            with pytest.raises(DeadlineExceeded):
+                await controller.acquire(deadline=time.monotonic() + 0.01)
+            waiter = asyncio.create_task(controller.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            waiter = asyncio.create_task(controller.acquire())
+            await asyncio.sleep(0)
+            controller.release()
+            await waiter
+            controller.release()
+
+        asyncio.run(run())
+
+        assert controller.get_stats()["queue_full"] == 0
+        assert controller.get_stats()["active"] == 0
+
+    def test_client_limit_evicts_idle_buckets(self):
+        """Test that reaching the client limit keeps the rate limits of active clients"""
+        controller = AdmissionController(rate_per_second=1.0, burst=1, max_clients=2)
+
+        async def run():
+            async with controller.admit(client_id="active"):
+                pass
+            async with controller.admit(client_id="idle"):
+                pass
+            controller._buckets["idle"].updated -= 10  # Refilled since
+            async with controller.admit(client_id="new"):
+                pass
+            with pytest.raises(RateLimited):
+                await controller.acquire(client_id="active")
+
+        asyncio.run(run())
+
+        assert set(controller._buckets) == {"active", "new"}
+
+    def test_unknown_lane(self):
+        """Test that an unknown lane is rejected"""
+        controller = AdmissionController()
+
+        with pytest.raises(ValueError):
+            asyncio.run(controller.acquire("urgent"))
@@ -0,0 +1,72 @@
+import pytest
+import os
+import sys
+import time
+
+import torch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.artifact_cache import ModelArtifactCache
+
+
+class TestModelArtifactCache:
+    """Test class for ModelArtifactCache"""
+
+    @pytest.fixture
+    def weights(self, tmp_path):
+        path = tmp_path / "weights.pt"
+        path.write_bytes(b"checkpoint")
+        return path
+
+    def test_key(self, tmp_path, weights):
+        """Test that the key depends on the weights content and the vocabulary"""
+        cache = ModelArtifactCache(tmp_path / "artifacts")
+        key = cache.key(weights, "cup\nrice")
+
+        assert cache.key(str(weights), "cup\nrice") == key
+        assert cache.key(weights, "rice\ncup") != key
+        time.sleep(0.01)
+        weights.write_bytes(b"fine-tuned")
+        assert cache.key(weights, "cup\nrice") != key
+        assert cache.key(tmp_path / "yolov8s-world.pt", "cup") is None
+
+    def test_put_and_get(self, tmp_path, weights):
+        """Test that a stored model loads back as an ultralytics-style checkpoint"""
+        cache = ModelArtifactCache(tmp_path / "artifacts")
+        key = cache.key(weights, "cup")
+        assert cache.get(key) is None
+
+        module = torch.nn.Linear(2, 1)
+        cache.put(key, module, train_args={"imgsz": 640})
+        ckpt = torch.load(cache.get(key), weights_only=False)
+
+        assert torch.equal(ckpt["model"].weight, module.weight)
+        assert ckpt["train_args"] == {"imgsz": 640}
+        assert [p.name for p in (tmp_path / "artifacts").iterdir()] == [f"{key}.pt"]
+        stats = cache.get_stats()
+        assert (stats["artifacts"], stats["hits"], stats["misses"], stats["stored"]) == (1, 1, 1, 1)
+
+    def test_prune_least_recently_used(self, tmp_path):
+        """Test that the least recently used artifacts are deleted over the budget"""
+        cache = ModelArtifactCache(tmp_path, max_bytes=None)
+        for key in ("a", "b", "c"):
+            cache.put(key, torch.nn.Linear(64, 64))
+        size = cache.path("a").stat().st_size
+        os.utime(cache.path("a"), (time.time() + 10, time.time() + 10))  # Recently used
+
+        cache.max_bytes = 2 * size
+        assert cache.prune() == ["b"]
+        assert cache.get("a") is not None and cache.get("b") is None
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_discard(self, tmp_path):
+        """Test that an unreadable artifact is removed"""
+        cache = ModelArtifactCache(tmp_path)
+        cache.path("broken").write_bytes(b"truncated")
+
+        cache.discard("broken")
+
+        assert cache.get("broken") is None
+        assert cache.get_stats()["errors"] == 1
@@ -0,0 +1,276 @@
+import pytest
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.admission import QueueFull
+from yolo.batch_jobs import BatchJobRunner, BatchJobStore
+
+
+def read_results(store, job_id):
+    with open(store.results_path(job_id), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestBatchJobStore:
+    """Test class for BatchJobStore"""
+
+    def test_submit_and_claim(self, tmp_path):
+        """Test that a submitted job is queued with one item per image and leased by one worker"""
+        store = BatchJobStore(tmp_path)
+        job = store.submit(["/data/a.jpg", "/data/b.jpg"], {"confidence": 0.3}, uploads=[("../c d.jpg", b"jpeg")])
+
+        assert (job["status"], job["total"], job["done"], job["progress"]) == ("queued", 3, 0, 0.0)
+        claimed = store.claim("worker-1")
+        assert (claimed["id"], claimed["status"], claimed["params"]) == (job["id"], "running", {"confidence": 0.3})
+        assert store.claim("worker-2") is None
+
+        items = store.pending_items(job["id"], 10)
+        assert [seq for seq, _ in items] == [0, 1, 2]
+        upload = items[2][1]
+        assert os.path.dirname(upload) == str(store.job_dir(job["id"]) / "inputs")
+        assert open(upload, "rb").read() == b"jpeg"
+
+    def test_no_files_until_used(self, tmp_path):
+        """Test that creating a store touches no files; the database is created on first use"""
+        store = BatchJobStore(tmp_path / "jobs")
+
+        assert not (tmp_path / "jobs").exists()
+        assert store.list() == []
+        assert (tmp_path / "jobs" / "jobs.db").exists()
+
+    def test_submit_requires_images(self, tmp_path):
+        """Test that an empty job is rejected"""
+        with pytest.raises(ValueError):
+            BatchJobStore(tmp_path).submit([], {})
+
+    def test_record_batch_and_finish(self, tmp_path):
+        """Test that results are appended and progress and throughput are reported"""
+        store = BatchJobStore(tmp_path)
+        job_id = store.submit(["a", "b", "c"], {})["id"]
+        store.claim("w")
+
+        assert store.record_batch(job_id, "w", [{"seq": 0, "detections": []}, {"seq": 1, "error": "bad"}], 0.5)
+        job = store.get(job_id)
+        assert (job["done"], job["failed"], job["images_per_second"]) == (1, 1, 4.0)
+        assert job["eta_seconds"] == pytest.approx(0.25)
+        assert [seq for seq, _ in store.pending_items(job_id, 10)] == [2]
+
+        store.record_batch(job_id, "w", [{"seq": 2, "detections": []}], 0.5)
+        store.finish(job_id, "w")
+
+        assert store.get(job_id)["status"] == "completed"
+        assert [record["seq"] for record in read_results(store, job_id)] == [0, 1, 2]
+        assert store.get_stats() == {
+            "jobs": {"queued": 0, "running": 0, "completed": 1, "failed": 0, "cancelled": 0},
+            "pending_images": 0
+        }
+
+    def test_abandoned_job_resumes(self, tmp_path):
+        """Test that another worker takes over after the lease runs out, without duplicated results"""
+        store = BatchJobStore(tmp_path, lease_seconds=0.05)
+        job_id = store.submit(["a", "b"], {})["id"]
+        store.claim("old")
+        store.record_batch(job_id, "old", [{"seq": 0}], 0.1)
+        # The old worker died while writing its next batch
+        with open(store.results_path(job_id), "a") as f:
+            f.write('{"seq": 1, "partial"')
+
+        time.sleep(0.1)
+        assert store.claim("new")["id"] == job_id
+        assert store.pending_items(job_id, 10) == [(1, "b")]
+        assert not store.record_batch(job_id, "old", [{"seq": 1}], 0.1)
+        assert store.record_batch(job_id, "new", [{"seq": 1}], 0.1)
+
+        assert read_results(store, job_id) == [{"seq": 0}, {"seq": 1}]
+
+    def test_renew_lease(self, tmp_path):
+        """Test that a renewed lease keeps the job from being taken over"""
+        store = BatchJobStore(tmp_path, lease_seconds=0.2)
+        job_id = store.submit(["a"], {})["id"]
+        store.claim("worker")
+
+        time.sleep(0.15)
+        assert store.renew(job_id, "worker")
+        time.sleep(0.1)
+
+        assert store.claim("other") is None
+        assert not store.renew(job_id, "other")
+        store.cancel(job_id)
+        assert not store.renew(job_id, "worker")
+
+    def test_jobs_survive_restart(self, tmp_path):
+        """Test that a job released on shutdown is picked up by a new store on the same directory"""
+        store = BatchJobStore(tmp_path)
+        job_id = store.submit(["a"], {"imgsz": 640})["id"]
+        store.claim("w")
+        store.release(job_id, "w")
+        store.close()
+
+        restarted = BatchJobStore(tmp_path)
+        assert restarted.claim("w2")["params"] == {"imgsz": 640}
+
+    def test_cancel(self, tmp_path):
+        """Test that a cancelled job stops accepting results"""
+        store = BatchJobStore(tmp_path)
+        job_id = store.submit(["a", "b"], {})["id"]
+        store.claim("w")
+
+        assert store.cancel(job_id)["status"] == "cancelled"
+        assert not store.record_batch(job_id, "w", [{"seq": 0}], 0.1)
+        assert store.cancel("missing") is None
+        assert store.list(status="cancelled")[0]["id"] == job_id
+
+
+class TestBatchJobRunner:
+    """Test class for BatchJobRunner"""
+
+    def test_runs_jobs_in_batches(self, tmp_path):
+        """Test that queued jobs are processed batch by batch in submission order"""
+        store = BatchJobStore(tmp_path)
+        first = store.submit([f"img{i}.jpg" for i in range(5)], {"confidence": 0.5})["id"]
+        second = store.submit(["other.jpg"], {"confidence": 0.5})["id"]
+        batches = []
+
+        async def process_batch(params, items):
+            batches.append([seq for seq, _ in items])
+            return [{"seq": seq, "source": source} for seq, source in items]
+
+        async def main():
+            runner = BatchJobRunner(store, process_batch, batch_size=2, poll_interval=0.01)
+            runner.start()
+            while store.get(second)["status"] != "completed":
+                await asyncio.sleep(0.01)
+            await runner.stop()
+            return runner.get_stats()
+
+        stats = asyncio.run(main())
+
+        assert batches == [[0, 1], [2, 3], [4], [0]]
+        assert [record["source"] for record in read_results(store, first)] == [f"img{i}.jpg" for i in range(5)]
+        assert (stats["batches"], stats["images"], stats["jobs"]["completed"]) == (4, 6, 2)
+
+    def test_admission_rejection_retries_batch(self, tmp_path):
+        """Test that a batch rejected by admission control is retried instead of failing the job"""
+        store = BatchJobStore(tmp_path)
+        job_id = store.submit(["a"], {})["id"]
+        calls = []
+
+        async def process_batch(params, items):
+            calls.append(1)
+            if len(calls) == 1:
+                raise QueueFull("Too many queued requests")
+            return [{"seq": seq} for seq, _ in items]
+
+        async def main():
+            runner = BatchJobRunner(store, process_batch, poll_interval=0.01)
+            runner.start()
+            while store.get(job_id)["status"] in ("queued", "running"):
+                await asyncio.sleep(0.01)
+            await runner.stop()
+
+        asyncio.run(main())
+
+        assert len(calls) == 2
+        assert store.get(job_id)["status"] == "completed"
+
+    def test_lease_renewed_while_batch_waits(self, tmp_path):
+        """Test that a batch waiting longer than the lease is not taken over and processed twice"""
+        store = BatchJobStore(tmp_path, lease_seconds=0.1)
+        job_id = store.submit(["a"], {})["id"]
+        taken_over = []
+
+        async def process_batch(params, items):
+            # E.g. waiting for admission behind interactive traffic
+            for _ in range(6):
+                await asyncio.sleep(0.05)
+                taken_over.append(await asyncio.to_thread(store.claim, "other"))
+            return [{"seq": seq} for seq, _ in items]
+
+        async def main():
+            runner = BatchJobRunner(store, process_batch, poll_interval=0.01)
+            runner.start()
+            # Bounded: a job taken over by "other" would stay running
+            for _ in range(200):
+                if store.get(job_id)["status"] not in ("queued", "running"):
+                    break
+                await asyncio.sleep(0.01)
+            await runner.stop()
+
+        asyncio.run(main())
+
+        assert taken_over == [None] * 6
+        assert read_results(store, job_id) == [{"seq": 0}]
+
+    def test_error_fails_job(self, tmp_path):
+        """Test that an unexpected error fails the job with its message"""
+        store = BatchJobStore(tmp_path)
+        job_id = store.submit(["a"], {})["id"]
+
+        async def process_batch(params, items):
+            raise RuntimeError("No detection classes set")
+
+        async def main():
+            runner = BatchJobRunner(store, process_batch, poll_interval=0.01)
+            runner.start()
+            while store.get(job_id)["status"] != "failed":
+                await asyncio.sleep(0.01)
+            await runner.stop()
+
+        asyncio.run(main())
+
+        assert store.get(job_id)["error"] == "No detection classes set"
+
+    def test_stop_releases_job(self, tmp_path):
+        """Test that stopping the worker mid-job puts the job back in the queue"""
+        store = BatchJobStore(tmp_path)
+        job_id = store.submit(["a", "b"], {})["id"]
+
+        async def process_batch(params, items):
+            await asyncio.sleep(10)
+
+        async def main():
+            runner = BatchJobRunner(store, process_batch, poll_interval=0.01)
+            runner.start()
+            while store.get(job_id)["status"] != "running":
+                await asyncio.sleep(0.01)
+            await runner.stop()
+
+        asyncio.run(main())
+
+        assert store.get(job_id)["status"] == "queued"
+
+    def test_claim_error_keeps_polling(self, tmp_path):
+        """Test that a database error while claiming is logged and the worker keeps running"""
+        store = BatchJobStore(tmp_path)
+        job_id = store.submit(["a"], {})["id"]
+        claim = store.claim
+        errors = []
+
+        def flaky_claim(owner):
+            if not errors:
+                errors.append(1)
+                raise sqlite3.OperationalError("database is locked")
+            return claim(owner)
+
+        store.claim = flaky_claim
+
+        async def process_batch(params, items):
+            return [{"seq": seq} for seq, _ in items]
+
+        async def main():
+            runner = BatchJobRunner(store, process_batch, poll_interval=0.01)
+            runner.start()
+            while store.get(job_id)["status"] != "completed":
+                await asyncio.sleep(0.01)
+            await runner.stop()
+
+        asyncio.run(asyncio.wait_for(main(), 5))
+
+        assert errors == [1]
@@ -0,0 +1,142 @@
+import pytest
+import asyncio
+import os
+import sys
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.admission import DeadlineExceeded, RateLimited
+from yolo.coalescing import SingleFlight, TooManyWaiters, request_key
+
+
+class TestSingleFlight:
+    """Test class for SingleFlight"""
+
+    def test_request_key(self):
+        """Test that the key depends on the payload and every parameter"""
+        assert request_key(b"image", "v1", 0.25) == request_key(b"image", "v1", 0.25)
+        assert request_key(b"image", "v1", 0.25) != request_key(b"image", "v1", 0.5)
+        assert request_key(b"image", "v1", 0.25) != request_key(b"other", "v1", 0.25)
+
+    def test_identical_requests_run_once(self):
+        """Test that concurrent identical requests share one run"""
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"detections": []}
+
+        async def main():
+            return await asyncio.gather(*(flights.run("key", work) for _ in range(3)))
+
+        results = asyncio.run(main())
+
+        assert len(calls) == 1
+        assert [coalesced for _, coalesced in results] == [False, True, True]
+        assert all(result is results[0][0] for result, _ in results)
+        stats = flights.get_stats()
+        assert (stats["leaders"], stats["coalesced"], stats["in_flight"], stats["waiting"]) == (1, 2, 0, 0)
+
+    def test_sequential_requests_run_again(self):
+        """Test that results are not cached after the run finishes"""
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        async def main():
+            return [await flights.run("key", work) for _ in range(2)]
+
+        assert asyncio.run(main()) == [(1, False), (2, False)]
+
+    def test_waiter_limit(self):
+        """Test that duplicates over the per-key limit are rejected"""
+        flights = SingleFlight(max_waiters=1)
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "result"
+
+        async def main():
+            return await asyncio.gather(*(flights.run("key", work) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(main())
+
+        assert results[:2] == [("result", False), ("result", True)]
+        assert isinstance(results[2], TooManyWaiters)
+        assert flights.get_stats()["rejected"] == 1
+
+    def test_shared_error(self):
+        """Test that an error caused by the input is shared with the waiters"""
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("Invalid image file")
+
+        async def main():
+            return await asyncio.gather(*(flights.run("key", work) for _ in range(2)), return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+    def test_leader_rejection_not_shared(self):
+        """Test that a waiter runs the work itself when the leader was rate limited"""
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RateLimited("Rate limit exceeded for client a")
+            return "result"
+
+        async def main():
+            return await asyncio.gather(*(flights.run("key", work) for _ in range(2)), return_exceptions=True)
+
+        leader, follower = asyncio.run(main())
+
+        assert isinstance(leader, RateLimited)
+        assert follower == ("result", False)
+        assert len(calls) == 2
+
+    def test_waiter_deadline(self):
+        """Test that a waiter gives up at its deadline without cancelling the work"""
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            leader = asyncio.ensure_future(flights.run("key", work))
+            await asyncio.sleep(0)
+            with pytest.raises(DeadlineExceeded):
+                await flights.run("key", work, deadline=time.monotonic() + 0.01)
+            return await leader
+
+        assert asyncio.run(main()) == ("result", False)
+
+    def test_leader_cancellation_does_not_cancel_work(self):
+        """Test that waiters still get the result when the leader goes away"""
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.03)
+            return "result"
+
+        async def main():
+            leader = asyncio.ensure_future(flights.run("key", work))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.run("key", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(main()) == ("result", True)
@@ -0,0 +1,97 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from cpu_layout import candidate_layouts, default_layout, detect_topology, parse_cpulist, tune_layout
+
+
+def make_sysfs(root, nodes, siblings):
+    """Create a fake /sys/devices/system tree"""
+    for node, cpulist in nodes.items():
+        (root / "node" / f"node{node}").mkdir(parents=True)
+        (root / "node" / f"node{node}" / "cpulist").write_text(cpulist + "\n")
+    for cpu, sibling_list in siblings.items():
+        (root / "cpu" / f"cpu{cpu}" / "topology").mkdir(parents=True)
+        (root / "cpu" / f"cpu{cpu}" / "topology" / "thread_siblings_list").write_text(sibling_list + "\n")
+    return root / "cpu", root / "node"
+
+
+# Two NUMA nodes with two hyper-threaded cores each
+TWO_NODE_TOPOLOGY = {"nodes": [[[0, 4], [1, 5]], [[2, 6], [3, 7]]]}
+
+
+class TestCpuLayout:
+    """Test class for the CPU topology and worker layout helpers"""
+
+    def test_parse_cpulist(self):
+        """Test parsing kernel CPU lists"""
+        assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+        assert parse_cpulist("") == []
+
+    def test_detect_topology(self, tmp_path):
+        """Test grouping CPUs by node and hyper-thread siblings"""
+        sys_cpu, sys_node = make_sysfs(
+            tmp_path,
+            nodes={0: "0-1,4-5", 1: "2-3,6-7"},
+            siblings={0: "0,4", 1: "1,5", 2: "2,6", 3: "3,7", 4: "0,4", 5: "1,5", 6: "2,6", 7: "3,7"}
+        )
+
+        with patch("os.sched_getaffinity", return_value=set(range(8))):
+            assert detect_topology(sys_cpu, sys_node) == TWO_NODE_TOPOLOGY
+
+    def test_detect_topology_respects_affinity(self, tmp_path):
+        """Test that CPUs outside the affinity mask are ignored"""
+        sys_cpu, sys_node = make_sysfs(
+            tmp_path,
+            nodes={0: "0-1,4-5", 1: "2-3,6-7"},
+            siblings={0: "0,4", 1: "1,5", 4: "0,4", 5: "1,5"}
+        )
+
+        with patch("os.sched_getaffinity", return_value={0, 1, 4}):
+            assert detect_topology(sys_cpu, sys_node) == {"nodes": [[[0, 4], [1]]]}
+
+    def test_detect_topology_without_sysfs(self, tmp_path):
+        """Test the single-node fallback"""
+        with patch("os.sched_getaffinity", return_value={0, 1}):
+            topology = detect_topology(tmp_path / "cpu", tmp_path / "node")
+
+        assert topology == {"nodes": [[[0], [1]]]}
+
+    def test_candidate_layouts(self):
+        """Test that workers never span NUMA nodes"""
+        layouts = candidate_layouts(TWO_NODE_TOPOLOGY)
+
+        assert [(layout["workers"], layout["threads"]) for layout in layouts] == [(4, 1), (2, 2)]
+        assert layouts[1]["cpusets"] == [[0, 1, 4, 5], [2, 3, 6, 7]]
+
+    def test_candidate_layouts_max_workers(self):
+        """Test limiting the worker count"""
+        layouts = candidate_layouts(TWO_NODE_TOPOLOGY, max_workers=1)
+
+        assert all(layout["workers"] == 1 for layout in layouts)
+
+    def test_default_layout(self):
+        """Test that the default layout uses about four threads per worker"""
+        topology = {"nodes": [[[cpu] for cpu in range(16)]]}
+
+        layout = default_layout(candidate_layouts(topology))
+
+        assert (layout["workers"], layout["threads"]) == (4, 4)
+
+    def test_tune_layout(self):
+        """Test that the layout with the highest throughput is chosen"""
+        throughput = {1: 10.0, 2: 14.0}
+
+        with patch("cpu_layout.detect_topology", return_value=TWO_NODE_TOPOLOGY):
+            best = tune_layout("model.pt", seconds=0.1,
+                               benchmark=lambda layout, *args: throughput[layout["threads"]])
+
+        assert (best["workers"], best["threads"]) == (2, 2)
+        assert best["throughput"] == pytest.approx(14.0)
+        assert len(best["candidates"]) == 2
+        assert best["topology"] == TWO_NODE_TOPOLOGY
+        assert best["model"] == "model.pt"
@@ -0,0 +1,134 @@
+import pytest
+import json
+import os
+import sys
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.dataset_split import DatasetSplit
+
+
+class TestDatasetSplit:
+    """Test class for DatasetSplit"""
+
+    @pytest.fixture
+    def data_dir(self, tmp_path):
+        """Create an empty YOLO dataset directory"""
+        (tmp_path / "images").mkdir()
+        (tmp_path / "labels").mkdir()
+        return tmp_path
+
+    def add_image(self, data_dir, name, class_ids):
+        (data_dir / "images" / f"{name}.jpg").write_bytes(b"")
+        with open(data_dir / "labels" / f"{name}.txt", 'w') as f:
+            for class_id in class_ids:
+                f.write(f"{class_id} 0.5 0.5 0.1 0.1\n")
+
+    def test_first_images_of_a_class_go_to_train(self, data_dir):
+        """Test that a class needs enough images before any is held out"""
+        for i in range(4):
+            self.add_image(data_dir, f"img{i}", [0])
+
+        splits = DatasetSplit(data_dir).update()
+
+        assert len(splits["train"]) == 4
+        assert splits["val"] == []
+
+    def test_stratified_by_class(self, data_dir):
+        """Test that every sufficiently large class gets validation images"""
+        for i in range(10):
+            self.add_image(data_dir, f"a{i}", [0])
+            self.add_image(data_dir, f"b{i}", [1])
+
+        split = DatasetSplit(data_dir, val_fraction=0.2)
+        splits = split.update()
+
+        val_names = {p.stem for p in splits["val"]}
+        assert len([n for n in val_names if n.startswith("a")]) == 2
+        assert len([n for n in val_names if n.startswith("b")]) == 2
+
+    def test_existing_assignments_are_kept(self, data_dir):
+        """Test that adding data never moves previously assigned images"""
+        for i in range(10):
+            self.add_image(data_dir, f"img{i:02d}", [0])
+        first = DatasetSplit(data_dir).update()
+
+        for i in range(10, 30):
+            self.add_image(data_dir, f"img{i:02d}", [0])
+        second = DatasetSplit(data_dir).update()
+
+        assert set(first["val"]) <= set(second["val"])
+        assert set(first["train"]) <= set(second["train"])
+        assert len(second["val"]) == 6
+
+    def test_max_val_images_cap(self, data_dir):
+        """Test that the validation set never exceeds the configured cap"""
+        for i in range(50):
+            self.add_image(data_dir, f"img{i:02d}", [i % 3])
+
+        splits = DatasetSplit(data_dir, val_fraction=0.5, max_val_images=3).update()
+
+        assert len(splits["val"]) == 3
+        assert len(splits["train"]) == 47
+
+    def test_deleted_images_are_dropped(self, data_dir):
+        """Test that removed images disappear from the persisted split"""
+        for i in range(5):
+            self.add_image(data_dir, f"img{i}", [0])
+        DatasetSplit(data_dir).update()
+
+        os.unlink(data_dir / "images" / "img0.jpg")
+        DatasetSplit(data_dir).update()
+
+        with open(data_dir / "split.json") as f:
+            assignments = json.load(f)["assignments"]
+        assert "img0.jpg" not in assignments
+        assert len(assignments) == 4
+
+    def test_background_images_are_stratified_separately(self, data_dir):
+        """Test that images without labels do not take the labeled images' validation slots"""
+        for i in range(10):
+            (data_dir / "images" / f"bg{i}.jpg").write_bytes(b"")
+        for i in range(10):
+            self.add_image(data_dir, f"img{i}", [0])
+
+        splits = DatasetSplit(data_dir, val_fraction=0.2).update()
+
+        val_names = {p.stem for p in splits["val"]}
+        assert len([n for n in val_names if n.startswith("bg")]) == 2
+        assert len([n for n in val_names if n.startswith("img")]) == 2
+
+    def test_get_counts_does_not_write(self, data_dir):
+        """Test that counting includes new images without persisting their assignment"""
+        for i in range(5):
+            self.add_image(data_dir, f"img{i}", [0])
+        split = DatasetSplit(data_dir)
+
+        assert split.get_counts() == {"train": 4, "val": 1}
+        assert not (data_dir / "split.json").exists()
+        assert split.assignments == {}
+
+    def test_write_lists(self, data_dir):
+        """Test writing relative image lists for the data config"""
+        for i in range(5):
+            self.add_image(data_dir, f"img{i}", [0])
+
+        train_list, val_list = DatasetSplit(data_dir).write_lists()
+
+        with open(train_list) as f:
+            train_lines = f.read().splitlines()
+        with open(val_list) as f:
+            val_lines = f.read().splitlines()
+        assert len(train_lines) == 4
+        assert val_lines == ["./images/img4.jpg"]
+
+    def test_write_lists_empty_val_falls_back_to_train(self, data_dir, capsys):
+        """Test that training can run before any image is held out"""
+        self.add_image(data_dir, "img0", [0])
+
+        train_list, val_list = DatasetSplit(data_dir).write_lists()
+
+        with open(val_list) as f:
+            assert f.read().splitlines() == ["./images/img0.jpg"]
+        assert "Validation split is empty" in capsys.readouterr().out
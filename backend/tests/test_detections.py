@@ -0,0 +1,61 @@
+import pytest
+import os
+import sys
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.detections import Detections
+
+
+def make_result(boxes):
+    """Create a detection result on a 100x200 image"""
+    data = torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6)
+    return Results(np.zeros((100, 200, 3), dtype=np.uint8), path="", names={0: "cup", 1: "plate"}, boxes=data)
+
+
+class TestDetections:
+    """Test class for Detections"""
+
+    def test_from_result(self):
+        """Test converting all boxes of a result at once"""
+        result = make_result([[10, 20, 30, 40, 0.9, 1], [0, 0, 5, 5, 0.5, 0]])
+        result.model_version = "v0003"
+
+        detections = Detections.from_result(result)
+
+        assert len(detections) == 2
+        assert isinstance(detections.xyxy, np.ndarray)
+        assert detections.class_names() == ["plate", "cup"]
+        assert detections.model_version == "v0003"
+        assert detections.cascade_stage is None
+
+    def test_empty_result(self):
+        """Test a result without boxes"""
+        detections = Detections.from_result(make_result([]))
+
+        assert len(detections) == 0
+        assert detections.to_records() == []
+
+    def test_to_records(self):
+        """Test building response dictionaries"""
+        detections = Detections.from_result(make_result([[10, 20, 30, 40, 0.75, 0]]))
+
+        records = detections.to_records()
+
+        assert records == [{"class": "cup", "confidence": 0.75, "bbox": [10.0, 20.0, 30.0, 40.0]}]
+        assert type(records[0]["confidence"]) is float
+
+    def test_scaled(self):
+        """Test mapping boxes to another resolution"""
+        detections = Detections.from_result(make_result([[10, 20, 30, 40, 0.75, 0]]))
+
+        scaled = detections.scaled(2.0, 0.5)
+
+        assert scaled.xyxy.tolist() == [[20.0, 10.0, 60.0, 20.0]]
+        assert detections.xyxy.tolist() == [[10.0, 20.0, 30.0, 40.0]]
+        assert scaled.class_names() == ["cup"]
@@ -0,0 +1,84 @@
+import pytest
+import os
+import sys
+
+import numpy as np
+import torch
+import yaml
+from ultralytics.engine.results import Results
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.distillation import build_distillation_dataset, merge_labels, pseudo_labels
+
+
+def make_result(boxes, names):
+    """Create a detection result on a 100x100 image"""
+    data = torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6)
+    return Results(np.zeros((100, 100, 3), dtype=np.uint8), path="", names=names, boxes=data)
+
+
+class TestDistillation:
+    """Test class for the distillation dataset builder"""
+
+    def test_pseudo_labels(self):
+        """Test converting detections to normalized YOLO rows by dataset class id"""
+        result = make_result([[10, 20, 30, 60, 0.9, 0], [0, 0, 10, 10, 0.8, 1]], {0: "cup", 1: "fork"})
+
+        rows = pseudo_labels(result, {"cup": 3})
+
+        assert len(rows) == 1  # "fork" is not in the dataset
+        assert rows[0][0] == 3
+        assert rows[0][1:] == pytest.approx((0.2, 0.4, 0.2, 0.4))
+
+    def test_pseudo_labels_empty(self):
+        """Test that missing results give no labels"""
+        assert pseudo_labels(None, {"cup": 0}) == []
+        assert pseudo_labels(make_result([], {0: "cup"}), {"cup": 0}) == []
+
+    def test_merge_labels_prefers_human_boxes(self):
+        """Test that teacher boxes duplicating a human box are dropped"""
+        human = [(0, 0.5, 0.5, 0.2, 0.2)]
+        pseudo = [(1, 0.51, 0.5, 0.2, 0.2), (0, 0.1, 0.1, 0.1, 0.1)]
+
+        merged = merge_labels(human, pseudo)
+
+        assert merged == [(0, 0.5, 0.5, 0.2, 0.2), (0, 0.1, 0.1, 0.1, 0.1)]
+
+    def test_build_distillation_dataset(self, tmp_path):
+        """Test building a dataset from human-labeled and unlabeled images"""
+        images_dir = tmp_path / "images"
+        labels_dir = tmp_path / "labels"
+        unlabeled_dir = tmp_path / "unlabeled"
+        for directory in (images_dir, labels_dir, unlabeled_dir):
+            directory.mkdir()
+        (images_dir / "a.jpg").write_bytes(b"a")
+        (labels_dir / "a.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+        (unlabeled_dir / "b.jpg").write_bytes(b"b")
+        val_list = tmp_path / "val.txt"
+        val_list.write_text("")
+
+        result = make_result([[40, 40, 60, 60, 0.9, 0], [0, 0, 10, 10, 0.9, 1]], {0: "cup", 1: "fork"})
+        stats = build_distillation_dataset(
+            lambda path: result,
+            labeled_images=[images_dir / "a.jpg"],
+            labels_dir=labels_dir,
+            out_dir=tmp_path / "distill",
+            class_names=["cup", "fork"],
+            val_list=val_list,
+            unlabeled_images=[unlabeled_dir / "b.jpg"]
+        )
+
+        assert stats["images"] == 2
+        assert stats["human_boxes"] == 1
+        assert stats["pseudo_boxes"] == 3  # One duplicate of the human box is dropped
+        assert len((tmp_path / "distill" / "labels" / "a.txt").read_text().splitlines()) == 2
+        assert len((tmp_path / "distill" / "labels" / "b.txt").read_text().splitlines()) == 2
+        assert (tmp_path / "distill" / "images" / "b.jpg").read_bytes() == b"b"
+
+        with open(stats["config_path"]) as f:
+            config = yaml.safe_load(f)
+        assert config["names"] == ["cup", "fork"]
+        assert config["val"] == str(val_list.absolute())
+        assert (tmp_path / "distill" / "train.txt").read_text().splitlines() == ["./images/a.jpg", "./images/b.jpg"]
@@ -0,0 +1,114 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+import numpy as np
+import torch
+from torch import nn
+import ultralytics
+from ultralytics.nn.tasks import WorldModel
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.feature_cache import FeatureCache, backbone_end, image_digest
+
+
+@pytest.fixture(scope="module")
+def world_model():
+    """Randomly initialized YOLO-World model (no weights download)"""
+    torch.manual_seed(0)
+    return WorldModel("yolov8s-world.yaml", nc=3, verbose=False).eval()
+
+
+def text_features(seed):
+    """Random normalized text embeddings for three classes"""
+    generator = torch.Generator().manual_seed(seed)
+    feats = torch.randn(1, 3, 512, generator=generator)
+    return feats / feats.norm(dim=-1, keepdim=True)
+
+
+class TestFeatureCache:
+    """Test class for the backbone feature cache"""
+
+    def test_image_digest(self):
+        """Test that the digest depends on pixels and shape"""
+        image = np.zeros((4, 6, 3), dtype=np.uint8)
+        other = image.copy()
+        other[0, 0, 0] = 1
+
+        assert image_digest(image) == image_digest(image.copy())
+        assert image_digest(image) != image_digest(other)
+        assert image_digest(image) != image_digest(image.reshape(6, 4, 3))
+
+    def test_backbone_end(self, world_model):
+        """Test that the backbone ends before the first text-conditioned layer on a kept output"""
+        end = backbone_end(world_model)
+
+        assert end - 1 in world_model.save
+        assert not any(type(m).__name__ in ("C2fAttn", "ImagePoolingAttn") for m in world_model.model[:end])
+
+    def test_backbone_end_without_text_layers(self):
+        """Test that plain detectors are not cached"""
+        model = nn.Module()
+        model.model = nn.Sequential(nn.Identity())
+
+        assert backbone_end(model) is None
+
+    def test_cached_head_matches_full_forward(self, world_model):
+        """Test that re-running only the head gives the full model's output under any vocabulary"""
+        cache = FeatureCache(max_bytes=256 * 1024 ** 2)
+        x = torch.rand(1, 3, 160, 160)
+        with torch.no_grad():
+            expected = [WorldModel.predict(world_model, x, txt_feats=text_features(seed))[0] for seed in (1, 2)]
+            cache.attach(world_model, weights_key="test.pt")
+            try:
+                with cache.use("image-1"):
+                    outputs = [world_model.predict(x, txt_feats=text_features(seed))[0] for seed in (1, 2)]
+            finally:
+                del world_model.predict
+
+        for output, reference in zip(outputs, expected):
+            torch.testing.assert_close(output, reference)
+        stats = cache.get_stats()
+        assert (stats["misses"], stats["hits"]) == (1, 1)
+        assert stats["entries"] == 1
+        assert stats["bytes"] > 0
+
+    def test_not_used_outside_context(self, world_model):
+        """Test that predictions without an image key bypass the cache"""
+        cache = FeatureCache(max_bytes=256 * 1024 ** 2)
+        cache.attach(world_model, weights_key="test.pt")
+        try:
+            with torch.no_grad():
+                world_model.predict(torch.rand(1, 3, 160, 160))
+        finally:
+            del world_model.predict
+
+        assert cache.get_stats()["entries"] == 0
+
+    def test_unsupported_ultralytics_version(self, world_model):
+        """Test that the model keeps its own forward pass on an unverified ultralytics version"""
+        cache = FeatureCache(max_bytes=256 * 1024 ** 2)
+
+        with patch.object(ultralytics, "__version__", "99.0.0"):
+            cache.attach(world_model, weights_key="test.pt")
+
+        assert "predict" not in vars(world_model)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used features are evicted over the budget"""
+        cache = FeatureCache(max_bytes=2 * 400)
+        features = [torch.zeros(100)]  # 400 bytes
+
+        cache._put(("w", "a", ()), features)
+        cache._put(("w", "b", ()), features)
+        cache._get(("w", "a", ()))
+        cache._put(("w", "c", ()), features)
+
+        assert cache._get(("w", "b", ())) is None
+        assert cache._get(("w", "a", ())) is not None
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes"] == 800
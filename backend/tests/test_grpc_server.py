@@ -0,0 +1,160 @@
+import pytest
+import asyncio
+import os
+import socket
+import sys
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.admission import DeadlineExceeded, RateLimited
+from yolo.detections import Detections
+
+# Generated from detector.proto by make setup-grpc
+detector_pb2 = pytest.importorskip("yolo.detector_pb2")
+
+from yolo.grpc_server import DetectorService, detect_response, error_status, start_grpc_server
+
+
+class FakeContext:
+    """Minimal grpc.aio servicer context"""
+
+    def __init__(self, metadata=(), time_remaining=None):
+        self.metadata = metadata
+        self.remaining = time_remaining
+
+    def invocation_metadata(self):
+        return self.metadata
+
+    def time_remaining(self):
+        return self.remaining
+
+    def peer(self):
+        return "ipv4:10.0.0.5:4711"
+
+
+async def stream(requests):
+    for request in requests:
+        yield request
+
+
+class TestDetectResponse:
+    """Test class for building responses from detections"""
+
+    def test_response_from_detections(self):
+        """Test packing detections with class ids into the names found in the image"""
+        detections = Detections(
+            xyxy=np.array([[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]], dtype=np.float32),
+            confidence=np.array([0.9, 0.5, 0.7], dtype=np.float32),
+            class_id=np.array([7, 2, 7]),
+            names={2: "rice", 7: "miso soup"}
+        )
+
+        response = detect_response(detections, model_version="v1", inference_size=640, id=3)
+        decoded = detector_pb2.DetectResponse.FromString(response.SerializeToString())
+
+        assert list(decoded.boxes) == detections.xyxy.ravel().tolist()
+        assert list(decoded.scores) == pytest.approx([0.9, 0.5, 0.7])
+        assert list(decoded.class_names) == ["miso soup", "rice"]
+        assert list(decoded.class_ids) == [0, 1, 0]
+        assert (decoded.model_version, decoded.inference_size, decoded.id) == ("v1", 640, 3)
+
+
+class TestDetectorServer:
+    """Test class for the gRPC server with a protobuf client"""
+
+    def test_server_end_to_end(self):
+        """Test unary and streaming calls from a protobuf client against start_grpc_server"""
+        grpc = pytest.importorskip("grpc")
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+
+        async def detect(request, lane, deadline, client_id):
+            if not request.image:
+                raise ValueError("Empty image")
+            return detector_pb2.DetectResponse(boxes=[0, 0, 10, 10], scores=[request.confidence or 0.25],
+                                               class_ids=[0], class_names=[lane], inference_size=request.imgsz,
+                                               id=request.id)
+
+        async def main():
+            server = await start_grpc_server(detect, port)
+            try:
+                async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                    unary = channel.unary_unary(
+                        "/detector.v1.Detector/Detect",
+                        request_serializer=detector_pb2.DetectRequest.SerializeToString,
+                        response_deserializer=detector_pb2.DetectResponse.FromString
+                    )
+                    streaming = channel.stream_stream(
+                        "/detector.v1.Detector/DetectStream",
+                        request_serializer=detector_pb2.DetectRequest.SerializeToString,
+                        response_deserializer=detector_pb2.DetectResponse.FromString
+                    )
+                    response = await unary(detector_pb2.DetectRequest(image=b"jpg", confidence=0.5, imgsz=320, id=1),
+                                           metadata=(("x-priority", "batch"),))
+                    with pytest.raises(grpc.aio.AioRpcError) as error:
+                        await unary(detector_pb2.DetectRequest())
+                    requests = [detector_pb2.DetectRequest(image=b"jpg" if i != 2 else b"", id=i) for i in range(1, 4)]
+                    streamed = [r async for r in streaming(iter(requests))]
+                    return response, error.value.code(), streamed
+            finally:
+                await server.stop(None)
+
+        response, code, streamed = asyncio.run(main())
+
+        assert (list(response.boxes), list(response.scores), list(response.class_names), response.inference_size,
+                response.id) == ([0, 0, 10, 10], [0.5], ["batch"], 320, 1)
+        assert code == grpc.StatusCode.INTERNAL
+        assert [r.id for r in streamed] == [1, 2, 3]
+        assert streamed[1].error == "INTERNAL: Empty image"
+
+
+class TestDetectorService:
+    """Test class for the gRPC servicer"""
+
+    def test_error_status(self):
+        """Test mapping errors of the detection path to gRPC status codes"""
+        assert error_status(RateLimited("Rate limit exceeded"))[0] == "RESOURCE_EXHAUSTED"
+        assert error_status(DeadlineExceeded("late")) == ("DEADLINE_EXCEEDED", "late")
+        assert error_status(RuntimeError("boom")) == ("INTERNAL", "boom")
+
+    def test_detect_passes_ticket(self):
+        """Test that metadata and the call deadline become the admission ticket"""
+        calls = []
+
+        async def detect(request, lane, deadline, client_id):
+            calls.append((lane, deadline, client_id))
+            return detector_pb2.DetectResponse(id=request.id)
+
+        service = DetectorService(detect)
+        context = FakeContext(metadata=(("x-priority", "Batch"),), time_remaining=2.0)
+
+        response = asyncio.run(service.Detect(detector_pb2.DetectRequest(id=5), context))
+
+        assert response.id == 5
+        lane, deadline, client_id = calls[0]
+        assert (lane, client_id) == ("batch", "ipv4:10.0.0.5:4711")
+        assert deadline is not None
+
+    def test_stream_keeps_order_and_reports_errors(self):
+        """Test that streamed images overlap, come back in order and fail individually"""
+        async def detect(request, lane, deadline, client_id):
+            await asyncio.sleep(0.01 * (5 - request.id))
+            if request.id == 2:
+                raise ValueError("Invalid image file")
+            return detector_pb2.DetectResponse(id=request.id)
+
+        service = DetectorService(detect, stream_window=3)
+
+        async def main():
+            requests = stream([detector_pb2.DetectRequest(id=i) for i in range(1, 5)])
+            return [response async for response in service.DetectStream(requests, FakeContext())]
+
+        responses = asyncio.run(main())
+
+        assert [response.id for response in responses] == [1, 2, 3, 4]
+        assert responses[1].error == "INTERNAL: Invalid image file"
+        assert all(not response.error for i, response in enumerate(responses) if i != 1)
@@ -0,0 +1,85 @@
+import pytest
+import os
+import sys
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.incremental import TrainingLedger, select_incremental_samples
+
+
+class TestTrainingLedger:
+    """Test class for TrainingLedger"""
+
+    def test_record_run_persists(self, tmp_path):
+        """Test that recorded runs survive a reload"""
+        ledger = TrainingLedger(tmp_path)
+        ledger.record_run("full", ["a.jpg", "b.jpg"], [], weights=None, epochs=5)
+
+        reloaded = TrainingLedger(tmp_path)
+        assert len(reloaded.runs) == 1
+        assert reloaded.runs[0]["run_id"] == 1
+        assert reloaded.seen_samples() == {"a.jpg", "b.jpg"}
+
+    def test_seen_samples_include_replay(self, tmp_path):
+        """Test that replayed samples count as seen"""
+        ledger = TrainingLedger(tmp_path)
+        ledger.record_run("full", ["a.jpg"], [], weights=None, epochs=5)
+        ledger.record_run("incremental", ["b.jpg"], ["a.jpg"], weights=None, epochs=5)
+
+        assert ledger.seen_samples() == {"a.jpg", "b.jpg"}
+
+    def test_latest_weights_skips_missing_files(self, tmp_path):
+        """Test that the latest existing checkpoint is returned"""
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(b"weights")
+        ledger = TrainingLedger(tmp_path)
+        ledger.record_run("full", ["a.jpg"], [], weights=str(weights), epochs=5)
+        ledger.record_run("incremental", ["b.jpg"], [], weights=str(tmp_path / "gone.pt"), epochs=5)
+
+        assert ledger.latest_weights() == str(weights)
+
+    def test_invalid_ledger_file(self, tmp_path, capsys):
+        """Test loading a corrupted ledger file"""
+        (tmp_path / "training_runs.json").write_text("not json")
+
+        ledger = TrainingLedger(tmp_path)
+
+        assert ledger.runs == []
+        assert "Warning: JSON decoding error" in capsys.readouterr().out
+
+
+class TestSelectIncrementalSamples:
+    """Test class for select_incremental_samples"""
+
+    @pytest.fixture
+    def train_images(self):
+        return [Path(f"images/img{i}.jpg") for i in range(10)]
+
+    def test_only_new_samples_without_replay(self, train_images):
+        """Test that a zero replay ratio trains on new samples only"""
+        seen = {f"img{i}.jpg" for i in range(8)}
+
+        new_images, replay_images = select_incremental_samples(train_images, seen, replay_ratio=0.0)
+
+        assert [p.name for p in new_images] == ["img8.jpg", "img9.jpg"]
+        assert replay_images == []
+
+    def test_replay_ratio(self, train_images):
+        """Test that replay samples are drawn from previously seen images"""
+        seen = {f"img{i}.jpg" for i in range(8)}
+
+        new_images, replay_images = select_incremental_samples(train_images, seen, replay_ratio=2.0, seed=0)
+
+        assert len(new_images) == 2
+        assert len(replay_images) == 4
+        assert all(p.name in seen for p in replay_images)
+
+    def test_replay_limited_by_history(self, train_images):
+        """Test that replay never exceeds the number of seen images"""
+        seen = {"img0.jpg"}
+
+        _, replay_images = select_incremental_samples(train_images, seen, replay_ratio=5.0)
+
+        assert [p.name for p in replay_images] == ["img0.jpg"]
@@ -0,0 +1,113 @@
+import pytest
+import asyncio
+import os
+import sys
+from io import BytesIO
+from PIL import Image
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.ingest import UploadTooLarge, decode_image, read_upload
+
+
+class FakeUpload:
+    """Minimal async file-like upload"""
+
+    def __init__(self, data, size=None):
+        self.file = BytesIO(data)
+        self.size = size
+        self.reads = 0
+
+    async def read(self, n=-1):
+        self.reads += 1
+        return self.file.read(n)
+
+
+def encode(image, format="JPEG", **kwargs):
+    buffer = BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+class TestReadUpload:
+    """Test class for read_upload"""
+
+    def test_reads_in_chunks(self):
+        """Test reading an upload below the size cap"""
+        upload = FakeUpload(b"x" * 2500)
+
+        data = asyncio.run(read_upload(upload, max_bytes=10000, chunk_size=1000))
+
+        assert data == b"x" * 2500
+        assert upload.reads == 4
+
+    def test_stops_at_size_cap(self):
+        """Test that reading stops once the cap is exceeded"""
+        upload = FakeUpload(b"x" * 10000)
+
+        with pytest.raises(UploadTooLarge):
+            asyncio.run(read_upload(upload, max_bytes=1500, chunk_size=1000))
+        assert upload.reads == 2
+
+    def test_rejects_known_size_without_reading(self):
+        """Test that a declared size over the cap is rejected immediately"""
+        upload = FakeUpload(b"x" * 10000, size=10000)
+
+        with pytest.raises(UploadTooLarge):
+            asyncio.run(read_upload(upload, max_bytes=1500))
+        assert upload.reads == 0
+
+
+class TestDecodeImage:
+    """Test class for decode_image"""
+
+    def test_large_jpeg_decoded_at_reduced_size(self):
+        """Test that draft mode decodes a large JPEG close to the target size"""
+        data = encode(Image.new('RGB', (4000, 3000), color='red'))
+
+        decoded = decode_image(data, target_size=640)
+
+        assert decoded.original_size == (4000, 3000)
+        assert 640 <= max(decoded.image.size) < 4000
+        assert decoded.image.mode == "RGB"
+
+    def test_small_image_not_scaled(self):
+        """Test that images smaller than the target keep their size"""
+        data = encode(Image.new('RGB', (100, 80), color='red'))
+
+        decoded = decode_image(data, target_size=640)
+
+        assert decoded.image.size == (100, 80)
+        assert decoded.scale == (1.0, 1.0)
+
+    def test_png_decoded_in_full(self):
+        """Test that non-JPEG images are decoded at full size and converted to RGB"""
+        data = encode(Image.new('RGBA', (1000, 500)), format="PNG")
+
+        decoded = decode_image(data, target_size=640)
+
+        assert decoded.image.size == (1000, 500)
+        assert decoded.image.mode == "RGB"
+
+    def test_exif_orientation_applied(self):
+        """Test that a rotated photo is decoded upright"""
+        image = Image.new('RGB', (4000, 2000), color='red')
+        exif = image.getexif()
+        exif[0x0112] = 6  # Rotate 90 CW
+        data = encode(image, exif=exif)
+
+        decoded = decode_image(data, target_size=640)
+
+        assert decoded.original_size == (2000, 4000)
+        width, height = decoded.image.size
+        assert height > width
+
+    def test_to_original(self):
+        """Test mapping boxes back to original coordinates"""
+        data = encode(Image.new('RGB', (4000, 3000), color='red'))
+        decoded = decode_image(data, target_size=640)
+        sx, sy = decoded.scale
+
+        assert decoded.to_original([10, 20, 30, 40]) == [10 * sx, 20 * sy, 30 * sx, 40 * sy]
+        assert decoded.to_original([0, 0, *decoded.image.size]) == [0, 0, 4000, 3000]
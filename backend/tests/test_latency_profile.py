@@ -0,0 +1,94 @@
+import pytest
+import os
+import sys
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.latency_profile import LatencyProfile
+
+
+class TestLatencyProfile:
+    """Test class for LatencyProfile"""
+
+    @pytest.fixture
+    def profile(self):
+        profile = LatencyProfile(sizes=(320, 480, 640, 960), default_size=640, smoothing=1.0)
+        profile.latencies_ms = {320: 50.0, 480: 110.0, 640: 200.0, 960: 450.0}
+        return profile
+
+    def test_measure(self):
+        """Test measuring every configured size"""
+        calls = []
+        profile = LatencyProfile(sizes=(320, 640))
+
+        profile.measure(lambda imgsz: calls.append(imgsz), runs=2)
+
+        assert calls == [320, 320, 320, 640, 640, 640]
+        assert set(profile.latencies_ms) == {320, 640}
+
+    def test_default_size(self, profile):
+        """Test that requests without preferences use the default size"""
+        assert profile.choose() == 640
+
+    def test_explicit_size_snapped(self, profile):
+        """Test that an explicit size is rounded and clamped"""
+        assert profile.choose(imgsz=650) == 640
+        assert profile.choose(imgsz=4000) == 960
+        assert profile.choose(imgsz=10) == 320
+
+    def test_budget_picks_largest_fitting_size(self, profile):
+        """Test choosing the largest size that fits the latency budget"""
+        assert profile.choose(budget_ms=250) == 640
+        assert profile.choose(budget_ms=1000) == 960
+        assert profile.choose(budget_ms=10) == 320
+
+    def test_budget_without_profile_uses_default(self):
+        """Test that an unmeasured profile falls back to the default size"""
+        assert LatencyProfile(default_size=640).choose(budget_ms=100) == 640
+
+    def test_overload_steps_down(self, profile):
+        """Test that slow inference steps the default size down"""
+        profile.record(640, 400.0)  # 2x slower than profiled
+
+        assert profile.overload_steps() == 1
+        assert profile.choose() == 480
+        assert profile.choose(budget_ms=250) == 480
+        assert profile.choose(imgsz=640) == 640  # Explicit sizes are honoured
+
+        profile.record(640, 800.0)  # 4x slower
+        assert profile.choose() == 320
+
+    def test_recovers_after_overload(self, profile):
+        """Test that the size goes back up when latency recovers"""
+        profile.record(640, 800.0)
+        profile.record(640, 200.0)
+
+        assert profile.choose() == 640
+
+    def test_no_flapping_around_threshold(self, profile):
+        """Test that a slowdown hovering around a step-down ratio keeps the stepped-down size"""
+        profile.record(640, 310.0)  # 1.55x
+        assert profile.choose() == 480
+
+        for latency in (140.0, 170.0, 160.0):  # 1.27x-1.55x at the smaller size
+            profile.record(480, latency)
+            assert profile.choose() == 480
+
+        profile.record(480, 120.0)  # 1.09x
+        assert profile.choose() == 640
+
+    def test_expected_ms(self, profile):
+        """Test the expected latency at profiled, in-between and oversized sizes, scaled by the slowdown"""
+        assert LatencyProfile().expected_ms(640) is None
+        assert profile.expected_ms(640) == profile.latencies_ms[640]
+        assert profile.expected_ms(600) == profile.latencies_ms[640]
+        assert profile.expected_ms(2000) == profile.latencies_ms[max(profile.latencies_ms)]
+        profile.record(640, 400.0)
+        assert profile.expected_ms(480) == 220.0
+
+    def test_record_unknown_size_ignored(self, profile):
+        """Test that latencies for unprofiled sizes are ignored"""
+        profile.record(123, 10000.0)
+
+        assert profile.get_stats()["slowdown"] == 1.0
@@ -1,17 +1,33 @@
 import pytest
+import asyncio
 import json
 import tempfile
 import os
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 import sys
 from io import BytesIO
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
+import torch
 
 # Add the src directory to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+import main
 from main import app
+from yolo.model_registry import ModelRegistry
+from yolo.admission import AdmissionController
+from ultralytics.engine.results import Boxes
+
+
+def on_event_loop() -> bool:
+    """Whether the caller runs on an event loop thread (and would block it)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
 
 
 class TestMainAPI:
@@ -22,6 +38,13 @@ class TestMainAPI:
         """Create test client"""
         return TestClient(app)
 
+    @pytest.fixture(autouse=True)
+    def admission(self):
+        """Give every test a fresh admission controller and rate limits"""
+        controller = AdmissionController(max_concurrency=1, rate_per_second=5.0, burst=20)
+        with patch('main.admission', controller):
+            yield controller
+
     @pytest.fixture
     def mock_yolo(self):
         """Mock the global yolo instance"""
@@ -102,6 +125,18 @@ class TestMainAPI:
         assert "Successfully added classes" in data["message"]
         mock_yolo.add_classes.assert_called_once_with(["car", "person", "dog"])
 
+    def test_add_detection_classes_reports_merges(self, client, mock_yolo):
+        """Test that classes added under an existing class are reported"""
+        mock_yolo.add_classes.return_value = {"backpak": "backpack"}
+        mock_yolo.get_current_classes.return_value = ["backpack", "person"]
+
+        response = client.post("/model/classes", json={"classes": ["backpak"]})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["merged"] == {"backpak": "backpack"}
+        assert "backpak -> backpack" in data["message"]
+
     def test_add_detection_classes_empty_list(self, client, mock_yolo):
         """Test adding empty classes list"""
         request_data = {"classes": []}
@@ -140,39 +175,85 @@ class TestMainAPI:
 
     def test_clear_detection_classes(self, client, mock_yolo):
         """Test clearing all detection classes"""
+        loops = []
+        mock_yolo.clear_classes.side_effect = lambda: loops.append(on_event_loop())
+
         response = client.delete("/model/classes")
 
         assert response.status_code == 200
         data = response.json()
         assert "All detection classes cleared successfully" in data["message"]
 
-        # Verify the correct methods were called
-        mock_yolo.current_classes.clear.assert_called_once()
-        mock_yolo._update_model_classes.assert_called_once()
-        mock_yolo._save_custom_vocab.assert_called_once()
+        # The vocabulary is replaced through the swap path, off the event loop
+        mock_yolo.clear_classes.assert_called_once()
+        assert loops == [False]
 
     def test_clear_detection_classes_error(self, client, mock_yolo):
         """Test clearing classes with error"""
-        mock_yolo.current_classes.clear.side_effect = Exception("Test error")
+        mock_yolo.clear_classes.side_effect = Exception("Test error")
 
         response = client.delete("/model/classes")
         assert response.status_code == 500
         assert "Error clearing classes" in response.json()["detail"]
 
+    def test_get_duplicate_classes(self, client, mock_yolo):
+        """Test suggesting classes to merge"""
+        groups = [{"canonical": "backpack", "aliases": ["backpak"], "similarity": [0.97]}]
+        mock_yolo.suggest_merges.return_value = groups
+
+        response = client.get("/model/classes/duplicates", params={"threshold": 0.95})
+
+        assert response.status_code == 200
+        assert response.json() == {"threshold": 0.95, "groups": groups}
+        mock_yolo.suggest_merges.assert_called_once_with(0.95)
+
+    def test_get_duplicate_classes_without_embeddings(self, client, mock_yolo):
+        """Test that a model without text embeddings is reported as a bad request"""
+        mock_yolo.suggest_merges.side_effect = ValueError("Class text embeddings are not available")
+
+        response = client.get("/model/classes/duplicates")
+
+        assert response.status_code == 400
+
+    def test_merge_detection_classes(self, client, mock_yolo):
+        """Test merging classes into a canonical class"""
+        loops = []
+        mock_yolo.merge_classes.side_effect = lambda *args: loops.append(on_event_loop()) or ["backpak"]
+        mock_yolo.get_current_classes.return_value = ["backpack", "person"]
+
+        response = client.post("/model/classes/merge", json={"canonical": "backpack", "aliases": [" backpak ", ""]})
+
+        assert response.status_code == 200
+        assert response.json()["classes"] == ["backpack", "person"]
+        mock_yolo.merge_classes.assert_called_once_with(["backpak"], "backpack")
+        assert loops == [False]
+
+    def test_dedupe_detection_classes(self, client, mock_yolo):
+        """Test merging every suggested duplicate group off the event loop"""
+        groups = [{"canonical": "backpack", "aliases": ["backpak"], "similarity": [0.97]}]
+        loops = []
+        mock_yolo.merge_duplicates.side_effect = lambda threshold: loops.append(on_event_loop()) or groups
+        mock_yolo.get_current_classes.return_value = ["backpack"]
+
+        response = client.post("/model/classes/dedupe", params={"threshold": 0.95})
+
+        assert response.status_code == 200
+        assert response.json() == {"merged": groups, "classes": ["backpack"]}
+        mock_yolo.merge_duplicates.assert_called_once_with(0.95)
+        assert loops == [False]
+
+    def test_merge_detection_classes_without_aliases(self, client, mock_yolo):
+        """Test that a merge needs at least one alias"""
+        response = client.post("/model/classes/merge", json={"canonical": "backpack", "aliases": [" "]})
+
+        assert response.status_code == 400
+        mock_yolo.merge_classes.assert_not_called()
+
     def test_detect_object_success(self, client, mock_yolo, sample_image_file):
         """Test successful object detection"""
         # Mock detection result
         mock_result = Mock()
-        mock_box = Mock()
-        mock_box.cls = [0]
-        mock_box.conf = [0.85]
-
-        # Mock tensor-like object with tolist() method
-        mock_bbox = Mock()
-        mock_bbox.tolist.return_value = [100, 200, 300, 400]
-        mock_box.xyxy = [mock_bbox]
-
-        mock_result.boxes = [mock_box]
+        mock_result.boxes = Boxes(torch.tensor([[100, 200, 300, 400, 0.85, 0]]), orig_shape=(480, 640))
         mock_result.names = {0: "car"}
 
         mock_yolo.predict_image.return_value = mock_result
@@ -191,7 +272,7 @@ class TestMainAPI:
         data = response.json()
         assert len(data["detections"]) == 1
         assert data["detections"][0]["class"] == "car"
-        assert data["detections"][0]["confidence"] == 0.85
+        assert data["detections"][0]["confidence"] == pytest.approx(0.85)  # float32 model output
         assert data["detections"][0]["bbox"] == [100, 200, 300, 400]
         assert "Found 1 objects" in data["message"]
 
@@ -250,16 +331,7 @@ class TestMainAPI:
     def test_detect_object_with_confidence(self, client, mock_yolo, sample_image_file):
         """Test object detection with custom confidence threshold"""
         mock_result = Mock()
-        mock_box = Mock()
-        mock_box.cls = [0]
-        mock_box.conf = [0.90]
-
-        # Mock tensor-like object with tolist() method
-        mock_bbox = Mock()
-        mock_bbox.tolist.return_value = [100, 200, 300, 400]
-        mock_box.xyxy = [mock_bbox]
-
-        mock_result.boxes = [mock_box]
+        mock_result.boxes = Boxes(torch.tensor([[100, 200, 300, 400, 0.90, 0]]), orig_shape=(480, 640))
         mock_result.names = {0: "person"}
 
         mock_yolo.predict_image.return_value = mock_result
@@ -314,4 +386,739 @@ class TestMainAPI:
         )
 
         assert response.status_code == 500
-        assert "Error processing image" in response.json()["detail"]
\ No newline at end of file
+        assert "Error processing image" in response.json()["detail"]
+
+    def test_start_training_invalid_mode(self, client, mock_yolo):
+        """Test starting training with an unknown mode"""
+        response = client.post("/training/start", params={"mode": "partial"})
+
+        assert response.status_code == 400
+        assert "Mode must be 'full' or 'incremental'" in response.json()["detail"]
+
+    @pytest.fixture
+    def registry(self, tmp_path):
+        """Replace the model registry with an empty temporary one"""
+        registry = ModelRegistry(tmp_path / "registry")
+        with patch('main.model_registry', registry):
+            yield registry
+
+    def test_get_model_registry(self, client, mock_yolo, registry, tmp_path):
+        """Test listing registered model versions"""
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(b"weights")
+        registry.register(weights, metrics={"fitness": 0.4})
+        registry.promote("v0001")
+        mock_yolo.model_version = "v0001"
+
+        response = client.get("/model/registry")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["active"] == "v0001"
+        assert data["serving"] == "v0001"
+        assert data["versions"][0]["metrics"] == {"fitness": 0.4}
+        assert data["versions"][0]["active"] is True
+
+    def test_promote_model_version(self, client, mock_yolo, registry, tmp_path):
+        """Test promoting a registered model version"""
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(b"weights")
+        entry = registry.register(weights)
+        mock_yolo.model_version = "v0001"
+        mock_yolo.vocabulary_version = "vocab"
+        loops = []
+        mock_yolo.load_trained_model.side_effect = lambda *args, **kwargs: loops.append(on_event_loop())
+
+        response = client.post("/model/registry/v0001/promote")
+
+        assert response.status_code == 200
+        assert response.json()["active"] == "v0001"
+        mock_yolo.load_trained_model.assert_called_once_with(entry["weights"], version="v0001", closed_set=False)
+        assert loops == [False]
+
+    def test_promote_unknown_model_version(self, client, mock_yolo, registry):
+        """Test promoting a version that does not exist"""
+        response = client.post("/model/registry/v0042/promote")
+
+        assert response.status_code == 404
+        mock_yolo.load_trained_model.assert_not_called()
+
+    def test_rollback_without_history(self, client, mock_yolo, registry):
+        """Test rolling back when no earlier version was promoted"""
+        response = client.post("/model/registry/rollback")
+
+        assert response.status_code == 400
+        assert "No previous model version" in response.json()["detail"]
+
+    def test_rollback_model_version(self, client, mock_yolo, registry, tmp_path):
+        """Test rolling back to the previously promoted version"""
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(b"weights")
+        first = registry.register(weights)
+        registry.register(weights)
+        registry.promote("v0001")
+        registry.promote("v0002")
+        mock_yolo.model_version = "v0001"
+        mock_yolo.vocabulary_version = "vocab"
+
+        loops = []
+        mock_yolo.load_trained_model.side_effect = lambda *args, **kwargs: loops.append(on_event_loop())
+
+        response = client.post("/model/registry/rollback")
+
+        assert response.status_code == 200
+        assert response.json()["active"] == "v0001"
+        mock_yolo.load_trained_model.assert_called_once_with(first["weights"], version="v0001", closed_set=False)
+        assert loops == [False]
+
+    def test_detect_object_large_image_boxes_in_original_coordinates(self, client, mock_yolo):
+        """Test that a large photo is decoded small and boxes are mapped back"""
+        img = Image.new('RGB', (4000, 3000), color='red')
+        img_bytes = BytesIO()
+        img.save(img_bytes, format='JPEG')
+        img_bytes.seek(0)
+
+        mock_result = Mock()
+        mock_result.boxes = Boxes(torch.tensor([[10, 20, 30, 40, 0.9, 0]]), orig_shape=(480, 640))
+        mock_result.names = {0: "plate"}
+        mock_yolo.predict_image.return_value = mock_result
+
+        response = client.post(
+            "/detect",
+            files={"image": ("big.jpg", img_bytes, "image/jpeg")}
+        )
+
+        assert response.status_code == 200
+        decoded = mock_yolo.predict_image.call_args[0][0]
+        assert max(decoded.size) < 4000
+        scale = 4000 / decoded.size[0]
+        assert response.json()["detections"][0]["bbox"] == pytest.approx([10 * scale, 20 * scale, 30 * scale, 40 * scale])
+
+    def test_request_body_limit(self, client, mock_yolo, sample_image_file):
+        """Test that oversized request bodies are rejected before they are spooled"""
+        filename, file_content, content_type = sample_image_file
+
+        with patch('main.MAX_UPLOAD_BYTES', 10), patch('main.MULTIPART_OVERHEAD_BYTES', 100):
+            declared = client.post("/detect", files={"image": (filename, file_content, content_type)})
+            chunked = client.post(
+                "/detect",
+                content=iter([b"x" * 100, b"x" * 100]),
+                headers={"Content-Type": "multipart/form-data; boundary=x"}
+            )
+
+        for response in (declared, chunked):
+            assert response.status_code == 413
+            assert "Request body exceeds" in response.json()["detail"]
+        mock_yolo.predict_image.assert_not_called()
+
+    def test_labeling_accepts_octet_stream(self, client, mock_yolo, sample_image_file, tmp_path):
+        """Test that labeling uploads without an image content type are accepted"""
+        filename, file_content, _ = sample_image_file
+        labeling_data = {"boxes": [{"label": "cup", "x1": 10, "y1": 10, "x2": 50, "y2": 50}],
+                         "image_width": 100, "image_height": 100}
+
+        with patch('main.TRAINING_DATA_DIR', tmp_path), patch('main.create_training_config'):
+            response = client.post(
+                "/labeling/submit",
+                files={"image": (filename, file_content, "application/octet-stream")},
+                data={"labeling_data": json.dumps(labeling_data)}
+            )
+
+        assert response.status_code == 200
+        assert len(list((tmp_path / "images").iterdir())) == 1
+
+    def test_detect_object_upload_too_large(self, client, mock_yolo, sample_image_file):
+        """Test that uploads over the size cap are rejected"""
+        filename, file_content, content_type = sample_image_file
+
+        with patch('main.MAX_UPLOAD_BYTES', 10):
+            response = client.post(
+                "/detect",
+                files={"image": (filename, file_content, content_type)}
+            )
+
+        assert response.status_code == 413
+        mock_yolo.predict_image.assert_not_called()
+
+    def test_detect_object_invalid_image(self, client, mock_yolo):
+        """Test that undecodable image data is rejected"""
+        response = client.post(
+            "/detect",
+            files={"image": ("test.jpg", BytesIO(b"not really a jpeg"), "image/jpeg")}
+        )
+
+        assert response.status_code == 400
+        assert "Invalid image file" in response.json()["detail"]
+
+    def test_detect_object_tiled(self, client, mock_yolo, sample_image_file):
+        """Test that tiled detection is used when requested"""
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_yolo.predict_tiled.return_value = mock_result
+
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            data={"tiled": "true", "tile_size": "512", "tile_overlap": "0.25"}
+        )
+
+        assert response.status_code == 200
+        mock_yolo.predict_image.assert_not_called()
+        kwargs = mock_yolo.predict_tiled.call_args.kwargs
+        assert kwargs["tile_size"] == 512
+        assert kwargs["overlap"] == 0.25
+        assert kwargs["include_full_image"] is True
+
+    def test_detect_object_tiled_invalid_tile_size(self, client, mock_yolo, sample_image_file):
+        """Test that unsupported tile sizes are rejected"""
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            data={"tiled": "true", "tile_size": "100"}
+        )
+
+        assert response.status_code == 400
+        assert "Tile size" in response.json()["detail"]
+
+    def test_detect_object_explicit_imgsz(self, client, mock_yolo, sample_image_file):
+        """Test that a requested input size is used for inference"""
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_yolo.predict_image.return_value = mock_result
+
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            data={"imgsz": "900"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["X-Inference-Size"] == "896"
+        assert mock_yolo.predict_image.call_args.kwargs["imgsz"] == 896
+
+    def test_detect_object_latency_budget(self, client, mock_yolo, sample_image_file):
+        """Test that the latency budget selects the input size"""
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_yolo.predict_image.return_value = mock_result
+
+        filename, file_content, content_type = sample_image_file
+        with patch.object(main.latency_profile, 'latencies_ms', {320: 40.0, 416: 70.0, 512: 100.0, 640: 160.0, 800: 250.0, 960: 360.0}):
+            response = client.post(
+                "/detect",
+                files={"image": (filename, file_content, content_type)},
+                data={"latency_budget_ms": "120"}
+            )
+
+        assert response.status_code == 200
+        assert mock_yolo.predict_image.call_args.kwargs["imgsz"] == 512
+
+    def test_latency_profile_uses_request_input_path(self, mock_yolo):
+        """Test that the latency profile is measured on decoded photos like real requests"""
+        profile = main.LatencyProfile(sizes=(320, 416), default_size=320)
+
+        with patch('main.latency_profile', profile):
+            main.measure_latency_profile(runs=2)
+
+        images = [c.args[0] for c in mock_yolo.predict_image.call_args_list]
+        sizes = [c.kwargs["imgsz"] for c in mock_yolo.predict_image.call_args_list]
+        assert sizes == [320] * 3 + [416] * 3
+        assert all(isinstance(image, Image.Image) for image in images)
+        assert [image.size for image in images] == [(320, 240)] * 3 + [(416, 312)] * 3
+        # Distinct pixels per run, so cached backbone features do not shorten the timings
+        assert len({image.tobytes() for image in images}) == len(images)
+        assert set(profile.latencies_ms) == {320, 416}
+
+    def test_detect_object_invalid_latency_budget(self, client, mock_yolo, sample_image_file):
+        """Test that a non-positive latency budget is rejected"""
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            data={"latency_budget_ms": "0"}
+        )
+
+        assert response.status_code == 400
+
+    def test_detect_object_priority_and_stats(self, client, mock_yolo, sample_image_file):
+        """Test that a prioritized request is admitted and counted"""
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_yolo.predict_image.return_value = mock_result
+
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            headers={"X-Priority": "labeling", "X-Request-Timeout-Ms": "5000"}
+        )
+
+        assert response.status_code == 200
+        stats = client.get("/admission/stats").json()
+        assert stats["admitted"] == 1
+        assert stats["active"] == 0
+        assert stats["coalescing"]["in_flight"] == 0
+
+    def test_pipeline_stats(self, client, mock_yolo, sample_image_file):
+        """Test that a detection passes through the decode, infer and annotate stages"""
+        mock_result = Mock()
+        mock_result.boxes = Boxes(torch.tensor([[10, 20, 30, 40, 0.9, 0]]), orig_shape=(100, 100))
+        mock_result.names = {0: "cup"}
+        mock_yolo.predict_image.return_value = mock_result
+        before = client.get("/pipeline/stats").json()
+
+        filename, file_content, content_type = sample_image_file
+        response = client.post("/detect", files={"image": (filename, file_content, content_type)}, data={"inline_image": "true"})
+
+        assert response.status_code == 200
+        assert response.json()["processed_image"]
+        stats = client.get("/pipeline/stats").json()
+        for stage in ("decode", "infer", "annotate"):
+            assert stats[stage]["completed"] == before[stage]["completed"] + 1
+            assert stats[stage]["in_flight"] == 0
+        assert stats["decode"]["executor"] == "process"
+
+    @pytest.fixture
+    def renders(self, tmp_path):
+        """Use a temporary render cache"""
+        from yolo.render_cache import RenderCache
+        cache = RenderCache(tmp_path / "renders", max_bytes=10 * 1024 * 1024)
+        with patch('main.render_cache', cache):
+            yield cache
+
+    def detect_with_link(self, client, mock_yolo, sample_image_file):
+        mock_result = Mock()
+        mock_result.boxes = Boxes(torch.tensor([[10, 20, 30, 40, 0.9, 0]]), orig_shape=(100, 100))
+        mock_result.names = {0: "cup"}
+        mock_yolo.predict_image.return_value = mock_result
+        filename, file_content, content_type = sample_image_file
+        response = client.post("/detect", files={"image": (filename, file_content, content_type)})
+        assert response.status_code == 200
+        return response.json()
+
+    def test_detect_returns_image_link(self, client, mock_yolo, sample_image_file, renders):
+        """Test that the processed image is returned as a link and rendered when fetched"""
+        data = self.detect_with_link(client, mock_yolo, sample_image_file)
+
+        assert "processed_image" not in data
+        assert data["processed_image_url"].startswith("/detect/renders/")
+        assert data["processed_image_expires_in"] == main.RENDER_TTL_SECONDS
+        assert renders.get_stats()["entries"] == 1
+
+        response = client.get(data["processed_image_url"])
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["cache-control"].startswith("private, max-age=")
+        assert Image.open(BytesIO(response.content)).size == (100, 100)
+
+        cached = client.get(data["processed_image_url"], headers={"If-None-Match": response.headers["etag"]})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+    def test_detect_names_render_id(self, client, mock_yolo, sample_image_file, renders):
+        """Test that the stored image is named in a header so a router can send the link back here"""
+        self.detect_with_link(client, mock_yolo, sample_image_file)
+        filename, file_content, content_type = sample_image_file
+
+        response = client.post("/detect", files={"image": (filename, file_content, content_type)})
+
+        assert response.json()["processed_image_url"] == f"/detect/renders/{response.headers['x-render-id']}"
+
+    def test_processed_image_size_and_format(self, client, mock_yolo, sample_image_file, renders):
+        """Test that the processed image can be downscaled and encoded in another format"""
+        url = self.detect_with_link(client, mock_yolo, sample_image_file)["processed_image_url"]
+
+        response = client.get(url, params={"size": 50, "format": "png"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        image = Image.open(BytesIO(response.content))
+        assert (image.format, image.size) == ("PNG", (50, 50))
+        assert response.headers["etag"] != client.get(url).headers["etag"]
+
+        assert client.get(url, params={"format": "gif"}).status_code == 400
+        assert client.get(url, params={"size": 1}).status_code == 422
+
+    def test_detect_render_cache_full(self, client, mock_yolo, sample_image_file, renders):
+        """Test that detections are still returned when the processed image cannot be stored"""
+        with patch.object(renders, 'put', side_effect=OSError(28, "No space left on device")):
+            data = self.detect_with_link(client, mock_yolo, sample_image_file)
+
+        assert data["processed_image_url"] is None
+        assert "processed_image_expires_in" not in data
+        assert data["detections"][0]["class"] == "cup"
+
+    def test_processed_image_not_found(self, client, renders):
+        """Test that unknown and expired links return 404"""
+        assert client.get("/detect/renders/unknown").status_code == 404
+
+        render_id = renders.put(Image.new('RGB', (10, 10)), [])
+        renders.ttl_seconds = 0
+        assert client.get(f"/detect/renders/{render_id}").status_code == 404
+
+    def test_grpc_detect(self, mock_yolo, sample_image_file):
+        """Test that a gRPC request runs through the shared detection path"""
+        import asyncio
+        DetectRequest = pytest.importorskip("yolo.detector_pb2").DetectRequest
+
+        mock_result = Mock()
+        mock_result.boxes = Boxes(torch.tensor([[10, 20, 30, 40, 0.9, 0]]), orig_shape=(100, 100))
+        mock_result.names = {0: "cup"}
+        mock_result.model_version = "v1"
+        mock_yolo.predict_image.return_value = mock_result
+        mock_yolo.vocabulary_version = "abc123"
+        image_bytes = sample_image_file[1].getvalue()
+
+        response = asyncio.run(main.detect_grpc_request(
+            DetectRequest(image=image_bytes, confidence=0.5, id=9), "interactive", None, "client-a"
+        ))
+
+        assert list(response.class_names) == ["cup"]
+        assert list(response.boxes) == [10, 20, 30, 40]
+        assert (response.id, response.model_version, response.vocabulary_version) == (9, "v1", "abc123")
+        assert mock_yolo.predict_image.call_args.kwargs["conf_threshold"] == 0.5
+
+    def test_grpc_detect_tiled_defaults(self, mock_yolo, sample_image_file):
+        """Test that tiled gRPC requests use the same tile defaults as the HTTP endpoints"""
+        import asyncio
+        DetectRequest = pytest.importorskip("yolo.detector_pb2").DetectRequest
+
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_yolo.predict_tiled.return_value = mock_result
+
+        with patch('main.DEFAULT_TILE_SIZE', 960), patch('main.DEFAULT_TILE_OVERLAP', 0.3):
+            asyncio.run(main.detect_grpc_request(
+                DetectRequest(image=sample_image_file[1].getvalue(), tiled=True), "interactive", None, None
+            ))
+
+        kwargs = mock_yolo.predict_tiled.call_args.kwargs
+        assert (kwargs["conf_threshold"], kwargs["tile_size"], kwargs["overlap"], kwargs["include_full_image"]) == \
+            (main.DEFAULT_CONFIDENCE, 960, 0.3, main.DEFAULT_TILE_FULL_IMAGE)
+
+    def test_grpc_detect_invalid_request(self, mock_yolo):
+        """Test that invalid gRPC requests are rejected before inference"""
+        import asyncio
+        from fastapi import HTTPException
+        DetectRequest = pytest.importorskip("yolo.detector_pb2").DetectRequest
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(main.detect_grpc_request(DetectRequest(), "interactive", None, None))
+        assert error.value.status_code == 400
+        with pytest.raises(HTTPException):
+            asyncio.run(main.detect_grpc_request(DetectRequest(image=b"x", confidence=2.0), "interactive", None, None))
+        mock_yolo.predict_image.assert_not_called()
+
+    @pytest.fixture
+    def batch_store(self, tmp_path):
+        """Use a temporary batch job store and input directory"""
+        from yolo.batch_jobs import BatchJobStore
+        store = BatchJobStore(tmp_path / "jobs")
+        (tmp_path / "inputs").mkdir()
+        with patch('main.batch_jobs', store), patch.object(main.batch_runner, 'store', store), \
+                patch('main.BATCH_INPUT_DIR', tmp_path / "inputs"):
+            yield store
+
+    def test_submit_batch_job(self, client, batch_store, sample_image_file):
+        """Test submitting a batch job from a manifest and uploaded images"""
+        filename, file_content, content_type = sample_image_file
+        manifest = b"# nightly\nshelf/a.jpg\n\nshelf/b.jpg\n"
+
+        response = client.post("/batch/jobs", data={"confidence": "0.4"}, files=[
+            ("manifest", ("manifest.txt", manifest, "text/plain")),
+            ("images", (filename, file_content, content_type))
+        ])
+
+        assert response.status_code == 202
+        job = response.json()
+        assert (job["status"], job["total"], job["params"]["confidence"]) == ("queued", 3, 0.4)
+        sources = [source for _, source in batch_store.pending_items(job["id"], 10)]
+        assert sources[0] == str((main.BATCH_INPUT_DIR / "shelf" / "a.jpg").resolve())
+        assert client.get(f"/batch/jobs/{job['id']}").json()["total"] == 3
+        assert client.get("/batch/jobs").json()["jobs"][0]["id"] == job["id"]
+        assert client.delete(f"/batch/jobs/{job['id']}").json()["status"] == "cancelled"
+        assert client.get("/batch/jobs/missing").status_code == 404
+
+    def test_submit_batch_job_invalid(self, client, batch_store):
+        """Test that manifests escaping the input directory and empty jobs are rejected"""
+        response = client.post("/batch/jobs", files={"manifest": ("m.txt", b"../../etc/passwd\n", "text/plain")})
+        assert response.status_code == 400
+        assert client.post("/batch/jobs", data={"confidence": "0.4"}).status_code == 400
+        assert batch_store.list() == []
+
+    def test_process_batch_items(self, mock_yolo, batch_store, tmp_path):
+        """Test that a batch is decoded, run as one batched inference and mapped to original pixels"""
+        import asyncio
+
+        Image.new('RGB', (1280, 960), color='red').save(tmp_path / "a.jpg")
+        (tmp_path / "broken.jpg").write_bytes(b"not an image")
+        mock_result = Mock()
+        mock_result.boxes = Boxes(torch.tensor([[10, 20, 30, 40, 0.9, 0]]), orig_shape=(480, 640))
+        mock_result.names = {0: "cup"}
+        mock_result.model_version = "v1"
+        mock_yolo.predict_batch.return_value = [mock_result]
+
+        records = asyncio.run(main.process_batch_items(
+            {"confidence": 0.3, "imgsz": 640}, [(0, str(tmp_path / "a.jpg")), (1, str(tmp_path / "broken.jpg"))]
+        ))
+
+        images = mock_yolo.predict_batch.call_args[0][0]
+        assert [image.size for image in images] == [(640, 480)]
+        assert mock_yolo.predict_batch.call_args.kwargs == {"conf_threshold": 0.3, "imgsz": 640}
+        assert (records[0]["seq"], records[0]["width"], records[0]["model_version"]) == (0, 1280, "v1")
+        assert records[0]["detections"][0]["bbox"] == [20, 40, 60, 80]
+        assert records[1]["seq"] == 1 and "Invalid image file" in records[1]["error"]
+
+    def test_process_batch_items_in_chunks(self, mock_yolo, batch_store, tmp_path):
+        """Test that a batch is cut into chunks that hold the inference slot about BATCH_MAX_SLOT_MS"""
+        import asyncio
+
+        for i in range(5):
+            Image.new('RGB', (64, 48), color='red').save(tmp_path / f"{i}.jpg")
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_yolo.predict_batch.side_effect = lambda images, **kwargs: [mock_result] * len(images)
+
+        with patch.object(main.latency_profile, 'latencies_ms', {640: main.BATCH_MAX_SLOT_MS / 2}):
+            records = asyncio.run(main.process_batch_items(
+                {"confidence": 0.3, "imgsz": 640}, [(i, str(tmp_path / f"{i}.jpg")) for i in range(5)]
+            ))
+
+        assert [len(call.args[0]) for call in mock_yolo.predict_batch.call_args_list] == [2, 2, 1]
+        assert [record["seq"] for record in records] == [0, 1, 2, 3, 4]
+        assert main.admission.get_stats()["admitted"] == 3
+
+    def test_health(self, client, mock_yolo):
+        """Test that health reports readiness and the served versions"""
+        mock_yolo.get_current_classes.return_value = ["cup"]
+        mock_yolo.model_version = "v3"
+        mock_yolo.vocabulary_version = "abc123"
+
+        response = client.get("/health")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ready"] is True
+        assert data["model_version"] == "v3"
+        assert data["vocabulary_version"] == "abc123"
+        assert data["queued"] == 0
+
+    def test_health_not_ready_without_classes(self, client, mock_yolo):
+        """Test that a server without detection classes is not ready"""
+        mock_yolo.get_current_classes.return_value = []
+        mock_yolo.vocabulary_version = "e3b0c44298fc"
+
+        assert client.get("/health").json()["ready"] is False
+
+    def test_detect_object_invalid_priority(self, client, mock_yolo, sample_image_file):
+        """Test that an unknown priority lane is rejected"""
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            headers={"X-Priority": "urgent"}
+        )
+
+        assert response.status_code == 400
+
+    def test_detect_object_deadline_exceeded(self, client, mock_yolo, sample_image_file, admission):
+        """Test that a request still queued at its deadline is dropped without inference"""
+        admission._active = admission.max_concurrency  # All slots busy
+
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            headers={"X-Request-Timeout-Ms": "10"}
+        )
+
+        assert response.status_code == 504
+        mock_yolo.predict_image.assert_not_called()
+
+    def test_detect_object_rate_limited(self, client, mock_yolo, sample_image_file, admission):
+        """Test that a client over its rate limit is rejected"""
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_yolo.predict_image.return_value = mock_result
+        admission.rate_per_second = 0.001
+        admission.burst = 1
+
+        filename, file_content, content_type = sample_image_file
+        responses = [
+            client.post(
+                "/detect/with-confidence",
+                files={"image": (filename, file_content, content_type)},
+                headers={"X-Client-Id": "camera-1"}
+            )
+            for _ in range(2)
+        ]
+
+        assert responses[0].status_code == 200
+        assert responses[1].status_code == 429
+        assert responses[1].headers["Retry-After"] == "1"
+
+    def test_rate_limited_before_decoding(self, client, mock_yolo, admission):
+        """Test that a client over its rate limit is rejected without decoding its upload"""
+        admission.rate_per_second = 0.001
+        admission.burst = 1
+
+        responses = [
+            client.post(
+                "/detect",
+                files={"image": ("broken.jpg", b"not an image", "image/jpeg")},
+                headers={"X-Client-Id": "camera-1"}
+            )
+            for _ in range(2)
+        ]
+
+        assert [response.status_code for response in responses] == [400, 429]
+
+    def test_detect_object_decode_worker_died(self, client, mock_yolo, sample_image_file):
+        """Test that a broken decode pool is reported as unavailable, not as a bad image"""
+        filename, file_content, content_type = sample_image_file
+
+        with patch('main.pipeline.run', AsyncMock(side_effect=BrokenProcessPool("worker died"))):
+            response = client.post("/detect", files={"image": (filename, file_content, content_type)})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        mock_yolo.predict_image.assert_not_called()
+
+    def test_detect_object_cascade_stage(self, client, mock_yolo, sample_image_file):
+        """Test that the cascade flag is forwarded and the serving stage reported"""
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_result.cascade_stage = "small"
+        mock_yolo.predict_image.return_value = mock_result
+
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect/with-confidence",
+            files={"image": (filename, file_content, content_type)},
+            data={"cascade": "false"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["X-Cascade-Stage"] == "small"
+        assert mock_yolo.predict_image.call_args.kwargs["cascade"] is False
+
+    def test_detect_object_with_model_variant(self, client, mock_yolo, sample_image_file):
+        """Test that a request naming a model version is served by the model pool"""
+        mock_result = Mock()
+        mock_result.boxes = None
+        mock_result.model_version = "v0002"
+        mock_result.cascade_stage = None
+        mock_yolo.predict_image.return_value = mock_result
+        mock_yolo.model_version = "v0001"
+        mock_yolo.vocabulary_version = "vocab"
+        pooled_model = Mock()
+        pool = Mock()
+        pool.get.return_value = pooled_model
+
+        filename, file_content, content_type = sample_image_file
+        with patch('main.model_pool', pool):
+            response = client.post(
+                "/detect/with-confidence",
+                files={"image": (filename, file_content, content_type)},
+                data={"model": "v0002"}
+            )
+
+        assert response.status_code == 200
+        assert response.headers["X-Model-Version"] == "v0002"
+        pool.get.assert_called_once_with("v0002", "vocab")
+        kwargs = mock_yolo.predict_image.call_args.kwargs
+        assert kwargs["model"] is pooled_model
+        assert kwargs["model_version"] == "v0002"
+
+    def test_detect_object_with_unknown_model_variant(self, client, mock_yolo, sample_image_file, registry):
+        """Test that an unregistered model version is rejected"""
+        mock_yolo.model_version = "v0001"
+        mock_yolo.vocabulary_version = "vocab"
+
+        filename, file_content, content_type = sample_image_file
+        response = client.post(
+            "/detect",
+            files={"image": (filename, file_content, content_type)},
+            data={"model": "v0042"}
+        )
+
+        assert response.status_code == 404
+        assert "v0042" in response.json()["detail"]
+        mock_yolo.predict_image.assert_not_called()
+
+    def test_get_model_pool(self, client):
+        """Test getting model pool statistics"""
+        response = client.get("/model/pool")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert {"hits", "misses", "evictions", "models", "bytes", "max_bytes"} <= set(data)
+
+    def test_distill_promotes_off_event_loop(self, client, mock_yolo, registry, tmp_path):
+        """Test that a promoted student is swapped in without blocking the event loop"""
+        config_path = tmp_path / "data.yaml"
+        config_path.write_text("names: [cup]\n")
+        best = tmp_path / "best.pt"
+        best.write_bytes(b"weights")
+        mock_yolo.get_current_classes.return_value = ["cup"]
+        mock_yolo.last_best_weights = str(best)
+        mock_yolo.evaluate.return_value = {"map50": 0.5}
+        mock_yolo.vocabulary_version = "vocab"
+        mock_yolo.model_version = "base"
+        mock_yolo.world_model_path = "yolov8s-world.pt"
+        loops = []
+        mock_yolo.load_trained_model.side_effect = lambda *args, **kwargs: loops.append(on_event_loop())
+        dataset = {"config_path": str(config_path), "images": 1, "human_boxes": 1, "pseudo_boxes": 0}
+
+        with patch('main.create_training_config', return_value=str(config_path)), \
+                patch('main.build_distillation_dataset', return_value=dataset), \
+                patch('main.dataset_split') as split:
+            split.snapshot_id.return_value = "snapshot"
+            response = client.post("/training/distill", params={"promote": "true"})
+
+        assert response.status_code == 200
+        assert response.json()["promoted"] is True
+        assert registry.active == "v0001"
+        assert loops == [False]
+
+    def test_incremental_training_keeps_serving_model(self, client, mock_yolo, registry, tmp_path):
+        """Test that an incremental run starts from the previous weights without swapping the served model"""
+        for sub in ("images", "labels"):
+            (tmp_path / sub).mkdir()
+        (tmp_path / "images" / "new.jpg").write_bytes(b"image")
+        (tmp_path / "labels" / "new.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+        best = tmp_path / "best.pt"
+        best.write_bytes(b"weights")
+        mock_yolo.model_path = "served.pt"
+        mock_yolo.last_best_weights = str(best)
+        mock_yolo.get_current_classes.return_value = ["cup"]
+        mock_yolo.vocabulary_version = "vocab"
+        swaps = []
+        mock_yolo.fine_tune_model.side_effect = lambda *args, **kwargs: swaps.append("trained")
+        mock_yolo.swap_model.side_effect = lambda *args, **kwargs: swaps.append(on_event_loop())
+        mock_yolo.load_trained_model.side_effect = lambda *args, **kwargs: swaps.append(on_event_loop())
+
+        with patch('main.TRAINING_DATA_DIR', tmp_path), \
+                patch('main.create_training_config', return_value="data.yaml"), \
+                patch('main.dataset_split') as split, patch('main.training_ledger') as ledger:
+            split.update.return_value = {"train": [tmp_path / "images" / "new.jpg"]}
+            split.snapshot_id.return_value = "snapshot"
+            ledger.seen_samples.return_value = set()
+            ledger.latest_weights.return_value = "previous.pt"
+            response = client.post("/training/start", params={"mode": "incremental", "epochs": 3})
+
+        assert response.status_code == 200
+        mock_yolo.fine_tune_model.assert_called_once_with("data.yaml", epochs=3, base_weights="previous.pt")
+        # Only the successful run's checkpoint is served, once training has finished
+        assert swaps == ["trained", False]
+        assert mock_yolo.swap_model.call_args.kwargs["version"] == "v0001"
+
+    def test_distill_without_classes(self, client, mock_yolo):
+        """Test that distillation needs detection classes"""
+        mock_yolo.get_current_classes.return_value = []
+
+        response = client.post("/training/distill")
+
+        assert response.status_code == 400
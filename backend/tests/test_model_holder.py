@@ -0,0 +1,67 @@
+import pytest
+import os
+import sys
+from unittest.mock import Mock
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.model_holder import ModelHolder
+
+
+class TestModelHolder:
+    """Test class for ModelHolder"""
+
+    def test_acquire_empty_holder(self):
+        """Test that acquiring without a model fails"""
+        holder = ModelHolder()
+
+        with pytest.raises(RuntimeError):
+            with holder.acquire():
+                pass
+
+    def test_acquire_returns_current_model(self):
+        """Test pinning the current model"""
+        model = Mock()
+        holder = ModelHolder(model, tag="v1")
+
+        with holder.acquire() as (pinned, tag):
+            assert pinned is model
+            assert tag == "v1"
+            assert holder.get_stats()["in_flight"] == 1
+        assert holder.get_stats()["in_flight"] == 0
+
+    def test_swap_without_readers_releases_old_model(self):
+        """Test that an idle model is released immediately on swap"""
+        holder = ModelHolder(Mock(), tag="v1")
+
+        holder.swap(Mock(), tag="v2")
+
+        stats = holder.get_stats()
+        assert stats["tag"] == "v2"
+        assert stats["draining"] == []
+
+    def test_in_flight_request_finishes_on_old_model(self):
+        """Test that a swap does not affect requests already running"""
+        old_model, new_model = Mock(), Mock()
+        holder = ModelHolder(old_model, tag="v1")
+
+        with holder.acquire() as (pinned, tag):
+            holder.swap(new_model, tag="v2")
+            assert pinned is old_model
+            assert tag == "v1"
+            assert holder.current is new_model
+            assert holder.get_stats()["draining"] == [{"tag": "v1", "in_flight": 1}]
+
+        assert holder.get_stats()["draining"] == []
+
+    def test_new_requests_use_new_model(self):
+        """Test that requests after a swap see the new model"""
+        holder = ModelHolder(Mock(), tag="v1")
+        new_model = Mock()
+
+        holder.swap(new_model, tag="v2")
+
+        with holder.acquire() as (pinned, tag):
+            assert pinned is new_model
+            assert tag == "v2"
@@ -0,0 +1,136 @@
+import pytest
+import os
+import sys
+import threading
+import time
+from unittest.mock import Mock
+
+import torch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.model_pool import ModelPool, model_nbytes
+
+
+def make_pool(max_bytes=250, sizes=None):
+    """Create a pool whose models are Mocks with a fixed size of 100 bytes each"""
+    loader = Mock(side_effect=lambda model_id: Mock(name=model_id, model_id=model_id))
+    sizes = sizes or {}
+    return ModelPool(loader, max_bytes=max_bytes, sizer=lambda model: sizes.get(model.model_id, 100)), loader
+
+
+class TestModelPool:
+    """Test class for ModelPool"""
+
+    def test_model_nbytes(self):
+        """Test sizing a model from its parameters and buffers"""
+        module = torch.nn.BatchNorm1d(4)  # 8 parameters, 8 running stats and a counter
+        model = Mock(model=module)
+
+        assert model_nbytes(model) == 16 * 4 + 8
+
+    def test_lazy_load_and_hit(self):
+        """Test that a model is loaded once and then served from the pool"""
+        pool, loader = make_pool()
+
+        first = pool.get("v1", "vocab")
+        second = pool.get("v1", "vocab")
+
+        assert first is second
+        loader.assert_called_once_with("v1")
+        stats = pool.get_stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        assert stats["hit_rate"] == 0.5
+        assert stats["bytes"] == 100
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used model is evicted over the budget"""
+        pool, loader = make_pool(max_bytes=250)
+        pool.get("v1", "vocab")
+        pool.get("v2", "vocab")
+        pool.get("v1", "vocab")  # v2 is now the least recently used
+
+        pool.get("v3", "vocab")
+
+        stats = pool.get_stats()
+        assert [m["model_id"] for m in stats["models"]] == ["v3", "v1"]
+        assert stats["evictions"] == 1
+        assert stats["bytes"] <= stats["max_bytes"]
+
+    def test_resident_models_count_against_budget(self):
+        """Test that models held outside the pool count against the budget once"""
+        serving = Mock(model_id="serving")
+        loader = Mock(side_effect=lambda model_id: preloaded if model_id == "v1" else Mock(model_id=model_id))
+        preloaded = Mock(model_id="v1")
+        pool = ModelPool(loader, max_bytes=350, sizer=lambda model: 100, resident=lambda: [serving, preloaded])
+
+        pool.get("v1", "vocab")  # The preloaded model is pooled as is and counted once
+        pool.get("v2", "vocab")
+        assert pool.get_stats()["evictions"] == 0
+
+        pool.get("v3", "vocab")
+
+        stats = pool.get_stats()
+        # Evicting the preloaded model would free nothing
+        assert [m["model_id"] for m in stats["models"]] == ["v3", "v1"]
+        assert stats["resident_bytes"] == 100
+        assert stats["bytes"] + stats["resident_bytes"] <= stats["max_bytes"]
+
+    def test_keeps_model_larger_than_budget(self):
+        """Test that the model just loaded is kept even if it alone exceeds the budget"""
+        pool, loader = make_pool(max_bytes=250, sizes={"big": 400})
+        pool.get("v1", "vocab")
+
+        model = pool.get("big", "vocab")
+
+        assert [m["model_id"] for m in pool.get_stats()["models"]] == ["big"]
+        assert pool.get("big", "vocab") is model
+
+    def test_reload_on_vocabulary_change(self):
+        """Test that a model prepared for another vocabulary is reloaded"""
+        pool, loader = make_pool()
+        pool.get("v1", "vocab-a")
+
+        pool.get("v1", "vocab-b")
+
+        assert loader.call_count == 2
+        assert pool.get_stats()["models"][0]["vocabulary_version"] == "vocab-b"
+
+    def test_unknown_model(self):
+        """Test that loader errors propagate and nothing is pooled"""
+        pool = ModelPool(Mock(side_effect=KeyError("Unknown model version: v9")), max_bytes=100)
+
+        with pytest.raises(KeyError):
+            pool.get("v9", "vocab")
+        assert pool.get_stats()["models"] == []
+        assert pool._loading == {}
+
+    def test_concurrent_requests_load_once(self):
+        """Test that concurrent requests for the same model wait for a single load"""
+        def slow_loader(model_id):
+            time.sleep(0.05)
+            return Mock(model_id=model_id)
+
+        loader = Mock(side_effect=slow_loader)
+        pool = ModelPool(loader, max_bytes=1000, sizer=lambda model: 100)
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(pool.get("v1", "vocab"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        loader.assert_called_once()
+        assert all(model is models[0] for model in models)
+        assert pool._loading == {}
+
+    def test_evict(self):
+        """Test dropping a model explicitly"""
+        pool, loader = make_pool()
+        pool.get("v1", "vocab")
+
+        pool.evict("v1")
+        pool.evict("unknown")
+
+        assert pool.get_stats()["models"] == []
@@ -0,0 +1,129 @@
+import pytest
+import json
+import os
+import sys
+from unittest.mock import Mock
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.model_registry import ModelRegistry
+
+
+class TestModelRegistry:
+    """Test class for ModelRegistry"""
+
+    @pytest.fixture
+    def weights(self, tmp_path):
+        """Create a fake checkpoint file"""
+        path = tmp_path / "best.pt"
+        path.write_bytes(b"x" * 100)
+        return path
+
+    @pytest.fixture
+    def registry(self, tmp_path):
+        return ModelRegistry(tmp_path / "registry", keep_last=1)
+
+    def test_register_copies_checkpoint(self, registry, weights):
+        """Test registering a checkpoint with its metadata"""
+        entry = registry.register(weights, metrics={"fitness": 0.5}, dataset_snapshot="abc",
+                                  vocabulary=["rice", "miso soup"])
+
+        assert entry["version"] == "v0001"
+        assert os.path.exists(entry["weights"])
+        assert entry["metrics"] == {"fitness": 0.5}
+        assert entry["dataset_snapshot"] == "abc"
+        assert entry["vocabulary"] == ["miso soup", "rice"]
+
+    def test_registry_persists(self, tmp_path, registry, weights):
+        """Test that versions and the active version survive a reload"""
+        registry.register(weights)
+        registry.promote("v0001")
+
+        reloaded = ModelRegistry(tmp_path / "registry")
+        assert reloaded.active == "v0001"
+        assert [e["version"] for e in reloaded.versions] == ["v0001"]
+
+    def test_get_unknown_version(self, registry):
+        """Test looking up a version that does not exist"""
+        with pytest.raises(KeyError):
+            registry.get("v0042")
+
+    def test_rollback(self, registry, weights):
+        """Test walking back through promoted versions"""
+        for _ in range(3):
+            registry.register(weights)
+        registry.promote("v0001")
+        registry.promote("v0002")
+        registry.promote("v0003")
+
+        assert registry.rollback()["version"] == "v0002"
+        assert registry.active == "v0002"
+        assert registry.rollback()["version"] == "v0001"
+        with pytest.raises(ValueError):
+            registry.rollback()
+
+    def test_prune_keeps_active_and_newest(self, registry, weights):
+        """Test that pruning never deletes the active or newest versions"""
+        for _ in range(4):
+            registry.register(weights)
+        registry.promote("v0001")
+
+        removed = registry.prune(max_bytes=200)
+
+        assert removed == ["v0002", "v0003"]
+        assert [e["version"] for e in registry.versions] == ["v0001", "v0004"]
+        assert registry.total_bytes() == 200
+
+    def test_prune_without_quota(self, registry, weights):
+        """Test that pruning without a quota does nothing"""
+        registry.register(weights)
+
+        assert registry.prune() == []
+
+    def test_preload_newest_versions(self, registry, weights):
+        """Test keeping the newest versions loaded for instant switching"""
+        for _ in range(3):
+            registry.register(weights)
+        loader = Mock(side_effect=lambda path: f"model:{path}")
+
+        registry.preload(loader, "vocab1", k=2)
+        registry.preload(loader, "vocab1", k=2)
+
+        assert loader.call_count == 2
+        assert registry.get_preloaded("v0001", "vocab1") is None
+        assert registry.get_preloaded("v0003", "vocab1") == f"model:{registry.get('v0003')['weights']}"
+        assert sorted(registry.preloaded_models()) == sorted(f"model:{registry.get(v)['weights']}"
+                                                             for v in ("v0002", "v0003"))
+
+    def test_preloaded_model_invalidated_by_vocabulary(self, registry, weights):
+        """Test that a model prepared for another vocabulary is not reused"""
+        registry.register(weights)
+        registry.preload(Mock(return_value="model"), "vocab1", k=1)
+
+        assert registry.get_preloaded("v0001", "vocab2") is None
+        assert registry.list_versions()[0]["preloaded"] is True
+
+    def test_preload_closed_set_version(self, registry, weights):
+        """Test that closed-set entries are loaded as closed-set models"""
+        registry.register(weights)
+        registry.register(weights, backend="closed_set", extra={"teacher_weights": "world.pt"})
+        loader = Mock(return_value="model")
+
+        registry.preload(loader, "vocab1", k=2)
+
+        assert registry.get("v0001")["backend"] == "world"
+        assert registry.get("v0002")["teacher_weights"] == "world.pt"
+        loader.assert_any_call(registry.get("v0001")["weights"])
+        loader.assert_any_call(registry.get("v0002")["weights"], closed_set=True)
+
+    def test_invalid_index_file(self, tmp_path, capsys):
+        """Test loading a corrupted registry index"""
+        root = tmp_path / "registry"
+        root.mkdir()
+        (root / "registry.json").write_text("not json")
+
+        registry = ModelRegistry(root)
+
+        assert registry.versions == []
+        assert "Warning: Could not read" in capsys.readouterr().out
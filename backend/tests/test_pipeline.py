@@ -0,0 +1,124 @@
+import pytest
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import BrokenExecutor
+from PIL import Image
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.pipeline import Stage, StagedPipeline
+
+
+def loaded_modules(*names):
+    """Which of the modules are loaded in the calling process"""
+    return [name for name in names if name in sys.modules]
+
+
+class TestStagedPipeline:
+    """Test class for StagedPipeline"""
+
+    def test_runs_on_stage_executor(self):
+        """Test that work runs on the stage's own threads"""
+        pipeline = StagedPipeline([Stage("infer", 1)])
+
+        name = asyncio.run(pipeline.run("infer", lambda: threading.current_thread().name))
+
+        assert name.startswith("infer-stage")
+        assert pipeline.get_stats()["infer"]["completed"] == 1
+        pipeline.shutdown()
+
+    def test_process_stage(self):
+        """Test that a process stage runs module-level functions in worker processes"""
+        pipeline = StagedPipeline([Stage("decode", 1, processes=True)])
+        pipeline.start()
+
+        pid = asyncio.run(pipeline.run("decode", os.getpid))
+
+        assert pid != os.getpid()
+        assert pipeline.get_stats()["decode"]["executor"] == "process"
+        pipeline.shutdown()
+
+    def test_bounded_in_flight(self):
+        """Test that callers wait in front of a saturated stage"""
+        stage = Stage("annotate", 1, max_in_flight=2)
+        pipeline = StagedPipeline([stage])
+        peak = []
+
+        def work():
+            peak.append(stage.get_stats()["in_flight"])
+            time.sleep(0.02)
+
+        async def main():
+            tasks = [asyncio.create_task(pipeline.run("annotate", work)) for _ in range(5)]
+            await asyncio.sleep(0.005)
+            waiting = stage.get_stats()["waiting"]
+            await asyncio.gather(*tasks)
+            return waiting
+
+        waiting = asyncio.run(main())
+
+        assert waiting == 3
+        assert max(peak) <= 2
+        stats = pipeline.get_stats()["annotate"]
+        assert (stats["completed"], stats["in_flight"], stats["waiting"]) == (5, 0, 0)
+        pipeline.shutdown()
+
+    def test_stages_overlap(self):
+        """Test that work of different stages runs at the same time"""
+        pipeline = StagedPipeline([Stage("decode", 1), Stage("infer", 1)])
+
+        async def main():
+            start = time.perf_counter()
+            await asyncio.gather(pipeline.run("decode", time.sleep, 0.1), pipeline.run("infer", time.sleep, 0.1))
+            return time.perf_counter() - start
+
+        assert asyncio.run(main()) < 0.18
+        pipeline.shutdown()
+
+    def test_failure(self):
+        """Test that exceptions propagate and free the stage"""
+        pipeline = StagedPipeline([Stage("decode", 1)])
+
+        with pytest.raises(ValueError):
+            asyncio.run(pipeline.run("decode", int, "not a number"))
+
+        stats = pipeline.get_stats()["decode"]
+        assert (stats["failed"], stats["in_flight"]) == (1, 0)
+        assert stats["mean_ms"] is not None
+        pipeline.shutdown()
+
+    def test_process_workers_stay_light(self):
+        """Test that process workers import neither torch nor the detector to run ingest code"""
+        from yolo.ingest import decode_image
+        pipeline = StagedPipeline([Stage("decode", 1, processes=True)])
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48)).save(buffer, format="PNG")
+
+        async def main():
+            decoded = await pipeline.run("decode", decode_image, buffer.getvalue(), target_size=32)
+            return decoded, await pipeline.run("decode", loaded_modules, "torch", "ultralytics", "yolo.object_detection")
+
+        decoded, loaded = asyncio.run(main())
+
+        assert decoded.original_size == (64, 48)
+        assert loaded == []
+        pipeline.shutdown()
+
+    def test_broken_process_pool_is_replaced(self):
+        """Test that a dead worker fails the request in flight and the stage recovers"""
+        pipeline = StagedPipeline([Stage("decode", 1, processes=True)])
+
+        async def main():
+            with pytest.raises(BrokenExecutor):
+                await pipeline.run("decode", os._exit, 1)
+            return await pipeline.run("decode", int, "7")
+
+        assert asyncio.run(main()) == 7
+        stats = pipeline.get_stats()["decode"]
+        assert (stats["restarts"], stats["failed"], stats["completed"]) == (1, 1, 1)
+        pipeline.shutdown()
@@ -0,0 +1,89 @@
+import pytest
+import os
+import sys
+
+import numpy as np
+import torch
+from PIL import Image
+from ultralytics.engine.results import Results
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.preprocess import PAD_VALUE, InputBufferPool, letterbox_into, letterbox_shape
+
+
+class TestLetterbox:
+    """Test class for the fused letterbox path"""
+
+    def test_letterbox_shape(self):
+        """Test that only the short side is padded, to a multiple of 32"""
+        assert letterbox_shape(1280, 960, 640) == (480, 640)
+        assert letterbox_shape(1000, 300, 640) == (192, 640)
+        assert letterbox_shape(640, 640, 640) == (640, 640)
+
+    def test_letterbox_into(self):
+        """Test scaling, padding and normalization into the buffer"""
+        image = Image.new('RGB', (200, 100), color=(255, 0, 51))
+        out = torch.full((3, 64, 64), -1.0)
+
+        placement = letterbox_into(image, out)
+
+        assert placement.ratio == pytest.approx(0.32)
+        assert (placement.left, placement.top) == (0, 16)
+        assert out[:, 16:48, :].mean(dim=(1, 2)).tolist() == pytest.approx([1.0, 0.0, 0.2])
+        assert float(out[:, :16].min()) == pytest.approx(PAD_VALUE)
+        assert float(out[:, 48:].max()) == pytest.approx(PAD_VALUE)
+
+    def test_letterbox_strided_array(self):
+        """Test copying a tile view of a larger array without resizing"""
+        pixels = np.zeros((100, 100, 3), dtype=np.uint8)
+        pixels[10:42, 20:52] = 255
+        out = torch.empty((3, 32, 32))
+
+        placement = letterbox_into(pixels[10:42, 20:52], out)
+
+        assert placement.ratio == 1.0
+        assert float(out.min()) == 1.0
+
+    def test_restore(self):
+        """Test mapping boxes back to source coordinates"""
+        out = torch.empty((3, 64, 64))
+        placement = letterbox_into(Image.new('RGB', (200, 100)), out)
+        result = Results(np.zeros((64, 64, 3), dtype=np.uint8), path="", names={0: "cup"},
+                         boxes=torch.tensor([[0.0, 16.0, 32.0, 64.0, 0.9, 0.0]]))
+
+        placement.restore(result)
+
+        assert result.orig_shape == (100, 200)
+        assert result.boxes.xyxy.tolist() == [pytest.approx([0.0, 0.0, 100.0, 100.0])]
+
+
+class TestInputBufferPool:
+    """Test class for InputBufferPool"""
+
+    def test_reuse(self):
+        """Test that released buffers are handed out again"""
+        pool = InputBufferPool()
+
+        with pool.acquire(1, 64, 64) as first:
+            pass
+        with pool.acquire(1, 64, 64) as second:
+            assert second is first
+            with pool.acquire(1, 64, 64) as third:
+                assert third is not first
+
+        stats = pool.get_stats()
+        assert stats["allocated"] == 2
+        assert stats["reused"] == 1
+        assert stats["pooled_bytes"] == 2 * 3 * 64 * 64 * 4
+
+    def test_bounded(self):
+        """Test that the pool keeps a bounded number of shapes"""
+        pool = InputBufferPool(max_buffers_per_shape=1, max_shapes=2)
+
+        for size in (32, 64, 96):
+            with pool.acquire(1, size, size) as buffer:
+                assert tuple(buffer.shape) == (1, 3, size, size)
+
+        assert pool.get_stats()["shapes"] == [[1, 64, 64], [1, 96, 96]]
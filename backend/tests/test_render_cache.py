@@ -0,0 +1,91 @@
+import pytest
+import os
+import sys
+import time
+from unittest.mock import patch
+
+from PIL import Image
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.render_cache import RenderCache
+
+
+DETECTIONS = [{"class": "cup", "confidence": 0.9, "bbox": [10, 20, 30, 40]}]
+
+
+class TestRenderCache:
+    """Test class for RenderCache"""
+
+    def test_put_and_get(self, tmp_path):
+        """Test that an entry returns the same pixels and detections"""
+        cache = RenderCache(tmp_path, max_bytes=1024 * 1024)
+        image = Image.new('RGB', (40, 30), color=(200, 10, 10))
+
+        render_id = cache.put(image, DETECTIONS)
+        loaded, detections = cache.get(render_id)
+
+        assert loaded.size == (40, 30)
+        assert loaded.getpixel((0, 0)) == (200, 10, 10)
+        assert detections == DETECTIONS
+        assert 0 < cache.expires_in(render_id) <= 300
+        assert (cache.get_stats()["stored"], cache.get_stats()["hits"]) == (1, 1)
+
+    def test_large_images_downscaled(self, tmp_path):
+        """Test that images over max_side are stored downscaled together with their boxes"""
+        cache = RenderCache(tmp_path, max_bytes=64 * 1024 * 1024, max_side=100)
+
+        loaded, detections = cache.get(cache.put(Image.new('RGB', (400, 300)), DETECTIONS))
+
+        assert loaded.size == (100, 75)
+        assert detections[0]["bbox"] == [2.5, 5.0, 7.5, 10.0]
+        assert detections[0]["class"] == "cup"
+
+    def test_write_error_leaves_nothing(self, tmp_path):
+        """Test that a failed write (e.g. a full /dev/shm) raises and removes the partial entry"""
+        cache = RenderCache(tmp_path, max_bytes=1024 * 1024)
+
+        with patch('yolo.render_cache.np.save', side_effect=OSError(28, "No space left on device")):
+            with pytest.raises(OSError):
+                cache.put(Image.new('RGB', (10, 10)), DETECTIONS)
+
+        assert not list(tmp_path.iterdir())
+        assert (cache.get_stats()["failed"], cache.get_stats()["entries"]) == (1, 0)
+
+    def test_invalid_ids(self, tmp_path):
+        """Test that ids which cannot be render ids never touch the file system"""
+        cache = RenderCache(tmp_path, max_bytes=1024 * 1024)
+        (tmp_path.parent / "secret.npy").write_bytes(b"x")
+
+        for render_id in ("../secret", "unknown", "a" * 22):
+            assert cache.get(render_id) is None
+        assert cache.get_stats()["misses"] == 3
+
+    def test_expiry(self, tmp_path):
+        """Test that entries disappear after their lifetime"""
+        cache = RenderCache(tmp_path, max_bytes=1024 * 1024, ttl_seconds=0.05)
+        render_id = cache.put(Image.new('RGB', (10, 10)), [])
+
+        time.sleep(0.1)
+        assert cache.expires_in(render_id) is None
+        assert cache.get(render_id) is None
+        assert not list(tmp_path.iterdir())
+
+    def test_budget_evicts_oldest(self, tmp_path):
+        """Test that the oldest entries are deleted when the entries exceed the budget"""
+        cache = RenderCache(tmp_path, max_bytes=2 * 100 * 100 * 3 + 1024)
+        ids = []
+        for _ in range(3):
+            ids.append(cache.put(Image.new('RGB', (100, 100)), []))
+            time.sleep(0.01)
+
+        assert cache.get(ids[0]) is None
+        assert cache.get(ids[1]) is not None and cache.get(ids[2]) is not None
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_shared_between_instances(self, tmp_path):
+        """Test that an entry stored by one worker process can be read by another"""
+        render_id = RenderCache(tmp_path, max_bytes=1024 * 1024).put(Image.new('RGB', (10, 10)), DETECTIONS)
+
+        assert RenderCache(tmp_path, max_bytes=1024 * 1024).get(render_id)[1] == DETECTIONS
@@ -0,0 +1,268 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import router
+from router import BackendPool
+
+
+def ready(model_version="v1", vocabulary_version="vocab-a"):
+    """Health check body of a ready backend"""
+    return {"status": "ok", "ready": True, "model_version": model_version, "vocabulary_version": vocabulary_version}
+
+
+class TestBackendPool:
+    """Test class for backend selection"""
+
+    @pytest.fixture
+    def pool(self):
+        pool = BackendPool(["http://a", "http://b", "http://c"], fail_threshold=2)
+        for backend in pool.backends:
+            pool.update_health(backend, ready())
+        return pool
+
+    def test_requires_backends(self):
+        """Test that an empty pool is rejected"""
+        with pytest.raises(ValueError):
+            BackendPool([])
+
+    def test_least_outstanding(self, pool):
+        """Test that the backend with the fewest outstanding requests is chosen"""
+        a, b, c = pool.backends
+        a.outstanding, b.outstanding, c.outstanding = 3, 1, 2
+
+        assert pool.choose() is b
+
+    def test_ties_rotate(self, pool):
+        """Test that idle backends take turns"""
+        chosen = []
+        for _ in range(3):
+            backend = pool.choose()
+            backend.requests += 1
+            chosen.append(backend.url)
+
+        assert sorted(chosen) == ["http://a", "http://b", "http://c"]
+
+    def test_vocabulary_affinity(self, pool):
+        """Test that a busier backend serving the requested vocabulary wins"""
+        a, b, c = pool.backends
+        pool.update_health(c, ready(vocabulary_version="vocab-b"))
+        c.outstanding = 5
+
+        assert pool.choose(vocabulary_version="vocab-b") is c
+        assert pool.choose(vocabulary_version="vocab-unknown") in (a, b)
+
+    def test_model_version_affinity(self, pool):
+        """Test that the requested model version is preferred"""
+        pool.update_health(pool.backends[1], ready(model_version="v2"))
+
+        assert pool.choose(model_version="v2") is pool.backends[1]
+
+    def test_ready_preferred(self, pool):
+        """Test that backends without detection classes are used last"""
+        a, b, c = pool.backends
+        pool.update_health(a, dict(ready(), ready=False))
+        b.outstanding = c.outstanding = 10
+
+        assert pool.choose() in (b, c)
+
+    def test_failed_health_checks(self, pool):
+        """Test that a backend leaves rotation after consecutive failed checks and comes back"""
+        a = pool.backends[0]
+
+        pool.update_health(a, None)
+        assert a.healthy  # One failure is tolerated
+        pool.update_health(a, None)
+        assert not a.healthy
+        assert pool.choose(exclude=pool.backends[1:]) is None
+
+        pool.update_health(a, ready())
+        assert a.healthy
+
+    def test_mark_unreachable(self, pool):
+        """Test that an unreachable backend is skipped at once"""
+        a = pool.backends[0]
+        pool.mark_unreachable(a)
+
+        assert not a.healthy
+        assert a.errors == 1
+        assert pool.get_stats()["healthy"] == 2
+
+
+class TestRenderRoutes:
+    """Test class for the processed image routes"""
+
+    def test_routes_expire(self):
+        """Test that routes are dropped with the backends' image links"""
+        routes = router.RenderRoutes(ttl_seconds=300)
+        backend = router.Backend("http://a")
+
+        with patch("router.time.monotonic", return_value=1000.0):
+            routes.add("abc", backend)
+            assert routes.get("abc") is backend
+        with patch("router.time.monotonic", return_value=1300.0):
+            assert routes.get("abc") is None
+        assert len(routes) == 0
+
+    def test_oldest_routes_dropped(self):
+        """Test that the number of routes is bounded"""
+        routes = router.RenderRoutes(ttl_seconds=300, max_entries=2)
+        backend = router.Backend("http://a")
+
+        for render_id in ("a", "b", "c"):
+            routes.add(render_id, backend)
+
+        assert routes.get("a") is None
+        assert routes.get("c") is backend
+
+
+class TestRouterAPI:
+    """Test class for the router endpoints with in-process backends"""
+
+    @pytest.fixture
+    def backends(self):
+        """Per-backend health bodies and detection status codes"""
+        return {
+            "http://a": {"health": ready(), "status": 200, "calls": []},
+            "http://b": {"health": ready(vocabulary_version="vocab-b"), "status": 200, "calls": []},
+        }
+
+    @pytest.fixture
+    def client(self, backends):
+        def handler(request: httpx.Request) -> httpx.Response:
+            backend = backends[f"{request.url.scheme}://{request.url.host}"]
+            if backend["status"] is None:
+                raise httpx.ConnectError("Connection refused", request=request)
+            if request.url.path == "/health":
+                return httpx.Response(200, json=backend["health"])
+            if request.url.path.startswith("/detect/renders/"):
+                backend["calls"].append(request)
+                return httpx.Response(200, content=b"image", headers={"Content-Type": "image/jpeg", "ETag": '"r"'})
+            backend["calls"].append(request)
+            return httpx.Response(
+                backend["status"],
+                json={"success": True},
+                headers={"X-Vocabulary-Version": backend["health"]["vocabulary_version"], **backend.get("headers", {})}
+            )
+
+        pool = BackendPool(list(backends), fail_threshold=2)
+        with patch("router.pool", pool), patch("router.render_routes", router.RenderRoutes(ttl_seconds=300)), \
+             patch("router.create_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))), \
+             patch("router.HEALTH_CHECK_INTERVAL", 3600):
+            with TestClient(router.app) as client:
+                yield client
+
+    def test_detect_is_forwarded(self, client, backends):
+        """Test that the upload and admission headers reach a backend"""
+        response = client.post(
+            "/detect/with-confidence",
+            files={"image": ("test.jpg", b"jpeg", "image/jpeg")},
+            data={"confidence": "0.5"},
+            headers={"X-Priority": "batch", "X-Request-Timeout-Ms": "5000"}
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"success": True}
+        calls = backends[response.headers["X-Backend"]]["calls"]
+        assert calls[0].url.path == "/detect/with-confidence"
+        assert calls[0].headers["x-priority"] == "batch"
+        assert 0 < float(calls[0].headers["x-request-timeout-ms"]) <= 5000
+        assert calls[0].headers["x-client-id"] == "testclient"  # Rate limits stay per client
+        assert b"jpeg" in calls[0].content
+
+    def test_vocabulary_affinity(self, client):
+        """Test that the requested vocabulary version selects the backend"""
+        response = client.post(
+            "/detect",
+            files={"image": ("test.jpg", b"jpeg", "image/jpeg")},
+            headers={"X-Vocabulary-Version": "vocab-b"}
+        )
+
+        assert response.headers["X-Backend"] == "http://b"
+        assert response.headers["X-Vocabulary-Version"] == "vocab-b"
+
+    def test_served_versions_from_health_checks(self, client, backends):
+        """Test that the version of a requested model variant does not become the backend's served version"""
+        backends["http://a"]["headers"] = {"X-Model-Version": "v0001"}
+        backends["http://b"]["headers"] = {"X-Model-Version": "v0001"}
+
+        response = client.post("/detect", files={"image": ("test.jpg", b"jpeg", "image/jpeg")},
+                               data={"model": "v0001"})
+
+        assert response.headers["X-Model-Version"] == "v0001"
+        served = {b["url"]: b["model_version"] for b in client.get("/router/backends").json()["backends"]}
+        assert served == {"http://a": "v1", "http://b": "v1"}
+
+    def test_request_size_limit(self, client, backends):
+        """Test that oversized uploads are rejected before they are buffered and forwarded"""
+        with patch("router.MAX_REQUEST_BYTES", 1024):
+            response = client.post("/detect", files={"image": ("test.jpg", b"x" * 4096, "image/jpeg")})
+
+        assert response.status_code == 413
+        assert all(not backend["calls"] for backend in backends.values())
+
+    def test_render_routed_to_detecting_backend(self, client, backends):
+        """Test that a processed image link is fetched from the backend that stored the image"""
+        backends["http://b"]["headers"] = {"X-Render-Id": "abc"}
+        detected = client.post("/detect", files={"image": ("test.jpg", b"jpeg", "image/jpeg")},
+                               headers={"X-Vocabulary-Version": "vocab-b"})
+        assert detected.headers["X-Backend"] == "http://b"
+
+        response = client.get("/detect/renders/abc", params={"size": 320}, headers={"If-None-Match": '"r"'})
+
+        assert response.status_code == 200
+        assert response.content == b"image"
+        assert response.headers["X-Backend"] == "http://b"
+        call = backends["http://b"]["calls"][-1]
+        assert call.url.path == "/detect/renders/abc"
+        assert call.url.params["size"] == "320"
+        assert call.headers["if-none-match"] == '"r"'
+        assert not backends["http://a"]["calls"]
+
+    def test_render_unknown(self, client, backends):
+        """Test that an image link the router has not seen is not found"""
+        response = client.get("/detect/renders/unknown")
+
+        assert response.status_code == 404
+        assert all(not backend["calls"] for backend in backends.values())
+
+    def test_retry_on_unreachable_backend(self, client, backends):
+        """Test that a request is retried on another backend when one is down"""
+        backends["http://b"]["status"] = None
+
+        response = client.post(
+            "/detect",
+            files={"image": ("test.jpg", b"jpeg", "image/jpeg")},
+            headers={"X-Vocabulary-Version": "vocab-b"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["X-Backend"] == "http://a"
+        backends_status = {b["url"]: b for b in client.get("/router/backends").json()["backends"]}
+        assert backends_status["http://b"]["healthy"] is False
+
+    def test_retry_on_overloaded_backend(self, client, backends):
+        """Test that a shed request is retried on another backend"""
+        backends["http://a"]["status"] = 503
+
+        response = client.post("/detect", files={"image": ("test.jpg", b"jpeg", "image/jpeg")})
+
+        assert response.status_code == 200
+        assert response.headers["X-Backend"] == "http://b"
+
+    def test_no_healthy_backends(self, client, backends):
+        """Test that the router answers 503 when every backend is down"""
+        for backend in backends.values():
+            backend["status"] = None
+
+        response = client.post("/detect", files={"image": ("test.jpg", b"jpeg", "image/jpeg")})
+
+        assert response.status_code == 503
+        assert client.get("/health").status_code == 503
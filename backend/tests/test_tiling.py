@@ -0,0 +1,74 @@
+import pytest
+import os
+import sys
+
+import torch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.tiling import make_tiles, merge_tile_detections
+
+
+class TestMakeTiles:
+    """Test class for make_tiles"""
+
+    def test_small_image_single_tile(self):
+        """Test that an image smaller than a tile is one tile"""
+        assert make_tiles(500, 300, tile_size=640) == [(0, 0, 500, 300)]
+
+    def test_tiles_cover_image_with_overlap(self):
+        """Test that tiles overlap and reach the image borders"""
+        tiles = make_tiles(1500, 700, tile_size=640, overlap=0.2)
+
+        xs = sorted({t[0] for t in tiles})
+        ys = sorted({t[1] for t in tiles})
+        assert xs == [0, 430, 860]
+        assert ys == [0, 60]
+        assert all(x2 - x1 == 640 and y2 - y1 == 640 for x1, y1, x2, y2 in tiles)
+        assert max(t[2] for t in tiles) == 1500
+        assert max(t[3] for t in tiles) == 700
+
+    def test_tile_count(self):
+        """Test the number of tiles for a large photo"""
+        assert len(make_tiles(2560, 1920, tile_size=640, overlap=0.2)) == 5 * 4
+
+
+class TestMergeTileDetections:
+    """Test class for merge_tile_detections"""
+
+    def test_offsets_applied(self):
+        """Test that tile detections are shifted to image coordinates"""
+        boxes = torch.tensor([[10.0, 20.0, 30.0, 40.0, 0.9, 1.0]])
+
+        merged = merge_tile_detections([boxes], [(100, 200)])
+
+        assert merged.tolist() == [pytest.approx([110.0, 220.0, 130.0, 240.0, 0.9, 1.0])]
+        assert boxes[0, 0] == 10.0  # Input is not modified
+
+    def test_duplicates_across_tiles_merged(self):
+        """Test that the same object seen by two tiles is kept once"""
+        left = torch.tensor([[500.0, 100.0, 600.0, 200.0, 0.8, 0.0]])
+        right = torch.tensor([[-10.0, 100.0, 90.0, 200.0, 0.9, 0.0]])
+
+        merged = merge_tile_detections([left, right], [(0, 0), (510, 0)])
+
+        assert len(merged) == 1
+        assert merged[0, 4].item() == pytest.approx(0.9)
+
+    def test_different_classes_not_merged(self):
+        """Test that overlapping boxes of different classes are both kept"""
+        boxes = torch.tensor([
+            [0.0, 0.0, 100.0, 100.0, 0.9, 0.0],
+            [0.0, 0.0, 100.0, 100.0, 0.8, 1.0],
+        ])
+
+        merged = merge_tile_detections([boxes], [(0, 0)])
+
+        assert len(merged) == 2
+
+    def test_no_detections(self):
+        """Test merging when no tile found anything"""
+        merged = merge_tile_detections([None, torch.zeros((0, 6))], [(0, 0), (10, 10)])
+
+        assert merged.shape == (0, 6)
@@ -0,0 +1,88 @@
+import pytest
+import os
+import sys
+
+import torch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.training_budget import benchmark_training_step, plan_training
+
+
+def fake_benchmark(seconds_at_640, batch_speedup=None):
+    """Benchmark whose cost scales with the image area"""
+    batch_speedup = batch_speedup or {}
+
+    def benchmark(imgsz, batch):
+        return seconds_at_640 * (imgsz / 640) ** 2 * batch_speedup.get(batch, 1.0)
+    return benchmark
+
+
+class TestPlanTraining:
+    """Test class for plan_training"""
+
+    def test_keeps_full_resolution_when_budget_allows(self):
+        """Test that the largest image size is used when it fits"""
+        plan = plan_training(fake_benchmark(0.1), n_train=100, n_val=20, budget_seconds=600)
+
+        assert plan["imgsz"] == 640
+        assert plan["epochs"] >= 3
+
+    def test_steps_down_resolution_for_tight_budget(self):
+        """Test that smaller images are used when full resolution does not fit"""
+        plan = plan_training(fake_benchmark(1.0), n_train=100, n_val=0, budget_seconds=200)
+
+        assert plan["imgsz"] < 640
+        assert plan["epochs"] >= 3
+
+    def test_picks_fastest_batch(self):
+        """Test that the batch size with the best throughput is chosen"""
+        benchmark = fake_benchmark(0.1, batch_speedup={16: 1.0, 8: 0.7, 4: 0.9})
+
+        plan = plan_training(benchmark, n_train=100, n_val=20, budget_seconds=600)
+
+        assert plan["batch"] == 8
+
+    def test_batch_not_larger_than_dataset(self):
+        """Test that the batch size is capped by the number of images"""
+        plan = plan_training(fake_benchmark(0.1), n_train=3, n_val=1, budget_seconds=600)
+
+        assert plan["batch"] == 3
+
+    def test_epochs_capped(self):
+        """Test that a huge budget does not plan unbounded epochs"""
+        plan = plan_training(fake_benchmark(0.001), n_train=10, n_val=2, budget_seconds=10 ** 6, max_epochs=50)
+
+        assert plan["epochs"] == 50
+
+    def test_at_least_one_epoch(self):
+        """Test that an impossible budget still plans a single epoch"""
+        plan = plan_training(fake_benchmark(10.0), n_train=1000, n_val=0, budget_seconds=60)
+
+        assert plan["imgsz"] == 320
+        assert plan["epochs"] == 1
+        assert plan["remaining_seconds"] <= 60
+
+
+class TestBenchmarkTrainingStep:
+    """Test class for benchmark_training_step"""
+
+    def test_returns_seconds_per_image(self):
+        """Test benchmarking a small network"""
+        module = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.ReLU())
+
+        seconds = benchmark_training_step(module, imgsz=32, batch=2, iterations=1)
+
+        assert seconds > 0
+
+    def test_does_not_modify_module(self):
+        """Test that the benchmark trains a copy of the network"""
+        module = torch.nn.Conv2d(3, 4, 3).eval()
+        before = module.weight.detach().clone()
+
+        benchmark_training_step(module, imgsz=32, batch=2, iterations=1)
+
+        assert not module.training
+        assert module.weight.grad is None
+        assert torch.equal(module.weight, before)
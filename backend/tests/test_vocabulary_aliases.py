@@ -0,0 +1,118 @@
+import pytest
+import json
+import os
+import sys
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.vocabulary_aliases import AliasMap, find_duplicate_classes, find_duplicates_of
+
+
+class TestFindDuplicateClasses:
+    """Test class for find_duplicate_classes"""
+
+    def test_groups_similar_classes(self):
+        """Test that similar classes are grouped under the first one"""
+        names = ["backpack", "person", "backpak", "rucksack"]
+        embeddings = np.array([[1.0, 0.0], [0.0, 1.0], [0.99, 0.1], [0.95, 0.3]])
+
+        groups = find_duplicate_classes(names, embeddings, threshold=0.9)
+
+        assert len(groups) == 1
+        assert groups[0]["canonical"] == "backpack"
+        assert groups[0]["aliases"] == ["backpak", "rucksack"]
+        assert all(score >= 0.9 for score in groups[0]["similarity"])
+
+    def test_no_chaining(self):
+        """Test that a class similar only to an alias is not pulled into the group"""
+        angles = np.radians([0, 20, 40])
+        embeddings = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+        groups = find_duplicate_classes(["a", "b", "c"], embeddings, threshold=np.cos(np.radians(25)))
+
+        assert [(g["canonical"], g["aliases"]) for g in groups] == [("a", ["b"])]
+
+    def test_no_duplicates(self):
+        """Test that distinct or too few classes give no groups"""
+        assert find_duplicate_classes(["a", "b"], np.eye(2), threshold=0.9) == []
+        assert find_duplicate_classes(["a"], np.ones((1, 2)), threshold=0.9) == []
+
+
+class TestFindDuplicatesOf:
+    """Test class for find_duplicates_of"""
+
+    def test_only_new_classes_are_merged(self):
+        """Test that new classes join an earlier class and existing duplicates are left alone"""
+        names = ["backpack", "backpak", "person", "rucksack", "dog"]
+        embeddings = np.array([[1.0, 0.0], [0.99, 0.1], [0.0, 1.0], [0.95, 0.3], [0.1, 0.99]])
+
+        groups = find_duplicates_of(names, embeddings, ["rucksack", "dog"], threshold=0.9)
+
+        assert [(g["canonical"], g["aliases"]) for g in groups] == [("backpack", ["rucksack"]), ("person", ["dog"])]
+        assert all(score >= 0.9 for g in groups for score in g["similarity"])
+
+    def test_matches_full_search(self):
+        """Test that the groups agree with find_duplicate_classes for the new classes"""
+        angles = np.radians([0, 20, 40, 90])
+        embeddings = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        threshold = np.cos(np.radians(25))
+
+        groups = find_duplicates_of(["a", "b", "c", "d"], embeddings, ["b", "c"], threshold=threshold)
+
+        assert groups == find_duplicate_classes(["a", "b", "c", "d"], embeddings, threshold=threshold)
+
+    def test_no_new_classes(self):
+        """Test that unknown or no new classes give no groups"""
+        assert find_duplicates_of(["a", "b"], np.ones((2, 2)), [], threshold=0.9) == []
+        assert find_duplicates_of(["a", "b"], np.ones((2, 2)), ["z"], threshold=0.9) == []
+
+
+class TestAliasMap:
+    """Test class for AliasMap"""
+
+    def test_canonical(self, tmp_path):
+        """Test resolving aliases and unknown names"""
+        aliases = AliasMap(tmp_path / "aliases.json")
+        aliases.add(["backpak", "rucksack"], "backpack")
+
+        assert aliases.canonical("backpak") == "backpack"
+        assert aliases.canonical("person") == "person"
+        assert "rucksack" in aliases
+        assert len(aliases) == 2
+
+    def test_repoints_existing_aliases(self, tmp_path):
+        """Test that merging a canonical class moves its aliases along"""
+        aliases = AliasMap(tmp_path / "aliases.json")
+        aliases.add(["backpak"], "backpack")
+
+        aliases.add(["backpack"], "bag")
+        aliases.add(["sack"], "backpak")
+
+        assert aliases.to_dict() == {"backpack": "bag", "backpak": "bag", "sack": "bag"}
+
+    def test_persistence(self, tmp_path):
+        """Test that aliases are saved and reloaded"""
+        path = tmp_path / "aliases.json"
+        AliasMap(path).add(["backpak"], "backpack")
+
+        assert json.loads(path.read_text()) == {"backpak": "backpack"}
+        assert AliasMap(path).canonical("backpak") == "backpack"
+
+    def test_nothing_written_without_aliases(self, tmp_path):
+        """Test that the file is only created once an alias is added"""
+        path = tmp_path / "aliases.json"
+        aliases = AliasMap(path)
+        aliases.add(["backpack"], "backpack")
+
+        assert not path.exists()
+
+    def test_invalid_file(self, tmp_path, capsys):
+        """Test that a corrupted file is ignored"""
+        path = tmp_path / "aliases.json"
+        path.write_text("not json")
+
+        assert len(AliasMap(path)) == 0
+        assert "JSON decoding error" in capsys.readouterr().out
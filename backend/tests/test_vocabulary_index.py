@@ -0,0 +1,101 @@
+import pytest
+import os
+import sys
+from unittest.mock import Mock
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from yolo.vocabulary_index import VocabularyIndex, top_k_classes
+
+
+def fake_encode(names):
+    """Deterministic normalized 8-dim embeddings derived from the class names"""
+    vectors = np.array([[len(name) + i for i in range(8)] for name in names], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestVocabularyIndex:
+    """Test class for VocabularyIndex"""
+
+    def test_empty_index_creates_nothing(self, tmp_path):
+        """Test that an unused index does not touch the disk"""
+        index = VocabularyIndex(tmp_path / "index", dim=8)
+
+        assert len(index) == 0
+        assert not (tmp_path / "index").exists()
+        assert index.embeddings([]).shape == (0, 8)
+
+    def test_stable_ids(self, tmp_path):
+        """Test that classes keep the id they were first added with"""
+        index = VocabularyIndex(tmp_path, dim=8)
+        index.add(["rice", "miso soup"], fake_encode)
+
+        ids = index.add(["tempura", "rice"], fake_encode)
+
+        assert ids == [2, 0]
+        assert index.sort({"tempura", "miso soup", "rice"}) == ["rice", "miso soup", "tempura"]
+
+    def test_sort_unknown_names_last(self, tmp_path):
+        """Test that names without an embedding are ordered after known ones"""
+        index = VocabularyIndex(tmp_path, dim=8)
+        index.add(["udon"], fake_encode)
+
+        assert index.sort(["soba", "udon", "natto"]) == ["udon", "natto", "soba"]
+
+    def test_encodes_only_new_names(self, tmp_path):
+        """Test that embeddings are computed once per name"""
+        index = VocabularyIndex(tmp_path, dim=8)
+        encode = Mock(side_effect=fake_encode)
+        index.add(["rice", "udon"], encode)
+
+        index.add(["udon", "soba", "soba"], encode)
+        index.add(["rice"], encode)
+
+        assert encode.call_count == 2
+        encode.assert_called_with(["soba"])
+
+    def test_persistence(self, tmp_path):
+        """Test that names and embeddings are reloaded memory-mapped"""
+        index = VocabularyIndex(tmp_path, dim=8)
+        index.add(["rice", "udon", "soba"], fake_encode)
+
+        reloaded = VocabularyIndex(tmp_path)
+
+        assert reloaded.ids(["soba", "rice"]) == [2, 0]
+        assert isinstance(reloaded._matrix, np.memmap)
+        np.testing.assert_allclose(reloaded.embeddings(["udon"]), fake_encode(["udon"]))
+        assert reloaded.get_stats() == {"classes": 3, "dim": 8, "bytes": 3 * 8 * 4}
+
+    def test_unknown_name(self, tmp_path):
+        """Test that looking up an unknown class fails"""
+        index = VocabularyIndex(tmp_path, dim=8)
+
+        with pytest.raises(KeyError):
+            index.ids(["unknown"])
+
+    def test_corrupt_index(self, tmp_path):
+        """Test that an unreadable index starts empty"""
+        (tmp_path / "names.json").write_text("{not json")
+        (tmp_path / "embeddings.npy").write_bytes(b"")
+
+        assert len(VocabularyIndex(tmp_path, dim=8)) == 0
+
+
+class TestTopKClasses:
+    """Test class for top_k_classes"""
+
+    def test_top_k(self):
+        """Test that the most similar classes are returned in row order"""
+        classes = np.eye(4, dtype=np.float32)
+        image = np.array([0.1, 0.9, 0.0, 0.5], dtype=np.float32)
+
+        assert top_k_classes(image, classes, 2).tolist() == [1, 3]
+
+    def test_k_larger_than_vocabulary(self):
+        """Test that small vocabularies are kept whole"""
+        classes = np.eye(3, dtype=np.float32)
+
+        assert top_k_classes(np.ones(3, dtype=np.float32), classes, 5).tolist() == [0, 1, 2]
@@ -171,6 +171,19 @@ class TestYoloDetector:
 
         assert detector.current_classes == {"apple", "banana"}
 
+    def test_clear_classes(self, mock_yolo_world, tmp_path):
+        """Test that clearing installs a new empty vocabulary instead of mutating the old one"""
+        vocab_file = tmp_path / "vocab.json"
+        detector = YoloDetector(vocab_file=str(vocab_file))
+        detector.add_classes(["cat", "dog"])
+        snapshot = detector.current_classes
+
+        detector.clear_classes()
+
+        assert detector.current_classes == set()
+        assert snapshot == {"cat", "dog"}
+        assert json.loads(vocab_file.read_text()) == []
+
     def test_get_current_classes(self, mock_yolo_world):
         """Test getting current classes"""
         detector = YoloDetector()
@@ -218,6 +231,385 @@ class TestYoloDetector:
 
         detector.model.predict.assert_called_once_with("test_image.jpg", conf=0.25, verbose=False)
 
+    def test_predict_tiled(self, mock_yolo_world):
+        """Test that tiles run as one batch and are merged in image coordinates"""
+        from PIL import Image
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+
+        def predict(batch, **kwargs):
+            results = []
+            for i in range(len(batch)):
+                # Only the two tiles (not the full image) find the bottle
+                boxes = [[10.0, 10.0, 20.0, 20.0, 0.9, 0.0]] if i < 2 else []
+                results.append(Results(np.zeros((640, 640, 3), dtype=np.uint8), path="", names={0: "soy sauce"},
+                                       boxes=torch.tensor(boxes).reshape(-1, 6)))
+            return results
+
+        mock_yolo_world.return_value.predict.side_effect = predict
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        detector.current_classes = {"soy sauce"}
+
+        result = detector.predict_tiled(Image.new('RGB', (1100, 640)), tile_size=640, overlap=0.2)
+
+        batch = detector.model.predict.call_args[0][0]
+        assert tuple(batch.shape) == (3, 3, 640, 640)  # Two tiles plus the full image
+        assert result.names == {0: "soy sauce"}
+        assert sorted(result.boxes.xyxy[:, 0].tolist()) == [10.0, 470.0]
+
+    def test_predict_pil_image_uses_input_buffer(self, mock_yolo_world):
+        """Test that PIL images are letterboxed into a pooled tensor and boxes mapped back"""
+        from PIL import Image
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+
+        def predict(batch, **kwargs):
+            # Letterboxed 640x320 -> 640x320 canvas (no padding needed, scale 0.5)
+            return [Results(np.zeros((320, 640, 3), dtype=np.uint8), path="", names={0: "cup"},
+                            boxes=torch.tensor([[10.0, 20.0, 30.0, 40.0, 0.9, 0.0]]))]
+
+        mock_yolo_world.return_value.predict.side_effect = predict
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        detector.current_classes = {"cup"}
+
+        for _ in range(2):
+            result = detector.predict_image(Image.new('RGB', (1280, 640), color='white'), imgsz=640)
+
+        batch = detector.model.predict.call_args[0][0]
+        assert tuple(batch.shape) == (1, 3, 320, 640)
+        assert float(batch.max()) == 1.0
+        assert result.orig_shape == (640, 1280)
+        assert result.boxes.xyxy.tolist() == [[20.0, 40.0, 60.0, 80.0]]
+        assert detector.get_model_info()["input_buffers"]["reused"] == 1
+
+    def test_predict_batch(self, mock_yolo_world):
+        """Test that several images run as one square batch and boxes map back per image"""
+        from PIL import Image
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+
+        def predict(batch, **kwargs):
+            return [Results(np.zeros((640, 640, 3), dtype=np.uint8), path="", names={0: "cup"},
+                            boxes=torch.tensor([[0.0, 160.0, 64.0, 224.0, 0.9, 0.0]])) for _ in range(len(batch))]
+
+        mock_yolo_world.return_value.predict.side_effect = predict
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        detector.current_classes = {"cup"}
+
+        results = detector.predict_batch([Image.new('RGB', (1280, 640)), Image.new('RGB', (640, 320))], imgsz=640)
+
+        batch = detector.model.predict.call_args[0][0]
+        assert tuple(batch.shape) == (2, 3, 640, 640)
+        assert detector.model.predict.call_count == 1
+        assert [result.orig_shape for result in results] == [(640, 1280), (320, 640)]
+        assert results[0].boxes.xyxy.tolist() == [[0.0, 0.0, 128.0, 128.0]]
+        assert results[1].boxes.xyxy.tolist() == [[0.0, 0.0, 64.0, 64.0]]
+        assert detector.predict_batch([]) == []
+
+    def test_prepared_model_from_artifact_cache(self, mock_yolo_world, tmp_path):
+        """Test that a cached prepared model is loaded instead of encoding the vocabulary again"""
+        import torch
+        from yolo.artifact_cache import ModelArtifactCache
+
+        weights = tmp_path / "weights.pt"
+        weights.write_bytes(b"checkpoint")
+        vocab_file = tmp_path / "vocab.json"
+        vocab_file.write_text(json.dumps(["cup", "rice"]))
+        cache = ModelArtifactCache(tmp_path / "artifacts")
+        key = cache.key(weights, "cup\nrice")
+        cache.put(key, torch.nn.Linear(1, 1))
+
+        detector = YoloDetector(model_path=str(weights), vocab_file=str(vocab_file),
+                                artifact_cache_dir=tmp_path / "artifacts")
+
+        mock_yolo_world.assert_called_once_with(cache.path(key))
+        mock_yolo_world.return_value.set_classes.assert_not_called()
+        assert detector.get_model_info()["artifact_cache"]["hits"] == 1
+
+    def test_fine_tune_model_training_arguments(self, mock_yolo_world):
+        """Test that patience, device and extra arguments reach the trainer"""
+        detector = YoloDetector()
+
+        detector.fine_tune_model("data.yaml", epochs=5, patience=3, device="cuda", batch=4)
+
+        kwargs = detector.model.train.call_args.kwargs
+        assert kwargs["epochs"] == 5
+        assert kwargs["patience"] == 3
+        assert kwargs["device"] == "cuda"
+        assert kwargs["batch"] == 4
+
+    def test_fine_tune_from_base_weights(self, mock_yolo_world):
+        """Test that training starts from the given weights and leaves the served model alone"""
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        served = detector.model
+
+        detector.fine_tune_model("data.yaml", epochs=5, base_weights="previous.pt")
+
+        mock_yolo_world.assert_called_with("previous.pt")
+        assert detector.model is served
+        assert detector.model_path != "previous.pt"
+
+    def test_fine_tune_with_budget(self, mock_yolo_world):
+        """Test that the planned settings and time limit are used for training"""
+        plan = {"imgsz": 416, "batch": 8, "workers": 2, "epochs": 12, "remaining_seconds": 1800}
+        detector = YoloDetector()
+
+        with patch('yolo.object_detection.plan_training', return_value=plan):
+            _, returned_plan = detector.fine_tune_with_budget("data.yaml", budget_minutes=30, n_train=50, n_val=10)
+
+        assert returned_plan == plan
+        kwargs = detector.model.train.call_args.kwargs
+        assert kwargs["imgsz"] == 416
+        assert kwargs["epochs"] == 12
+        assert kwargs["batch"] == 8
+        assert kwargs["workers"] == 2
+        assert kwargs["time"] == pytest.approx(0.5)
+
+    def test_fine_tune_with_budget_benchmarks_training_network(self, mock_yolo_world):
+        """Test that the benchmark runs on a fresh instance of the weights that will be trained"""
+        served, fresh, trained = Mock(), Mock(), Mock()
+        mock_yolo_world.side_effect = [served, fresh, trained]
+        plan = {"imgsz": 320, "batch": 4, "workers": 1, "epochs": 3, "remaining_seconds": 600}
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+
+        def run_benchmark(benchmark, **kwargs):
+            benchmark(320, 4)
+            return plan
+
+        with patch('yolo.object_detection.plan_training', side_effect=run_benchmark), \
+                patch('yolo.object_detection.benchmark_training_step', return_value=0.01) as benchmark:
+            detector.fine_tune_with_budget("data.yaml", budget_minutes=10, n_train=20, n_val=5,
+                                           base_weights="previous.pt")
+
+        assert benchmark.call_args.args[0] is fresh.model
+        mock_yolo_world.assert_called_with("previous.pt")
+        trained.train.assert_called_once()
+        served.train.assert_not_called()
+
+    def test_fine_tune_with_budget_used_up(self, mock_yolo_world):
+        """Test that training does not start without a time limit when benchmarking used up the budget"""
+        plan = {"imgsz": 320, "batch": 1, "workers": 0, "epochs": 1, "remaining_seconds": 0.0}
+        detector = YoloDetector()
+
+        with patch('yolo.object_detection.plan_training', return_value=plan):
+            with pytest.raises(ValueError):
+                detector.fine_tune_with_budget("data.yaml", budget_minutes=0.1, n_train=50, n_val=10)
+
+        detector.model.train.assert_not_called()
+
+    def test_update_model_classes_uses_standby_model(self, mock_yolo_world):
+        """Test that a vocabulary change is prepared on a new instance and swapped in"""
+        old_model, new_model = Mock(), Mock()
+        mock_yolo_world.side_effect = [old_model, new_model]
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        detector.current_classes = {"car"}
+
+        detector._update_model_classes()
+
+        assert detector.model is new_model
+        new_model.set_classes.assert_called_once_with(["car"])
+        new_model.predict.assert_called_once()  # warm-up
+        old_model.set_classes.assert_not_called()
+
+    def test_load_trained_model_swaps_model(self, mock_yolo_world):
+        """Test loading fine-tuned weights while a request is in flight"""
+        old_model, new_model = Mock(), Mock()
+        mock_yolo_world.side_effect = [old_model, new_model]
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        detector.current_classes = {"car"}
+
+        with detector._holder.acquire() as (pinned, _):
+            detector.load_trained_model("best.pt")
+            assert pinned is old_model
+
+        assert detector.model is new_model
+        assert detector.model_path == "best.pt"
+        assert detector.get_model_info()["serving"]["draining"] == []
+
+    def _cascade_detector(self, mock_yolo_world, small_confidences):
+        """Create a cascade detector whose small model returns the given confidences"""
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+
+        large, small = MagicMock(), MagicMock()
+        mock_yolo_world.side_effect = [large, small]
+        boxes = torch.tensor([[10.0, 10.0, 50.0, 50.0, conf, 0.0] for conf in small_confidences]).reshape(-1, 6)
+        small.predict.return_value = [Results(np.zeros((100, 100, 3), dtype=np.uint8), path="", names={0: "car"}, boxes=boxes)]
+        large.predict.return_value = [Mock()]
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            json.dump(["car"], f)
+            vocab_path = f.name
+        try:
+            detector = YoloDetector(vocab_file=vocab_path, cascade_model_path="small.pt", uncertainty_band=(0.25, 0.6))
+        finally:
+            os.unlink(vocab_path)
+        return detector, large, small
+
+    def test_cascade_shares_vocabulary(self, mock_yolo_world):
+        """Test that the small model reuses the main model's text embeddings"""
+        detector, large, small = self._cascade_detector(mock_yolo_world, [0.9])
+
+        large.set_classes.assert_called_once_with(["car"])
+        small.set_classes.assert_not_called()
+        assert small.model.txt_feats is large.model.txt_feats
+        assert detector.cascade_enabled
+
+    def test_cascade_confident_small_result(self, mock_yolo_world):
+        """Test that confident images are answered by the small model"""
+        detector, large, small = self._cascade_detector(mock_yolo_world, [0.9, 0.1])
+
+        result = detector.predict_image("test.jpg", conf_threshold=0.5)
+
+        assert result.cascade_stage == "small"
+        assert result.model_version == detector.model_version  # The serving model's, not the screening model's
+        assert len(result.boxes) == 1  # Filtered to the requested threshold
+        assert small.predict.call_args.kwargs["conf"] == 0.25
+        large.predict.assert_not_called()
+        assert detector.get_cascade_stats()["small"] == 1
+
+    def test_cascade_escalates_uncertain_image(self, mock_yolo_world):
+        """Test that images with uncertain top confidences go to the main model"""
+        detector, large, small = self._cascade_detector(mock_yolo_world, [0.9, 0.4])
+
+        result = detector.predict_image("test.jpg")
+
+        assert result.cascade_stage == "large"
+        large.predict.assert_called_once()
+        assert detector.get_cascade_stats()["escalated"] == 1
+
+    def test_cascade_escalates_empty_result(self, mock_yolo_world):
+        """Test that images where the small model finds nothing go to the main model"""
+        detector, large, small = self._cascade_detector(mock_yolo_world, [])
+
+        result = detector.predict_image("test.jpg")
+
+        assert result.cascade_stage == "large"
+        large.predict.assert_called_once()
+
+    def test_cascade_disabled_per_request(self, mock_yolo_world):
+        """Test that cascade=False skips the small model"""
+        detector, large, small = self._cascade_detector(mock_yolo_world, [0.9])
+
+        result = detector.predict_image("test.jpg", cascade=False)
+
+        assert result.cascade_stage is None
+        small.predict.assert_not_called()
+        large.predict.assert_called_once()
+
+    def test_predict_image_with_pooled_model(self, mock_yolo_world):
+        """Test that a pooled model is used instead of the serving model and the cascade"""
+        detector, large, small = self._cascade_detector(mock_yolo_world, [0.9])
+        pooled = MagicMock()
+
+        result = detector.predict_image("test.jpg", model=pooled, model_version="v0002")
+
+        pooled.predict.assert_called_once()
+        small.predict.assert_not_called()
+        large.predict.assert_not_called()
+        assert result.model_version == "v0002"
+        assert result.cascade_stage is None
+
+    def test_load_closed_set_model(self, mock_yolo_world):
+        """Test serving a distilled closed-set model"""
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        detector.current_classes = {"car"}
+
+        with patch('yolo.object_detection.YOLO') as mock_yolo:
+            detector.load_trained_model("student.pt", version="v0002", closed_set=True)
+
+        mock_yolo.assert_called_once_with("student.pt")
+        mock_yolo.return_value.set_classes.assert_not_called()
+        assert detector.model is mock_yolo.return_value
+        assert detector.closed_set
+        assert detector.world_model_path == "./yolov8s-world.pt"
+
+    def test_vocabulary_change_leaves_closed_set_model(self, mock_yolo_world):
+        """Test that adding classes switches back to the open-vocabulary model"""
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+        detector.current_classes = {"car"}
+        with patch('yolo.object_detection.YOLO'):
+            detector.load_trained_model("student.pt", version="v0002", closed_set=True)
+
+        with patch.object(detector, '_save_custom_vocab'):
+            detector.add_classes(["bus"])
+
+        assert not detector.closed_set
+        assert detector.model_path == "./yolov8s-world.pt"
+        assert detector.model is mock_yolo_world.return_value
+        assert detector.model_version == "./yolov8s-world.pt"
+
+    def _dedup_detector(self, tmp_path, **kwargs):
+        """Create a detector whose text encoder maps misspellings of backpack close to it"""
+        import numpy as np
+
+        vectors = {"backpack": [1.0, 0.0, 0.0], "backpak": [0.98, 0.2, 0.0], "person": [0.0, 0.0, 1.0],
+                   "dog": [0.0, 1.0, 0.0]}
+        clip = Mock()
+        clip.encode_text.side_effect = lambda names: np.array([vectors[name] for name in names])
+        (tmp_path / "vocab.json").write_text(json.dumps(["person", "backpack"]))
+        return YoloDetector(vocab_file=tmp_path / "vocab.json", candidate_k=100, clip_encoder=clip,
+                            vocabulary_index_dir=tmp_path / "index", **kwargs)
+
+    def test_suggest_and_merge_classes(self, mock_yolo_world, tmp_path):
+        """Test that a misspelled class is suggested, merged and resolved afterwards"""
+        detector = self._dedup_detector(tmp_path)
+        detector.add_classes(["backpak"])
+
+        groups = detector.suggest_merges(threshold=0.9)
+        assert [(g["canonical"], g["aliases"]) for g in groups] == [("backpack", ["backpak"])]
+
+        assert detector.merge_classes(["backpak"], "backpack") == ["backpak"]
+        assert detector.current_classes == {"person", "backpack"}
+        assert json.loads((tmp_path / "vocab_aliases.json").read_text()) == {"backpak": "backpack"}
+
+        detector.add_classes(["backpak"])
+        assert detector.current_classes == {"person", "backpack"}
+        assert detector.canonical_name("backpak") == "backpack"
+
+    def test_auto_merge_new_class(self, mock_yolo_world, tmp_path):
+        """Test that a new class close to an existing one is merged as it is added"""
+        detector = self._dedup_detector(tmp_path, auto_merge_threshold=0.95)
+
+        merged = detector.add_classes(["backpak", "dog"])
+
+        assert merged == {"backpak": "backpack"}
+        assert detector.current_classes == {"person", "backpack", "dog"}
+        assert detector.aliases.to_dict() == {"backpak": "backpack"}
+
+    def test_no_auto_merge_by_default(self, mock_yolo_world, tmp_path):
+        """Test that near-duplicates are only suggested unless auto-merge is enabled"""
+        detector = self._dedup_detector(tmp_path)
+
+        assert detector.add_classes(["backpak"]) == {}
+        assert detector.current_classes == {"person", "backpack", "backpak"}
+
+    def test_result_reports_canonical_names(self, mock_yolo_world, tmp_path):
+        """Test that a model still predicting a merged class reports the canonical name"""
+        detector = self._dedup_detector(tmp_path)
+        detector.aliases.add(["backpak"], "backpack")
+        pooled = MagicMock()
+        pooled.predict.return_value = [Mock(names={0: "backpak", 1: "person"})]
+
+        result = detector.predict_image("test.jpg", model=pooled, model_version="v0001")
+
+        assert result.names == {0: "backpack", 1: "person"}
+
+    def test_fine_tune_student(self, mock_yolo_world):
+        """Test that a student checkpoint is trained instead of YOLO-World"""
+        detector = YoloDetector(vocab_file="non_existent_vocab.json")
+
+        with patch('yolo.object_detection.YOLO') as mock_yolo:
+            detector.fine_tune_model("data.yaml", epochs=5, student_weights="yolov8n.pt")
+
+        mock_yolo.assert_called_once_with("yolov8n.pt")
+        mock_yolo.return_value.train.assert_called_once()
+        assert detector.last_best_weights is mock_yolo.return_value.trainer.best
+
     def test_integration_workflow(self, mock_yolo_world):
         """Test complete workflow: init -> add classes -> predict"""
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
@@ -249,4 +641,100 @@ class TestYoloDetector:
 
         finally:
             if os.path.exists(temp_path):
-                os.unlink(temp_path)
\ No newline at end of file
+                os.unlink(temp_path)
+
+class FakeClipEncoder:
+    """Deterministic stand-in for CLIP: random unit text embeddings per name, images close to chosen classes"""
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.image_classes = ["apple"]
+
+    def encode_text(self, names):
+        import numpy as np
+        vectors = []
+        for name in names:
+            generator = np.random.default_rng(sum(name.encode("utf-8")) * 7919 + len(name))
+            vector = generator.standard_normal(self.dim).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.stack(vectors)
+
+    def encode_image(self, image):
+        vector = self.encode_text(self.image_classes).sum(axis=0)
+        return vector / (vector ** 2).sum() ** 0.5
+
+
+class TestCandidatePrefilter:
+    """Test prefiltering large vocabularies on a randomly initialized YOLO-World model"""
+
+    @pytest.fixture
+    def detector(self, tmp_path):
+        """Detector with candidate_k=4 whose models are built from the YOLO-World v2 config"""
+        import torch
+        from ultralytics.models import YOLOWorld as WorldModelWrapper
+
+        clip = FakeClipEncoder()
+
+        def build_model(model_path):
+            torch.manual_seed(0)
+            model = WorldModelWrapper("yolov8s-worldv2.yaml")
+
+            def set_classes(names):
+                # Text features from the fake encoder instead of downloading CLIP
+                model.model.txt_feats = torch.from_numpy(clip.encode_text(names)).unsqueeze(0)
+                model.model.model[-1].nc = len(names)
+                model.model.names = dict(enumerate(names))
+                model.predictor = None
+
+            model.set_classes = set_classes
+            return model
+
+        (tmp_path / "vocab.json").write_text(json.dumps(["apple", "banana", "cherry"]))
+        with patch('yolo.object_detection.YOLOWorld', side_effect=build_model):
+            detector = YoloDetector(vocab_file=tmp_path / "vocab.json", candidate_k=4, clip_encoder=clip,
+                                    vocabulary_index_dir=tmp_path / "index")
+            yield detector, clip
+
+    @pytest.fixture
+    def image(self):
+        from PIL import Image
+        return Image.new('RGB', (96, 64), color=(120, 80, 40))
+
+    MENU = [f"dish {i}" for i in range(10)]
+
+    def test_prefilter_switches_on_above_k(self, detector, image):
+        """Test that growing the vocabulary past k runs each image on its candidate classes"""
+        detector, clip = detector
+        assert not detector.prefilter_active
+
+        detector.add_classes(self.MENU)
+        clip.image_classes = ["dish 5", "dish 6", "dish 7", "dish 8"]
+        result = detector.predict_image(image, conf_threshold=0.0, imgsz=320)
+
+        assert detector.prefilter_active
+        assert detector.model.model.model[-1].nc == 4
+        assert sorted(result.names.values()) == ["dish 5", "dish 6", "dish 7", "dish 8"]
+
+    def test_previous_model_keeps_its_vocabulary_while_growing(self, detector, image):
+        """Test that a request still on the full-vocabulary model is not given candidate classes"""
+        detector, clip = detector
+
+        with detector._holder.acquire() as (old_model, _):
+            detector.add_classes(self.MENU)
+            result = detector._predict_one(old_model, image, 0.0, 320)
+
+        assert sorted(result.names.values()) == ["apple", "banana", "cherry"]
+
+    def test_previous_model_keeps_its_candidates_while_shrinking(self, detector, image):
+        """Test that a request still on the candidate-slot model keeps prefiltering below k"""
+        detector, clip = detector
+        detector.add_classes(self.MENU)
+        clip.image_classes = ["dish 5", "dish 6", "dish 7", "dish 8"]
+
+        with detector._holder.acquire() as (old_model, _):
+            detector.merge_classes(self.MENU, "apple")
+            result = detector._predict_one(old_model, image, 0.0, 320)
+
+        assert not detector.prefilter_active
+        assert sorted(result.names.values()) == ["dish 5", "dish 6", "dish 7", "dish 8"]
+        assert sorted(detector.predict_image(image, imgsz=320).names.values()) == ["apple", "banana", "cherry"]
@@ -21,7 +21,7 @@ interface Detection {
 interface DetectionResponse {
   detections: Detection[];
   message: string;
-  processed_image: string;
+  processed_image_url: string | null;
 }
 
 const HomeScreen = () => {
@@ -268,7 +268,7 @@ const HomeScreen = () => {
       capturedImage: !!capturedImage,
       detectionResults: !!detectionResults,
       detectionsCount: detectionResults?.detections.length || 0,
-      hasProcessedImage: !!detectionResults?.processed_image
+      hasProcessedImage: !!detectionResults?.processed_image_url
     });
 
     return (
@@ -284,8 +284,8 @@ const HomeScreen = () => {
           <View style={styles.imageContainer}>
             <Image
               source={{
-                uri: detectionResults?.processed_image
-                  ? `data:image/jpeg;base64,${detectionResults.processed_image}`
+                uri: detectionResults?.processed_image_url
+                  ? `${env?.API_ENDPOINT}${detectionResults.processed_image_url}`
                   : capturedImage
               }}
               style={[styles.resultImage, { backgroundColor: isDark ? '#374151' : '#F3F4F6' }]}